@@ -8,21 +8,73 @@ ALADDIN Security System - Database Module
 Дата: 2025-09-01
 """
 
+import asyncio
+import itertools
 import json
+import queue
 import sqlite3
 import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
 
 from .base import ComponentStatus, CoreBase
 
+# Размер кэша подготовленных выражений sqlite3 на соединение
+STATEMENT_CACHE_SIZE = 256
+
+_memory_db_ids = itertools.count(1)
+
+
+def _resolve_db_target(db_path: str) -> Tuple[str, bool]:
+    """
+    Путь для sqlite3.connect и флаг uri.
+
+    ":memory:" превращается в именованную общую БД в памяти, чтобы
+    писатель и читатели пула видели одни и те же данные.
+    """
+    if db_path == ":memory:":
+        name = f"aladdin_mem_{next(_memory_db_ids)}"
+        return f"file:{name}?mode=memory&cache=shared", True
+    return db_path, db_path.startswith("file:")
+
+
+def open_sqlite(
+    target: str, uri: bool = False, timeout: float = 30.0
+) -> sqlite3.Connection:
+    """Открытие соединения в режиме WAL с кэшем выражений"""
+    connection = sqlite3.connect(
+        target,
+        check_same_thread=False,
+        timeout=timeout,
+        uri=uri,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    connection.row_factory = sqlite3.Row
+    if "mode=memory" not in target:
+        # WAL: читатели не блокируют писателя и друг друга
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
 
 class DatabaseConnection:
     """Класс для управления соединением с базой данных"""
 
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, uri: bool = False):
         self.db_path = db_path
+        self.uri = uri
         self.connection: Optional[sqlite3.Connection] = None
         self.lock = threading.Lock()
 
@@ -35,10 +87,7 @@ class DatabaseConnection:
         """
         try:
             with self.lock:
-                self.connection = sqlite3.connect(
-                    self.db_path, check_same_thread=False, timeout=30.0)
-                if self.connection:
-                    self.connection.row_factory = sqlite3.Row
+                self.connection = open_sqlite(self.db_path, self.uri)
                 return True
         except Exception as e:
             print(f"Ошибка подключения к БД: {e}")
@@ -117,8 +166,192 @@ class DatabaseConnection:
             return False
 
 
+class ReaderPool:
+    """
+    Пул соединений для чтения.
+
+    Каждое соединение в каждый момент используется одним потоком,
+    поэтому чтения из разных потоков идут параллельно (WAL), а не
+    через одну общую блокировку.
+    """
+
+    def __init__(self, target: str, uri: bool, size: int,
+                 timeout: float = 30.0):
+        self.target = target
+        self.uri = uri
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        connection = open_sqlite(self.target, self.uri, self.timeout)
+        connection.execute("PRAGMA query_only=ON")
+        return connection
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Выдача соединения из пула (создаётся лениво до size)"""
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            connection = None
+            with self._lock:
+                if len(self._all) < self.size:
+                    connection = self._open()
+                    self._all.append(connection)
+            if connection is None:
+                connection = self._idle.get(timeout=self.timeout)
+        try:
+            yield connection
+        finally:
+            self._idle.put(connection)
+
+    def close_all(self):
+        with self._lock:
+            for connection in self._all:
+                connection.close()
+            self._all.clear()
+            self._idle = queue.LifoQueue()
+
+    @property
+    def open_connections(self) -> int:
+        return len(self._all)
+
+
+class WriteBatcher:
+    """
+    Выделенный поток записи с групповым коммитом.
+
+    Записи ставятся в очередь и выполняются пачками в одной
+    транзакции. Каждая запись выполняется в своей точке сохранения,
+    поэтому ошибка одной записи не откатывает остальные. Результат
+    возвращается через concurrent.futures.Future (для asyncio -
+    asyncio.wrap_future).
+    """
+
+    _STOP = object()
+
+    def __init__(self, target: str, uri: bool, batch_size: int = 1000,
+                 timeout: float = 30.0):
+        self.target = target
+        self.uri = uri
+        self.batch_size = max(1, batch_size)
+        self.timeout = timeout
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._start_error: Optional[Exception] = None
+        # Соединение писателя держит общую БД в памяти живой
+        self._connection: Optional[sqlite3.Connection] = None
+        self.stats = {"batches": 0, "writes": 0, "errors": 0}
+
+    def start(self) -> bool:
+        if self._thread is not None:
+            return self._start_error is None
+        self._thread = threading.Thread(
+            target=self._run, name="aladdin-db-writer", daemon=True)
+        self._thread.start()
+        self._ready.wait(self.timeout)
+        return self._start_error is None and self._ready.is_set()
+
+    def submit(self, query: str, params: Sequence[Any] = ()) -> Future:
+        """Постановка одной записи в очередь"""
+        future: Future = Future()
+        self._queue.put((query, params, False, future))
+        return future
+
+    def submit_many(self, query: str,
+                    rows: Iterable[Sequence[Any]]) -> Future:
+        """Постановка пакета строк для executemany"""
+        future: Future = Future()
+        self._queue.put((query, list(rows), True, future))
+        return future
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._queue.put(self._STOP)
+        self._thread.join(self.timeout)
+        self._thread = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        try:
+            connection = open_sqlite(self.target, self.uri, self.timeout)
+            # Транзакциями управляем сами
+            connection.isolation_level = None
+            self._connection = connection
+        except Exception as e:
+            self._start_error = e
+            self._ready.set()
+            return
+        self._ready.set()
+
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if any(item is self._STOP for item in batch):
+                stopping = True
+                batch = [item for item in batch if item is not self._STOP]
+            if batch:
+                self._write_batch(connection, batch)
+
+        connection.close()
+        self._connection = None
+
+    def _write_batch(self, connection: sqlite3.Connection,
+                     batch: List[Tuple[str, Any, bool, Future]]):
+        results: List[Tuple[Future, Any, Optional[Exception]]] = []
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            for query, params, many, future in batch:
+                try:
+                    connection.execute("SAVEPOINT write_item")
+                    if many:
+                        cursor = connection.executemany(query, params)
+                    else:
+                        cursor = connection.execute(query, params)
+                    connection.execute("RELEASE write_item")
+                    results.append((future, cursor.lastrowid, None))
+                except Exception as e:
+                    connection.execute("ROLLBACK TO write_item")
+                    connection.execute("RELEASE write_item")
+                    results.append((future, None, e))
+            connection.execute("COMMIT")
+        except Exception as e:
+            try:
+                connection.execute("ROLLBACK")
+            except Exception:
+                pass
+            results = [(item[3], None, e) for item in batch]
+
+        self.stats["batches"] += 1
+        for future, value, error in results:
+            if error is None:
+                self.stats["writes"] += 1
+                future.set_result(value)
+            else:
+                self.stats["errors"] += 1
+                future.set_exception(error)
+
+
 class DatabaseManager(CoreBase):
-    """Менеджер базы данных для системы ALADDIN"""
+    """
+    Менеджер базы данных для системы ALADDIN
+
+    Чтения выполняются через пул соединений в режиме WAL, записи -
+    через выделенный поток с групповым коммитом (WriteBatcher).
+    """
 
     def __init__(self, name: str = "DatabaseManager",
                  config: Optional[Dict[str, Any]] = None):
@@ -133,11 +366,16 @@ class DatabaseManager(CoreBase):
             "max_connections", 10) if config else 10
         self.connection_timeout = config.get(
             "connection_timeout", 30) if config else 30
+        self.write_batch_size = self.config.get("write_batch_size", 1000)
 
         # Управление соединениями
         self.connection_pool: List[DatabaseConnection] = []
         self.active_connections = 0
         self.connection_lock = threading.Lock()
+        self._db_target, self._db_uri = _resolve_db_target(self.db_path)
+        self.reader_pool: Optional[ReaderPool] = None
+        self.writer: Optional[WriteBatcher] = None
+        self._stats_lock = threading.Lock()
 
         # Статистика
         self.query_count = 0
@@ -178,7 +416,8 @@ class DatabaseManager(CoreBase):
     def _create_directories(self):
         """Создание необходимых директорий"""
         try:
-            Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            if not self._db_uri:
+                Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
             Path(self.backup_path).mkdir(parents=True, exist_ok=True)
             self.log_activity("Директории для базы данных созданы")
         except Exception as e:
@@ -187,12 +426,19 @@ class DatabaseManager(CoreBase):
     def _initialize_database(self) -> bool:
         """Инициализация базы данных"""
         try:
-            # Создание основного соединения
-            connection = DatabaseConnection(self.db_path)
-            if not connection.connect():
+            # Поток записи (первым: создаёт файл и включает WAL)
+            self.writer = WriteBatcher(
+                self._db_target, self._db_uri,
+                batch_size=self.write_batch_size,
+                timeout=self.connection_timeout)
+            if not self.writer.start():
                 return False
 
-            self.connection_pool.append(connection)
+            # Пул соединений для чтения
+            self.reader_pool = ReaderPool(
+                self._db_target, self._db_uri,
+                size=self.max_connections,
+                timeout=self.connection_timeout)
             self.active_connections = 1
 
             self.log_activity("База данных инициализирована")
@@ -288,16 +534,30 @@ class DatabaseManager(CoreBase):
                 """,
             ]
 
-            connection = self.get_connection()
-            if not connection:
-                return False
+            # Индексы под выборки по времени и имени
+            indexes = [
+                "CREATE INDEX IF NOT EXISTS idx_metrics_name_time "
+                "ON metrics (metric_name, timestamp)",
+                "CREATE INDEX IF NOT EXISTS idx_metrics_component_time "
+                "ON metrics (component, timestamp)",
+                "CREATE INDEX IF NOT EXISTS idx_metrics_time "
+                "ON metrics (timestamp)",
+                "CREATE INDEX IF NOT EXISTS idx_events_time "
+                "ON security_events (timestamp)",
+                "CREATE INDEX IF NOT EXISTS idx_events_resolved_time "
+                "ON security_events (resolved, timestamp)",
+                "CREATE INDEX IF NOT EXISTS idx_audit_time "
+                "ON audit_log (timestamp)",
+                "CREATE INDEX IF NOT EXISTS idx_audit_user_time "
+                "ON audit_log (user_id, timestamp)",
+                "CREATE INDEX IF NOT EXISTS idx_threats_status_time "
+                "ON threats (status, detected_at)",
+            ]
 
-            for table_sql in tables:
-                cursor = connection.execute(table_sql)
-                if not cursor:
+            for sql in tables + indexes:
+                if not self.execute_update(sql):
                     return False
 
-            connection.commit()
             self.log_activity("Таблицы базы данных созданы")
             return True
 
@@ -307,7 +567,10 @@ class DatabaseManager(CoreBase):
 
     def get_connection(self) -> Optional[DatabaseConnection]:
         """
-        Получение соединения с базой данных
+        Получение отдельного соединения с базой данных
+
+        Для совместимости с кодом, которому нужен прямой доступ к
+        соединению; запросы менеджера используют пул и поток записи.
 
         Returns:
             Optional[DatabaseConnection]: Соединение с БД или None
@@ -317,7 +580,8 @@ class DatabaseManager(CoreBase):
                 if self.connection_pool:
                     return self.connection_pool[0]  # Простая реализация
                 else:
-                    connection = DatabaseConnection(self.db_path)
+                    connection = DatabaseConnection(
+                        self._db_target, self._db_uri)
                     if connection.connect():
                         self.connection_pool.append(connection)
                         self.active_connections += 1
@@ -327,6 +591,14 @@ class DatabaseManager(CoreBase):
             self.log_activity(f"Ошибка получения соединения: {e}", "error")
             return None
 
+    def _count_query(self):
+        with self._stats_lock:
+            self.query_count += 1
+
+    def _count_error(self):
+        with self._stats_lock:
+            self.error_count += 1
+
     def execute_query(self, query: str, params: tuple = ()
                       ) -> Optional[List[Dict[str, Any]]]:
         """
@@ -340,57 +612,146 @@ class DatabaseManager(CoreBase):
             Optional[List[Dict[str, Any]]]: Результаты запроса или None
         """
         try:
-            connection = self.get_connection()
-            if not connection:
+            if not self.reader_pool:
                 return None
 
-            cursor = connection.execute(query, params)
-            if not cursor:
-                return None
-
-            results = []
-            for row in cursor.fetchall():
-                results.append(dict(row))
+            with self.reader_pool.connection() as connection:
+                cursor = connection.execute(query, params)
+                results = [dict(row) for row in cursor.fetchall()]
 
-            self.query_count += 1
+            self._count_query()
             return results
 
         except Exception as e:
-            self.error_count += 1
+            self._count_error()
             self.log_activity(f"Ошибка выполнения запроса: {e}", "error")
             return None
 
-    def execute_update(self, query: str, params: tuple = ()) -> bool:
+    def iter_query(self, query: str, params: tuple = (),
+                   batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
         """
-        Выполнение обновления базы данных
+        Потоковое чтение результатов запроса
+
+        Строки читаются порциями по batch_size через fetchmany, поэтому
+        большие выборки не материализуются в памяти целиком. Соединение
+        пула занято, пока итератор не исчерпан или не закрыт.
 
         Args:
             query: SQL запрос
             params: Параметры запроса
+            batch_size: Размер порции
+
+        Yields:
+            Dict[str, Any]: Строка результата
+        """
+        if not self.reader_pool:
+            return
+        try:
+            with self.reader_pool.connection() as connection:
+                cursor = connection.execute(query, params)
+                try:
+                    while True:
+                        rows = cursor.fetchmany(batch_size)
+                        if not rows:
+                            break
+                        for row in rows:
+                            yield dict(row)
+                finally:
+                    cursor.close()
+            self._count_query()
+        except sqlite3.Error as e:
+            self._count_error()
+            self.log_activity(f"Ошибка выполнения запроса: {e}", "error")
+
+    def submit_update(self, query: str, params: tuple = ()) -> Future:
+        """
+        Постановка записи в очередь потока записи без ожидания
 
         Returns:
-            bool: True если обновление выполнено успешно
+            Future: Результат (lastrowid) после группового коммита
         """
+        if not self.writer:
+            future: Future = Future()
+            future.set_exception(
+                RuntimeError("База данных не инициализирована"))
+            return future
+        return self.writer.submit(query, params)
+
+    def _wait_write(self, future: Future, wait: bool) -> bool:
+        if not wait:
+            future.add_done_callback(self._on_write_done)
+            return True
         try:
-            connection = self.get_connection()
-            if not connection:
-                return False
+            future.result(timeout=self.connection_timeout)
+            self._count_query()
+            return True
+        except Exception as e:
+            self._count_error()
+            self.log_activity(f"Ошибка выполнения обновления: {e}", "error")
+            return False
 
-            cursor = connection.execute(query, params)
-            if not cursor:
-                return False
+    def _on_write_done(self, future: Future):
+        if future.exception() is None:
+            self._count_query()
+        else:
+            self._count_error()
+            self.log_activity(
+                f"Ошибка выполнения обновления: {future.exception()}",
+                "error")
+
+    def execute_update(self, query: str, params: tuple = (),
+                       wait: bool = True) -> bool:
+        """
+        Выполнение обновления базы данных
 
-            success = connection.commit()
-            if success:
-                self.query_count += 1
+        Args:
+            query: SQL запрос
+            params: Параметры запроса
+            wait: Дождаться коммита (False - только поставить в очередь)
 
-            return success
+        Returns:
+            bool: True если обновление выполнено (или поставлено в очередь)
+        """
+        return self._wait_write(self.submit_update(query, params), wait)
 
+    def execute_many(self, query: str, rows: Iterable[Sequence[Any]],
+                     wait: bool = True) -> bool:
+        """
+        Пакетное выполнение одного выражения для набора строк
+
+        Args:
+            query: SQL запрос
+            rows: Параметры для каждой строки
+            wait: Дождаться коммита
+
+        Returns:
+            bool: True если пакет записан (или поставлен в очередь)
+        """
+        if not self.writer:
+            return False
+        return self._wait_write(self.writer.submit_many(query, rows), wait)
+
+    async def execute_update_async(self, query: str,
+                                   params: tuple = ()) -> bool:
+        """
+        Асинхронная запись: не блокирует event loop до коммита
+
+        Returns:
+            bool: True если запись зафиксирована
+        """
+        try:
+            await asyncio.wrap_future(self.submit_update(query, params))
+            self._count_query()
+            return True
         except Exception as e:
-            self.error_count += 1
+            self._count_error()
             self.log_activity(f"Ошибка выполнения обновления: {e}", "error")
             return False
 
+    def flush(self) -> bool:
+        """Ожидание записи всех поставленных в очередь изменений"""
+        return self.execute_update("SELECT 1")
+
     def insert_user(
         self,
         username: str,
@@ -438,6 +799,7 @@ class DatabaseManager(CoreBase):
         description: str,
         source: str,
         event_data: Optional[Dict[str, Any]] = None,
+        wait: bool = True,
     ) -> bool:
         """
         Добавление события безопасности
@@ -448,6 +810,7 @@ class DatabaseManager(CoreBase):
             description: Описание события
             source: Источник события
             event_data: Дополнительные данные события
+            wait: Дождаться коммита (False - групповая запись в фоне)
 
         Returns:
             bool: True если событие добавлено
@@ -460,7 +823,8 @@ class DatabaseManager(CoreBase):
         event_data_json = json.dumps(event_data) if event_data else None
         return self.execute_update(
             query,
-            (event_type, severity, description, source, event_data_json)
+            (event_type, severity, description, source, event_data_json),
+            wait=wait,
         )
 
     def get_security_events(
@@ -554,6 +918,7 @@ class DatabaseManager(CoreBase):
         ip_address: Optional[str] = None,
         user_agent: Optional[str] = None,
         details: Optional[Dict[str, Any]] = None,
+        wait: bool = True,
     ) -> bool:
         """
         Добавление записи в аудиторский журнал
@@ -565,6 +930,7 @@ class DatabaseManager(CoreBase):
             ip_address: IP адрес
             user_agent: User Agent
             details: Дополнительные детали
+            wait: Дождаться коммита (False - групповая запись в фоне)
 
         Returns:
             bool: True если запись добавлена
@@ -582,7 +948,8 @@ class DatabaseManager(CoreBase):
              resource,
              ip_address,
              user_agent,
-             details_json))
+             details_json),
+            wait=wait)
 
     def get_audit_log(self, limit: int = 100,
                       user_id: Optional[int] = None) -> List[Dict[str, Any]]:
@@ -656,6 +1023,7 @@ class DatabaseManager(CoreBase):
         metric_unit: Optional[str] = None,
         component: Optional[str] = None,
         tags: Optional[Dict[str, str]] = None,
+        wait: bool = True,
     ) -> bool:
         """
         Добавление метрики
@@ -666,23 +1034,49 @@ class DatabaseManager(CoreBase):
             metric_unit: Единица измерения
             component: Компонент
             tags: Теги метрики
+            wait: Дождаться коммита (False - групповая запись в фоне)
 
         Returns:
             bool: True если метрика добавлена
         """
-        query = """
-        INSERT INTO metrics
-        (metric_name, metric_value, metric_unit, component, tags)
-        VALUES (?, ?, ?, ?, ?)
-        """
         tags_json = json.dumps(tags) if tags else None
         return self.execute_update(
-            query,
+            self._METRIC_INSERT,
             (metric_name,
              metric_value,
              metric_unit,
              component,
-             tags_json))
+             tags_json),
+            wait=wait)
+
+    _METRIC_INSERT = """
+        INSERT INTO metrics
+        (metric_name, metric_value, metric_unit, component, tags)
+        VALUES (?, ?, ?, ?, ?)
+        """
+
+    def add_metrics(self, metrics: Iterable[Dict[str, Any]],
+                    wait: bool = True) -> bool:
+        """
+        Пакетное добавление метрик одним выражением
+
+        Args:
+            metrics: Словари с ключами metric_name, metric_value и
+                необязательными metric_unit, component, tags
+            wait: Дождаться коммита
+
+        Returns:
+            bool: True если метрики добавлены
+        """
+        rows = [
+            (m["metric_name"],
+             m["metric_value"],
+             m.get("metric_unit"),
+             m.get("component"),
+             json.dumps(m["tags"]) if m.get("tags") else None)
+            for m in metrics
+        ]
+        return self.execute_many(self._METRIC_INSERT, rows, wait=wait)
 
     def get_metrics(self,
                     metric_name: Optional[str] = None,
@@ -700,34 +1094,52 @@ class DatabaseManager(CoreBase):
         Returns:
             List[Dict[str, Any]]: Список метрик
         """
-        if metric_name and component:
-            query = """
-            SELECT * FROM metrics
-            WHERE metric_name = ? AND component = ? AND
-                  timestamp >= datetime('now', '-{} hours')
-            ORDER BY timestamp DESC
-            """.format(
-                hours
-            )
-            return self.execute_query(query, (metric_name, component)) or []
-        elif metric_name:
-            query = """
-            SELECT * FROM metrics
-            WHERE metric_name = ? AND timestamp >= datetime('now', '-{} hours')
-            ORDER BY timestamp DESC
-            """.format(
-                hours
-            )
-            return self.execute_query(query, (metric_name,)) or []
-        else:
-            query = """
-            SELECT * FROM metrics
-            WHERE timestamp >= datetime('now', '-{} hours')
-            ORDER BY timestamp DESC
-            """.format(
-                hours
-            )
-            return self.execute_query(query) or []
+        query, params = self._metrics_query(metric_name, component, hours)
+        return self.execute_query(query, params) or []
+
+    def iter_metrics(self,
+                     metric_name: Optional[str] = None,
+                     component: Optional[str] = None,
+                     hours: int = 24,
+                     batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Потоковое получение метрик (см. iter_query)
+
+        Args:
+            metric_name: Название метрики
+            component: Компонент
+            hours: Количество часов для выборки
+            batch_size: Размер порции чтения
+
+        Yields:
+            Dict[str, Any]: Метрика
+        """
+        query, params = self._metrics_query(metric_name, component, hours)
+        return self.iter_query(query, params, batch_size)
+
+    @staticmethod
+    def _metrics_query(metric_name: Optional[str],
+                       component: Optional[str],
+                       hours: int) -> Tuple[str, tuple]:
+        """
+        Параметризованный запрос метрик
+
+        Интервал передаётся параметром, поэтому текст запроса не
+        меняется и подготовленное выражение берётся из кэша.
+        """
+        conditions = ["timestamp >= datetime('now', ?)"]
+        params: List[Any] = [f"-{int(hours)} hours"]
+        if metric_name:
+            conditions.append("metric_name = ?")
+            params.append(metric_name)
+        if component:
+            conditions.append("component = ?")
+            params.append(component)
+        query = (
+            "SELECT * FROM metrics WHERE " + " AND ".join(conditions)
+            + " ORDER BY timestamp DESC"
+        )
+        return query, tuple(params)
 
     def create_backup(self) -> bool:
         """
@@ -738,12 +1150,19 @@ class DatabaseManager(CoreBase):
         """
         try:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = f"{self.backup_path}aladdin_backup_{timestamp}.db"
+            backup_file = str(
+                Path(self.backup_path) / f"aladdin_backup_{timestamp}.db")
 
-            # Копирование файла базы данных
-            import shutil
-
-            shutil.copy2(self.db_path, backup_file)
+            # Копирование через backup API: согласованная копия с учётом
+            # WAL без остановки записи
+            if not self.reader_pool:
+                return False
+            target = sqlite3.connect(backup_file)
+            try:
+                with self.reader_pool.connection() as connection:
+                    connection.backup(target)
+            finally:
+                target.close()
 
             self.last_backup = datetime.now()
             self.log_activity(f"Создана резервная копия: {backup_file}")
@@ -763,7 +1182,12 @@ class DatabaseManager(CoreBase):
         stats = {
             "total_queries": self.query_count,
             "error_count": self.error_count,
-            "active_connections": self.active_connections,
+            "active_connections": (
+                self.reader_pool.open_connections + 1
+                if self.reader_pool else 0
+            ),
+            "pending_writes": self.writer.pending if self.writer else 0,
+            "writer": dict(self.writer.stats) if self.writer else {},
             "last_backup": (
                 self.last_backup.isoformat()
                 if self.last_backup else None
@@ -790,9 +1214,10 @@ class DatabaseManager(CoreBase):
                 )
                 continue
 
-            # Безопасный параметризованный запрос
-            query = "SELECT COUNT(*) as count FROM ?"
-            result = self.execute_query(query, (table,))
+            # Имя таблицы из белого списка и прошло валидацию
+            # (имена таблиц нельзя передать параметром запроса)
+            query = f"SELECT COUNT(*) as count FROM {table}"
+            result = self.execute_query(query)
             if result:
                 stats[f"{table}_count"] = result[0]["count"]
 
@@ -855,7 +1280,13 @@ class DatabaseManager(CoreBase):
         try:
             self.log_activity(f"Остановка менеджера базы данных {self.name}")
 
-            # Закрытие всех соединений
+            # Дописываем очередь и закрываем все соединения
+            if self.writer:
+                self.writer.stop()
+                self.writer = None
+            if self.reader_pool:
+                self.reader_pool.close_all()
+                self.reader_pool = None
             for connection in self.connection_pool:
                 connection.disconnect()
 
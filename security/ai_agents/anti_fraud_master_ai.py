@@ -36,12 +36,23 @@ AntiFraudMasterAI - Главный агент защиты от мошеннич
 
 import asyncio
 import logging
+import re
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 from functools import lru_cache
-from typing import Any, Dict, Generic, List, Optional, Protocol, Tuple, TypeVar
+from typing import (
+    Any,
+    Dict,
+    Generic,
+    List,
+    Optional,
+    Protocol,
+    Set,
+    Tuple,
+    TypeVar,
+)
 
 from core.base import ComponentStatus, SecurityBase
 from security.ai_agents.deepfake_protection_system import (
@@ -153,6 +164,16 @@ class AntiFraudConfig:
     batch_size: int = 5
     task_timeout: int = 30  # таймаут для задач в секундах
 
+    # Списки номеров
+    blocked_numbers: List[str] = field(default_factory=list)
+    trusted_contacts: List[str] = field(default_factory=list)
+
+    # Настройки потокового анализа звонков
+    stream_score_interval: float = 1.0  # секунды аудио между оценками
+    stream_ambiguity_floor: float = 0.3  # ниже - риск считается низким
+    stream_deepfake_interval: float = 5.0  # секунды между deepfake-анализами
+    stream_window_bytes: int = 4 * 1024 * 1024  # окно аудио/видео
+
     def validate(self) -> ValidationResult:
         """Валидация конфигурации."""
         try:
@@ -177,6 +198,11 @@ class AntiFraudConfig:
                     False, "analysis_timeout должен быть больше 0"
                 )
 
+            if self.stream_score_interval <= 0:
+                return ValidationResult(
+                    False, "stream_score_interval должен быть больше 0"
+                )
+
             return ValidationResult(True)
         except Exception as e:
             return ValidationResult(
@@ -280,6 +306,274 @@ class EmergencyAlert:
     emergency_type: str = ""
 
 
+# Риск одного совпадения с ключевым словом мошенников в расшифровке
+PHRASE_HIT_RISK = 0.25
+
+
+@dataclass
+class CallDecision:
+    """Решение по звонку в потоковом сеансе"""
+
+    risk_level: RiskLevel
+    action: ProtectionAction
+    reason: str
+    risk_score: float
+    stage: str  # Стадия, после которой принято решение
+    final: bool  # Сеанс завершён, новые данные не анализируются
+    elapsed: float  # Секунды от начала сеанса
+
+
+class CallRiskSession:
+    """
+    Сеанс потокового анализа звонка.
+
+    Данные подаются по мере поступления: feed_transcript() для фрагментов
+    расшифровки, feed_audio() и feed_video() для чанков. Детекторы
+    выполняются от дешёвых к дорогим: номер (блокировка и доверенные
+    контакты), подозрительные фразы, потоковый анализ голоса; deepfake
+    анализ - только пока риск неоднозначен. Риски стадий объединяются
+    как независимые свидетельства: 1 - П(1 - risk). Как только риск
+    достигает emergency_threshold, сеанс завершается досрочно через
+    _trigger_emergency_mode.
+    """
+
+    def __init__(
+        self,
+        agent: "AntiFraudMasterAI",
+        elderly_id: str,
+        phone_number: str = "",
+        caller_name: str = "",
+    ):
+        self.agent = agent
+        self.elderly_id = elderly_id
+        self.phone_number = phone_number
+        self.caller_name = caller_name
+        self.started_at = time.perf_counter()
+
+        self.stage_risks: Dict[str, float] = {}
+        self.stage_metrics: Dict[str, Dict[str, float]] = {}
+        self.matched_keywords: Set[str] = set()
+        self.decision: Optional[CallDecision] = None
+        self.time_to_decision: Optional[float] = None
+
+        self._voice = agent.voice_analyzer.open_stream(
+            phone_number, caller_name, agent.config.stream_score_interval
+        )
+        self._audio_window = bytearray()
+        self._video_window = bytearray()
+        self._last_deepfake_at: Optional[float] = None
+
+    @property
+    def risk_score(self) -> float:
+        """Накопленный риск по всем выполненным стадиям"""
+        safe = 1.0
+        for risk in self.stage_risks.values():
+            safe *= 1.0 - min(max(risk, 0.0), 1.0)
+        return 1.0 - safe
+
+    @property
+    def closed(self) -> bool:
+        """Принято окончательное решение"""
+        return self.decision is not None and self.decision.final
+
+    @property
+    def is_ambiguous(self) -> bool:
+        """Риск ни низкий, ни экстренный - нужны дорогие детекторы"""
+        risk = self.risk_score
+        return (
+            self.agent.config.stream_ambiguity_floor
+            <= risk
+            < self.agent.emergency_threshold
+        )
+
+    async def start(self) -> CallDecision:
+        """Стадия номера: блокировка и доверенные контакты"""
+        started = time.perf_counter()
+        if self.phone_number in self.agent._get_blocked_numbers():
+            decision = self._finalize(
+                RiskLevel.CRITICAL,
+                ProtectionAction.BLOCK,
+                "Номер заблокирован",
+                1.0,
+                "caller_id",
+            )
+        elif self.phone_number in self.agent._get_trusted_contacts():
+            decision = self._finalize(
+                RiskLevel.LOW,
+                ProtectionAction.ALLOW,
+                "Доверенный контакт",
+                0.0,
+                "caller_id",
+            )
+        else:
+            decision = self._decide("caller_id")
+        self._record_stage("caller_id", started)
+        return decision
+
+    async def feed_transcript(self, text: str) -> CallDecision:
+        """Фрагмент расшифровки: поиск фраз мошенников"""
+        if self.closed:
+            return self.decision
+        started = time.perf_counter()
+        self.matched_keywords |= self.agent._match_scam_keywords(text)
+        self.stage_risks["phrases"] = 1.0 - (1.0 - PHRASE_HIT_RISK) ** len(
+            self.matched_keywords
+        )
+        self._record_stage("phrases", started)
+        return await self._evaluate("phrases")
+
+    async def feed_audio(self, chunk: bytes) -> CallDecision:
+        """Чанк аудио (PCM 16 бит): потоковые признаки голоса"""
+        if self.closed:
+            return self.decision
+        self._append_window(self._audio_window, chunk)
+        started = time.perf_counter()
+        voice_result = await self._voice.feed(chunk)
+        if voice_result is not None:
+            self.stage_risks["voice"] = self.agent._voice_call_risk(
+                voice_result
+            )
+        self._record_stage("voice", started)
+        if voice_result is None:
+            return self._decide("voice")
+        return await self._evaluate("voice")
+
+    async def feed_video(self, chunk: bytes) -> CallDecision:
+        """Чанк видео: deepfake-анализ окна, если риск неоднозначен"""
+        if self.closed:
+            return self.decision
+        self._append_window(self._video_window, chunk)
+        if await self._run_deepfake(force=False):
+            return await self._evaluate("deepfake")
+        return self._decide("deepfake")
+
+    async def finish(self) -> CallDecision:
+        """Итоговое решение по звонку с действиями защиты"""
+        if self.closed:
+            return self.decision
+
+        if self._voice.extractor.duration > 0:
+            started = time.perf_counter()
+            voice_result = await self._voice.finish()
+            self.stage_risks["voice"] = self.agent._voice_call_risk(
+                voice_result
+            )
+            self._record_stage("voice", started)
+        await self._run_deepfake(force=True)
+
+        risk = self.risk_score
+        level, action, reason = self.agent._classify_call_risk(risk)
+        await self.agent._apply_call_action(
+            self.elderly_id,
+            self.phone_number,
+            action,
+            "Критический риск мошенничества (итог звонка)",
+        )
+        return self._finalize(level, action, reason, risk, "final")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Задержки стадий и время до окончательного решения"""
+        return {
+            "stages": {
+                stage: {
+                    "calls": metric["calls"],
+                    "avg_seconds": metric["total"] / metric["calls"],
+                    "max_seconds": metric["max"],
+                }
+                for stage, metric in self.stage_metrics.items()
+            },
+            "stage_risks": dict(self.stage_risks),
+            "risk_score": self.risk_score,
+            "time_to_decision": self.time_to_decision,
+            "audio_duration": self._voice.extractor.duration,
+        }
+
+    async def _run_deepfake(self, force: bool) -> bool:
+        """Дорогой deepfake-анализ окна видео (только при неоднозначности)"""
+        if not self._video_window or not self.is_ambiguous:
+            return False
+        now = time.perf_counter()
+        if (
+            not force
+            and self._last_deepfake_at is not None
+            and now - self._last_deepfake_at
+            < self.agent.config.stream_deepfake_interval
+        ):
+            return False
+        self._last_deepfake_at = now
+        result = await self.agent.deepfake_detector.analyze_video_call(
+            bytes(self._video_window),
+            bytes(self._audio_window),
+            self.caller_name,
+        )
+        self.stage_risks["deepfake"] = self.agent._extract_risk_score(result)
+        self._record_stage("deepfake", now)
+        return True
+
+    async def _evaluate(self, stage: str) -> CallDecision:
+        """Досрочное завершение при экстренном риске"""
+        risk = self.risk_score
+        if risk < self.agent.emergency_threshold:
+            return self._decide(stage)
+        await self.agent._trigger_emergency_mode(
+            self.elderly_id,
+            f"Критический риск мошенничества (стадия {stage})",
+        )
+        return self._finalize(
+            RiskLevel.EMERGENCY,
+            ProtectionAction.EMERGENCY_MODE,
+            f"Экстренный риск: {risk:.2f}",
+            risk,
+            stage,
+        )
+
+    def _decide(self, stage: str) -> CallDecision:
+        """Промежуточное решение по текущему риску (без действий)"""
+        if self.closed:
+            return self.decision
+        risk = self.risk_score
+        level, action, reason = self.agent._classify_call_risk(risk)
+        self.decision = CallDecision(
+            level, action, reason, risk, stage, False, self._elapsed()
+        )
+        return self.decision
+
+    def _finalize(
+        self,
+        level: RiskLevel,
+        action: ProtectionAction,
+        reason: str,
+        risk: float,
+        stage: str,
+    ) -> CallDecision:
+        elapsed = self._elapsed()
+        self.decision = CallDecision(
+            level, action, reason, risk, stage, True, elapsed
+        )
+        self.time_to_decision = elapsed
+        self.agent._record_metric("call_time_to_decision", elapsed)
+        return self.decision
+
+    def _record_stage(self, stage: str, started: float) -> None:
+        duration = time.perf_counter() - started
+        metric = self.stage_metrics.setdefault(
+            stage, {"calls": 0, "total": 0.0, "max": 0.0}
+        )
+        metric["calls"] += 1
+        metric["total"] += duration
+        metric["max"] = max(metric["max"], duration)
+        self.agent._record_metric(f"call_stage_{stage}_seconds", duration)
+
+    def _append_window(self, window: bytearray, chunk: bytes) -> None:
+        window += chunk
+        excess = len(window) - self.agent.config.stream_window_bytes
+        if excess > 0:
+            del window[:excess]
+
+    def _elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+
 class AntiFraudMasterAI(SecurityBase):
     """
     Главный агент защиты от мошенничества на 27 миллионов
@@ -325,6 +619,12 @@ class AntiFraudMasterAI(SecurityBase):
 
         # База данных мошеннических паттернов
         self.fraud_patterns = self._initialize_fraud_patterns()
+        self._scam_keywords: Tuple[str, ...] = ()
+        self._scam_keyword_re: Optional[re.Pattern] = None
+
+        # Списки номеров (множества для проверки за O(1))
+        self._blocked_numbers: Set[str] = set(self.config.blocked_numbers)
+        self._trusted_contacts: Set[str] = set(self.config.trusted_contacts)
 
         # Настройки из конфигурации
         self.max_risk_threshold = self.config.max_risk_threshold
@@ -438,11 +738,7 @@ class AntiFraudMasterAI(SecurityBase):
         try:
             self.logger.info(f"Анализ телефонного звонка для {elderly_id}")
 
-            # Анализ голоса
-            voice_result = await self.voice_analyzer.analyze_voice(
-                audio_data, phone_number, caller_name
-            )
-
+            # Дешёвые проверки номера до анализа голоса
             # Проверка на заблокированные номера
             if phone_number in self._get_blocked_numbers():
                 return (
@@ -459,92 +755,23 @@ class AntiFraudMasterAI(SecurityBase):
                     "Доверенный контакт",
                 )
 
-            # Обработка результата анализа голоса
-            if hasattr(voice_result, "emotion_detection"):
-                emotion_detection = voice_result.emotion_detection
-            elif isinstance(voice_result, dict):
-                emotion_detection = voice_result.get("emotion_detection", {})
-            else:
-                emotion_detection = {"neutral": 0.5}
-
-            if hasattr(voice_result, "manipulation_indicators"):
-                manipulation_indicators = voice_result.manipulation_indicators
-            elif isinstance(voice_result, dict):
-                manipulation_indicators = voice_result.get(
-                    "manipulation_indicators", []
-                )
-            else:
-                manipulation_indicators = []
-
-            # Анализ эмоционального состояния
-            emotional_risk = self._assess_emotional_risk(emotion_detection)
-
-            # Анализ манипуляций
-            manipulation_risk = self._assess_manipulation_risk(
-                manipulation_indicators
+            # Анализ голоса
+            voice_result = await self.voice_analyzer.analyze_voice(
+                audio_data, phone_number, caller_name
             )
 
-            # Обработка risk_score из voice_result
-            if hasattr(voice_result, "risk_score"):
-                voice_risk_score = voice_result.risk_score
-            elif isinstance(voice_result, dict):
-                voice_risk_score = voice_result.get("risk_score", 0.5)
-            else:
-                voice_risk_score = 0.5
-
             # Общая оценка риска
-            total_risk = (
-                voice_risk_score * 0.4
-                + emotional_risk * 0.3
-                + manipulation_risk * 0.3
-            )
+            total_risk = self._voice_call_risk(voice_result)
 
             # Определение уровня риска и действия
-            if total_risk >= self.emergency_threshold:
-                await self._trigger_emergency_mode(
-                    elderly_id, "Критический риск мошенничества"
-                )
-                return (
-                    RiskLevel.EMERGENCY,
-                    ProtectionAction.EMERGENCY_MODE,
-                    f"Экстренный риск: {total_risk:.2f}",
-                )
-
-            elif total_risk >= self.max_risk_threshold:
-                await self._block_phone_number(phone_number)
-                await self._notify_family(
-                    elderly_id,
-                    f"Заблокирован подозрительный звонок: {phone_number}",
-                )
-                return (
-                    RiskLevel.CRITICAL,
-                    ProtectionAction.BLOCK_PHONE,
-                    f"Высокий риск: {total_risk:.2f}",
-                )
-
-            elif total_risk >= self.family_notification_threshold:
-                await self._notify_family(
-                    elderly_id, f"Подозрительный звонок: {phone_number}"
-                )
-                return (
-                    RiskLevel.HIGH,
-                    ProtectionAction.NOTIFY_FAMILY,
-                    f"Средний риск: {total_risk:.2f}",
-                )
-
-            elif total_risk >= 0.5:
-                return (
-                    RiskLevel.MEDIUM,
-                    ProtectionAction.WARN,
-                    f"Низкий риск: {total_risk:.2f}",
-                )
-
-            else:
-                return (
-                    RiskLevel.LOW,
-                    ProtectionAction.ALLOW,
-                    "Звонок безопасен",
-                )
+            level, action, reason = self._classify_call_risk(total_risk)
+            await self._apply_call_action(
+                elderly_id,
+                phone_number,
+                action,
+                "Критический риск мошенничества",
+            )
+            return level, action, reason
 
         except Exception as e:
             self.logger.error(f"Ошибка анализа телефонного звонка: {e}")
@@ -575,30 +802,19 @@ class AntiFraudMasterAI(SecurityBase):
                 f"Анализ видеозвонка на deepfake для {elderly_id}"
             )
 
-            # Анализ deepfake
-            deepfake_result = await self.deepfake_detector.analyze_video_call(
-                video_stream, audio_stream, caller_name
-            )
-
-            # Анализ голоса
-            voice_result = await self.voice_analyzer.analyze_voice(
-                audio_stream, "", caller_name
+            # Анализ deepfake и голоса независимы - выполняются параллельно
+            deepfake_result, voice_result = await asyncio.gather(
+                self.deepfake_detector.analyze_video_call(
+                    video_stream, audio_stream, caller_name
+                ),
+                self.voice_analyzer.analyze_voice(
+                    audio_stream, "", caller_name
+                ),
             )
 
             # Обработка результатов анализа
-            if hasattr(deepfake_result, "risk_score"):
-                deepfake_risk = deepfake_result.risk_score
-            elif isinstance(deepfake_result, dict):
-                deepfake_risk = deepfake_result.get("risk_score", 0.5)
-            else:
-                deepfake_risk = 0.5
-
-            if hasattr(voice_result, "risk_score"):
-                voice_risk = voice_result.risk_score
-            elif isinstance(voice_result, dict):
-                voice_risk = voice_result.get("risk_score", 0.5)
-            else:
-                voice_risk = 0.5
+            deepfake_risk = self._extract_risk_score(deepfake_result)
+            voice_risk = self._extract_risk_score(voice_result)
 
             # Общая оценка риска
             total_risk = deepfake_risk * 0.6 + voice_risk * 0.4
@@ -730,9 +946,145 @@ class AntiFraudMasterAI(SecurityBase):
                     suspicious.append(phrase)
         return suspicious
 
+    def _match_scam_keywords(self, text: str) -> Set[str]:
+        """Ключевые слова мошенников в тексте (одно скомпилированное
+        выражение, пересобирается при изменении паттернов)"""
+        keywords = tuple(self.fraud_patterns["phone_scam"]["keywords"])
+        if keywords != self._scam_keywords:
+            self._scam_keywords = keywords
+            self._scam_keyword_re = re.compile(
+                r"(?<!\w)(?:{})".format(
+                    "|".join(
+                        re.escape(keyword)
+                        for keyword in sorted(keywords, key=len, reverse=True)
+                    )
+                ),
+                re.IGNORECASE,
+            )
+        return {
+            match.group(0).lower()
+            for match in self._scam_keyword_re.finditer(text)
+        }
+
+    @staticmethod
+    def _extract_risk_score(result: Any, default: float = 0.5) -> float:
+        """risk_score из результата детектора (объект или словарь)"""
+        if hasattr(result, "risk_score"):
+            return result.risk_score
+        if isinstance(result, dict):
+            return result.get("risk_score", default)
+        return default
+
+    def _voice_call_risk(self, voice_result: Any) -> float:
+        """Риск звонка по результату анализа голоса: голос, эмоции
+        и манипуляции"""
+        if hasattr(voice_result, "emotion_detection"):
+            emotions = voice_result.emotion_detection
+        elif isinstance(voice_result, dict):
+            emotions = voice_result.get("emotion_detection")
+            if emotions is None:
+                emotions = getattr(
+                    voice_result.get("emotional_analysis"),
+                    "emotion_scores",
+                    {},
+                )
+        else:
+            emotions = {"neutral": 0.5}
+
+        if hasattr(voice_result, "manipulation_indicators"):
+            indicators = voice_result.manipulation_indicators
+        elif isinstance(voice_result, dict):
+            indicators = voice_result.get("manipulation_indicators", [])
+        else:
+            indicators = []
+
+        return (
+            self._extract_risk_score(voice_result) * 0.4
+            + self._assess_emotional_risk(emotions) * 0.3
+            + self._assess_manipulation_risk(indicators) * 0.3
+        )
+
+    def _classify_call_risk(
+        self, total_risk: float
+    ) -> Tuple[RiskLevel, ProtectionAction, str]:
+        """Уровень риска и действие для звонка по общей оценке"""
+        if total_risk >= self.emergency_threshold:
+            return (
+                RiskLevel.EMERGENCY,
+                ProtectionAction.EMERGENCY_MODE,
+                f"Экстренный риск: {total_risk:.2f}",
+            )
+        if total_risk >= self.max_risk_threshold:
+            return (
+                RiskLevel.CRITICAL,
+                ProtectionAction.BLOCK_PHONE,
+                f"Высокий риск: {total_risk:.2f}",
+            )
+        if total_risk >= self.family_notification_threshold:
+            return (
+                RiskLevel.HIGH,
+                ProtectionAction.NOTIFY_FAMILY,
+                f"Средний риск: {total_risk:.2f}",
+            )
+        if total_risk >= 0.5:
+            return (
+                RiskLevel.MEDIUM,
+                ProtectionAction.WARN,
+                f"Низкий риск: {total_risk:.2f}",
+            )
+        return RiskLevel.LOW, ProtectionAction.ALLOW, "Звонок безопасен"
+
+    async def _apply_call_action(
+        self,
+        elderly_id: str,
+        phone_number: str,
+        action: ProtectionAction,
+        emergency_reason: str,
+    ) -> None:
+        """Действия защиты по решению о звонке"""
+        if action == ProtectionAction.EMERGENCY_MODE:
+            await self._trigger_emergency_mode(elderly_id, emergency_reason)
+        elif action == ProtectionAction.BLOCK_PHONE:
+            await self._block_phone_number(phone_number)
+            await self._notify_family(
+                elderly_id,
+                f"Заблокирован подозрительный звонок: {phone_number}",
+            )
+        elif action == ProtectionAction.NOTIFY_FAMILY:
+            await self._notify_family(
+                elderly_id, f"Подозрительный звонок: {phone_number}"
+            )
+
+    async def open_call_session(
+        self, elderly_id: str, phone_number: str = "", caller_name: str = ""
+    ) -> CallRiskSession:
+        """
+        Потоковый анализ звонка с досрочным решением
+
+        Args:
+            elderly_id: ID пожилого человека
+            phone_number: Номер телефона
+            caller_name: Имя звонящего
+
+        Returns:
+            CallRiskSession: Сеанс (feed_transcript/feed_audio/feed_video,
+            finish); проверка номера уже выполнена
+        """
+        self.logger.info(f"Потоковый анализ звонка для {elderly_id}")
+        session = CallRiskSession(self, elderly_id, phone_number, caller_name)
+        await session.start()
+        return session
+
     def _assess_emotional_risk(self, emotions: Dict[str, float]) -> float:
         """Оценка эмоционального риска"""
-        risk_emotions = ["страх", "паника", "тревога", "стресс"]
+        risk_emotions = [
+            "страх",
+            "паника",
+            "тревога",
+            "стресс",
+            "fear",
+            "stress",
+        ]
         risk_score = 0.0
 
         for emotion, score in emotions.items():
@@ -754,6 +1106,10 @@ class AntiFraudMasterAI(SecurityBase):
             else:
                 indicators_list = []
 
+            # Итоговая оценка потокового анализа голоса
+            if hasattr(indicators, "total_manipulation_score"):
+                return min(float(indicators.total_manipulation_score), 1.0)
+
             manipulation_techniques = self.fraud_patterns.get(
                 "phone_scam", {}
             ).get("manipulation_techniques", [])
@@ -804,19 +1160,20 @@ class AntiFraudMasterAI(SecurityBase):
     async def _block_phone_number(self, phone_number: str):
         """Блокировка номера телефона"""
         try:
+            self._blocked_numbers.add(phone_number)
             await self.emergency_system.block_phone_number(phone_number)
             self.blocked_attempts += 1
 
         except Exception as e:
             self.logger.error(f"Ошибка блокировки номера: {e}")
 
-    def _get_blocked_numbers(self) -> List[str]:
-        """Получение списка заблокированных номеров"""
-        return self.config.get("blocked_numbers", [])
+    def _get_blocked_numbers(self) -> Set[str]:
+        """Получение множества заблокированных номеров"""
+        return self._blocked_numbers
 
-    def _get_trusted_contacts(self) -> List[str]:
-        """Получение списка доверенных контактов"""
-        return self.config.get("trusted_contacts", [])
+    def _get_trusted_contacts(self) -> Set[str]:
+        """Получение множества доверенных контактов"""
+        return self._trusted_contacts
 
     async def get_protection_status(self) -> Dict[str, Any]:
         """Получение статуса защиты"""
@@ -1757,10 +2114,10 @@ class AntiFraudMasterAI(SecurityBase):
             )
 
         required_fields = ["amount", "recipient", "description"]
-        for field in required_fields:
-            if field not in transaction_data:
+        for field_name in required_fields:
+            if field_name not in transaction_data:
                 raise ValueError(
-                    f"Обязательное поле '{field}' отсутствует "
+                    f"Обязательное поле '{field_name}' отсутствует "
                     f"в данных транзакции"
                 )
 
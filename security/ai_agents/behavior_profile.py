@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Потоковые профили поведения для BehavioralAnalyticsEngine
+
+Профиль пользователя хранит только достаточные статистики, а не историю
+событий: гистограммы часов и дней недели, скетч частот местоположений
+(Space-Saving), счётчики переходов между активностями и затухающие
+моменты продолжительности, часа и интервалов между событиями.
+Обновление и оценка события стоят O(1) независимо от длины истории,
+профиль сериализуется в компактный словарь.
+"""
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+PROFILE_VERSION = 1
+
+# Полураспад весов затухающих моментов (30 дней)
+DEFAULT_HALF_LIFE = 30 * 24 * 3600.0
+
+NIGHT_HOURS = frozenset(list(range(0, 6)) + list(range(22, 24)))
+WEEKEND_DAYS = (5, 6)
+
+
+class DecayedMoments:
+    """
+    Экспоненциально затухающие среднее и дисперсия.
+
+    Вес старых наблюдений уменьшается вдвое за half_life секунд, поэтому
+    статистики следуют за изменением привычек пользователя.
+    """
+
+    __slots__ = ("half_life", "weight", "mean", "m2", "last_time")
+
+    def __init__(self, half_life: float = DEFAULT_HALF_LIFE):
+        self.half_life = half_life
+        self.weight = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.last_time: Optional[float] = None
+
+    def update(self, value: float, timestamp: float):
+        """Добавление наблюдения (взвешенный алгоритм Уэлфорда)"""
+        if self.last_time is not None and timestamp > self.last_time:
+            decay = 0.5 ** ((timestamp - self.last_time) / self.half_life)
+            self.weight *= decay
+            self.m2 *= decay
+        if self.last_time is None or timestamp > self.last_time:
+            self.last_time = timestamp
+        self.weight += 1.0
+        delta = value - self.mean
+        self.mean += delta / self.weight
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / self.weight if self.weight > 0 else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(max(self.variance, 0.0))
+
+    def to_list(self) -> List[Optional[float]]:
+        return [self.weight, self.mean, self.m2, self.last_time]
+
+    @classmethod
+    def from_list(
+        cls, data: List[Optional[float]], half_life: float = DEFAULT_HALF_LIFE
+    ) -> "DecayedMoments":
+        moments = cls(half_life)
+        moments.weight, moments.mean, moments.m2, moments.last_time = data
+        return moments
+
+
+class FrequencySketch:
+    """
+    Скетч частот Space-Saving с ограниченным числом счётчиков.
+
+    Хранит не более capacity значений; новое значение вытесняет самое
+    редкое и наследует его счётчик как верхнюю оценку ошибки.
+    """
+
+    __slots__ = ("capacity", "counts", "errors", "distinct")
+
+    def __init__(self, capacity: int = 32):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.distinct = 0  # оценка числа различных значений
+
+    def __contains__(self, item: str) -> bool:
+        return item in self.counts
+
+    def add(self, item: str):
+        """Учет значения"""
+        counts = self.counts
+        if item in counts:
+            counts[item] += 1
+            return
+        self.distinct += 1
+        if len(counts) < self.capacity:
+            counts[item] = 1
+            self.errors[item] = 0
+            return
+        victim = min(counts, key=counts.__getitem__)
+        floor = counts.pop(victim)
+        del self.errors[victim]
+        counts[item] = floor + 1
+        self.errors[item] = floor
+
+    def estimate(self, item: str) -> int:
+        """Оценка частоты сверху (0 - значение не отслеживается)"""
+        return self.counts.get(item, 0)
+
+    def most_common(self, n: Optional[int] = None) -> List[Tuple[str, int]]:
+        items = sorted(self.counts.items(), key=lambda kv: -kv[1])
+        return items if n is None else items[:n]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "c": self.capacity,
+            "k": self.distinct,
+            "i": {
+                item: [count, self.errors[item]]
+                for item, count in self.counts.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FrequencySketch":
+        sketch = cls(data["c"])
+        sketch.distinct = data["k"]
+        for item, (count, error) in data["i"].items():
+            sketch.counts[item] = count
+            sketch.errors[item] = error
+        return sketch
+
+
+class BehaviorProfile:
+    """Достаточные статистики поведения одного пользователя"""
+
+    __slots__ = (
+        "user_id",
+        "count",
+        "first_seen",
+        "last_seen",
+        "hours",
+        "days",
+        "activities",
+        "transitions",
+        "last_activity",
+        "locations",
+        "durations",
+        "hour_moments",
+        "gaps",
+        "risk_sum",
+        "behavior_types",
+    )
+
+    def __init__(
+        self,
+        user_id: str,
+        half_life: float = DEFAULT_HALF_LIFE,
+        location_capacity: int = 32,
+    ):
+        self.user_id = user_id
+        self.count = 0
+        self.first_seen: Optional[float] = None
+        self.last_seen: Optional[float] = None
+        self.hours = [0] * 24
+        self.days = [0] * 7
+        self.activities: Dict[str, int] = {}
+        # предыдущая активность -> текущая -> количество
+        self.transitions: Dict[str, Dict[str, int]] = {}
+        self.last_activity: Optional[str] = None
+        self.locations = FrequencySketch(location_capacity)
+        self.durations = DecayedMoments(half_life)
+        self.hour_moments = DecayedMoments(half_life)
+        # интервалы между событиями в часах
+        self.gaps = DecayedMoments(half_life)
+        self.risk_sum = 0.0
+        self.behavior_types: Dict[str, int] = {}
+
+    def update(
+        self,
+        timestamp: float,
+        hour: int,
+        weekday: int,
+        activity: str,
+        location: str,
+        duration: float,
+        risk_score: float = 0.0,
+        behavior_type: Optional[str] = None,
+    ):
+        """Учет события за O(1)"""
+        if self.last_seen is not None and timestamp >= self.last_seen:
+            self.gaps.update((timestamp - self.last_seen) / 3600, timestamp)
+        if self.first_seen is None or timestamp < self.first_seen:
+            self.first_seen = timestamp
+        if self.last_seen is None or timestamp > self.last_seen:
+            self.last_seen = timestamp
+        self.count += 1
+        self.hours[hour] += 1
+        self.days[weekday] += 1
+        self.activities[activity] = self.activities.get(activity, 0) + 1
+        if self.last_activity is not None:
+            row = self.transitions.setdefault(self.last_activity, {})
+            row[activity] = row.get(activity, 0) + 1
+        self.last_activity = activity
+        self.locations.add(location)
+        self.durations.update(duration, timestamp)
+        self.hour_moments.update(hour, timestamp)
+        self.risk_sum += risk_score
+        if behavior_type is not None:
+            self.behavior_types[behavior_type] = (
+                self.behavior_types.get(behavior_type, 0) + 1
+            )
+
+    @property
+    def risk_score_avg(self) -> float:
+        return self.risk_sum / self.count if self.count else 0.0
+
+    def transition_probability(self, previous: str, current: str) -> float:
+        """Доля переходов previous -> current среди переходов из previous"""
+        row = self.transitions.get(previous)
+        if not row:
+            return 0.0
+        return row.get(current, 0) / sum(row.values())
+
+    def time_patterns(self) -> Dict[str, Any]:
+        """Временные паттерны по гистограммам"""
+        hour_counts = {h: c for h, c in enumerate(self.hours) if c}
+        day_counts = {d: c for d, c in enumerate(self.days) if c}
+        avg_activity = (
+            sum(hour_counts.values()) / len(hour_counts) if hour_counts else 0
+        )
+        weekend = sum(self.days[day] for day in WEEKEND_DAYS)
+        total = sum(self.days)
+        return {
+            "most_active_hour": (
+                max(hour_counts, key=hour_counts.__getitem__)
+                if hour_counts
+                else 0
+            ),
+            "most_active_day": (
+                max(day_counts, key=day_counts.__getitem__)
+                if day_counts
+                else 0
+            ),
+            "activity_distribution": hour_counts,
+            "day_distribution": day_counts,
+            "time_consistency": self.time_consistency(),
+            "peak_hours": [
+                h for h, c in hour_counts.items() if c > avg_activity * 1.5
+            ],
+            "off_hours": [
+                h for h, c in hour_counts.items() if c < avg_activity * 0.5
+            ],
+            "weekend_activity": weekend / total if total else 0.0,
+            "weekday_activity": (total - weekend) / total if total else 0.0,
+            "temporal_anomalies": self.temporal_anomalies(),
+        }
+
+    def time_consistency(self) -> float:
+        """1 - коэффициент вариации интервалов между событиями"""
+        if self.count < 2 or self.gaps.mean <= 0:
+            return 0.0
+        return min(1.0, max(0.0, 1.0 - self.gaps.std / self.gaps.mean))
+
+    def temporal_anomalies(self) -> List[Dict[str, Any]]:
+        """Аномалии распределения по часам суток"""
+        anomalies: List[Dict[str, Any]] = []
+        if self.count < 3:
+            return anomalies
+        hour_counts = [(h, c) for h, c in enumerate(self.hours) if c]
+        avg_hourly = self.count / len(hour_counts)
+        for hour, count in hour_counts:
+            if count > avg_hourly * 3:
+                anomalies.append(
+                    {
+                        "type": "high_activity_hour",
+                        "hour": hour,
+                        "count": count,
+                        "severity": "medium",
+                    }
+                )
+            elif count < avg_hourly * 0.1:
+                anomalies.append(
+                    {
+                        "type": "low_activity_hour",
+                        "hour": hour,
+                        "count": count,
+                        "severity": "low",
+                    }
+                )
+        night = sum(self.hours[h] for h in NIGHT_HOURS)
+        if night / self.count > 0.3:
+            anomalies.append(
+                {
+                    "type": "high_night_activity",
+                    "night_activity_ratio": night / self.count,
+                    "severity": "high",
+                }
+            )
+        return anomalies
+
+    def location_patterns(self) -> Dict[str, Any]:
+        """Локационные паттерны по скетчу частот"""
+        top = self.locations.most_common()
+        return {
+            "most_common_location": top[0][0] if top else "unknown",
+            "location_diversity": self.locations.distinct,
+            "location_distribution": dict(top),
+        }
+
+    def activity_patterns(self) -> Dict[str, Any]:
+        """Паттерны активностей и переходов между ними"""
+        return {
+            "most_common_activity": (
+                max(self.activities, key=self.activities.__getitem__)
+                if self.activities
+                else "unknown"
+            ),
+            "activity_diversity": len(self.activities),
+            "activity_distribution": dict(self.activities),
+            "last_activity": self.last_activity,
+        }
+
+    def pattern_anomalies(
+        self,
+        timestamp: float,
+        hour: int,
+        activity: str,
+        location: str,
+        duration: float,
+        min_transitions: int = 20,
+        min_transition_probability: float = 0.02,
+    ) -> List[Dict[str, Any]]:
+        """Отклонения события от профиля (профиль еще не обновлен)"""
+        anomalies = []
+        if not self.count:
+            return anomalies
+        if abs(hour - self.hour_moments.mean) > 4:
+            anomalies.append(
+                {
+                    "type": "time_anomaly",
+                    "description": (
+                        f"Необычное время активности: {hour}:00"
+                    ),
+                    "severity": 0.3,
+                }
+            )
+        if duration > self.durations.mean * 2:
+            anomalies.append(
+                {
+                    "type": "duration_anomaly",
+                    "description": (
+                        f"Необычно долгая активность: {duration:.1f}с"
+                    ),
+                    "severity": 0.4,
+                }
+            )
+        if location not in self.locations:
+            anomalies.append(
+                {
+                    "type": "location_anomaly",
+                    "description": f"Новое местоположение: {location}",
+                    "severity": 0.5,
+                }
+            )
+        row = self.transitions.get(self.last_activity or "")
+        if row and sum(row.values()) >= min_transitions:
+            probability = row.get(activity, 0) / sum(row.values())
+            if probability < min_transition_probability:
+                anomalies.append(
+                    {
+                        "type": "transition_anomaly",
+                        "description": (
+                            f"Редкий переход: {self.last_activity} -> "
+                            f"{activity}"
+                        ),
+                        "probability": probability,
+                        "severity": 0.3,
+                    }
+                )
+        if self.count >= 3 and self.last_seen is not None:
+            gap = (timestamp - self.last_seen) / 3600
+            if gap > self.gaps.mean + 2 * self.gaps.std:
+                anomalies.append(
+                    {
+                        "type": "long_inactivity_gap",
+                        "description": (
+                            f"Долгий перерыв в активности: {gap:.1f}ч"
+                        ),
+                        "gap_hours": gap,
+                        "severity": 0.2,
+                    }
+                )
+        return anomalies
+
+    def summary(self) -> Dict[str, Any]:
+        """Краткая сводка профиля"""
+        return {
+            "user_id": self.user_id,
+            "total_behaviors": self.count,
+            "risk_score_avg": self.risk_score_avg,
+            "behavior_types": dict(self.behavior_types),
+            "average_duration": self.durations.mean,
+            "most_common_location": self.location_patterns()[
+                "most_common_location"
+            ],
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Компактное представление для сохранения"""
+        return {
+            "v": PROFILE_VERSION,
+            "n": self.count,
+            "f": self.first_seen,
+            "l": self.last_seen,
+            "h": self.hours,
+            "d": self.days,
+            "a": self.activities,
+            "t": self.transitions,
+            "la": self.last_activity,
+            "loc": self.locations.to_dict(),
+            "dur": self.durations.to_list(),
+            "hr": self.hour_moments.to_list(),
+            "gap": self.gaps.to_list(),
+            "hl": self.durations.half_life,
+            "r": self.risk_sum,
+            "bt": self.behavior_types,
+        }
+
+    @classmethod
+    def from_dict(
+        cls, user_id: str, data: Dict[str, Any]
+    ) -> "BehaviorProfile":
+        if data.get("v") != PROFILE_VERSION:
+            raise ValueError(
+                "Неподдерживаемая версия профиля: {}".format(data.get("v"))
+            )
+        half_life = data["hl"]
+        profile = cls(user_id, half_life)
+        profile.count = data["n"]
+        profile.first_seen = data["f"]
+        profile.last_seen = data["l"]
+        profile.hours = list(data["h"])
+        profile.days = list(data["d"])
+        profile.activities = dict(data["a"])
+        profile.transitions = {k: dict(v) for k, v in data["t"].items()}
+        profile.last_activity = data["la"]
+        profile.locations = FrequencySketch.from_dict(data["loc"])
+        profile.durations = DecayedMoments.from_list(data["dur"], half_life)
+        profile.hour_moments = DecayedMoments.from_list(data["hr"], half_life)
+        profile.gaps = DecayedMoments.from_list(data["gap"], half_life)
+        profile.risk_sum = data["r"]
+        profile.behavior_types = dict(data["bt"])
+        return profile
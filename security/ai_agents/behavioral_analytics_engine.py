@@ -16,18 +16,26 @@ import queue
 
 # Импорт базового класса
 import sys
-from collections import Counter
+from collections import Counter, deque
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Optional, Union
 
 import numpy as np
 
 from core.base import SecurityBase
+from security.ai_agents.behavior_profile import (
+    PROFILE_VERSION,
+    BehaviorProfile,
+)
 from security.types.security_types import MatrixAIColorScheme, ColorTheme
 
 
+# Последние события для отчетов; профили пользователей от истории не зависят
+DEFAULT_HISTORY_LIMIT = 10000
+
+
 class BehaviorType(Enum):
     """Типы поведения пользователей"""
 
@@ -110,10 +118,13 @@ class BehavioralAnalyticsEngine(SecurityBase):
             "BehavioralAnalyticsEngine", "AI-анализ поведения пользователей"
         )
         self.color_scheme = self._initialize_color_scheme()
-        self.user_behaviors = []
+        self.user_behaviors = deque(maxlen=DEFAULT_HISTORY_LIMIT)
         self.behavior_patterns = []
         self.anomalies = []
         self.user_profiles = {}
+        # Потоковые статистики поведения по пользователям
+        self.behavior_profiles: Dict[str, BehaviorProfile] = {}
+        self.profiles_path = "data/behavioral_profiles.json"
         self.ml_models = self._initialize_ml_models()
         self.analytics_queue = queue.Queue()
         self.is_processing = False
@@ -448,30 +459,27 @@ class BehavioralAnalyticsEngine(SecurityBase):
             return BehaviorType.NORMAL
 
     def _analyze_patterns(self, behavior: UserBehavior) -> Dict[str, Any]:
-        """Анализ паттернов поведения"""
+        """Анализ паттернов поведения по профилю пользователя"""
         try:
-            user_id = behavior.user_id
-
-            # Получаем историю поведения пользователя
-            user_behaviors = [
-                b for b in self.user_behaviors if b.user_id == user_id
-            ]
+            # Профиль содержит статистики всей истории, кроме текущего
+            # события, поэтому анализ не зависит от длины истории
+            profile = self.behavior_profiles.get(behavior.user_id)
 
-            if len(user_behaviors) < 2:
+            if profile is None or profile.count < 2:
                 return {"pattern_detected": False, "confidence": 0.0}
 
             # Анализ временных паттернов
-            time_patterns = self._analyze_time_patterns(user_behaviors)
+            time_patterns = self._analyze_time_patterns(profile)
 
             # Анализ локационных паттернов
-            location_patterns = self._analyze_location_patterns(user_behaviors)
+            location_patterns = self._analyze_location_patterns(profile)
 
             # Анализ активностей
-            activity_patterns = self._analyze_activity_patterns(user_behaviors)
+            activity_patterns = self._analyze_activity_patterns(profile)
 
             # Определение аномалий в паттернах
             pattern_anomalies = self._detect_pattern_anomalies(
-                behavior, user_behaviors
+                behavior, profile
             )
 
             return {
@@ -487,101 +495,11 @@ class BehavioralAnalyticsEngine(SecurityBase):
             return {"pattern_detected": False, "confidence": 0.0}
 
     def _analyze_time_patterns(
-        self, behaviors: List[UserBehavior]
+        self, profile: BehaviorProfile
     ) -> Dict[str, Any]:
-        """Анализ временных паттернов"""
+        """Анализ временных паттернов по гистограммам профиля"""
         try:
-            if not behaviors:
-                return {
-                    "most_active_hour": 0,
-                    "most_active_day": 0,
-                    "activity_distribution": {},
-                    "day_distribution": {},
-                    "time_consistency": 0.0,
-                    "peak_hours": [],
-                    "off_hours": [],
-                    "weekend_activity": 0.0,
-                    "weekday_activity": 0.0,
-                    "temporal_anomalies": [],
-                }
-
-            hours = [b.timestamp.hour for b in behaviors]
-            days = [b.timestamp.weekday() for b in behaviors]
-            timestamps = [b.timestamp for b in behaviors]
-
-            # Наиболее активные часы
-            hour_counts = Counter(hours)
-            most_active_hour = (
-                hour_counts.most_common(1)[0][0] if hour_counts else 0
-            )
-
-            # Наиболее активные дни
-            day_counts = Counter(days)
-            most_active_day = (
-                day_counts.most_common(1)[0][0] if day_counts else 0
-            )
-
-            # Пиковые часы (часы с активностью выше среднего)
-            avg_activity = (
-                sum(hour_counts.values()) / len(hour_counts)
-                if hour_counts
-                else 0
-            )
-            peak_hours = [
-                hour
-                for hour, count in hour_counts.items()
-                if count > avg_activity * 1.5
-            ]
-
-            # Часы с низкой активностью
-            off_hours = [
-                hour
-                for hour, count in hour_counts.items()
-                if count < avg_activity * 0.5
-            ]
-
-            # Активность в выходные vs будни
-            weekend_days = [5, 6]  # Суббота, воскресенье
-            weekend_activity = sum(
-                day_counts[day] for day in weekend_days if day in day_counts
-            )
-            weekday_activity = sum(
-                day_counts[day] for day in range(5) if day in day_counts
-            )
-            total_activity = weekend_activity + weekday_activity
-
-            weekend_ratio = (
-                weekend_activity / total_activity
-                if total_activity > 0
-                else 0.0
-            )
-            weekday_ratio = (
-                weekday_activity / total_activity
-                if total_activity > 0
-                else 0.0
-            )
-
-            # Временная консистентность
-            # (насколько регулярно пользователь активен)
-            time_consistency = self._calculate_time_consistency(timestamps)
-
-            # Временные аномалии
-            temporal_anomalies = self._detect_temporal_anomalies(
-                timestamps, hour_counts
-            )
-
-            return {
-                "most_active_hour": most_active_hour,
-                "most_active_day": most_active_day,
-                "activity_distribution": dict(hour_counts),
-                "day_distribution": dict(day_counts),
-                "time_consistency": time_consistency,
-                "peak_hours": peak_hours,
-                "off_hours": off_hours,
-                "weekend_activity": weekend_ratio,
-                "weekday_activity": weekday_ratio,
-                "temporal_anomalies": temporal_anomalies,
-            }
+            return profile.time_patterns()
         except Exception as e:
             self.logger.error(f"Ошибка анализа временных паттернов: {e}")
             return {
@@ -598,55 +516,21 @@ class BehavioralAnalyticsEngine(SecurityBase):
             }
 
     def _analyze_location_patterns(
-        self, behaviors: List[UserBehavior]
+        self, profile: BehaviorProfile
     ) -> Dict[str, Any]:
-        """Анализ локационных паттернов"""
+        """Анализ локационных паттернов по скетчу частот"""
         try:
-            locations = [b.location for b in behaviors]
-            location_counts = Counter(locations)
-
-            # Наиболее частое местоположение
-            most_common_location = (
-                location_counts.most_common(1)[0][0]
-                if location_counts
-                else "unknown"
-            )
-
-            # Разнообразие местоположений
-            location_diversity = len(set(locations))
-
-            return {
-                "most_common_location": most_common_location,
-                "location_diversity": location_diversity,
-                "location_distribution": dict(location_counts),
-            }
+            return profile.location_patterns()
         except Exception as e:
             self.logger.error(f"Ошибка анализа локационных паттернов: {e}")
             return {}
 
     def _analyze_activity_patterns(
-        self, behaviors: List[UserBehavior]
+        self, profile: BehaviorProfile
     ) -> Dict[str, Any]:
-        """Анализ паттернов активности"""
+        """Анализ паттернов активности и переходов"""
         try:
-            activities = [b.activity_type.value for b in behaviors]
-            activity_counts = Counter(activities)
-
-            # Наиболее частая активность
-            most_common_activity = (
-                activity_counts.most_common(1)[0][0]
-                if activity_counts
-                else "unknown"
-            )
-
-            # Разнообразие активностей
-            activity_diversity = len(set(activities))
-
-            return {
-                "most_common_activity": most_common_activity,
-                "activity_diversity": activity_diversity,
-                "activity_distribution": dict(activity_counts),
-            }
+            return profile.activity_patterns()
         except Exception as e:
             self.logger.error(f"Ошибка анализа паттернов активности: {e}")
             return {}
@@ -654,72 +538,18 @@ class BehavioralAnalyticsEngine(SecurityBase):
     def _detect_pattern_anomalies(
         self,
         current_behavior: UserBehavior,
-        historical_behaviors: List[UserBehavior],
+        profile: BehaviorProfile,
     ) -> List[Dict[str, Any]]:
-        """Обнаружение аномалий в паттернах"""
+        """Обнаружение отклонений события от профиля пользователя"""
         try:
-            anomalies = []
-
-            # Аномалия времени
-            if historical_behaviors:
-                avg_hour = np.mean(
-                    [b.timestamp.hour for b in historical_behaviors]
-                )
-                current_hour = current_behavior.timestamp.hour
-
-                if (
-                    abs(current_hour - avg_hour) > 4
-                ):  # Более 4 часов от среднего
-                    anomalies.append(
-                        {
-                            "type": "time_anomaly",
-                            "description": (
-                                f"Необычное время активности: "
-                                f"{current_hour}:00"
-                            ),
-                            "severity": 0.3,
-                        }
-                    )
-
-            # Аномалия продолжительности
-            if historical_behaviors:
-                avg_duration = np.mean(
-                    [b.duration for b in historical_behaviors]
-                )
-                current_duration = current_behavior.duration
-
-                if (
-                    current_duration > avg_duration * 2
-                ):  # В 2 раза дольше среднего
-                    anomalies.append(
-                        {
-                            "type": "duration_anomaly",
-                            "description": (
-                                f"Необычно долгая активность: "
-                                f"{current_duration:.1f}с"
-                            ),
-                            "severity": 0.4,
-                        }
-                    )
-
-            # Аномалия местоположения
-            if historical_behaviors:
-                common_locations = set(
-                    [b.location for b in historical_behaviors]
-                )
-                if current_behavior.location not in common_locations:
-                    anomalies.append(
-                        {
-                            "type": "location_anomaly",
-                            "description": (
-                                f"Новое местоположение: "
-                                f"{current_behavior.location}"
-                            ),
-                            "severity": 0.5,
-                        }
-                    )
-
-            return anomalies
+            timestamp = current_behavior.timestamp
+            return profile.pattern_anomalies(
+                timestamp.timestamp(),
+                timestamp.hour,
+                current_behavior.activity_type.value,
+                current_behavior.location,
+                current_behavior.duration,
+            )
         except Exception as e:
             self.logger.error(f"Ошибка обнаружения аномалий в паттернах: {e}")
             return []
@@ -849,9 +679,9 @@ class BehavioralAnalyticsEngine(SecurityBase):
         }
 
     def _detect_anomalies(
-        self, user_id: str, behavior: UserBehavior
+        self, user_id: str, behavior: UserBehavior, record: bool = True
     ) -> Dict[str, Any]:
-        """Обнаружение аномалий в поведении"""
+        """Обнаружение аномалий в поведении (record - сохранить запись)"""
         try:
             anomalies = []
 
@@ -914,7 +744,7 @@ class BehavioralAnalyticsEngine(SecurityBase):
                 )
 
             # Создаем запись об аномалии
-            if anomalies:
+            if anomalies and record:
                 anomaly = AnomalyDetection(
                     anomaly_id=hashlib.md5(
                         f"{user_id}{str(behavior.timestamp)}{len(anomalies)}"
@@ -981,9 +811,169 @@ class BehavioralAnalyticsEngine(SecurityBase):
                 profile["behavior_types"].get(behavior_type, 0) + 1
             )
 
+            # Обновляем потоковые статистики за O(1)
+            self._update_behavior_profile(behavior)
+
         except Exception as e:
             self.logger.error(f"Ошибка обновления профиля пользователя: {e}")
 
+    def _update_behavior_profile(self, behavior: UserBehavior):
+        """Учет события в потоковом профиле пользователя"""
+        profile = self.behavior_profiles.get(behavior.user_id)
+        if profile is None:
+            profile = BehaviorProfile(behavior.user_id)
+            self.behavior_profiles[behavior.user_id] = profile
+        timestamp = behavior.timestamp
+        profile.update(
+            timestamp.timestamp(),
+            timestamp.hour,
+            timestamp.weekday(),
+            behavior.activity_type.value,
+            behavior.location,
+            behavior.duration,
+            behavior.risk_score,
+            behavior.behavior_type.value,
+        )
+
+    def score_events(
+        self,
+        events: Iterable[Union[UserBehavior, Dict[str, Any]]],
+        update_profiles: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Пакетная оценка потока событий многих пользователей.
+
+        Каждое событие оценивается по профилю своего пользователя и
+        (при update_profiles) сразу учитывается в нем, поэтому события
+        одного пользователя должны идти в порядке времени. Полный отчет
+        и лог на каждое событие не формируются.
+
+        Args:
+            events: UserBehavior или словари с полями user_id,
+                activity_type, duration, location, device и
+                необязательными timestamp и metadata
+            update_profiles: Обновлять профили, историю и записи
+                об аномалиях (False - оценка без изменения состояния)
+
+        Returns:
+            List[Dict[str, Any]]: Оценки событий в исходном порядке
+        """
+        results = []
+        skipped = 0
+        for event in events:
+            try:
+                behavior = self._behavior_from_event(event)
+            except (KeyError, TypeError, ValueError) as e:
+                skipped += 1
+                self.logger.warning(f"Пропущено некорректное событие: {e}")
+                continue
+
+            behavior.risk_score = self._calculate_risk_score(behavior)
+            behavior.behavior_type = self._classify_behavior(behavior)
+
+            anomalies = []
+            profile = self.behavior_profiles.get(behavior.user_id)
+            if profile is not None and profile.count >= 2:
+                anomalies.extend(
+                    self._detect_pattern_anomalies(behavior, profile)
+                )
+            anomalies.extend(
+                self._detect_anomalies(
+                    behavior.user_id, behavior, record=update_profiles
+                )["anomalies"]
+            )
+
+            if update_profiles:
+                self._update_user_profile(behavior.user_id, behavior, {})
+                self.user_behaviors.append(behavior)
+
+            results.append(
+                {
+                    "user_id": behavior.user_id,
+                    "timestamp": behavior.timestamp.isoformat(),
+                    "risk_score": behavior.risk_score,
+                    "behavior_type": behavior.behavior_type.value,
+                    "anomaly_score": max(
+                        (a["severity"] for a in anomalies), default=0.0
+                    ),
+                    "anomalies": [a["type"] for a in anomalies],
+                }
+            )
+
+        self.logger.info(
+            f"Пакетная оценка: {len(results)} событий, пропущено {skipped}"
+        )
+        return results
+
+    @staticmethod
+    def _behavior_from_event(
+        event: Union[UserBehavior, Dict[str, Any]]
+    ) -> UserBehavior:
+        """Событие пакета в UserBehavior"""
+        if isinstance(event, UserBehavior):
+            return event
+        timestamp = event.get("timestamp") or datetime.now()
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        elif isinstance(timestamp, (int, float)):
+            timestamp = datetime.fromtimestamp(timestamp)
+        return UserBehavior(
+            user_id=event["user_id"],
+            activity_type=UserActivity(event["activity_type"]),
+            timestamp=timestamp,
+            duration=float(event["duration"]),
+            location=event["location"],
+            device=event["device"],
+            risk_score=0.0,
+            behavior_type=BehaviorType.NORMAL,
+            metadata=event.get("metadata") or {},
+        )
+
+    def save_profiles(self, path: Optional[str] = None) -> bool:
+        """Сохранение потоковых профилей в компактный JSON"""
+        path = path or self.profiles_path
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            data = {
+                "version": PROFILE_VERSION,
+                "profiles": {
+                    user_id: profile.to_dict()
+                    for user_id, profile in self.behavior_profiles.items()
+                },
+            }
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_path, path)
+            self.logger.info(
+                f"Сохранено профилей поведения: {len(self.behavior_profiles)}"
+            )
+            return True
+        except Exception as e:
+            self.logger.error(f"Ошибка сохранения профилей поведения: {e}")
+            return False
+
+    def load_profiles(self, path: Optional[str] = None) -> int:
+        """Загрузка потоковых профилей; возвращает их количество"""
+        path = path or self.profiles_path
+        try:
+            if not os.path.exists(path):
+                return 0
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            for user_id, profile_data in data.get("profiles", {}).items():
+                self.behavior_profiles[user_id] = BehaviorProfile.from_dict(
+                    user_id, profile_data
+                )
+            loaded = len(data.get("profiles", {}))
+            self.logger.info(f"Загружено профилей поведения: {loaded}")
+            return loaded
+        except Exception as e:
+            self.logger.error(f"Ошибка загрузки профилей поведения: {e}")
+            return 0
+
     def _generate_behavior_report(
         self,
         user_id: str,
@@ -1022,7 +1012,10 @@ class BehavioralAnalyticsEngine(SecurityBase):
     def get_behavioral_analytics(self) -> Dict[str, Any]:
         """Получение аналитики поведения"""
         try:
-            total_behaviors = len(self.user_behaviors)
+            # Всего событий по профилям; user_behaviors - последние события
+            total_behaviors = sum(
+                profile.count for profile in self.behavior_profiles.values()
+            )
             total_users = len(self.user_profiles)
             total_anomalies = len(self.anomalies)
 
@@ -1371,7 +1364,10 @@ class BehavioralAnalyticsEngine(SecurityBase):
     def get_behavior_analytics(self) -> Dict[str, Any]:
         """Получение аналитики поведения"""
         try:
-            total_behaviors = len(self.user_behaviors)
+            # Всего событий по профилям; user_behaviors - последние события
+            total_behaviors = sum(
+                profile.count for profile in self.behavior_profiles.values()
+            )
             total_users = len(self.user_profiles)
             total_anomalies = len(self.anomalies)
 
@@ -1492,133 +1488,6 @@ class BehavioralAnalyticsEngine(SecurityBase):
             self.logger.error(f"Ошибка генерации комплексного отчета: {e}")
             return {}
 
-    @staticmethod
-    def _calculate_time_consistency(timestamps: List[datetime]) -> float:
-        """Расчет временной консистентности"""
-        try:
-            if len(timestamps) < 2:
-                return 0.0
-
-            # Сортируем временные метки
-            sorted_timestamps = sorted(timestamps)
-
-            # Вычисляем интервалы между активностями
-            intervals = []
-            for i in range(1, len(sorted_timestamps)):
-                interval = (
-                    sorted_timestamps[i] - sorted_timestamps[i - 1]
-                ).total_seconds() / 3600  # в часах
-                intervals.append(interval)
-
-            if not intervals:
-                return 0.0
-
-            # Вычисляем стандартное отклонение интервалов
-            mean_interval = np.mean(intervals)
-            std_interval = np.std(intervals)
-
-            # Консистентность = 1 - (коэффициент вариации)
-            if mean_interval > 0:
-                coefficient_of_variation = std_interval / mean_interval
-                consistency = max(0.0, 1.0 - coefficient_of_variation)
-            else:
-                consistency = 0.0
-
-            return min(1.0, consistency)
-        except Exception as e:
-            # В статическом методе не можем использовать self.logger
-            print(f"Ошибка расчета временной консистентности: {e}")
-            return 0.0
-
-    def _detect_temporal_anomalies(
-        self, timestamps: List[datetime], hour_counts: Counter
-    ) -> List[Dict[str, Any]]:
-        """Обнаружение временных аномалий"""
-        try:
-            anomalies = []
-
-            if len(timestamps) < 3:
-                return anomalies
-
-            # Аномалии по часам
-            if hour_counts:
-                avg_hourly_activity = sum(hour_counts.values()) / len(
-                    hour_counts
-                )
-                for hour, count in hour_counts.items():
-                    if (
-                        count > avg_hourly_activity * 3
-                    ):  # Аномально высокая активность
-                        anomalies.append(
-                            {
-                                "type": "high_activity_hour",
-                                "hour": hour,
-                                "count": count,
-                                "severity": "medium",
-                            }
-                        )
-                    elif (
-                        count > 0 and count < avg_hourly_activity * 0.1
-                    ):  # Аномально низкая активность
-                        anomalies.append(
-                            {
-                                "type": "low_activity_hour",
-                                "hour": hour,
-                                "count": count,
-                                "severity": "low",
-                            }
-                        )
-
-            # Аномалии по времени суток
-            night_hours = list(range(0, 6)) + list(range(22, 24))
-            night_activity = sum(
-                hour_counts[hour]
-                for hour in night_hours
-                if hour in hour_counts
-            )
-            total_activity = sum(hour_counts.values())
-
-            if total_activity > 0 and night_activity / total_activity > 0.3:
-                anomalies.append(
-                    {
-                        "type": "high_night_activity",
-                        "night_activity_ratio": night_activity
-                        / total_activity,
-                        "severity": "high",
-                    }
-                )
-
-            # Аномалии по регулярности
-            sorted_timestamps = sorted(timestamps)
-            time_gaps = []
-            for i in range(1, len(sorted_timestamps)):
-                gap = (
-                    sorted_timestamps[i] - sorted_timestamps[i - 1]
-                ).total_seconds() / 3600
-                time_gaps.append(gap)
-
-            if time_gaps:
-                avg_gap = np.mean(time_gaps)
-                std_gap = np.std(time_gaps)
-
-                for i, gap in enumerate(time_gaps):
-                    if (
-                        gap > avg_gap + 2 * std_gap
-                    ):  # Аномально большой перерыв
-                        anomalies.append(
-                            {
-                                "type": "long_inactivity_gap",
-                                "gap_hours": gap,
-                                "timestamp": sorted_timestamps[i].isoformat(),
-                                "severity": "medium",
-                            }
-                        )
-
-            return anomalies
-        except Exception as e:
-            self.logger.error(f"Ошибка обнаружения временных аномалий: {e}")
-            return []
-
     def generate_quality_report(self) -> Dict[str, Any]:
         """Генерация отчета о качестве"""
         try:
@@ -0,0 +1,480 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+BreachIndex - Компактный индекс утёкших паролей ALADDIN
+
+Файл индекса содержит отсортированные SHA-256 дайджесты фиксированной
+длины, таблицу смещений бакетов по первым битам дайджеста и фильтр
+Блума. Индекс открывается через mmap: корпус не загружается в память
+процесса, старт мгновенный, проверка - фильтр Блума и бинарный поиск
+внутри одного бакета.
+
+Формат файла:
+    заголовок | смещения бакетов (uint64) | дайджесты | фильтр Блума
+
+Построение выполняется офлайн (BreachIndexBuilder): входной список
+(пароли, SHA-256 или формат "HASH:count") читается потоково, дайджесты
+сортируются порциями во временные файлы и сливаются с удалением
+дубликатов.
+"""
+
+import argparse
+import hashlib
+import heapq
+import math
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from dataclasses import dataclass
+from typing import BinaryIO, Iterable, Iterator, List, Optional
+
+MAGIC = b"ALDNBRX1"
+HEADER = struct.Struct("<8sHHIQQQ")
+OFFSET = struct.Struct("<Q")
+DIGEST_SIZE = hashlib.sha256().digest_size
+DEFAULT_PREFIX_BITS = 16
+DEFAULT_FALSE_POSITIVE_RATE = 0.01
+DEFAULT_CHUNK_RECORDS = 1_000_000
+# Минимальная длина префикса для k-анонимного запроса (20 бит)
+MIN_RANGE_PREFIX = 5
+
+INPUT_FORMATS = ("plaintext", "sha256", "auto")
+
+
+class BreachIndexError(Exception):
+    """Ошибка формата или построения индекса утечек"""
+
+
+def password_digest(password: str) -> bytes:
+    """SHA-256 дайджест пароля (тот же, что в PasswordSecurityAgent)"""
+    return hashlib.sha256(password.encode()).digest()
+
+
+def _bloom_positions(digest: bytes, bits: int, k: int) -> Iterator[int]:
+    """
+    Позиции битов фильтра Блума.
+
+    Дайджест уже равномерно распределён, поэтому два 64-битных слова
+    из него используются как независимые хеши (двойное хеширование).
+    """
+    h1 = int.from_bytes(digest[:8], "big")
+    h2 = int.from_bytes(digest[8:16], "big") | 1
+    for i in range(k):
+        yield (h1 + i * h2) % bits
+
+
+def bloom_parameters(count: int, false_positive_rate: float):
+    """Размер фильтра в битах и число хешей для заданной доли ошибок"""
+    count = max(1, count)
+    bits = math.ceil(
+        -count * math.log(false_positive_rate) / (math.log(2) ** 2)
+    )
+    bits = max(64, (bits + 7) // 8 * 8)
+    k = max(1, round(bits / count * math.log(2)))
+    return bits, k
+
+
+@dataclass
+class BreachIndexStats:
+    """Результат построения индекса"""
+
+    records_read: int = 0
+    records_skipped: int = 0
+    unique_digests: int = 0
+    runs: int = 0
+    bloom_bits: int = 0
+    bloom_hashes: int = 0
+    file_size: int = 0
+
+    def to_dict(self):
+        return {
+            "records_read": self.records_read,
+            "records_skipped": self.records_skipped,
+            "unique_digests": self.unique_digests,
+            "runs": self.runs,
+            "bloom_bits": self.bloom_bits,
+            "bloom_hashes": self.bloom_hashes,
+            "file_size": self.file_size,
+        }
+
+
+class BreachIndex:
+    """Индекс утечек в режиме только чтения поверх mmap"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(
+                self._file.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        except ValueError:
+            self._file.close()
+            raise BreachIndexError(f"Пустой файл индекса: {path}")
+
+        if len(self._mm) < HEADER.size:
+            self.close()
+            raise BreachIndexError(f"Повреждённый файл индекса: {path}")
+        (
+            magic,
+            self.digest_size,
+            self.prefix_bits,
+            self.bloom_hashes,
+            self.count,
+            self.bloom_bits,
+            self.bloom_offset,
+        ) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self.close()
+            raise BreachIndexError(f"Неизвестный формат индекса: {path}")
+
+        self._offsets_start = HEADER.size
+        self._digests_start = (
+            self._offsets_start + ((1 << self.prefix_bits) + 1) * OFFSET.size
+        )
+        expected = self.bloom_offset + self.bloom_bits // 8
+        if (
+            self._digests_start + self.count * self.digest_size
+            != self.bloom_offset
+            or len(self._mm) != expected
+        ):
+            self.close()
+            raise BreachIndexError(f"Повреждённый файл индекса: {path}")
+
+        self.lookups = 0
+        self.bloom_rejections = 0
+
+    # --- низкоуровневый доступ ---
+
+    def _bucket(self, digest: bytes) -> int:
+        return int.from_bytes(digest[:8], "big") >> (64 - self.prefix_bits)
+
+    def _bucket_start(self, bucket: int) -> int:
+        return OFFSET.unpack_from(
+            self._mm, self._offsets_start + bucket * OFFSET.size
+        )[0]
+
+    def _digest_at(self, i: int) -> bytes:
+        start = self._digests_start + i * self.digest_size
+        return self._mm[start:start + self.digest_size]
+
+    def _bisect(self, key: bytes, lo: int, hi: int, right: bool) -> int:
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = self._digest_at(mid)
+            if value < key or (right and value == key):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _bloom_contains(self, digest: bytes) -> bool:
+        mm = self._mm
+        base = self.bloom_offset
+        positions = _bloom_positions(
+            digest, self.bloom_bits, self.bloom_hashes
+        )
+        for pos in positions:
+            if not mm[base + (pos >> 3)] & (1 << (pos & 7)):
+                return False
+        return True
+
+    # --- публичный API ---
+
+    def contains_digest(self, digest: bytes) -> bool:
+        """Проверка дайджеста: фильтр Блума, затем поиск в бакете"""
+        if len(digest) != self.digest_size:
+            raise ValueError("Неверная длина дайджеста")
+        self.lookups += 1
+        if not self._bloom_contains(digest):
+            self.bloom_rejections += 1
+            return False
+        bucket = self._bucket(digest)
+        lo = self._bucket_start(bucket)
+        hi = self._bucket_start(bucket + 1)
+        i = self._bisect(digest, lo, hi, right=False)
+        return i < hi and self._digest_at(i) == digest
+
+    def contains_password(self, password: str) -> bool:
+        return self.contains_digest(password_digest(password))
+
+    def contains_hash(self, hex_digest: str) -> bool:
+        return self.contains_digest(bytes.fromhex(hex_digest))
+
+    def __contains__(self, item) -> bool:
+        if isinstance(item, (bytes, bytearray)):
+            return self.contains_digest(bytes(item))
+        return self.contains_hash(item)
+
+    def range_search(self, prefix: str) -> List[str]:
+        """
+        k-анонимный запрос по префиксу хеша.
+
+        Клиент передаёт только первые символы hex-хеша пароля и
+        получает все окончания хешей с этим префиксом; сам хеш остаётся
+        у клиента.
+
+        Args:
+            prefix: Начало hex-дайджеста (не короче MIN_RANGE_PREFIX)
+
+        Returns:
+            List[str]: Окончания хешей (в верхнем регистре, без префикса)
+        """
+        prefix = prefix.strip().lower()
+        width = self.digest_size * 2
+        if not MIN_RANGE_PREFIX <= len(prefix) <= width:
+            raise ValueError(
+                f"Длина префикса должна быть от {MIN_RANGE_PREFIX} "
+                f"до {width} символов"
+            )
+        low = bytes.fromhex(prefix.ljust(width, "0"))
+        high = bytes.fromhex(prefix.ljust(width, "f"))
+
+        lo = self._bucket_start(self._bucket(low))
+        hi = self._bucket_start(self._bucket(high) + 1)
+        start = self._bisect(low, lo, hi, right=False)
+        end = self._bisect(high, start, hi, right=True)
+        return [
+            self._digest_at(i).hex()[len(prefix):].upper()
+            for i in range(start, end)
+        ]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self):
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get_stats(self):
+        return {
+            "path": self.path,
+            "count": self.count,
+            "prefix_bits": self.prefix_bits,
+            "bloom_bits": self.bloom_bits,
+            "bloom_hashes": self.bloom_hashes,
+            "lookups": self.lookups,
+            "bloom_rejections": self.bloom_rejections,
+        }
+
+
+def _read_run(path: str, digest_size: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(digest_size * 4096)
+            if not block:
+                break
+            for i in range(0, len(block), digest_size):
+                yield block[i:i + digest_size]
+
+
+class BreachIndexBuilder:
+    """
+    Офлайн-построение индекса утечек.
+
+    Записи добавляются потоково (add_line / add_lines / add_file);
+    в памяти держится не больше chunk_records дайджестов, остальные
+    лежат в отсортированных временных файлах до слияния в finish().
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        input_format: str = "plaintext",
+        prefix_bits: int = DEFAULT_PREFIX_BITS,
+        false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE,
+        chunk_records: int = DEFAULT_CHUNK_RECORDS,
+        tmp_dir: Optional[str] = None,
+    ):
+        if input_format not in INPUT_FORMATS:
+            raise ValueError(f"Неизвестный формат входа: {input_format}")
+        if not 1 <= prefix_bits <= 24:
+            raise ValueError("prefix_bits должен быть от 1 до 24")
+        if not 0 < false_positive_rate < 1:
+            raise ValueError("false_positive_rate должен быть в (0, 1)")
+        self.output_path = output_path
+        self.input_format = input_format
+        self.prefix_bits = prefix_bits
+        self.false_positive_rate = false_positive_rate
+        self.chunk_records = max(1, chunk_records)
+        self._tmp = tempfile.mkdtemp(prefix="breach_index_", dir=tmp_dir)
+        self._buffer: List[bytes] = []
+        self._runs: List[str] = []
+        self.stats = BreachIndexStats()
+
+    def _parse(self, line: str) -> Optional[bytes]:
+        line = line.strip()
+        if not line:
+            return None
+        if self.input_format == "plaintext":
+            return password_digest(line)
+        # Формат "HASH:count" (списки вида Have I Been Pwned)
+        candidate = line.split(":", 1)[0]
+        if len(candidate) == DIGEST_SIZE * 2:
+            try:
+                return bytes.fromhex(candidate)
+            except ValueError:
+                pass
+        if self.input_format == "auto":
+            return password_digest(line)
+        return None
+
+    def add_digest(self, digest: bytes):
+        self._buffer.append(digest)
+        if len(self._buffer) >= self.chunk_records:
+            self._flush_run()
+
+    def add_line(self, line: str):
+        self.stats.records_read += 1
+        digest = self._parse(line)
+        if digest is None:
+            self.stats.records_skipped += 1
+            return
+        self.add_digest(digest)
+
+    def add_lines(self, lines: Iterable[str]):
+        for line in lines:
+            self.add_line(line)
+
+    def add_file(self, path: str, encoding: str = "utf-8"):
+        with open(path, "r", encoding=encoding, errors="ignore") as f:
+            self.add_lines(f)
+
+    def _flush_run(self):
+        if not self._buffer:
+            return
+        self._buffer.sort()
+        path = os.path.join(self._tmp, f"run_{len(self._runs)}.bin")
+        with open(path, "wb") as f:
+            f.write(b"".join(self._buffer))
+        self._runs.append(path)
+        self._buffer = []
+
+    def _merge(self, out: BinaryIO, bucket_counts: "array[int]") -> int:
+        shift = 64 - self.prefix_bits
+        previous = None
+        count = 0
+        runs = [_read_run(path, DIGEST_SIZE) for path in self._runs]
+        pending: List[bytes] = []
+        for digest in heapq.merge(*runs):
+            if digest == previous:
+                continue
+            previous = digest
+            bucket_counts[int.from_bytes(digest[:8], "big") >> shift] += 1
+            pending.append(digest)
+            if len(pending) >= 4096:
+                out.write(b"".join(pending))
+                pending.clear()
+            count += 1
+        out.write(b"".join(pending))
+        return count
+
+    def finish(self) -> BreachIndexStats:
+        """Слияние порций и атомарная запись файла индекса"""
+        try:
+            self._flush_run()
+            self.stats.runs = len(self._runs)
+            buckets = 1 << self.prefix_bits
+            bucket_counts = array("Q", bytes(8 * buckets))
+
+            merged_path = os.path.join(self._tmp, "merged.bin")
+            with open(merged_path, "wb") as merged:
+                count = self._merge(merged, bucket_counts)
+            self.stats.unique_digests = count
+
+            bits, k = bloom_parameters(count, self.false_positive_rate)
+            self.stats.bloom_bits, self.stats.bloom_hashes = bits, k
+            bloom = bytearray(bits // 8)
+            for digest in _read_run(merged_path, DIGEST_SIZE):
+                for pos in _bloom_positions(digest, bits, k):
+                    bloom[pos >> 3] |= 1 << (pos & 7)
+
+            offsets = array("Q", [0])
+            total = 0
+            for bucket_count in bucket_counts:
+                total += bucket_count
+                offsets.append(total)
+            if sys.byteorder != "little":
+                offsets.byteswap()
+
+            digests_start = HEADER.size + len(offsets) * OFFSET.size
+            bloom_offset = digests_start + count * DIGEST_SIZE
+
+            directory = os.path.dirname(self.output_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            partial = self.output_path + ".partial"
+            with open(partial, "wb") as out:
+                out.write(
+                    HEADER.pack(
+                        MAGIC,
+                        DIGEST_SIZE,
+                        self.prefix_bits,
+                        k,
+                        count,
+                        bits,
+                        bloom_offset,
+                    )
+                )
+                out.write(offsets.tobytes())
+                with open(merged_path, "rb") as merged:
+                    shutil.copyfileobj(merged, out, 1024 * 1024)
+                out.write(bloom)
+            os.replace(partial, self.output_path)
+            self.stats.file_size = os.path.getsize(self.output_path)
+            return self.stats
+        finally:
+            shutil.rmtree(self._tmp, ignore_errors=True)
+
+
+def build_breach_index(
+    sources: Iterable[str], output_path: str, **kwargs
+) -> BreachIndexStats:
+    """Построение индекса из набора файлов со списками утечек"""
+    builder = BreachIndexBuilder(output_path, **kwargs)
+    for source in sources:
+        builder.add_file(source)
+    return builder.finish()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Построение индекса утёкших паролей ALADDIN"
+    )
+    parser.add_argument("output", help="Путь к файлу индекса")
+    parser.add_argument("sources", nargs="+", help="Входные списки")
+    parser.add_argument(
+        "--format", choices=INPUT_FORMATS, default="plaintext"
+    )
+    parser.add_argument(
+        "--fp-rate", type=float, default=DEFAULT_FALSE_POSITIVE_RATE
+    )
+    parser.add_argument(
+        "--chunk-records", type=int, default=DEFAULT_CHUNK_RECORDS
+    )
+    args = parser.parse_args()
+    stats = build_breach_index(
+        args.sources,
+        args.output,
+        input_format=args.format,
+        false_positive_rate=args.fp_rate,
+        chunk_records=args.chunk_records,
+    )
+    print(stats.to_dict())
+
+
+if __name__ == "__main__":
+    main()
@@ -9,17 +9,36 @@ ALADDIN Security System - Data Protection Agent
 """
 
 import asyncio
+import base64
 import hashlib
 import json
 import logging
 import os
 import re
+import secrets
 import time
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from core.base import ComponentStatus, SecurityBase
+from security.ai_agents.data_protection_crypto import (
+    DEFAULT_ANONYMIZATION_RULES,
+    EncryptionContext,
+    FieldAnonymizer,
+    key_from_string,
+    protect_chunk,
+    serialize_payload,
+)
+
+
+# Данные крупнее порога шифруются в асинхронном API вне event loop
+ASYNC_OFFLOAD_BYTES = 1 << 20
 
 
 class DataType(Enum):
@@ -204,7 +223,6 @@ class DataProtectionAgent(SecurityBase):
         )
 
         # Настройки защиты
-        self.default_encryption_method = EncryptionMethod.AES_256
         self.default_protection_level = ProtectionLevel.HIGH
         self.auto_backup_interval = (
             config.get("auto_backup_interval", 3600) if config else 3600
@@ -245,6 +263,31 @@ class DataProtectionAgent(SecurityBase):
             "cpu_usage": 0.0,
         }
 
+        # AEAD-шифрование: контекст на ключ создаётся один раз
+        config = config or {}
+        self.default_encryption_method = EncryptionMethod(
+            config.get("encryption_method", EncryptionMethod.AES_256.value)
+        )
+        self._encryption_contexts: Dict[
+            Tuple[str, str], EncryptionContext
+        ] = {}
+
+        # Анонимизация по таблице правил полей
+        salt = config.get("anonymization_salt")
+        self.anonymizer = FieldAnonymizer(
+            config.get("anonymization_rules", DEFAULT_ANONYMIZATION_RULES),
+            salt=salt.encode("utf-8") if salt else None,
+        )
+
+        # Пакетная обработка: CPU-работа порциями в пуле
+        self.batch_executor_type = config.get("batch_executor", "thread")
+        self.batch_workers = config.get("batch_workers") or min(
+            4, os.cpu_count() or 1
+        )
+        self.batch_chunk_size = config.get("batch_chunk_size", 256)
+        self._batch_executor: Optional[Executor] = None
+        self.last_batch_stats: Dict[str, Any] = {}
+
     def initialize(self) -> bool:
         """Инициализация агента"""
         try:
@@ -319,8 +362,56 @@ class DataProtectionAgent(SecurityBase):
         self.log_activity("Система резервного копирования настроена")
 
     def _generate_encryption_key(self) -> str:
-        """Генерация ключа шифрования"""
-        return hashlib.sha256(str(time.time()).encode()).hexdigest()
+        """Генерация ключа шифрования (256 бит из CSPRNG, hex)"""
+        return secrets.token_hex(32)
+
+    def _get_encryption_context(
+        self, key_id: str = "master"
+    ) -> EncryptionContext:
+        """Контекст шифрования для ключа (создаётся при первом обращении)"""
+        method = self.default_encryption_method.value
+        context = self._encryption_contexts.get((key_id, method))
+        if context is None:
+            key = self.encryption_keys.get(key_id)
+            if key is None:
+                key = self._generate_encryption_key()
+                self.encryption_keys[key_id] = key
+            context = EncryptionContext(key_from_string(key), method)
+            self._encryption_contexts[(key_id, method)] = context
+        return context
+
+    def encrypt_bytes(
+        self, data: bytes, data_id: str, key_id: str = "master"
+    ) -> bytes:
+        """
+        AEAD-шифрование байтов.
+
+        Args:
+            data: Открытые данные
+            data_id: Идентификатор данных (привязывается к шифртексту)
+            key_id: Идентификатор ключа
+
+        Returns:
+            bytes: Токен (заголовок, nonce, шифртекст с тегом)
+        """
+        token = self._get_encryption_context(key_id).encrypt(
+            data, data_id.encode("utf-8")
+        )
+        self.metrics.encryption_operations += 1
+        return token
+
+    def decrypt_bytes(
+        self, token: bytes, data_id: str, key_id: str = "master"
+    ) -> bytes:
+        """
+        Расшифровка токена encrypt_bytes.
+
+        Raises:
+            DataEncryptionError: Токен повреждён или data_id не совпадает
+        """
+        return self._get_encryption_context(key_id).decrypt(
+            token, data_id.encode("utf-8")
+        )
 
     def protect_data(
         self,
@@ -470,21 +561,10 @@ class DataProtectionAgent(SecurityBase):
         return min(risk_level, 1.0)
 
     def _encrypt_data(self, data: Any, data_id: str) -> str:
-        """Шифрование данных"""
+        """Шифрование данных (токен encrypt_bytes в base64)"""
         try:
-            data_str = json.dumps(data) if not isinstance(data, str) else data
-            key = self.encryption_keys.get(
-                "master", self._generate_encryption_key()
-            )
-
-            # Простое XOR шифрование для демонстрации
-            encrypted = ""
-            for i, char in enumerate(data_str):
-                key_char = key[i % len(key)]
-                encrypted += chr(ord(char) ^ ord(key_char))
-
-            self.metrics.encryption_operations += 1
-            return encrypted
+            token = self.encrypt_bytes(serialize_payload(data), data_id)
+            return base64.urlsafe_b64encode(token).decode("ascii")
 
         except Exception as e:
             self.log_activity(
@@ -492,21 +572,14 @@ class DataProtectionAgent(SecurityBase):
             )
             return str(data)
 
+    def _decrypt_data(self, encrypted: str, data_id: str) -> bytes:
+        """Расшифровка результата _encrypt_data"""
+        return self.decrypt_bytes(base64.urlsafe_b64decode(encrypted), data_id)
+
     def _anonymize_data(self, data: Any) -> Any:
-        """Анонимизация данных"""
+        """Анонимизация данных по таблице правил полей"""
         try:
-            if isinstance(data, dict):
-                anonymized = {}
-                for key, value in data.items():
-                    if "name" in key.lower() or "email" in key.lower():
-                        anonymized[key] = "***ANONYMIZED***"
-                    else:
-                        anonymized[key] = value
-                return anonymized
-            elif isinstance(data, str):
-                return "***ANONYMIZED***"
-            else:
-                return data
+            return self.anonymizer.anonymize(data)
 
         except Exception as e:
             self.log_activity(
@@ -754,6 +827,10 @@ class DataProtectionAgent(SecurityBase):
             self.log_activity("Остановка DataProtectionAgent")
             self.status = ComponentStatus.STOPPED
 
+            if self._batch_executor is not None:
+                self._batch_executor.shutdown(wait=True)
+                self._batch_executor = None
+
             # Сохранение состояния
             self._save_state()
 
@@ -874,14 +951,35 @@ class DataProtectionAgent(SecurityBase):
                 )
                 raise
 
+    def _get_batch_executor(self) -> Executor:
+        """Пул для CPU-части пакетной защиты (создаётся один раз)"""
+        if self._batch_executor is None:
+            if self.batch_executor_type == "process":
+                self._batch_executor = ProcessPoolExecutor(
+                    max_workers=self.batch_workers
+                )
+            else:
+                self._batch_executor = ThreadPoolExecutor(
+                    max_workers=self.batch_workers,
+                    thread_name_prefix="data-protection",
+                )
+        return self._batch_executor
+
     async def batch_protect_data_async(
-        self, data_batch: List[Dict[str, Any]]
+        self,
+        data_batch: List[Dict[str, Any]],
+        chunk_size: Optional[int] = None,
     ) -> List[DataProtectionResult]:
         """
         Асинхронная пакетная защита данных.
 
+        Сериализация, шифрование и анонимизация выполняются порциями по
+        chunk_size элементов в пуле потоков или процессов
+        (batch_executor), event loop только собирает результаты.
+
         Args:
             data_batch: Список данных для защиты
+            chunk_size: Размер порции (по умолчанию batch_chunk_size)
 
         Returns:
             List[DataProtectionResult]: Список результатов защиты
@@ -889,43 +987,138 @@ class DataProtectionAgent(SecurityBase):
         self.logger.info(
             f"Начало асинхронной пакетной защиты {len(data_batch)} элементов"
         )
+        start_time = time.perf_counter()
+        chunk_size = max(1, chunk_size or self.batch_chunk_size)
+        context = (
+            self._get_encryption_context()
+            if self.encryption_enabled
+            else None
+        )
+        anonymizer = self.anonymizer if self.anonymization_enabled else None
 
-        tasks = []
+        items = []
         for item in data_batch:
-            task = asyncio.create_task(
-                self.protect_data_async(
+            data_type = item.get("data_type", DataType.GENERAL)
+            items.append(
+                (
                     item.get("data_id", ""),
                     item.get("data"),
-                    item.get("data_type", DataType.GENERAL),
+                    data_type,
                     item.get("protection_level", ProtectionLevel.HIGH),
                 )
             )
-            tasks.append(task)
-            self._async_tasks.add(task)
 
-        try:
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+        loop = asyncio.get_running_loop()
+        executor = self._get_batch_executor()
+        chunks = [
+            items[i:i + chunk_size] for i in range(0, len(items), chunk_size)
+        ]
+        chunk_outputs = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    executor,
+                    protect_chunk,
+                    context,
+                    anonymizer,
+                    [
+                        (data_id, data, data_type == DataType.PERSONAL)
+                        for data_id, data, data_type, _ in chunk
+                    ],
+                )
+                for chunk in chunks
+            ),
+            return_exceptions=True,
+        )
 
-            # Обработка результатов
-            successful_results = []
-            for i, result in enumerate(results):
-                if isinstance(result, Exception):
+        successful_results = []
+        total_bytes = 0
+        for chunk, outputs in zip(chunks, chunk_outputs):
+            if isinstance(outputs, Exception):
+                self.logger.error(f"Ошибка в пакетной обработке: {outputs}")
+                continue
+            for (data_id, data, data_type, level), output in zip(
+                chunk, outputs
+            ):
+                token, _, size, error = output
+                if error is not None or data is None:
                     self.logger.error(
-                        f"Ошибка в пакетной обработке элемента {i}: {result}"
+                        f"Ошибка в пакетной обработке элемента {data_id}: "
+                        f"{error or 'пустые данные'}"
                     )
-                else:
-                    successful_results.append(result)
+                    continue
+                total_bytes += size
+                risk_level = await self._assess_data_risk_async(
+                    data, data_type, level
+                )
+                status = (
+                    DataStatus.ENCRYPTED
+                    if token is not None
+                    else DataStatus.PROTECTED
+                )
+                self._update_metrics(status)
+                successful_results.append(
+                    DataProtectionResult(
+                        data_id=data_id,
+                        protection_status=status,
+                        risk_level=risk_level,
+                        protection_score=(
+                            await self._calculate_protection_score_async(
+                                status, risk_level
+                            )
+                        ),
+                        compliance_status=True,
+                        encryption_method=(
+                            self.default_encryption_method
+                            if token is not None
+                            else None
+                        ),
+                    )
+                )
 
-            self.logger.info(
-                f"Асинхронная пакетная защита завершена: "
-                f"{len(successful_results)}/{len(data_batch)} успешно"
-            )
-            return successful_results
+        if context is not None:
+            self.metrics.encryption_operations += len(successful_results)
+        if self.backup_enabled and successful_results:
+            await loop.run_in_executor(None, self._backup_batch, items)
+
+        duration = time.perf_counter() - start_time
+        self.last_batch_stats = {
+            "items": len(successful_results),
+            "bytes": total_bytes,
+            "chunks": len(chunks),
+            "duration": duration,
+            "items_per_second": (
+                len(successful_results) / duration if duration > 0 else 0.0
+            ),
+            "mb_per_second": (
+                total_bytes / 1e6 / duration if duration > 0 else 0.0
+            ),
+        }
+        self.logger.info(
+            f"Асинхронная пакетная защита завершена: "
+            f"{len(successful_results)}/{len(data_batch)} успешно"
+        )
+        return successful_results
 
-        finally:
-            # Очистка завершенных задач
-            for task in tasks:
-                self._async_tasks.discard(task)
+    def _backup_batch(self, items: List[Tuple[str, Any, Any, Any]]):
+        """Резервная копия пакета одним файлом JSON Lines"""
+        try:
+            backup_dir = "data/backups"
+            os.makedirs(backup_dir, exist_ok=True)
+            backup_file = os.path.join(
+                backup_dir, "batch_{}.jsonl".format(time.time_ns())
+            )
+            timestamp = datetime.now().isoformat()
+            with open(backup_file, "w", encoding="utf-8") as f:
+                for data_id, data, _, _ in items:
+                    record = {
+                        "data_id": data_id,
+                        "timestamp": timestamp,
+                        "data": str(data)[:1000],  # Ограничиваем размер
+                    }
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.metrics.backup_operations += 1
+        except Exception as e:
+            self.logger.error(f"Ошибка резервного копирования пакета: {e}")
 
     async def _validate_data_input_async(
         self, data: Any, data_type: DataType
@@ -989,15 +1182,18 @@ class DataProtectionAgent(SecurityBase):
     async def _encrypt_data_async(self, data: Any, data_id: str) -> str:
         """Асинхронное шифрование данных."""
         try:
-            # Имитация асинхронного шифрования
-            await asyncio.sleep(0.001)  # Небольшая задержка для имитации
-
-            data_str = str(data)
-            hash_obj = hashlib.sha256()
-            hash_obj.update(data_str.encode("utf-8"))
-            hash_obj.update(data_id.encode("utf-8"))
+            payload = serialize_payload(data)
+            context = self._get_encryption_context()
+            if len(payload) >= ASYNC_OFFLOAD_BYTES:
+                # Крупные данные шифруются вне event loop
+                token = await asyncio.get_running_loop().run_in_executor(
+                    None, context.encrypt, payload, data_id.encode("utf-8")
+                )
+            else:
+                token = context.encrypt(payload, data_id.encode("utf-8"))
+            self.metrics.encryption_operations += 1
 
-            encrypted = hash_obj.hexdigest()
+            encrypted = base64.urlsafe_b64encode(token).decode("ascii")
             self.logger.debug(f"Данные зашифрованы: {data_id}")
             return encrypted
 
@@ -1008,26 +1204,7 @@ class DataProtectionAgent(SecurityBase):
     async def _anonymize_data_async(self, data: Any) -> Any:
         """Асинхронная анонимизация данных."""
         try:
-            # Имитация асинхронной анонимизации
-            await asyncio.sleep(0.001)  # Небольшая задержка для имитации
-
-            if isinstance(data, str):
-                # Простая анонимизация строк
-                anonymized = "*" * min(len(data), 20)
-                if len(data) > 20:
-                    anonymized += "..."
-                return anonymized
-            elif isinstance(data, dict):
-                # Анонимизация словаря
-                anonymized = {}
-                for key, value in data.items():
-                    if isinstance(value, str) and len(value) > 5:
-                        anonymized[key] = "*" * 5 + "..."
-                    else:
-                        anonymized[key] = value
-                return anonymized
-            else:
-                return "[ANONYMIZED]"
+            return self.anonymizer.anonymize(data)
 
         except Exception as e:
             self.logger.error(f"Ошибка анонимизации данных: {e}")
@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Криптография и анонимизация для DataProtectionAgent
+
+EncryptionContext - AEAD-шифрование (AES-256-GCM или ChaCha20-Poly1305)
+над байтами. Объект шифра создаётся один раз на ключ и переиспользуется
+для всех сообщений; контекст сериализуется по ключу, поэтому его можно
+передать в пул процессов.
+
+Формат токена:
+    версия (1 байт) | метод (1 байт) | nonce (12 байт) | шифртекст + тег
+
+FieldAnonymizer - анонимизация по таблице правил для имён полей.
+Правила компилируются в одно регулярное выражение, решение по имени
+поля кэшируется; записи обрабатываются потоково.
+"""
+
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import (
+    AESGCM,
+    ChaCha20Poly1305,
+)
+
+TOKEN_VERSION = 1
+NONCE_SIZE = 12
+KEY_SIZE = 32
+HEADER_SIZE = 2 + NONCE_SIZE
+
+# Значение EncryptionMethod -> (идентификатор в токене, класс шифра)
+AEAD_METHODS = {
+    "aes_256": (1, AESGCM),
+    "chacha20": (2, ChaCha20Poly1305),
+}
+_METHOD_BY_ID = {code: name for name, (code, _) in AEAD_METHODS.items()}
+
+ANONYMIZED = "***ANONYMIZED***"
+
+# (шаблон имени поля, действие); порядок задаёт приоритет
+DEFAULT_ANONYMIZATION_RULES: Tuple[Tuple[str, str], ...] = (
+    (r"e[-_]?mail|почт", "email"),
+    (r"phone|(?:^|_)tel(?:_|$)|mobile|телефон", "phone"),
+    (
+        r"passport|snils|(?:^|_)inn(?:_|$)|card|account|iban|"
+        r"паспорт|снилс|инн|карт|сч[её]т",
+        "pseudonym",
+    ),
+    (r"birth|(?:^|_)dob(?:_|$)|рожден", "year"),
+    (
+        r"name|имя|фамили|отчеств|address|адрес|(?:^|_)ip(?:_|$)|"
+        r"password|пароль|secret|token",
+        "redact",
+    ),
+)
+ANONYMIZATION_ACTIONS = ("redact", "email", "phone", "pseudonym", "year")
+
+_YEAR_RE = re.compile(r"(?:^|\D)((?:19|20)\d{2})(?:\D|$)")
+_NON_DIGIT_RE = re.compile(r"\D")
+
+
+class DataEncryptionError(Exception):
+    """Ошибка шифрования или проверки целостности данных"""
+
+
+def serialize_payload(data: Any) -> bytes:
+    """
+    Данные в байты для шифрования.
+
+    bytes передаются без копирования, строки кодируются в UTF-8,
+    остальное сериализуется компактным JSON один раз.
+    """
+    if isinstance(data, bytes):
+        return data
+    if isinstance(data, (bytearray, memoryview)):
+        return bytes(data)
+    if isinstance(data, str):
+        return data.encode("utf-8")
+    return json.dumps(
+        data, ensure_ascii=False, separators=(",", ":"), default=str
+    ).encode("utf-8")
+
+
+def key_from_string(key: str) -> bytes:
+    """256-битный ключ из hex-строки (или SHA-256 от произвольной строки)"""
+    try:
+        raw = bytes.fromhex(key)
+    except ValueError:
+        raw = b""
+    if len(raw) == KEY_SIZE:
+        return raw
+    return hashlib.sha256(key.encode("utf-8")).digest()
+
+
+class EncryptionContext:
+    """Общий AEAD-контекст для одного ключа"""
+
+    def __init__(self, key: bytes, method: str = "aes_256"):
+        if method not in AEAD_METHODS:
+            raise ValueError(
+                "Метод {} не поддерживает AEAD (доступны: {})".format(
+                    method, ", ".join(AEAD_METHODS)
+                )
+            )
+        if len(key) != KEY_SIZE:
+            raise ValueError("Ключ должен быть {} байт".format(KEY_SIZE))
+        self.key = bytes(key)
+        self.method = method
+        code, cipher_cls = AEAD_METHODS[method]
+        self._header = bytes((TOKEN_VERSION, code))
+        self._cipher = cipher_cls(self.key)
+
+    def __reduce__(self):
+        # Объект шифра не сериализуется; в пуле процессов он создаётся
+        # заново из ключа
+        return (EncryptionContext, (self.key, self.method))
+
+    def encrypt(self, plaintext: bytes, associated_data: bytes = b"") -> bytes:
+        """Шифрование с уникальным nonce; associated_data не шифруется,
+        но защищено тегом (например, идентификатор данных)"""
+        nonce = os.urandom(NONCE_SIZE)
+        return (
+            self._header
+            + nonce
+            + self._cipher.encrypt(nonce, plaintext, associated_data or None)
+        )
+
+    def decrypt(self, token: bytes, associated_data: bytes = b"") -> bytes:
+        """Расшифровка с проверкой целостности"""
+        if len(token) < HEADER_SIZE or token[0] != TOKEN_VERSION:
+            raise DataEncryptionError("Неизвестный формат токена")
+        if _METHOD_BY_ID.get(token[1]) != self.method:
+            raise DataEncryptionError(
+                "Токен зашифрован методом {}".format(
+                    _METHOD_BY_ID.get(token[1], token[1])
+                )
+            )
+        nonce = token[2:HEADER_SIZE]
+        try:
+            return self._cipher.decrypt(
+                nonce, token[HEADER_SIZE:], associated_data or None
+            )
+        except InvalidTag:
+            raise DataEncryptionError(
+                "Проверка целостности не пройдена"
+            ) from None
+
+
+class FieldAnonymizer:
+    """Анонимизация полей по предкомпилированной таблице правил"""
+
+    def __init__(
+        self,
+        rules: Iterable[Tuple[str, str]] = DEFAULT_ANONYMIZATION_RULES,
+        salt: Optional[bytes] = None,
+        max_cached_fields: int = 4096,
+    ):
+        self.rules = tuple(rules)
+        for _, action in self.rules:
+            if action not in ANONYMIZATION_ACTIONS:
+                raise ValueError(
+                    "Неизвестное действие анонимизации: {}".format(action)
+                )
+        self._actions = [action for _, action in self.rules]
+        self._pattern = re.compile(
+            "|".join(
+                "(?P<r{}>{})".format(i, pattern)
+                for i, (pattern, _) in enumerate(self.rules)
+            ),
+            re.IGNORECASE,
+        )
+        self.salt = salt if salt is not None else os.urandom(16)
+        self.max_cached_fields = max_cached_fields
+        self._field_actions: Dict[str, Optional[str]] = {}
+
+    def action_for(self, field: str) -> Optional[str]:
+        """Действие для поля (None - оставить значение как есть)"""
+        try:
+            return self._field_actions[field]
+        except KeyError:
+            pass
+        match = self._pattern.search(field)
+        action = self._actions[int(match.lastgroup[1:])] if match else None
+        if len(self._field_actions) < self.max_cached_fields:
+            self._field_actions[field] = action
+        return action
+
+    def anonymize(self, data: Any) -> Any:
+        """Анонимизация значения: словари по полям, строка целиком"""
+        if isinstance(data, dict):
+            return self._anonymize_dict(data)
+        if isinstance(data, (list, tuple)):
+            return [self._anonymize_nested(item) for item in data]
+        if isinstance(data, str):
+            return ANONYMIZED
+        return data
+
+    def iter_anonymize(self, records: Iterable[Any]) -> Iterator[Any]:
+        """Потоковая анонимизация последовательности записей"""
+        for record in records:
+            yield self.anonymize(record)
+
+    def _anonymize_nested(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return self._anonymize_dict(value)
+        if isinstance(value, (list, tuple)):
+            return [self._anonymize_nested(item) for item in value]
+        return value
+
+    def _anonymize_dict(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        result = {}
+        for key, value in data.items():
+            action = self.action_for(key) if isinstance(key, str) else None
+            if action is None:
+                result[key] = self._anonymize_nested(value)
+            elif value is None:
+                result[key] = None
+            else:
+                result[key] = self._apply(action, value)
+        return result
+
+    def _apply(self, action: str, value: Any) -> Any:
+        if isinstance(value, (dict, list, tuple)) or action == "redact":
+            return ANONYMIZED
+        text = str(value)
+        if action == "email":
+            _, at, domain = text.rpartition("@")
+            return "***@" + domain if at else ANONYMIZED
+        if action == "phone":
+            digits = _NON_DIGIT_RE.sub("", text)
+            return "***" + digits[-2:] if len(digits) > 4 else ANONYMIZED
+        if action == "pseudonym":
+            digest = hashlib.blake2b(
+                text.encode("utf-8"), key=self.salt, digest_size=8
+            )
+            return "anon_" + digest.hexdigest()
+        # year: от даты остаётся только год
+        match = _YEAR_RE.search(text)
+        return match.group(1) if match else ANONYMIZED
+
+
+def protect_chunk(
+    context: Optional[EncryptionContext],
+    anonymizer: Optional[FieldAnonymizer],
+    items: List[Tuple[str, Any, bool]],
+) -> List[Tuple[Optional[bytes], Any, int, Optional[str]]]:
+    """
+    CPU-часть пакетной защиты для пула потоков или процессов.
+
+    Args:
+        context: Контекст шифрования (None - без шифрования)
+        anonymizer: Анонимизатор (None - без анонимизации)
+        items: Тройки (data_id, данные, нужна ли анонимизация)
+
+    Returns:
+        Для каждого элемента: (токен, анонимизированные данные,
+        размер открытых данных, ошибка)
+    """
+    results = []
+    for data_id, data, anonymize in items:
+        try:
+            payload = serialize_payload(data)
+            token = (
+                context.encrypt(payload, data_id.encode("utf-8"))
+                if context is not None
+                else None
+            )
+            anonymized = (
+                anonymizer.anonymize(data)
+                if anonymize and anonymizer is not None
+                else None
+            )
+            results.append((token, anonymized, len(payload), None))
+        except Exception as e:
+            results.append((None, None, 0, str(e)))
+    return results
@@ -0,0 +1,472 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Многомерный индекс инцидентов для IncidentResponseManager
+
+IncidentIndex хранит для каждого поля (статус, приоритет, тип, команда)
+множества идентификаторов по значению и обратную карту
+инцидент -> ключи, поэтому добавление, перемещение и удаление стоят O(1)
+по полям. Время создания хранится в отсортированных массивах (общем и
+по значениям выбранных полей) - диапазоны и выборки «старше N часов»
+получаются двоичным поиском.
+
+Составные запросы (статус И приоритет И диапазон дат) пересекают
+множества от меньшего к большему; если диапазон дат уже множеств,
+перебирается отрезок отсортированного массива с ранним выходом.
+Результаты упорядочены по времени создания и отдаются постранично.
+"""
+
+from bisect import bisect_left, bisect_right
+from itertools import accumulate, islice
+from typing import (
+    Any,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+_EMPTY: frozenset = frozenset()
+
+
+class TimeIndex:
+    """
+    Идентификаторы, отсортированные по времени.
+
+    Данные хранятся блоками ограниченного размера (как в SortedList):
+    вставка и удаление сдвигают только один блок, а не весь массив.
+    """
+
+    def __init__(self, load: int = 512):
+        self._load = load
+        self._times: List[List[float]] = []
+        self._ids: List[List[str]] = []
+        self._maxes: List[float] = []
+        self._offsets: Optional[List[int]] = None
+        self._len = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, item_id: str, timestamp: float):
+        """Вставка (для возрастающего времени - в конец последнего блока)"""
+        self._len += 1
+        self._offsets = None
+        maxes = self._maxes
+        if not maxes:
+            self._times.append([timestamp])
+            self._ids.append([item_id])
+            maxes.append(timestamp)
+            return
+        block = bisect_right(maxes, timestamp)
+        if block == len(maxes):
+            block -= 1
+            times, ids = self._times[block], self._ids[block]
+            times.append(timestamp)
+            ids.append(item_id)
+            maxes[block] = timestamp
+        else:
+            times, ids = self._times[block], self._ids[block]
+            position = bisect_right(times, timestamp)
+            times.insert(position, timestamp)
+            ids.insert(position, item_id)
+        if len(times) > 2 * self._load:
+            # Разбиение переполненного блока пополам
+            half = self._load
+            self._times.insert(block + 1, times[half:])
+            self._ids.insert(block + 1, ids[half:])
+            del times[half:]
+            del ids[half:]
+            maxes.insert(block, times[-1])
+
+    def remove(self, item_id: str, timestamp: float) -> bool:
+        """Удаление: двоичный поиск блока и времени, затем среди равных"""
+        block = bisect_left(self._maxes, timestamp)
+        while block < len(self._maxes):
+            times, ids = self._times[block], self._ids[block]
+            position = bisect_left(times, timestamp)
+            while position < len(times) and times[position] == timestamp:
+                if ids[position] == item_id:
+                    del times[position]
+                    del ids[position]
+                    self._len -= 1
+                    self._offsets = None
+                    if times:
+                        self._maxes[block] = times[-1]
+                    else:
+                        del self._times[block]
+                        del self._ids[block]
+                        del self._maxes[block]
+                    return True
+                position += 1
+            if self._maxes[block] != timestamp:
+                break
+            block += 1  # равные значения продолжаются в следующем блоке
+        return False
+
+    def bounds(
+        self, start: Optional[float] = None, end: Optional[float] = None
+    ) -> Tuple[int, int]:
+        """Позиции [lo, hi) для start <= время <= end"""
+        lo = 0 if start is None else self._position(start, bisect_left)
+        hi = self._len if end is None else self._position(end, bisect_right)
+        return lo, max(lo, hi)
+
+    def ids(self, lo: int, hi: int) -> List[str]:
+        """Идентификаторы в позициях [lo, hi)"""
+        return list(self.iter_ids(lo, hi))
+
+    def iter_ids(self, lo: int, hi: int) -> Iterator[str]:
+        """Ленивый обход позиций [lo, hi)"""
+        if lo >= hi:
+            return
+        offsets = self._get_offsets()
+        block = bisect_right(offsets, lo) - 1
+        position = lo - offsets[block]
+        remaining = hi - lo
+        while remaining > 0 and block < len(self._ids):
+            chunk = self._ids[block][position:position + remaining]
+            yield from chunk
+            remaining -= len(chunk)
+            block += 1
+            position = 0
+
+    def _get_offsets(self) -> List[int]:
+        if self._offsets is None:
+            self._offsets = [0]
+            self._offsets.extend(accumulate(len(ids) for ids in self._ids))
+        return self._offsets
+
+    def _position(self, timestamp: float, bisect_func) -> int:
+        block = bisect_func(self._maxes, timestamp)
+        if block == len(self._maxes):
+            return self._len
+        return self._get_offsets()[block] + bisect_func(
+            self._times[block], timestamp
+        )
+
+
+class IncidentIndex:
+    """Индекс инцидентов по полям и времени создания"""
+
+    def __init__(
+        self,
+        fields: Iterable[str] = (
+            "status",
+            "priority",
+            "incident_type",
+            "assigned_to",
+        ),
+        time_fields: Iterable[str] = ("status",),
+    ):
+        self.fields = tuple(fields)
+        self.time_fields = tuple(time_fields)
+        unknown = set(self.time_fields) - set(self.fields)
+        if unknown:
+            raise ValueError(
+                "Поля времени не входят в индекс: {}".format(
+                    ", ".join(sorted(unknown))
+                )
+            )
+        # поле -> значение -> множество идентификаторов
+        self._fields: Dict[str, Dict[Hashable, Set[str]]] = {
+            field: {} for field in self.fields
+        }
+        # поле -> значение -> идентификаторы по времени создания
+        self._field_times: Dict[str, Dict[Hashable, TimeIndex]] = {
+            field: {} for field in self.time_fields
+        }
+        self._by_time = TimeIndex()
+        # Обратная карта: идентификатор -> (ключи полей, время создания)
+        self._entries: Dict[str, Tuple[Dict[str, Hashable], float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, incident_id: str) -> bool:
+        return incident_id in self._entries
+
+    def clear(self):
+        """Очистка индекса"""
+        for values in self._fields.values():
+            values.clear()
+        for values in self._field_times.values():
+            values.clear()
+        self._by_time = TimeIndex()
+        self._entries.clear()
+
+    def add(
+        self,
+        incident_id: str,
+        keys: Dict[str, Hashable],
+        created_at: float,
+    ):
+        """
+        Добавление или переиндексация инцидента.
+
+        Для уже известного инцидента перемещаются только изменившиеся
+        ключи. Значение None означает отсутствие ключа (инцидент не
+        попадает в индекс поля).
+
+        Args:
+            incident_id: Идентификатор инцидента
+            keys: Значения индексируемых полей
+            created_at: Время создания (timestamp)
+        """
+        keys = {field: keys.get(field) for field in self.fields}
+        entry = self._entries.get(incident_id)
+        if entry is None:
+            for field, key in keys.items():
+                self._add_key(incident_id, field, key, created_at)
+            self._by_time.add(incident_id, created_at)
+        else:
+            old_keys, old_created = entry
+            if old_created != created_at:
+                # Меняется время - переносим все ключи
+                self.remove(incident_id)
+                self.add(incident_id, keys, created_at)
+                return
+            for field, key in keys.items():
+                old_key = old_keys[field]
+                if old_key != key:
+                    self._remove_key(incident_id, field, old_key, created_at)
+                    self._add_key(incident_id, field, key, created_at)
+        self._entries[incident_id] = (keys, created_at)
+
+    def remove(self, incident_id: str) -> bool:
+        """Удаление инцидента по обратной карте ключей"""
+        entry = self._entries.pop(incident_id, None)
+        if entry is None:
+            return False
+        keys, created_at = entry
+        for field, key in keys.items():
+            self._remove_key(incident_id, field, key, created_at)
+        self._by_time.remove(incident_id, created_at)
+        return True
+
+    def keys_of(self, incident_id: str) -> Optional[Dict[str, Hashable]]:
+        """Проиндексированные ключи инцидента"""
+        entry = self._entries.get(incident_id)
+        return dict(entry[0]) if entry else None
+
+    def ids_for(self, field: str, key: Hashable) -> Set[str]:
+        """Идентификаторы с заданным значением поля (без копирования)"""
+        return self._fields[field].get(key, _EMPTY)
+
+    def counts(self, field: str) -> Dict[Hashable, int]:
+        """Количество инцидентов по значениям поля"""
+        return {key: len(ids) for key, ids in self._fields[field].items()}
+
+    def count(self, **filters: Any) -> int:
+        """Количество инцидентов, удовлетворяющих фильтрам query"""
+        created_from = filters.pop("created_from", None)
+        created_to = filters.pop("created_to", None)
+        plan = self._plan(filters, created_from, created_to)
+        if not plan.sets:
+            return plan.hi - plan.lo
+        return sum(1 for _ in self._iter_plan(plan))
+
+    def query(
+        self,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        created_from: Optional[float] = None,
+        created_to: Optional[float] = None,
+        **filters: Any,
+    ) -> List[str]:
+        """
+        Составной запрос с пагинацией.
+
+        Args:
+            offset: Сколько первых результатов пропустить
+            limit: Максимальное количество результатов
+            created_from: Нижняя граница времени создания (включительно)
+            created_to: Верхняя граница времени создания (включительно)
+            **filters: Поле -> значение или коллекция значений (ИЛИ);
+                None - поле не фильтруется
+
+        Returns:
+            List[str]: Идентификаторы по возрастанию времени создания
+        """
+        plan = self._plan(filters, created_from, created_to)
+        if not plan.sets:
+            lo, hi = plan.lo, plan.hi
+            end = hi if limit is None else min(hi, lo + offset + limit)
+            return plan.time_index.ids(min(lo + offset, end), end)
+        stop = None if limit is None else offset + limit
+        return list(islice(self._iter_plan(plan, stop), offset, stop))
+
+    def iter_pages(
+        self,
+        page_size: int = 1000,
+        created_from: Optional[float] = None,
+        created_to: Optional[float] = None,
+        **filters: Any,
+    ) -> Iterator[List[str]]:
+        """Постраничный обход результатов запроса"""
+        if page_size <= 0:
+            raise ValueError("page_size должен быть положительным")
+        plan = self._plan(filters, created_from, created_to)
+        if not plan.sets:
+            for start in range(plan.lo, plan.hi, page_size):
+                yield plan.time_index.ids(
+                    start, min(plan.hi, start + page_size)
+                )
+            return
+        iterator = self._iter_plan(plan)
+        while True:
+            page = list(islice(iterator, page_size))
+            if not page:
+                return
+            yield page
+
+    def _add_key(
+        self, incident_id: str, field: str, key: Hashable, created_at: float
+    ):
+        if key is None:
+            return
+        self._fields[field].setdefault(key, set()).add(incident_id)
+        times = self._field_times.get(field)
+        if times is not None:
+            time_index = times.get(key)
+            if time_index is None:
+                time_index = times[key] = TimeIndex()
+            time_index.add(incident_id, created_at)
+
+    def _remove_key(
+        self, incident_id: str, field: str, key: Hashable, created_at: float
+    ):
+        if key is None:
+            return
+        values = self._fields[field]
+        ids = values.get(key)
+        if ids is not None:
+            ids.discard(incident_id)
+            if not ids:
+                del values[key]
+        times = self._field_times.get(field)
+        if times is not None and key in times:
+            times[key].remove(incident_id, created_at)
+            if not times[key]:
+                del times[key]
+
+    def _plan(
+        self,
+        filters: Dict[str, Any],
+        created_from: Optional[float],
+        created_to: Optional[float],
+    ) -> "_QueryPlan":
+        """
+        План запроса: множества фильтров (от меньшего к большему) и
+        отрезок наиболее узкого массива времени.
+        """
+        sets = []
+        implied: Optional[Set[str]] = None
+        time_index = self._by_time
+        for field, value in filters.items():
+            if value is None:
+                continue
+            if field not in self._fields:
+                raise KeyError("Поле {} не индексируется".format(field))
+            values = self._fields[field]
+            if isinstance(value, (set, frozenset, list, tuple)):
+                if len(value) != 1:
+                    sets.append(
+                        set().union(*(values.get(v, _EMPTY) for v in value))
+                    )
+                    continue
+                value = next(iter(value))
+            ids = values.get(value, _EMPTY)
+            times = self._field_times.get(field)
+            if times is not None and implied is None:
+                # Массив времени по значению поля уже фильтрует по нему;
+                # множество нужно только при переборе от множеств
+                time_index = times.get(value) or TimeIndex()
+                implied = ids
+                continue
+            sets.append(ids)
+        sets.sort(key=len)
+        lo, hi = time_index.bounds(created_from, created_to)
+        return _QueryPlan(
+            sets, implied, time_index, lo, hi, created_from, created_to
+        )
+
+    def _iter_plan(
+        self, plan: "_QueryPlan", needed: Optional[int] = None
+    ) -> Iterator[str]:
+        """
+        Идентификаторы плана по возрастанию времени создания.
+
+        needed - сколько результатов понадобится (страница); при малой
+        странице выгоднее перебирать отрезок времени с ранним выходом.
+        """
+        sets, lo, hi = plan.sets, plan.lo, plan.hi
+        if not sets[0]:
+            return
+        scan = hi - lo
+        if needed is not None and scan > len(sets[0]):
+            # Ожидаемая длина перебора при независимых фильтрах
+            selectivity = 1.0
+            for ids in sets:
+                selectivity *= len(ids) / len(self._entries)
+            scan = min(scan, needed / selectivity)
+        if scan <= len(sets[0]):
+            # Отрезок времени уже множеств - перебираем его по порядку
+            for incident_id in plan.time_index.iter_ids(lo, hi):
+                if all(incident_id in ids for ids in sets):
+                    yield incident_id
+            return
+
+        result = sets[0]
+        if plan.implied is not None:
+            sets = sets + [plan.implied]
+        for ids in sets[1:]:
+            if not result:
+                return
+            result = result & ids
+        entries = self._entries
+        if plan.created_from is not None or plan.created_to is not None:
+            start = (
+                float("-inf")
+                if plan.created_from is None
+                else plan.created_from
+            )
+            end = float("inf") if plan.created_to is None else plan.created_to
+            result = [i for i in result if start <= entries[i][1] <= end]
+        yield from sorted(result, key=lambda i: entries[i][1])
+
+
+class _QueryPlan:
+    """План составного запроса"""
+
+    __slots__ = (
+        "sets",
+        "implied",
+        "time_index",
+        "lo",
+        "hi",
+        "created_from",
+        "created_to",
+    )
+
+    def __init__(
+        self,
+        sets: List[Set[str]],
+        implied: Optional[Set[str]],
+        time_index: TimeIndex,
+        lo: int,
+        hi: int,
+        created_from: Optional[float],
+        created_to: Optional[float],
+    ):
+        self.sets = sets
+        self.implied = implied
+        self.time_index = time_index
+        self.lo = lo
+        self.hi = hi
+        self.created_from = created_from
+        self.created_to = created_to
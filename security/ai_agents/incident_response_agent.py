@@ -10,12 +10,13 @@ ALADDIN Security System - Incident Response Module
 
 import asyncio
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
 from enum import Enum
-from functools import lru_cache, wraps
-from typing import Any, Dict, List, Optional
+from functools import wraps
+from typing import Any, Dict, Iterator, List, Optional
 
 from core.base import ComponentStatus, SecurityBase, SecurityLevel
+from security.ai_agents.incident_index import IncidentIndex
 
 
 def performance_monitor(func):
@@ -47,6 +48,20 @@ def performance_monitor(func):
     return wrapper
 
 
+def _enum_key(value: Any) -> Any:
+    """Ключ индекса: значение Enum или строка"""
+    return value.value if hasattr(value, "value") else str(value)
+
+
+def _filter_key(value: Any) -> Any:
+    """Фильтр запроса в ключи индекса (значение или список значений)"""
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_enum_key(item) for item in value]
+    return _enum_key(value)
+
+
 class IncidentResponseError(Exception):
     """Базовое исключение для модуля реагирования на инциденты"""
 
@@ -347,12 +362,8 @@ class IncidentResponseManager(SecurityBase):
         self.cache_misses = 0  # Количество промахов кэша
         self.performance_metrics = {}  # Метрики производительности
 
-        # Индексы для быстрого поиска
-        self._status_index = {}  # Индекс по статусам
-        self._priority_index = {}  # Индекс по приоритетам
-        self._type_index = {}  # Индекс по типам
-        self._created_at_index = {}  # Индекс по дате создания
-        self._assigned_to_index = {}  # Индекс по назначенным пользователям
+        # Индекс по статусу, приоритету, типу, команде и времени создания
+        self._index = IncidentIndex()
 
         # Rate limiting
         self._rate_limits = {}  # Ограничения скорости запросов
@@ -366,57 +377,31 @@ class IncidentResponseManager(SecurityBase):
         self.notification_handlers = []  # Обработчики уведомлений
         self.audit_log = []  # Журнал аудита
 
+    @staticmethod
+    def _index_keys(incident: "Incident") -> Dict[str, Any]:
+        """Значения индексируемых полей инцидента"""
+        return {
+            "status": _enum_key(incident.status),
+            "priority": _enum_key(incident.priority),
+            "incident_type": _enum_key(incident.incident_type),
+            "assigned_to": getattr(incident, "assigned_to", None) or None,
+        }
+
     def _update_indexes(self, incident: "Incident", action: str = "add"):
-        """Обновление индексов при изменении инцидента"""
-        incident_id = incident.incident_id
-
-        if action == "add":
-            # Добавление в индексы
-            status_key = (
-                incident.status.value
-                if hasattr(incident.status, "value")
-                else str(incident.status)
-            )
-            priority_key = (
-                incident.priority.value
-                if hasattr(incident.priority, "value")
-                else str(incident.priority)
-            )
-            type_key = (
-                incident.incident_type.value
-                if hasattr(incident.incident_type, "value")
-                else str(incident.incident_type)
-            )
+        """
+        Обновление индексов при изменении инцидента.
 
-            self._status_index.setdefault(status_key, set()).add(incident_id)
-            self._priority_index.setdefault(priority_key, set()).add(
-                incident_id
+        "add" добавляет инцидент или переиндексирует изменившиеся поля,
+        "remove" удаляет его по обратной карте ключей.
+        """
+        if action == "remove":
+            self._index.remove(incident.incident_id)
+        else:
+            self._index.add(
+                incident.incident_id,
+                self._index_keys(incident),
+                incident.created_at.timestamp(),
             )
-            self._type_index.setdefault(type_key, set()).add(incident_id)
-
-            # Индекс по дате создания (по дням)
-            date_key = incident.created_at.date().isoformat()
-            self._created_at_index.setdefault(date_key, set()).add(incident_id)
-
-            # Индекс по назначенным пользователям
-            if hasattr(incident, "assigned_to") and incident.assigned_to:
-                self._assigned_to_index.setdefault(
-                    incident.assigned_to, set()
-                ).add(incident_id)
-
-        elif action == "remove":
-            # Удаление из индексов
-            for index in [
-                self._status_index,
-                self._priority_index,
-                self._type_index,
-                self._created_at_index,
-                self._assigned_to_index,
-            ]:
-                for key in index:
-                    index[key].discard(incident_id)
-                    if not index[key]:  # Удаляем пустые ключи
-                        del index[key]
 
     def _check_rate_limit(self, user_id: str = "default") -> bool:
         """Проверка лимита запросов"""
@@ -442,10 +427,14 @@ class IncidentResponseManager(SecurityBase):
         user_requests.append(now)
         return True
 
-    @lru_cache(maxsize=1000)
     def _get_incident_cached(self, incident_id: str):
-        """Кэшированное получение инцидента"""
-        return self.incidents.get(incident_id)
+        """Получение инцидента с учетом статистики обращений"""
+        incident = self.incidents.get(incident_id)
+        if incident is None:
+            self.cache_misses += 1
+        else:
+            self.cache_hits += 1
+        return incident
 
     def initialize(self) -> bool:
         """Инициализация менеджера реагирования на инциденты"""
@@ -769,6 +758,8 @@ class IncidentResponseManager(SecurityBase):
                     f"{incident.assigned_to}"
                 )
 
+            self._update_indexes(incident, "add")
+
         except Exception as e:
             self.log_activity(f"Ошибка назначения команды: {e}", "error")
 
@@ -864,6 +855,7 @@ class IncidentResponseManager(SecurityBase):
 
             # Обновление статуса
             incident.update_status(new_status)
+            self._update_indexes(incident, "add")
 
             # Обновление счетчиков
             if (
@@ -1025,13 +1017,12 @@ class IncidentResponseManager(SecurityBase):
         Returns:
             List[Dict[str, Any]]: Список инцидентов
         """
-        incidents = []
-
-        for incident in self.incidents.values():
-            if status is None or incident.status == status:
-                incidents.append(incident.to_dict())
-
-        return incidents
+        if status is None:
+            return [incident.to_dict() for incident in self.incidents.values()]
+        return [
+            incident.to_dict()
+            for incident in self.query_incidents(status=status)
+        ]
 
     def get_open_incidents(self) -> List[Dict[str, Any]]:
         """
@@ -1056,8 +1047,7 @@ class IncidentResponseManager(SecurityBase):
         """
         return [
             incident.to_dict()
-            for incident in self.incidents.values()
-            if incident.priority == priority
+            for incident in self.query_incidents(priority=priority)
         ]
 
     def get_incidents_by_type(
@@ -1074,8 +1064,7 @@ class IncidentResponseManager(SecurityBase):
         """
         return [
             incident.to_dict()
-            for incident in self.incidents.values()
-            if incident.incident_type == incident_type
+            for incident in self.query_incidents(incident_type=incident_type)
         ]
 
     def escalate_incident(
@@ -1112,6 +1101,7 @@ class IncidentResponseManager(SecurityBase):
 
             # Обновление статуса
             incident.update_status(IncidentStatus.ESCALATED)
+            self._update_indexes(incident, "add")
 
             # Добавление заметки
             incident.add_note(f"Эскалирован: {reason}", escalated_by)
@@ -1155,46 +1145,193 @@ class IncidentResponseManager(SecurityBase):
 
     def _get_incidents_by_status(self) -> Dict[str, int]:
         """Получение количества инцидентов по статусам"""
-        status_count = {}
-        for incident in self.incidents.values():
-            if hasattr(incident.status, "value"):
-                status = incident.status.value
-            else:
-                status = str(incident.status)
-            status_count[status] = status_count.get(status, 0) + 1
-        return status_count
+        return self._index.counts("status")
 
     def _get_incidents_by_priority(self) -> Dict[str, int]:
         """Получение количества инцидентов по приоритетам"""
-        priority_count = {}
-        for incident in self.incidents.values():
-            if hasattr(incident.priority, "value"):
-                priority = incident.priority.value
-            else:
-                priority = str(incident.priority)
-            priority_count[priority] = priority_count.get(priority, 0) + 1
-        return priority_count
+        return self._index.counts("priority")
 
     def _get_incidents_by_type(self) -> Dict[str, int]:
         """Получение количества инцидентов по типам"""
-        type_count = {}
-        for incident in self.incidents.values():
-            if hasattr(incident.incident_type, "value"):
-                incident_type = incident.incident_type.value
-            else:
-                incident_type = str(incident.incident_type)
-            type_count[incident_type] = type_count.get(incident_type, 0) + 1
-        return type_count
+        return self._index.counts("incident_type")
 
     def _get_team_workload(self) -> Dict[str, int]:
         """Получение нагрузки команд"""
+        open_ids = self._index.ids_for("status", IncidentStatus.OPEN.value)
         workload = {}
-        for incident in self.incidents.values():
-            if incident.status == IncidentStatus.OPEN and incident.assigned_to:
-                team = incident.assigned_to
-                workload[team] = workload.get(team, 0) + 1
+        for team in self._index.counts("assigned_to"):
+            team_ids = self._index.ids_for("assigned_to", team)
+            smaller, larger = sorted((open_ids, team_ids), key=len)
+            count = sum(1 for i in smaller if i in larger)
+            if count:
+                workload[team] = count
         return workload
 
+    # ==================== ЗАПРОСЫ К ИНДЕКСУ ====================
+
+    def query_incidents(
+        self,
+        status: Any = None,
+        priority: Any = None,
+        incident_type: Any = None,
+        assigned_to: Any = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> List[Incident]:
+        """
+        Составной запрос к индексу инцидентов.
+
+        Фильтры объединяются по И; каждый принимает значение или список
+        значений (ИЛИ). Множества пересекаются от меньшего к большему,
+        диапазон дат ищется двоичным поиском.
+
+        Args:
+            status: IncidentStatus или список статусов
+            priority: IncidentPriority или список приоритетов
+            incident_type: IncidentType или список типов
+            assigned_to: Команда или список команд
+            created_after: Создан не раньше (включительно)
+            created_before: Создан не позже (включительно)
+            offset: Сколько первых результатов пропустить
+            limit: Размер страницы (None - все)
+
+        Returns:
+            List[Incident]: Инциденты по возрастанию времени создания
+        """
+        ids = self._index.query(
+            offset=offset,
+            limit=limit,
+            **self._query_filters(
+                status,
+                priority,
+                incident_type,
+                assigned_to,
+                created_after,
+                created_before,
+            ),
+        )
+        return [self.incidents[incident_id] for incident_id in ids]
+
+    def count_incidents(
+        self,
+        status: Any = None,
+        priority: Any = None,
+        incident_type: Any = None,
+        assigned_to: Any = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ) -> int:
+        """Количество инцидентов по фильтрам query_incidents"""
+        return self._index.count(
+            **self._query_filters(
+                status,
+                priority,
+                incident_type,
+                assigned_to,
+                created_after,
+                created_before,
+            )
+        )
+
+    def iter_incident_pages(
+        self,
+        page_size: int = 1000,
+        status: Any = None,
+        priority: Any = None,
+        incident_type: Any = None,
+        assigned_to: Any = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+    ) -> Iterator[List[Incident]]:
+        """Постраничный обход результатов query_incidents"""
+        for ids in self._index.iter_pages(
+            page_size,
+            **self._query_filters(
+                status,
+                priority,
+                incident_type,
+                assigned_to,
+                created_after,
+                created_before,
+            ),
+        ):
+            yield [self.incidents[incident_id] for incident_id in ids]
+
+    def get_escalation_candidates(
+        self,
+        threshold_hours: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> List[Incident]:
+        """
+        Открытые инциденты старше порога эскалации.
+
+        Args:
+            threshold_hours: Порог в часах (по умолчанию
+                auto_escalation_threshold)
+            limit: Максимальное количество (самые старые первыми)
+
+        Returns:
+            List[Incident]: Кандидаты на эскалацию
+        """
+        if threshold_hours is None:
+            threshold_hours = self.auto_escalation_threshold
+        return self.query_incidents(
+            status=IncidentStatus.OPEN,
+            created_before=datetime.now() - timedelta(hours=threshold_hours),
+            limit=limit,
+        )
+
+    def escalate_overdue_incidents(
+        self,
+        threshold_hours: Optional[float] = None,
+        escalated_by: str = "system",
+    ) -> int:
+        """
+        Эскалация открытых инцидентов старше порога.
+
+        Returns:
+            int: Количество эскалированных инцидентов
+        """
+        threshold = (
+            self.auto_escalation_threshold
+            if threshold_hours is None
+            else threshold_hours
+        )
+        escalated = 0
+        for incident in self.get_escalation_candidates(threshold):
+            if self.escalate_incident(
+                incident.incident_id,
+                f"Открыт дольше {threshold} ч",
+                escalated_by,
+            ):
+                escalated += 1
+        return escalated
+
+    @staticmethod
+    def _query_filters(
+        status: Any,
+        priority: Any,
+        incident_type: Any,
+        assigned_to: Any,
+        created_after: Optional[datetime],
+        created_before: Optional[datetime],
+    ) -> Dict[str, Any]:
+        """Фильтры query_incidents в ключи индекса"""
+        return {
+            "status": _filter_key(status),
+            "priority": _filter_key(priority),
+            "incident_type": _filter_key(incident_type),
+            "assigned_to": _filter_key(assigned_to),
+            "created_from": (
+                created_after.timestamp() if created_after else None
+            ),
+            "created_to": (
+                created_before.timestamp() if created_before else None
+            ),
+        }
+
     def get_advanced_analytics(self) -> Dict[str, Any]:
         """Расширенная аналитика инцидентов"""
         return {
@@ -1584,14 +1721,13 @@ class IncidentResponseManager(SecurityBase):
             self.log_activity(f"Ошибка в контексте: {exc_val}", "error")
         return False
 
-    # ==================== КЭШИРОВАННЫЕ МЕТОДЫ ====================
+    # ==================== ИНДЕКСИРОВАННЫЕ МЕТОДЫ ====================
 
-    @lru_cache(maxsize=128)
     def _get_incident_by_id_cached(
         self, incident_id: str
     ) -> Optional[Dict[str, Any]]:
         """
-        Кэшированное получение инцидента по ID.
+        Получение инцидента по ID.
 
         Args:
             incident_id (str): ID инцидента
@@ -1599,15 +1735,14 @@ class IncidentResponseManager(SecurityBase):
         Returns:
             Optional[Dict[str, Any]]: Данные инцидента или None
         """
-        incident = self.incidents.get(incident_id)
+        incident = self._get_incident_cached(incident_id)
         return incident.to_dict() if incident else None
 
-    @lru_cache(maxsize=64)
     def _get_incidents_by_status_cached(
         self, status: str
     ) -> List[Dict[str, Any]]:
         """
-        Кэшированное получение инцидентов по статусу.
+        Получение инцидентов по статусу через индекс.
 
         Args:
             status (str): Статус инцидента
@@ -1617,16 +1752,14 @@ class IncidentResponseManager(SecurityBase):
         """
         return [
             incident.to_dict()
-            for incident in self.incidents.values()
-            if incident.status.value == status
+            for incident in self.query_incidents(status=status)
         ]
 
-    @lru_cache(maxsize=32)
     def _get_incidents_by_priority_cached(
         self, priority: str
     ) -> List[Dict[str, Any]]:
         """
-        Кэшированное получение инцидентов по приоритету.
+        Получение инцидентов по приоритету через индекс.
 
         Args:
             priority (str): Приоритет инцидента
@@ -1636,16 +1769,14 @@ class IncidentResponseManager(SecurityBase):
         """
         return [
             incident.to_dict()
-            for incident in self.incidents.values()
-            if incident.priority.value == priority
+            for incident in self.query_incidents(priority=priority)
         ]
 
-    @lru_cache(maxsize=16)
     def _get_incidents_by_type_cached(
         self, incident_type: str
     ) -> List[Dict[str, Any]]:
         """
-        Кэшированное получение инцидентов по типу.
+        Получение инцидентов по типу через индекс.
 
         Args:
             incident_type (str): Тип инцидента
@@ -1655,30 +1786,23 @@ class IncidentResponseManager(SecurityBase):
         """
         return [
             incident.to_dict()
-            for incident in self.incidents.values()
-            if incident.incident_type.value == incident_type
+            for incident in self.query_incidents(incident_type=incident_type)
         ]
 
     def clear_cache(self):
-        """Очистка кэша"""
-        self._get_incident_by_id_cached.cache_clear()
-        self._get_incidents_by_status_cached.cache_clear()
-        self._get_incidents_by_priority_cached.cache_clear()
-        self._get_incidents_by_type_cached.cache_clear()
+        """Сброс статистики обращений и перестроение индекса"""
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._index.clear()
+        for incident in self.incidents.values():
+            self._update_indexes(incident, "add")
 
     def get_cache_info(self) -> Dict[str, Any]:
-        """Получение информации о кэше"""
+        """Получение информации о кэше и индексе"""
         return {
-            "incident_by_id": self._get_incident_by_id_cached.cache_info(),
-            "incidents_by_status": (
-                self._get_incidents_by_status_cached.cache_info()
-            ),
-            "incidents_by_priority": (
-                self._get_incidents_by_priority_cached.cache_info()
-            ),
-            "incidents_by_type": (
-                self._get_incidents_by_type_cached.cache_info()
-            ),
+            **self._get_cache_performance(),
+            "indexed_incidents": len(self._index),
+            "incidents_by_status": self._index.counts("status"),
         }
 
     # ==================== АСИНХРОННЫЕ МЕТОДЫ ====================
@@ -2147,11 +2271,7 @@ class IncidentResponseManager(SecurityBase):
         Returns:
             List[Incident]: Список инцидентов команды
         """
-        return [
-            incident
-            for incident in self.incidents.values()
-            if incident.assigned_to == team_name
-        ]
+        return self.query_incidents(assigned_to=team_name)
 
     def get_overdue_incidents(
         self, threshold_hours: float = 24.0
@@ -2165,11 +2285,16 @@ class IncidentResponseManager(SecurityBase):
         Returns:
             List[Incident]: Список просроченных инцидентов
         """
-        return [
-            incident
-            for incident in self.incidents.values()
-            if incident.is_overdue(threshold_hours)
-        ]
+        cutoff = datetime.now() - timedelta(hours=threshold_hours)
+        overdue = []
+        # Отрезок массива времени по каждому неразрешенному статусу
+        for status in self._index.counts("status"):
+            if status != IncidentStatus.RESOLVED.value:
+                overdue.extend(
+                    self.query_incidents(status=status, created_before=cutoff)
+                )
+        overdue.sort()
+        return overdue
 
     def get_high_priority_incidents(self) -> List[Incident]:
         """
@@ -2178,12 +2303,9 @@ class IncidentResponseManager(SecurityBase):
         Returns:
             List[Incident]: Список высокоприоритетных инцидентов
         """
-        return [
-            incident
-            for incident in self.incidents.values()
-            if incident.priority
-            in [IncidentPriority.HIGH, IncidentPriority.CRITICAL]
-        ]
+        return self.query_incidents(
+            priority=[IncidentPriority.HIGH, IncidentPriority.CRITICAL]
+        )
 
     def search_incidents(self, query: str) -> List[Incident]:
         """
@@ -2327,6 +2449,7 @@ class IncidentResponseManager(SecurityBase):
                             incident.status = IncidentStatus(row["status"])
 
                         self.incidents[incident.incident_id] = incident
+                        self._update_indexes(incident, "add")
                         imported_count += 1
 
                     except Exception as e:
@@ -2413,6 +2536,7 @@ class IncidentResponseManager(SecurityBase):
                         )
 
                     self.incidents[incident.incident_id] = incident
+                    self._update_indexes(incident, "add")
                     restored_count += 1
 
                 except Exception as e:
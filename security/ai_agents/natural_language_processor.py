@@ -8,6 +8,7 @@ NaturalLanguageProcessor - Обработка естественного язы
 Цветовая схема: Matrix AI
 """
 
+import asyncio
 import json
 import logging
 import os
@@ -15,14 +16,15 @@ import re
 
 # Импорт базового класса
 import sys
-
-# import time  # Временно отключено
+import time
+from collections import deque
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Union
 
 from core.base import SecurityBase
+from security.ai_agents.nlp_matcher import LexiconMatcher, TextAnalysis
 
 
 class IntentType(Enum):
@@ -100,16 +102,59 @@ class ProcessingResult:
     session_id: str
 
 
+# Словари тональности, контекста и эмоций; порядок задаёт приоритет
+SENTIMENT_KEYWORDS = {
+    SentimentType.URGENT: ["срочно", "быстро", "urgent", "quick", "fast"],
+    SentimentType.POSITIVE: [
+        "хорошо",
+        "отлично",
+        "прекрасно",
+        "good",
+        "excellent",
+        "great",
+    ],
+    SentimentType.NEGATIVE: ["плохо", "ужасно", "bad", "terrible", "awful"],
+}
+CONTEXT_KEYWORDS = {
+    "urgent": ["срочно", "быстро", "urgent"],
+    "important": ["важно", "important"],
+}
+EMOTION_KEYWORDS = {
+    "joy": ["радость", "joy"],
+    "sadness": ["грусть", "sadness"],
+    "anger": ["гнев", "anger"],
+    "fear": ["страх", "fear"],
+}
+
+# Размер пакета по умолчанию для process_texts
+DEFAULT_BATCH_SIZE = 256
+
+
+def build_lexicon_matcher(config: Dict[str, Any]) -> LexiconMatcher:
+    """Единый матчер для всех словарей и шаблонов сущностей конфигурации.
+
+    Теги: IntentType и SentimentType для намерений и тональности,
+    ("context", имя) и ("emotion", имя) для контекста и эмоций.
+    """
+    lexicon: Dict[Any, List[str]] = {}
+    for intent_type, keywords in config["intent_keywords"].items():
+        lexicon[IntentType(intent_type)] = list(keywords)
+    lexicon.update(SENTIMENT_KEYWORDS)
+    for name, words in CONTEXT_KEYWORDS.items():
+        lexicon[("context", name)] = words
+    for name, words in EMOTION_KEYWORDS.items():
+        lexicon[("emotion", name)] = words
+    return LexiconMatcher(lexicon, config["entity_patterns"])
+
+
 class NaturalLanguageProcessor(SecurityBase):
     """Процессор естественного языка для системы безопасности ALADDIN"""
 
     def __init__(self, config: Optional[Dict[str, Any]] = None):
-        super().__init__(
-            name="NaturalLanguageProcessor",
-            description=(
-                "AI-процессор естественного языка для понимания команд "
-                "пользователей"
-            ),
+        super().__init__(name="NaturalLanguageProcessor", config=config)
+        self.description = (
+            "AI-процессор естественного языка для понимания команд "
+            "пользователей"
         )
 
         # Конфигурация
@@ -127,7 +172,11 @@ class NaturalLanguageProcessor(SecurityBase):
         self.successful_processed = 0
         self.failed_processed = 0
         self.average_confidence = 0.0
-        self.processing_history = []
+        self.processing_history = deque(maxlen=1000)
+        self.results_dir = self.config.get(
+            "results_dir", "data/nlp_processing"
+        )
+        self.last_batch_stats: Dict[str, Any] = {}
 
         # Очереди (временно отключено)
         # self.text_queue = queue.Queue()
@@ -270,6 +319,9 @@ class NaturalLanguageProcessor(SecurityBase):
     def _initialize_components(self):
         """Инициализация компонентов системы"""
         try:
+            # Единый матчер ключевых слов и сущностей для всех компонентов
+            self.matcher = build_lexicon_matcher(self.config)
+
             # Инициализация токенизатора
             self.tokenizer = TextTokenizer(self.config)
 
@@ -340,61 +392,9 @@ class NaturalLanguageProcessor(SecurityBase):
         """Обработка естественного языка"""
         try:
             self.total_processed += 1
-            # start_time = time.time()  # Временно отключено
-
-            # Валидация входных данных
-            if not self._validate_text_input(text):
-                raise ValueError("Неверные входные данные")
-
-            # Предобработка текста
-            processed_text = await self._preprocess_text(text, language)
-
-            # Токенизация
-            tokens = await self.tokenizer.tokenize(processed_text)
-
-            # Классификация намерений
-            intent = await self._analyze_intent(processed_text, tokens)
-
-            # Распознавание сущностей
-            entities = await self._extract_entities(processed_text, tokens)
 
-            # Анализ тональности
-            sentiment = await self.sentiment_analyzer.analyze_sentiment(
-                processed_text
-            )
-
-            # Анализ контекста
-            # context = await self.context_analyzer.analyze_context(
-            #     processed_text, intent, entities
-            # )
-
-            # Извлечение ключевых слов
-            # keywords = await self.keyword_extractor.extract_keywords(
-            #     processed_text, tokens
-            # )
-
-            # Детекция эмоций
-            # emotions = await self.emotion_detector.detect_emotions(
-            #     processed_text
-            # )
-
-            # Расчет общей уверенности
-            confidence = self._calculate_confidence(
-                intent, entities, sentiment
-            )
-
-            # Создание результата
-            result = ProcessingResult(
-                original_text=text,
-                processed_text=processed_text,
-                intent=intent,
-                entities=entities,
-                sentiment=sentiment,
-                confidence=confidence,
-                language=language,
-                timestamp=datetime.now(),
-                user_id=user_id,
-                session_id=session_id,
+            result = await self._analyze_text(
+                text, user_id, session_id, language
             )
 
             # Сохранение результата
@@ -405,7 +405,7 @@ class NaturalLanguageProcessor(SecurityBase):
 
             self.successful_processed += 1
             self.logger.info(
-                f"Текст успешно обработан: {processed_text[:50]}..."
+                f"Текст успешно обработан: {result.processed_text[:50]}..."
             )
 
             return result
@@ -415,56 +415,208 @@ class NaturalLanguageProcessor(SecurityBase):
             self.logger.error(f"Ошибка обработки текста: {e}")
             raise
 
+    async def process_texts(
+        self,
+        texts: Iterable[Union[str, Dict[str, Any]]],
+        user_id: str = "",
+        session_id: str = "",
+        language: str = "ru",
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> List[Optional[ProcessingResult]]:
+        """
+        Пакетная обработка текстов.
+
+        Элемент - строка или словарь с ключами text, user_id, session_id,
+        language (недостающие значения берутся из аргументов). Пакет из
+        batch_size результатов сохраняется одной дозаписью в фоне, пока
+        анализируется следующий пакет.
+
+        Returns:
+            Результаты в порядке входа; None для текстов с ошибкой
+        """
+        start = time.perf_counter()
+        results: List[Optional[ProcessingResult]] = []
+        batch: List[ProcessingResult] = []
+        pending: Optional[asyncio.Future] = None
+        batches = failed = 0
+
+        try:
+            for item in texts:
+                if isinstance(item, dict):
+                    text = item.get("text")
+                    item_user = item.get("user_id", user_id)
+                    item_session = item.get("session_id", session_id)
+                    item_language = item.get("language", language)
+                else:
+                    text, item_user, item_session, item_language = (
+                        item,
+                        user_id,
+                        session_id,
+                        language,
+                    )
+
+                self.total_processed += 1
+                try:
+                    result = await self._analyze_text(
+                        text, item_user, item_session, item_language
+                    )
+                except Exception as e:
+                    self.failed_processed += 1
+                    failed += 1
+                    self.logger.debug(f"Текст пропущен в пакете: {e}")
+                    results.append(None)
+                    continue
+
+                self._update_statistics(result)
+                self.successful_processed += 1
+                results.append(result)
+                batch.append(result)
+
+                if len(batch) >= batch_size:
+                    # Один пакет в записи: запись предыдущего завершается
+                    # до постановки следующего, порядок строк сохраняется
+                    if pending is not None:
+                        await pending
+                    pending = asyncio.ensure_future(
+                        self._save_processing_results(batch)
+                    )
+                    batches += 1
+                    batch = []
+
+            if pending is not None:
+                await pending
+                pending = None
+            if batch:
+                await self._save_processing_results(batch)
+                batches += 1
+        finally:
+            if pending is not None:
+                await pending
+
+        duration = time.perf_counter() - start
+        self.last_batch_stats = {
+            "items": len(results),
+            "failed": failed,
+            "batches": batches,
+            "duration": duration,
+            "items_per_second": (
+                len(results) / duration if duration > 0 else 0.0
+            ),
+        }
+        self.logger.info(
+            f"Пакет текстов обработан: {len(results)} "
+            f"(ошибок {failed}) за {duration:.3f} с"
+        )
+        return results
+
+    async def _analyze_text(
+        self, text: str, user_id: str, session_id: str, language: str
+    ) -> ProcessingResult:
+        """Конвейер анализа одного текста без сохранения"""
+        # Валидация входных данных
+        if not self._validate_text_input(text):
+            raise ValueError("Неверные входные данные")
+
+        # Предобработка текста
+        processed_text = await self._preprocess_text(text, language)
+
+        # Токенизация и словарный разбор выполняются один раз,
+        # результат разделяют все компоненты
+        tokens = await self.tokenizer.tokenize(processed_text)
+        analysis = self.matcher.analyze(processed_text)
+
+        # Намерение, сущности и тональность не зависят друг от друга
+        intent, entities, sentiment = await asyncio.gather(
+            self._analyze_intent(processed_text, tokens, analysis),
+            self._extract_entities(processed_text, tokens, analysis),
+            self.sentiment_analyzer.analyze_sentiment(
+                processed_text, analysis
+            ),
+        )
+
+        # Анализ контекста
+        # context = await self.context_analyzer.analyze_context(
+        #     processed_text, intent, entities
+        # )
+
+        # Извлечение ключевых слов
+        # keywords = await self.keyword_extractor.extract_keywords(
+        #     processed_text, tokens, analysis
+        # )
+
+        # Детекция эмоций
+        # emotions = await self.emotion_detector.detect_emotions(
+        #     processed_text, analysis
+        # )
+
+        # Расчет общей уверенности
+        confidence = self._calculate_confidence(intent, entities, sentiment)
+
+        return ProcessingResult(
+            original_text=text,
+            processed_text=processed_text,
+            intent=intent,
+            entities=entities,
+            sentiment=sentiment,
+            confidence=confidence,
+            language=language,
+            timestamp=datetime.now(),
+            user_id=user_id,
+            session_id=session_id,
+        )
+
     async def _extract_entities(
-        self, text: str, tokens: List[str]
+        self,
+        text: str,
+        tokens: List[str],
+        analysis: Optional[TextAnalysis] = None,
     ) -> List[Entity]:
         """Извлечение сущностей из текста"""
         try:
-            entities = []
-
-            # Простое извлечение сущностей по паттернам
-            for entity_type, pattern in self.config["entity_patterns"].items():
-                matches = re.finditer(pattern, text, re.IGNORECASE)
-                for match in matches:
-                    entity = Entity(
-                        type=entity_type,
-                        value=match.group(),
-                        start_pos=match.start(),
-                        end_pos=match.end(),
-                        confidence=0.8,
-                        context={},
-                    )
-                    entities.append(entity)
+            if analysis is None:
+                analysis = self.matcher.analyze(text)
 
-            return entities
+            # Все шаблоны сущностей проверяются одним выражением
+            return [
+                Entity(
+                    type=entity_type,
+                    value=value,
+                    start_pos=start,
+                    end_pos=end,
+                    confidence=0.8,
+                    context={},
+                )
+                for entity_type, value, start, end in analysis.entities
+            ]
         except Exception as e:
             self.logger.error(f"Ошибка извлечения сущностей: {e}")
             return []
 
-    async def _analyze_intent(self, text: str, tokens: List[str]) -> Intent:
+    async def _analyze_intent(
+        self,
+        text: str,
+        tokens: List[str],
+        analysis: Optional[TextAnalysis] = None,
+    ) -> Intent:
         """Анализ намерения пользователя"""
         try:
-            # Простая классификация намерений по ключевым словам
-            text_lower = text.lower()
-
-            # Определение типа намерения
-            intent_type = IntentType.QUERY  # По умолчанию
-
-            for intent_key, keywords in self.config["intent_keywords"].items():
-                for keyword in keywords:
-                    if keyword.lower() in text_lower:
-                        intent_type = IntentType(intent_key)
-                        break
-                if intent_type != IntentType.QUERY:
+            if analysis is None:
+                analysis = self.matcher.analyze(text)
+
+            # Первое по порядку конфигурации намерение, ключевое слово
+            # которого есть в тексте; QUERY - по умолчанию
+            intent_type = IntentType.QUERY
+            for intent_key in self.config["intent_keywords"]:
+                candidate = IntentType(intent_key)
+                if candidate != IntentType.QUERY and analysis.has(candidate):
+                    intent_type = candidate
                     break
 
             # Определение контекста
             context = "general"
-            if any(
-                word in text_lower for word in ["срочно", "быстро", "urgent"]
-            ):
+            if analysis.has(("context", "urgent")):
                 context = "urgent"
-            elif any(word in text_lower for word in ["важно", "important"]):
+            elif analysis.has(("context", "important")):
                 context = "important"
 
             # Расчет уверенности
@@ -579,64 +731,86 @@ class NaturalLanguageProcessor(SecurityBase):
 
     async def _save_processing_result(self, result: ProcessingResult):
         """Сохранение результата обработки"""
+        await self._save_processing_results([result])
+
+    async def _save_processing_results(
+        self, results: List[ProcessingResult]
+    ):
+        """Сохранение пакета результатов одной дозаписью в JSONL"""
         try:
-            # Добавление в историю
-            self.processing_history.append(result)
-
-            # Ограничение размера истории
-            if len(self.processing_history) > 1000:
-                self.processing_history = self.processing_history[-1000:]
-
-            # Сохранение в файл
-            os.makedirs("data/nlp_processing", exist_ok=True)
-
-            result_data = {
-                "original_text": result.original_text,
-                "processed_text": result.processed_text,
-                "intent": {
-                    "type": result.intent.type.value,
-                    "confidence": result.intent.confidence,
-                    "entities": [
-                        {
-                            "type": e.type.value,
-                            "value": e.value,
-                            "confidence": e.confidence,
-                        }
-                        for e in result.intent.entities
-                    ],
-                    "context": result.intent.context,
-                },
+            # Добавление в историю (ограничена maxlen)
+            self.processing_history.extend(results)
+
+            loop = asyncio.get_running_loop()
+            filename = await loop.run_in_executor(
+                None, self._append_results, list(results)
+            )
+            self.logger.debug(
+                f"Результаты обработки сохранены: {filename} "
+                f"({len(results)})"
+            )
+
+        except Exception as e:
+            self.logger.error(f"Ошибка сохранения результата: {e}")
+
+    def _append_results(self, results: List[ProcessingResult]) -> str:
+        """Дозапись результатов в файл дня (выполняется в пуле потоков)"""
+        os.makedirs(self.results_dir, exist_ok=True)
+        filename = os.path.join(
+            self.results_dir,
+            "processing_{}.jsonl".format(
+                results[0].timestamp.strftime("%Y%m%d")
+            ),
+        )
+        lines = "".join(
+            json.dumps(
+                self._result_to_dict(result),
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+            + "\n"
+            for result in results
+        )
+        with open(filename, "a", encoding="utf-8") as f:
+            f.write(lines)
+        return filename
+
+    @staticmethod
+    def _result_to_dict(result: ProcessingResult) -> Dict[str, Any]:
+        """Сериализуемое представление результата"""
+        return {
+            "original_text": result.original_text,
+            "processed_text": result.processed_text,
+            "intent": {
+                "type": result.intent.type.value,
+                "confidence": result.intent.confidence,
                 "entities": [
                     {
                         "type": e.type.value,
                         "value": e.value,
-                        "start_pos": e.start_pos,
-                        "end_pos": e.end_pos,
                         "confidence": e.confidence,
                     }
-                    for e in result.entities
+                    for e in result.intent.entities
                 ],
-                "sentiment": result.sentiment.value,
-                "confidence": result.confidence,
-                "language": result.language,
-                "timestamp": result.timestamp.isoformat(),
-                "user_id": result.user_id,
-                "session_id": result.session_id,
-            }
-
-            filename = (
-                f"data/nlp_processing/processing_"
-                f"{result.timestamp.strftime('%Y%m%d_%H%M%S')}_"
-                f"{result.user_id}.json"
-            )
-
-            with open(filename, "w", encoding="utf-8") as f:
-                json.dump(result_data, f, ensure_ascii=False, indent=2)
-
-            self.logger.info(f"Результат обработки сохранен: {filename}")
-
-        except Exception as e:
-            self.logger.error(f"Ошибка сохранения результата: {e}")
+                "context": result.intent.context,
+            },
+            "entities": [
+                {
+                    "type": e.type.value,
+                    "value": e.value,
+                    "start_pos": e.start_pos,
+                    "end_pos": e.end_pos,
+                    "confidence": e.confidence,
+                }
+                for e in result.entities
+            ],
+            "sentiment": result.sentiment.value,
+            "confidence": result.confidence,
+            "language": result.language,
+            "timestamp": result.timestamp.isoformat(),
+            "user_id": result.user_id,
+            "session_id": result.session_id,
+        }
 
     def _update_statistics(self, result: ProcessingResult):
         """Обновление статистики обработки"""
@@ -1029,29 +1203,19 @@ class SentimentAnalyzer:
     def __init__(self, config):
         self.config = config
 
-    async def analyze_sentiment(self, text):
+    async def analyze_sentiment(self, text, analysis=None):
         """Анализ тональности"""
-        positive_words = [
-            "хорошо",
-            "отлично",
-            "прекрасно",
-            "good",
-            "excellent",
-            "great",
-        ]
-        negative_words = ["плохо", "ужасно", "bad", "terrible", "awful"]
-        urgent_words = ["срочно", "быстро", "urgent", "quick", "fast"]
+        if analysis is not None:
+            for sentiment in SENTIMENT_KEYWORDS:
+                if analysis.has(sentiment):
+                    return sentiment
+            return SentimentType.NEUTRAL
 
         text_lower = text.lower()
-
-        if any(word in text_lower for word in urgent_words):
-            return SentimentType.URGENT
-        elif any(word in text_lower for word in positive_words):
-            return SentimentType.POSITIVE
-        elif any(word in text_lower for word in negative_words):
-            return SentimentType.NEGATIVE
-        else:
-            return SentimentType.NEUTRAL
+        for sentiment, words in SENTIMENT_KEYWORDS.items():
+            if any(word in text_lower for word in words):
+                return sentiment
+        return SentimentType.NEUTRAL
 
 
 class ContextAnalyzer:
@@ -1076,14 +1240,20 @@ class KeywordExtractor:
     def __init__(self, config):
         self.config = config
 
-    async def extract_keywords(self, text, tokens):
+    async def extract_keywords(self, text, tokens, analysis=None):
         """Извлечение ключевых слов"""
+        text_lower = text.lower()
         keywords = []
         for intent_type, keywords_list in self.config[
             "intent_keywords"
         ].items():
             for keyword in keywords_list:
-                if keyword.lower() in text.lower():
+                word = keyword.lower()
+                if analysis is not None:
+                    present = word in analysis.words
+                else:
+                    present = word in text_lower
+                if present:
                     keywords.append(keyword)
         return keywords
 
@@ -1094,19 +1264,21 @@ class EmotionDetector:
     def __init__(self, config):
         self.config = config
 
-    async def detect_emotions(self, text):
+    async def detect_emotions(self, text, analysis=None):
         """Детекция эмоций"""
-        emotions = []
-        text_lower = text.lower()
-
-        if "радость" in text_lower or "joy" in text_lower:
-            emotions.append("joy")
-        if "грусть" in text_lower or "sadness" in text_lower:
-            emotions.append("sadness")
-        if "гнев" in text_lower or "anger" in text_lower:
-            emotions.append("anger")
-        if "страх" in text_lower or "fear" in text_lower:
-            emotions.append("fear")
+        if analysis is not None:
+            emotions = [
+                name
+                for name in EMOTION_KEYWORDS
+                if analysis.has(("emotion", name))
+            ]
+        else:
+            text_lower = text.lower()
+            emotions = [
+                name
+                for name, words in EMOTION_KEYWORDS.items()
+                if any(word in text_lower for word in words)
+            ]
 
         return emotions if emotions else ["neutral"]
 
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Единый словарный матчер для NaturalLanguageProcessor
+
+LexiconMatcher компилирует словари ключевых слов (намерения, контекст,
+тональность, эмоции) и шаблоны сущностей один раз при инициализации.
+Текст разбирается за один вызов analyze(); результат TextAnalysis
+разделяют все компоненты конвейера вместо повторных проверок
+"слово in text" по каждому словарю.
+
+Ключевые слова ищутся как подстроки (как и раньше): словарь сворачивается
+в префиксное дерево, из которого строится одно регулярное выражение
+с опережающей проверкой, поэтому находятся и перекрывающиеся вхождения.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, List, Tuple
+
+
+@dataclass
+class TextAnalysis:
+    """Результат однопроходного разбора текста"""
+
+    words: FrozenSet[str]
+    tags: FrozenSet[Hashable]
+    # (тип сущности, значение, начало, конец) в порядке появления
+    entities: List[Tuple[Any, str, int, int]] = field(default_factory=list)
+
+    def has(self, tag: Hashable) -> bool:
+        """Встречается ли в тексте слово с данным тегом"""
+        return tag in self.tags
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Регулярное выражение по префиксному дереву слов.
+
+    На каждой позиции выражение выбирает самое длинное слово; более
+    короткие слова с той же позиции учитываются через префиксы.
+    """
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = None
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = [
+            re.escape(char) + build(child)
+            for char, child in sorted(node.items())
+            if char
+        ]
+        if not branches:
+            return ""
+        terminal = "" in node
+        if len(branches) == 1 and not terminal:
+            return branches[0]
+        return "(?:{}){}".format("|".join(branches), "?" if terminal else "")
+
+    return build(trie)
+
+
+class LexiconMatcher:
+    """Скомпилированные словари ключевых слов и шаблоны сущностей"""
+
+    def __init__(
+        self,
+        lexicon: Dict[Hashable, Iterable[str]],
+        entity_patterns: Dict[Any, str],
+    ):
+        """
+        Args:
+            lexicon: Тег -> список ключевых слов (подстрок)
+            entity_patterns: Тип сущности -> регулярное выражение
+        """
+        word_tags: Dict[str, set] = {}
+        for tag, words in lexicon.items():
+            for word in words:
+                word = word.lower()
+                if word:
+                    word_tags.setdefault(word, set()).add(tag)
+
+        # Совпадение на позиции - самое длинное слово; все слова-префиксы
+        # этого слова тоже присутствуют в тексте
+        self._closure: Dict[str, Tuple[FrozenSet[str], FrozenSet]] = {}
+        for word in word_tags:
+            prefixes = [
+                word[:i] for i in range(1, len(word) + 1)
+                if word[:i] in word_tags
+            ]
+            self._closure[word] = (
+                frozenset(prefixes),
+                frozenset(tag for p in prefixes for tag in word_tags[p]),
+            )
+
+        self._keyword_re = (
+            re.compile(
+                "(?=({}))".format(_trie_pattern(word_tags)), re.IGNORECASE
+            )
+            if word_tags
+            else None
+        )
+
+        self._entity_types = list(entity_patterns)
+        self._entity_re = (
+            re.compile(
+                "|".join(
+                    "(?P<e{}>{})".format(i, pattern)
+                    for i, pattern in enumerate(entity_patterns.values())
+                ),
+                re.IGNORECASE,
+            )
+            if entity_patterns
+            else None
+        )
+
+    def analyze(self, text: str) -> TextAnalysis:
+        """Однопроходный разбор: найденные слова, их теги и сущности"""
+        words: set = set()
+        tags: set = set()
+        if self._keyword_re is not None:
+            closure = self._closure
+            for found in {m.group(1) for m in self._keyword_re.finditer(text)}:
+                try:
+                    found_words, found_tags = closure[found]
+                except KeyError:
+                    found_words, found_tags = closure[found.lower()]
+                words.update(found_words)
+                tags.update(found_tags)
+
+        entities = []
+        if self._entity_re is not None:
+            types = self._entity_types
+            for match in self._entity_re.finditer(text):
+                entities.append(
+                    (
+                        types[int(match.lastgroup[1:])],
+                        match.group(),
+                        match.start(),
+                        match.end(),
+                    )
+                )
+
+        return TextAnalysis(frozenset(words), frozenset(tags), entities)
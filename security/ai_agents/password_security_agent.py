@@ -264,6 +264,14 @@ except ImportError:
             print("{}: {}".format(level.upper(), message))
 
 
+from security.ai_agents.breach_index import (  # noqa: E402
+    BreachIndex,
+    BreachIndexError,
+)
+
+DEFAULT_BREACH_INDEX_PATH = "data/password_security/breach_index.bin"
+
+
 class PasswordStrength(Enum):
     """Уровни сложности пароля"""
 
@@ -375,12 +383,15 @@ class PasswordMetrics:
 class PasswordSecurityAgent(SecurityBase):
     """Агент безопасности паролей ALADDIN"""
 
-    def __init__(self, name="PasswordSecurityAgent"):
+    def __init__(self, name="PasswordSecurityAgent", breach_index_path=None):
         SecurityBase.__init__(self, name)
 
         # Конфигурация агента
         self.default_policy = PasswordPolicy()
         self.breach_database = set()
+        # Индекс утечек на диске (mmap), см. breach_index.py
+        self.breach_index_path = breach_index_path or DEFAULT_BREACH_INDEX_PATH
+        self.breach_index = None
         self.password_history = {}  # user_id -> [password_hashes]
         self.failed_attempts = {}  # user_id -> count
         self.lockouts = {}  # user_id -> lockout_until
@@ -573,6 +584,24 @@ class PasswordSecurityAgent(SecurityBase):
                 )
             )
 
+            # Полный корпус утечек: индекс открывается через mmap,
+            # в память процесса не загружается
+            if self.breach_index is None and os.path.exists(
+                self.breach_index_path
+            ):
+                try:
+                    self.breach_index = BreachIndex(self.breach_index_path)
+                    self.log_activity(
+                        "Индекс утечек подключен: {} записей".format(
+                            len(self.breach_index)
+                        )
+                    )
+                except (OSError, BreachIndexError) as e:
+                    self.log_activity(
+                        "Ошибка открытия индекса утечек: {}".format(str(e)),
+                        "error",
+                    )
+
         except Exception as e:
             self.log_activity(
                 "Ошибка загрузки базы данных утечек: {}".format(str(e)),
@@ -968,10 +997,13 @@ class PasswordSecurityAgent(SecurityBase):
                 return False
 
             # Хеширование пароля для проверки
-            password_hash = hashlib.sha256(password.encode()).hexdigest()
+            digest = hashlib.sha256(password.encode()).digest()
 
-            # Проверка в базе данных утечек
-            is_breached = password_hash in self.breach_database
+            # Проверка во встроенном списке, затем в индексе утечек
+            is_breached = digest.hex() in self.breach_database or (
+                self.breach_index is not None
+                and self.breach_index.contains_digest(digest)
+            )
 
             # Обновление метрик
             if is_breached:
@@ -985,6 +1017,30 @@ class PasswordSecurityAgent(SecurityBase):
             )
             return False
 
+    def check_breach_range(self, hash_prefix):
+        """
+        k-анонимная проверка по префиксу SHA-256 хеша пароля
+
+        Клиент отправляет только начало хеша и сам сравнивает
+        полученные окончания со своим хешем.
+
+        Args:
+            hash_prefix: Первые символы hex SHA-256 (от 5)
+
+        Returns:
+            list: Окончания хешей из базы утечек (верхний регистр)
+        """
+        prefix = hash_prefix.strip().lower()
+        suffixes = set()
+        if self.breach_index is not None:
+            suffixes.update(self.breach_index.range_search(prefix))
+        elif len(prefix) < 5:
+            raise ValueError("Длина префикса должна быть не меньше 5")
+        for password_hash in self.breach_database:
+            if password_hash.startswith(prefix):
+                suffixes.add(password_hash[len(prefix):].upper())
+        return sorted(suffixes)
+
     def validate_password_policy(self, password, policy=None):
         """Валидация пароля по политике"""
         try:
@@ -1147,6 +1203,10 @@ class PasswordSecurityAgent(SecurityBase):
             # Сохранение данных
             self._save_data()
 
+            if self.breach_index is not None:
+                self.breach_index.close()
+                self.breach_index = None
+
             self.log_activity("PasswordSecurityAgent остановлен")
 
         except Exception as e:
@@ -10,14 +10,26 @@ ALADDIN Security System - PhishingProtectionAgent
 
 import asyncio
 import datetime
-import hashlib
 import re
+import threading
+import time
 import urllib.parse
 import uuid
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from enum import Enum
-from functools import lru_cache
-from typing import Any, AsyncGenerator, Dict, List, Optional
+from typing import Any, AsyncGenerator, Dict, Hashable, Iterable, List, Optional
+
+# Маркер промаха кэша: None - допустимый закэшированный результат ("угроз нет")
+_MISSING = object()
+
+# Подозрительные паттерны URL одним выражением: один проход по строке
+_SUSPICIOUS_URL_RE = re.compile(
+    r"bit\.ly|tinyurl\.com|goo\.gl"
+    r"|[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}"
+    r"|[a-zA-Z0-9-]+\.tk|\.ml|\.ga|\.cf",
+    re.IGNORECASE,
+)
 
 
 class PhishingProtectionError(Exception):
@@ -403,6 +415,143 @@ class PhishingReport:
         )
 
 
+class TTLCache:
+    """
+    Ограниченный LRU-кэш с временем жизни записей.
+
+    Общий для проверок URL, email и доменов: при переполнении вытесняется
+    давно не использованная запись, просроченные записи удаляются при
+    обращении. Запись может иметь метку (например, хост) для выборочного
+    сброса через invalidate(). Все операции, кроме invalidate, O(1).
+    """
+
+    def __init__(self, maxsize: int = 100000, ttl: float = 3600.0):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = float(ttl)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._tags: Dict[Hashable, set] = {}  # метка -> ключи
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Значение по ключу или default, если записи нет или она просрочена"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires_at, value, _ = item
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, tag: Hashable = None) -> None:
+        """Сохранение значения; ttl переопределяет время жизни записи"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (expires_at, value, tag)
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._data) > self.maxsize:
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _remove(self, key: Hashable) -> Optional[tuple]:
+        """Удаление записи вместе с её меткой (под блокировкой)"""
+        item = self._data.pop(key, None)
+        if item is not None and item[2] is not None:
+            keys = self._tags[item[2]]
+            keys.discard(key)
+            if not keys:
+                del self._tags[item[2]]
+        return item
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Удаление записи"""
+        with self._lock:
+            item = self._remove(key)
+        return default if item is None else item[1]
+
+    def invalidate(self, tag: Hashable) -> int:
+        """Удаление всех записей с меткой tag"""
+        with self._lock:
+            keys = self._tags.pop(tag, ())
+            for key in keys:
+                del self._data[key]
+        return len(keys)
+
+    def purge_expired(self) -> int:
+        """Удаление всех просроченных записей"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, item in self._data.items() if item[0] <= now]
+            for key in expired:
+                self._remove(key)
+        return len(expired)
+
+    def clear(self) -> None:
+        """Очистка кэша"""
+        with self._lock:
+            self._data.clear()
+            self._tags.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Статистика кэша"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TokenBucket:
+    """Token bucket: до capacity запросов подряд, пополнение rate токенов в секунду"""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated_at", "_lock")
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = float(capacity)
+        self.rate = float(rate)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, tokens: float = 1.0) -> bool:
+        """Попытка списать токены; O(1), без хранения истории запросов"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    @property
+    def remaining(self) -> int:
+        """Доступные токены на текущий момент"""
+        elapsed = time.monotonic() - self.updated_at
+        return int(min(self.capacity, self.tokens + elapsed * self.rate))
+
+
 class PhishingProtectionAgent:
     """
     Агент защиты от фишинговых атак с использованием множественных методов
@@ -468,44 +617,51 @@ class PhishingProtectionAgent:
         print(f"Загружено {len(default_indicators)} базовых индикаторов фишинга")
 
     def _get_cache_key(self, data: str) -> str:
-        """Генерация ключа кэша"""
-        return hashlib.md5(data.encode()).hexdigest()
+        """Генерация ключа кэша (строка используется как есть, без хеширования)"""
+        return data
 
     def _is_cache_valid(self, cache_key: str) -> bool:
         """Проверка валидности кэша"""
-        if cache_key not in self._cache:
-            return False
-        cache_time = self._cache[cache_key].get("timestamp", 0)
-        return (datetime.datetime.now().timestamp() - cache_time) < self._cache_ttl
+        return cache_key in self._cache
 
-    def _get_from_cache(self, cache_key: str) -> Optional[Any]:
+    def _get_from_cache(self, cache_key: str, default: Any = None) -> Optional[Any]:
         """Получение данных из кэша"""
-        if self._is_cache_valid(cache_key):
-            return self._cache[cache_key]["data"]
-        return None
+        return self._cache.get(cache_key, default)
 
-    def _set_cache(self, cache_key: str, data: Any) -> None:
-        """Сохранение данных в кэш"""
-        self._cache[cache_key] = {"data": data, "timestamp": datetime.datetime.now().timestamp()}
+    def _set_cache(
+        self, cache_key: str, data: Any, host: Optional[str] = None, generation: Optional[int] = None
+    ) -> None:
+        """
+        Сохранение данных в кэш
 
-    def _check_rate_limit(self, method_name: str) -> bool:
-        """Проверка лимита запросов"""
-        now = datetime.datetime.now().timestamp()
-        minute_ago = now - 60
+        С host запись помечается хостом; если generation задано и списки
+        доменов хоста успели измениться, устаревший вердикт не сохраняется.
+        """
+        if host is not None and generation is not None and self._host_generation(host) != generation:
+            return
+        self._cache.set(cache_key, data, self._cache_ttl, tag=host)
 
-        # Инициализируем список если его нет
-        if method_name not in self._rate_limits:
-            self._rate_limits[method_name] = []
+    def _host_generation(self, host: str) -> int:
+        """Текущее поколение списков доменов для хоста"""
+        return self._list_generations.get(host, 0)
 
-        # Очищаем старые запросы
-        self._rate_limits[method_name] = [
-            req_time for req_time in self._rate_limits[method_name] if req_time > minute_ago
-        ]
+    def _invalidate_host(self, host: str) -> None:
+        """Сброс закэшированных вердиктов хоста после изменения списков"""
+        self._list_generations[host] = self._host_generation(host) + 1
+        self._cache.invalidate(host)
 
-        if len(self._rate_limits[method_name]) >= self._max_requests_per_minute:
-            raise RateLimitExceededError(f"Rate limit exceeded for {method_name}")
+    def _check_rate_limit(self, method_name: str) -> bool:
+        """Проверка лимита запросов (token bucket на каждый метод)"""
+        bucket = self._rate_limits.get(method_name)
+        if bucket is None:
+            with self._rate_limits_lock:
+                bucket = self._rate_limits.setdefault(
+                    method_name,
+                    TokenBucket(self._max_requests_per_minute, self._max_requests_per_minute / 60.0),
+                )
 
-        self._rate_limits[method_name].append(now)
+        if not bucket.consume():
+            raise RateLimitExceededError(f"Rate limit exceeded for {method_name}")
         return True
 
     def _validate_url(self, url: str) -> str:
@@ -549,10 +705,15 @@ class PhishingProtectionAgent:
 
         return domain.strip().lower()
 
-    @lru_cache(maxsize=1000)
     def _cached_domain_check(self, domain: str) -> Dict[str, Any]:
-        """Кэшированная проверка домена"""
-        return self.validate_domain(domain)
+        """Кэшированная проверка домена (общий TTL-кэш агента)"""
+        cache_key = f"domain_check:{domain}"
+        result = self._cache.get(cache_key, _MISSING)
+        if result is _MISSING:
+            generation = self._host_generation(domain)
+            result = self.validate_domain(domain)
+            self._set_cache(cache_key, result, domain, generation)
+        return result
 
     # ==================== АСИНХРОННЫЕ МЕТОДЫ ====================
 
@@ -565,51 +726,95 @@ class PhishingProtectionAgent:
             # Проверяем rate limit
             self._check_rate_limit("analyze_url_async")
 
-            # Проверяем кэш
-            cache_key = self._get_cache_key(f"url_analysis_async:{url}")
-            cached_result = self._get_from_cache(cache_key)
-            if cached_result is not None:
-                return cached_result
+            return await self._analyze_url_coalesced(url)
 
-            # Асинхронная проверка домена
-            domain = urllib.parse.urlparse(url).netloc.lower()
-            domain_check = await self._async_domain_check(domain)
+        except Exception as e:
+            print(f"Ошибка при асинхронном анализе URL {url}: {e}")
+            return None
 
-            if domain_check["is_blocked"]:
-                result = self._create_detection(
-                    source=url,
-                    phishing_type=PhishingType.WEBSITE,
-                    threat_level=ThreatLevel.CRITICAL,
-                    confidence=1.0,
-                    detection_method=DetectionMethod.BLACKLIST,
-                    description="Домен в черном списке",
-                )
-                self._set_cache(cache_key, result)
-                return result
+    async def _coalesce(self, key: Hashable, factory) -> Any:
+        """
+        Объединение одинаковых запросов в полёте.
 
-            if domain_check["is_trusted"]:
-                self._set_cache(cache_key, None)
-                return None
+        Пока запрос с ключом key выполняется, повторные вызовы ждут его
+        результат вместо собственной проверки. В ключ входит поколение
+        списков хоста, поэтому вызов после block/trust не присоединяется
+        к проверке, начатой до изменения.
+        """
+        future = self._inflight.get(key)
+        if future is not None:
+            self._coalesced_requests += 1
+            return await asyncio.shield(future)
 
-            # Асинхронный анализ по индикаторам
-            detection = await self._async_analyze_indicators(url, PhishingType.WEBSITE)
-            if detection:
-                self._set_cache(cache_key, detection)
-                return detection
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Ожидающих может не быть: помечаем как полученное
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._inflight[key]
 
-            # Дополнительные асинхронные проверки
-            additional_detection = await self._async_additional_url_checks(url, domain)
-            if additional_detection:
-                self._set_cache(cache_key, additional_detection)
-                return additional_detection
+    async def _analyze_url_coalesced(self, url: str) -> Optional[PhishingDetection]:
+        """Анализ валидированного URL: кэш, затем одна проверка на URL в полёте"""
+        cache_key = self._get_cache_key(f"url_analysis_async:{url}")
+        cached_result = self._get_from_cache(cache_key, _MISSING)
+        if cached_result is not _MISSING:
+            return cached_result
 
-            self._set_cache(cache_key, None)
-            return None
+        host = urllib.parse.urlsplit(url).netloc.lower()
+        return await self._coalesce_for_host(cache_key, host, lambda: self._analyze_url_uncached(url))
 
-        except Exception as e:
-            print(f"Ошибка при асинхронном анализе URL {url}: {e}")
+    async def _coalesce_for_host(self, cache_key: str, host: str, factory) -> Any:
+        """
+        Проверка в полёте с учётом поколения списков хоста.
+
+        Если списки хоста изменились, пока шла проверка, её результат
+        отбрасывается и проверка повторяется; в кэш попадает только
+        вердикт текущего поколения.
+        """
+        while True:
+            generation = self._host_generation(host)
+            result = await self._coalesce((cache_key, generation), factory)
+            if self._host_generation(host) == generation:
+                self._set_cache(cache_key, result, host, generation)
+                return result
+
+    async def _analyze_url_uncached(self, url: str) -> Optional[PhishingDetection]:
+        """Полный анализ URL без обращения к кэшу результатов"""
+        # Асинхронная проверка домена
+        domain = urllib.parse.urlsplit(url).netloc.lower()
+        domain_check = await self._async_domain_check(domain)
+
+        if domain_check["is_blocked"]:
+            return self._create_detection(
+                source=url,
+                phishing_type=PhishingType.WEBSITE,
+                threat_level=ThreatLevel.CRITICAL,
+                confidence=1.0,
+                detection_method=DetectionMethod.BLACKLIST,
+                description="Домен в черном списке",
+            )
+
+        if domain_check["is_trusted"]:
             return None
 
+        # Асинхронный анализ по индикаторам
+        detection = await self._async_analyze_indicators(url, PhishingType.WEBSITE)
+        if detection:
+            return detection
+
+        # Дополнительные асинхронные проверки
+        return await self._async_additional_url_checks(url, domain)
+
     async def analyze_email_async(self, subject: str, content: str, sender: str = "") -> Optional[PhishingDetection]:
         """Асинхронный анализ email на предмет фишинга"""
         try:
@@ -638,13 +843,48 @@ class PhishingProtectionAgent:
             print(f"Ошибка при асинхронном анализе email: {e}")
             return None
 
-    async def batch_analyze_urls(self, urls: List[str]) -> AsyncGenerator[PhishingDetection, None]:
-        """Пакетный асинхронный анализ URL"""
-        tasks = [self.analyze_url_async(url) for url in urls]
-        for task in asyncio.as_completed(tasks):
-            result = await task
-            if result:
-                yield result
+    async def batch_analyze_urls(
+        self, urls: Iterable[str], concurrency: Optional[int] = None
+    ) -> AsyncGenerator[PhishingDetection, None]:
+        """
+        Пакетный асинхронный анализ URL.
+
+        URL читаются из итератора по мере обработки фиксированным числом
+        обработчиков (concurrency, по умолчанию batch_concurrency), поэтому
+        пакет любого размера не создаёт задачу на каждый URL. Лимит запросов
+        списывается один раз на пакет; одинаковые URL и домены в полёте
+        проверяются один раз.
+        """
+        self._check_rate_limit("batch_analyze_urls")
+        workers = max(1, concurrency or self.batch_concurrency)
+        url_iter = iter(urls)
+        results: asyncio.Queue = asyncio.Queue(maxsize=workers * 4)
+        done = object()
+
+        async def worker() -> None:
+            for url in url_iter:
+                try:
+                    result = await self._analyze_url_coalesced(self._validate_url(url))
+                except Exception as e:
+                    print(f"Ошибка при асинхронном анализе URL {url}: {e}")
+                    continue
+                if result:
+                    await results.put(result)
+            await results.put(done)
+
+        tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+        try:
+            active = workers
+            while active:
+                item = await results.get()
+                if item is done:
+                    active -= 1
+                else:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
 
     async def batch_analyze_emails(self, emails: List[Dict[str, str]]) -> AsyncGenerator[PhishingDetection, None]:
         """Пакетный асинхронный анализ email"""
@@ -658,7 +898,15 @@ class PhishingProtectionAgent:
                 yield result
 
     async def _async_domain_check(self, domain: str) -> Dict[str, Any]:
-        """Асинхронная проверка домена"""
+        """Асинхронная проверка домена (кэш + одна проверка на домен в полёте)"""
+        cache_key = f"domain_check_async:{domain}"
+        result = self._cache.get(cache_key, _MISSING)
+        if result is _MISSING:
+            result = await self._coalesce_for_host(cache_key, domain, lambda: self._lookup_domain(domain))
+        return result
+
+    async def _lookup_domain(self, domain: str) -> Dict[str, Any]:
+        """Проверка домена по спискам и репутационному источнику"""
         await asyncio.sleep(0.001)  # Имитация асинхронной операции
         return {
             "is_blocked": domain in self.blocked_domains,
@@ -668,7 +916,6 @@ class PhishingProtectionAgent:
 
     async def _async_analyze_indicators(self, text: str, phishing_type: PhishingType) -> Optional[PhishingDetection]:
         """Асинхронный анализ по индикаторам"""
-        await asyncio.sleep(0.001)  # Имитация асинхронной операции
 
         matched_indicators = []
         max_confidence = 0.0
@@ -703,25 +950,17 @@ class PhishingProtectionAgent:
 
     async def _async_additional_url_checks(self, url: str, domain: str) -> Optional[PhishingDetection]:
         """Асинхронные дополнительные проверки URL"""
-        await asyncio.sleep(0.001)  # Имитация асинхронной операции
 
         # Проверка на подозрительные паттерны
-        suspicious_patterns = [
-            r"bit\.ly|tinyurl\.com|goo\.gl",
-            r"[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}",
-            r"[a-zA-Z0-9-]+\.tk|\.ml|\.ga|\.cf",
-        ]
-
-        for pattern in suspicious_patterns:
-            if re.search(pattern, url, re.IGNORECASE):
-                return self._create_detection(
-                    source=url,
-                    phishing_type=PhishingType.WEBSITE,
-                    threat_level=ThreatLevel.MEDIUM,
-                    confidence=0.7,
-                    detection_method=DetectionMethod.URL_ANALYSIS,
-                    description="Подозрительный URL паттерн",
-                )
+        if _SUSPICIOUS_URL_RE.search(url):
+            return self._create_detection(
+                source=url,
+                phishing_type=PhishingType.WEBSITE,
+                threat_level=ThreatLevel.MEDIUM,
+                confidence=0.7,
+                detection_method=DetectionMethod.URL_ANALYSIS,
+                description="Подозрительный URL паттерн",
+            )
 
         return None
 
@@ -782,12 +1021,22 @@ class PhishingProtectionAgent:
         self.notifications_enabled: bool = True
         self.backup_enabled: bool = True
 
-        # Кэширование
-        self._cache: Dict[str, Any] = {}
+        # Кэширование: общий ограниченный TTL-LRU кэш для URL, email и доменов
         self._cache_ttl: int = 3600  # 1 час
-        self._rate_limits: Dict[str, List[float]] = {}
+        self._cache_maxsize: int = 100000
+        self._cache = TTLCache(self._cache_maxsize, self._cache_ttl)
+        self._rate_limits: Dict[str, TokenBucket] = {}
+        self._rate_limits_lock = threading.Lock()
         self._max_requests_per_minute: int = 100
 
+        # Пакетный анализ: число обработчиков и запросы в полёте
+        self.batch_concurrency: int = 100
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._coalesced_requests: int = 0
+        # Поколение списков доменов по хосту: растет при block/trust,
+        # вердикты, начатые до изменения, в кэш не попадают
+        self._list_generations: Dict[str, int] = {}
+
         # Плагинная архитектура
         self.plugins: List[PhishingPlugin] = []
         self.plugin_configs: Dict[str, Dict[str, Any]] = {}
@@ -913,12 +1162,13 @@ class PhishingProtectionAgent:
 
             # Проверяем кэш
             cache_key = self._get_cache_key(f"url_analysis:{url}")
-            cached_result = self._get_from_cache(cache_key)
-            if cached_result is not None:
+            cached_result = self._get_from_cache(cache_key, _MISSING)
+            if cached_result is not _MISSING:
                 return cached_result
 
             parsed_url = urllib.parse.urlparse(url)
             domain = parsed_url.netloc.lower()
+            generation = self._host_generation(domain)
 
             # Проверяем черный список доменов
             if domain in self.blocked_domains:
@@ -960,17 +1210,17 @@ class PhishingProtectionAgent:
                     indicators_matched=matched_indicators,
                     description=f"Обнаружено {len(matched_indicators)} " f"индикаторов фишинга",
                 )
-                self._set_cache(cache_key, result)
+                self._set_cache(cache_key, result, domain, generation)
                 return result
 
             # Дополнительные проверки
             detection = self._additional_url_checks(url, domain)
             if detection:
-                self._set_cache(cache_key, detection)
+                self._set_cache(cache_key, detection, domain, generation)
                 return detection
 
             # Кэшируем None результат
-            self._set_cache(cache_key, None)
+            self._set_cache(cache_key, None, domain, generation)
             return None
 
         except Exception as e:
@@ -1121,11 +1371,13 @@ class PhishingProtectionAgent:
     def block_domain(self, domain: str):
         """Добавляет домен в черный список"""
         self.blocked_domains.add(domain.lower())
+        self._invalidate_host(domain.lower())  # Вердикты хоста устарели
         print(f"Домен добавлен в черный список: {domain}")
 
     def trust_domain(self, domain: str):
         """Добавляет домен в белый список"""
         self.trusted_domains.add(domain.lower())
+        self._invalidate_host(domain.lower())  # Вердикты хоста устарели
         print(f"Домен добавлен в белый список: {domain}")
 
     def report_phishing(
@@ -1276,6 +1528,8 @@ class PhishingProtectionAgent:
                 "blocked_domains": len(getattr(self, "blocked_domains", [])),
                 "trusted_domains": len(getattr(self, "trusted_domains", [])),
                 "total_detections": getattr(self, "total_detections", 0),
+                "cache": self._cache.get_stats(),
+                "coalesced_requests": self._coalesced_requests,
             }
         except Exception as e:
             print(f"Ошибка получения информации о системе защиты от фишинга: {e}")
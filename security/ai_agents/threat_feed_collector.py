@@ -0,0 +1,627 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+ThreatFeedCollector - Параллельный сбор лент угроз ALADDIN
+
+Ленты скачиваются одновременно через одну aiohttp-сессию (keep-alive,
+общий пул соединений). Для каждой ленты запоминаются ETag и
+Last-Modified, повторный запрос идёт с If-None-Match/If-Modified-Since
+и при ответе 304 тело не передаётся вовсе.
+
+Тело разбирается по мере поступления: записи отдаются обработчику
+порциями, не дожидаясь конца ответа, поэтому большая лента не
+копируется в память целиком (кроме формата "json", который требует
+полного документа).
+
+Загрузка подменяема: вместо aiohttp-сессии коллектор может получать
+ответы от переданного fetcher (локальные фикстуры, тесты, прокси).
+
+IOCIndex - обратный индекс индикатор -> идентификаторы угроз с
+нормализацией значений, поиск за O(1).
+"""
+
+import asyncio
+import ipaddress
+import json
+import re
+import time
+import xml.etree.ElementTree as ET
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+import aiohttp
+
+FEED_FORMATS = ("ndjson", "json", "text", "rss")
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 30.0
+USER_AGENT = "ALADDIN-ThreatIntelligence/1.0"
+
+_HASH_RE = re.compile(r"^(?:[0-9a-fA-F]{32}|[0-9a-fA-F]{40}|[0-9a-fA-F]{64})$")
+_DOMAIN_RE = re.compile(
+    r"^(?=.{1,253}$)(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+"
+    r"[a-zA-Z][a-zA-Z0-9-]{1,62}$"
+)
+# Канонический IPv4 без ведущих нулей: проверка без ipaddress
+_IPV4_RE = re.compile(
+    r"^(?:(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)\.){3}"
+    r"(?:25[0-5]|2[0-4]\d|1\d\d|[1-9]?\d)$"
+)
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+_URL_RE = re.compile(r"^([a-zA-Z][a-zA-Z0-9+.-]*)://([^/?#]*)(.*)$")
+
+
+class FeedError(Exception):
+    """Ошибка загрузки или разбора ленты угроз"""
+
+
+def detect_ioc_type(value: str) -> Optional[str]:
+    """
+    Определение типа индикатора по значению.
+
+    Returns:
+        Значение IOCType ("ip_address", "url", "file_hash", "email",
+        "domain") или None, если тип не распознан
+    """
+    value = value.strip()
+    if not value:
+        return None
+    if _IPV4_RE.match(value):
+        return "ip_address"
+    if _URL_RE.match(value):
+        return "url"
+    try:
+        ipaddress.ip_address(value)
+        return "ip_address"
+    except ValueError:
+        pass
+    if _HASH_RE.match(value):
+        return "file_hash"
+    if _EMAIL_RE.match(value):
+        return "email"
+    if _DOMAIN_RE.match(value.rstrip(".")):
+        return "domain"
+    return None
+
+
+def normalize_ioc(ioc_type: str, value: str) -> str:
+    """
+    Каноническая форма индикатора для индекса.
+
+    IP-адреса приводятся к стандартной записи, домены, хеши и email - к
+    нижнему регистру, в URL в нижний регистр переводятся только схема и
+    хост (путь чувствителен к регистру).
+    """
+    value = value.strip()
+    if ioc_type == "ip_address":
+        if _IPV4_RE.match(value):
+            return value
+        try:
+            return str(ipaddress.ip_address(value))
+        except ValueError:
+            return value.lower()
+    if ioc_type == "domain":
+        return value.lower().rstrip(".")
+    if ioc_type == "url":
+        match = _URL_RE.match(value)
+        if match:
+            scheme, host, rest = match.groups()
+            return "{}://{}{}".format(scheme.lower(), host.lower(), rest)
+        return value
+    if ioc_type in ("file_hash", "email"):
+        return value.lower()
+    return value
+
+
+class IOCIndex:
+    """Обратный индекс (тип, значение) -> идентификаторы угроз"""
+
+    def __init__(self) -> None:
+        self._index: Dict[Tuple[str, str], Set[str]] = {}
+        self._by_threat: Dict[str, List[Tuple[str, str]]] = {}
+
+    def add(self, threat_id: str, iocs: Iterable[Tuple[str, str]]) -> int:
+        """
+        Привязка индикаторов к угрозе.
+
+        Args:
+            threat_id: Идентификатор угрозы
+            iocs: Пары (тип, значение); тип - значение IOCType
+
+        Returns:
+            int: Количество добавленных индикаторов
+        """
+        keys = self._by_threat.setdefault(threat_id, [])
+        added = 0
+        for ioc_type, value in iocs:
+            key = (ioc_type, normalize_ioc(ioc_type, value))
+            threats = self._index.setdefault(key, set())
+            if threat_id not in threats:
+                threats.add(threat_id)
+                keys.append(key)
+                added += 1
+        return added
+
+    def remove(self, threat_id: str) -> None:
+        """Удаление всех индикаторов угрозы из индекса"""
+        for key in self._by_threat.pop(threat_id, ()):
+            threats = self._index.get(key)
+            if threats is None:
+                continue
+            threats.discard(threat_id)
+            if not threats:
+                del self._index[key]
+
+    def lookup(self, value: str, ioc_type: Optional[str] = None) -> Set[str]:
+        """
+        Угрозы, в которых встречается индикатор.
+
+        Если тип не указан, он определяется по значению.
+        """
+        ioc_type = ioc_type or detect_ioc_type(value)
+        if ioc_type is None:
+            return set()
+        return set(
+            self._index.get((ioc_type, normalize_ioc(ioc_type, value)), ())
+        )
+
+    def clear(self) -> None:
+        """Очистка индекса"""
+        self._index.clear()
+        self._by_threat.clear()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, value: str) -> bool:
+        return bool(self.lookup(value))
+
+
+class _LineParser:
+    """Построчный разбор с переносом неполной строки между порциями"""
+
+    def __init__(self) -> None:
+        self._tail = b""
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        data = self._tail + chunk
+        lines = data.split(b"\n")
+        self._tail = lines.pop()
+        return self._parse_lines(lines)
+
+    def close(self) -> List[Dict[str, Any]]:
+        tail, self._tail = self._tail, b""
+        return self._parse_lines([tail])
+
+    def _parse_lines(self, lines: List[bytes]) -> List[Dict[str, Any]]:
+        records = []
+        for raw in lines:
+            line = raw.strip()
+            if not line or line.startswith(b"#"):
+                continue
+            record = self._parse_line(line)
+            if record is not None:
+                records.append(record)
+        return records
+
+    def _parse_line(self, line: bytes) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+
+class NDJSONParser(_LineParser):
+    """Лента из JSON-объектов, по одному на строку"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.errors = 0
+
+    def _parse_line(self, line: bytes) -> Optional[Dict[str, Any]]:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            self.errors += 1
+            return None
+        return record if isinstance(record, dict) else None
+
+
+class TextIOCParser(_LineParser):
+    """Список индикаторов (блок-лист), по одному на строку"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.errors = 0
+
+    def _parse_line(self, line: bytes) -> Optional[Dict[str, Any]]:
+        value = line.decode("utf-8", "replace").split()[0]
+        ioc_type = detect_ioc_type(value)
+        if ioc_type is None:
+            self.errors += 1
+            return None
+        return {"indicator": value, "ioc_type": ioc_type}
+
+
+class JSONParser:
+    """JSON-документ: массив записей или объект со списком записей"""
+
+    LIST_KEYS = ("threats", "data", "items", "results")
+
+    def __init__(self) -> None:
+        self._parts: List[bytes] = []
+        self.errors = 0
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        self._parts.append(chunk)
+        return []
+
+    def close(self) -> List[Dict[str, Any]]:
+        data, self._parts = b"".join(self._parts), []
+        if not data.strip():
+            return []
+        try:
+            document = json.loads(data)
+        except ValueError as e:
+            raise FeedError("Некорректный JSON: {}".format(e)) from e
+        if isinstance(document, dict):
+            for key in self.LIST_KEYS:
+                if isinstance(document.get(key), list):
+                    document = document[key]
+                    break
+            else:
+                document = [document]
+        if not isinstance(document, list):
+            return []
+        return [item for item in document if isinstance(item, dict)]
+
+
+class RSSParser:
+    """RSS 2.0 и Atom: записи формируются по закрытию <item>/<entry>"""
+
+    ATOM = "{http://www.w3.org/2005/Atom}"
+
+    def __init__(self) -> None:
+        self._parser = ET.XMLPullParser(events=("end",))
+        self.errors = 0
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        try:
+            self._parser.feed(chunk)
+        except ET.ParseError as e:
+            raise FeedError("Некорректный XML: {}".format(e)) from e
+        return self._collect()
+
+    def close(self) -> List[Dict[str, Any]]:
+        try:
+            self._parser.close()
+        except ET.ParseError as e:
+            raise FeedError("Некорректный XML: {}".format(e)) from e
+        return self._collect()
+
+    def _collect(self) -> List[Dict[str, Any]]:
+        records = []
+        for _, element in self._parser.read_events():
+            if element.tag == "item":
+                records.append(
+                    {
+                        "id": element.findtext("guid")
+                        or element.findtext("link"),
+                        "title": element.findtext("title") or "",
+                        "description": element.findtext("description")
+                        or "",
+                        "link": element.findtext("link"),
+                    }
+                )
+                element.clear()
+            elif element.tag == self.ATOM + "entry":
+                link = element.find(self.ATOM + "link")
+                records.append(
+                    {
+                        "id": element.findtext(self.ATOM + "id"),
+                        "title": element.findtext(self.ATOM + "title") or "",
+                        "description": element.findtext(self.ATOM + "summary")
+                        or "",
+                        "link": link.get("href") if link is not None else None,
+                    }
+                )
+                element.clear()
+        return records
+
+
+_PARSERS = {
+    "ndjson": NDJSONParser,
+    "json": JSONParser,
+    "text": TextIOCParser,
+    "rss": RSSParser,
+}
+
+
+def create_parser(feed_format: str):
+    """Инкрементальный парсер для формата ленты"""
+    try:
+        return _PARSERS[feed_format]()
+    except KeyError:
+        raise ValueError(
+            "Неизвестный формат ленты: {} (ожидается один из {})".format(
+                feed_format, ", ".join(FEED_FORMATS)
+            )
+        ) from None
+
+
+@dataclass
+class FeedSpec:
+    """Описание ленты"""
+
+    url: str
+    feed_format: str = "ndjson"
+    source: str = ""
+
+
+@dataclass
+class FeedState:
+    """Состояние ленты для условных запросов"""
+
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    last_status: Optional[int] = None
+    last_fetch: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "last_status": self.last_status,
+            "last_fetch": self.last_fetch,
+        }
+
+
+@dataclass
+class FeedResponse:
+    """Ответ ленты от подменяемого загрузчика"""
+
+    status: int
+    headers: Dict[str, str] = field(default_factory=dict)
+    body: bytes = b""
+
+
+@dataclass
+class FeedResult:
+    """Результат загрузки одной ленты"""
+
+    url: str
+    source: str
+    status: str  # updated | not_modified | error
+    http_status: Optional[int] = None
+    records: int = 0
+    parse_errors: int = 0
+    bytes_received: int = 0
+    duration: float = 0.0
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "source": self.source,
+            "status": self.status,
+            "http_status": self.http_status,
+            "records": self.records,
+            "parse_errors": self.parse_errors,
+            "bytes_received": self.bytes_received,
+            "duration": self.duration,
+            "error": self.error,
+        }
+
+
+RecordHandler = Callable[[FeedSpec, List[Dict[str, Any]]], None]
+# Загрузчик ленты: (url, заголовки условного запроса) -> ответ
+FeedFetcher = Callable[[str, Dict[str, str]], Awaitable[FeedResponse]]
+
+
+class ThreatFeedCollector:
+    """Параллельная загрузка лент с условными запросами"""
+
+    def __init__(
+        self,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        timeout: float = DEFAULT_TIMEOUT,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        user_agent: str = USER_AGENT,
+        fetcher: Optional[FeedFetcher] = None,
+    ) -> None:
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.user_agent = user_agent
+        self.fetcher = fetcher
+        self.states: Dict[str, FeedState] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {
+            "requests": 0,
+            "not_modified": 0,
+            "errors": 0,
+            "bytes_received": 0,
+            "records": 0,
+        }
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Сессия, общая для всех лент текущего event loop"""
+        loop = asyncio.get_running_loop()
+        if (
+            self._session is None
+            or self._session.closed
+            or self._session_loop is not loop
+        ):
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency, ttl_dns_cache=300
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"User-Agent": self.user_agent},
+            )
+            self._session_loop = loop
+        return self._session
+
+    async def close(self) -> None:
+        """Закрытие сессии и пула соединений"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
+
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Заголовки условного запроса по сохранённому состоянию"""
+        state = self.states.get(url)
+        headers = {}
+        if state is not None:
+            if state.etag:
+                headers["If-None-Match"] = state.etag
+            if state.last_modified:
+                headers["If-Modified-Since"] = state.last_modified
+        return headers
+
+    async def collect(
+        self, feeds: Iterable[FeedSpec], on_records: RecordHandler
+    ) -> List[FeedResult]:
+        """
+        Параллельная загрузка лент.
+
+        Args:
+            feeds: Ленты для загрузки
+            on_records: Обработчик порции разобранных записей; вызывается
+                в event loop по мере разбора тела ответа
+
+        Returns:
+            List[FeedResult]: Результаты в порядке переданных лент
+        """
+        feeds = list(feeds)
+        if not feeds:
+            return []
+        session = None if self.fetcher else await self._get_session()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def bounded(spec: FeedSpec) -> FeedResult:
+            async with semaphore:
+                return await self._fetch(session, spec, on_records)
+
+        return list(await asyncio.gather(*(bounded(f) for f in feeds)))
+
+    @asynccontextmanager
+    async def _open(
+        self,
+        session: Optional[aiohttp.ClientSession],
+        url: str,
+        headers: Dict[str, str],
+    ) -> AsyncIterator[Tuple[int, Any, AsyncIterator[bytes]]]:
+        """Ответ ленты: (статус, заголовки, порции тела)"""
+        if self.fetcher is not None:
+            response = await self.fetcher(url, headers)
+            yield response.status, response.headers, self._split_body(
+                response.body
+            )
+            return
+        async with session.get(url, headers=headers) as response:
+            yield response.status, response.headers, (
+                response.content.iter_chunked(self.chunk_size)
+            )
+
+    async def _split_body(self, body: bytes) -> AsyncIterator[bytes]:
+        """Тело ответа загрузчика порциями chunk_size"""
+        for offset in range(0, len(body), self.chunk_size):
+            yield body[offset : offset + self.chunk_size]
+
+    async def _fetch(
+        self,
+        session: Optional[aiohttp.ClientSession],
+        spec: FeedSpec,
+        on_records: RecordHandler,
+    ) -> FeedResult:
+        """Загрузка и потоковый разбор одной ленты"""
+        result = FeedResult(url=spec.url, source=spec.source, status="error")
+        start = time.perf_counter()
+        self.stats["requests"] += 1
+        try:
+            parser = create_parser(spec.feed_format)
+            headers = self.conditional_headers(spec.url)
+            async with self._open(session, spec.url, headers) as (
+                status,
+                response_headers,
+                chunks,
+            ):
+                result.http_status = status
+                if status == 304:
+                    result.status = "not_modified"
+                    self.stats["not_modified"] += 1
+                    self._remember(spec.url, status, response_headers)
+                    return result
+                if status >= 400:
+                    raise FeedError("HTTP {}".format(status))
+
+                async for chunk in chunks:
+                    result.bytes_received += len(chunk)
+                    records = parser.feed(chunk)
+                    if records:
+                        result.records += len(records)
+                        on_records(spec, records)
+                records = parser.close()
+                if records:
+                    result.records += len(records)
+                    on_records(spec, records)
+
+            # Валидаторы сохраняются только после полного разбора: при
+            # обрыве следующий запрос снова получит всё тело
+            self._remember(spec.url, status, response_headers)
+            result.status = "updated"
+            result.parse_errors = parser.errors
+        except (
+            aiohttp.ClientError,
+            asyncio.TimeoutError,
+            OSError,
+            FeedError,
+        ) as e:
+            result.error = str(e) or e.__class__.__name__
+            self.stats["errors"] += 1
+        except (ValueError, ET.ParseError) as e:
+            result.error = str(e)
+            self.stats["errors"] += 1
+        finally:
+            result.duration = time.perf_counter() - start
+            self.stats["bytes_received"] += result.bytes_received
+            self.stats["records"] += result.records
+        return result
+
+    def _remember(self, url: str, status: int, headers: Any) -> None:
+        state = self.states.setdefault(url, FeedState())
+        etag = headers.get("ETag")
+        last_modified = headers.get("Last-Modified")
+        if etag:
+            state.etag = etag
+        if last_modified:
+            state.last_modified = last_modified
+        state.last_status = status
+        state.last_fetch = time.time()
+
+    def export_state(self) -> Dict[str, Dict[str, Any]]:
+        """Состояние лент для сохранения между запусками"""
+        return {url: state.to_dict() for url, state in self.states.items()}
+
+    def load_state(self, data: Dict[str, Dict[str, Any]]) -> None:
+        """Восстановление состояния лент"""
+        for url, item in data.items():
+            self.states[url] = FeedState(
+                etag=item.get("etag"),
+                last_modified=item.get("last_modified"),
+                last_status=item.get("last_status"),
+                last_fetch=item.get("last_fetch"),
+            )
@@ -12,11 +12,12 @@ import logging
 import os
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from datetime import datetime
 from enum import Enum
 from functools import lru_cache
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 # Добавляем путь к модулям
 
@@ -94,6 +95,20 @@ def performance_monitor(operation_name: str):
         )
 
 
+def _run_coroutine(coro):
+    """Выполнение корутины из синхронного кода
+
+    Если в потоке уже работает event loop, корутина выполняется в
+    отдельном потоке со своим loop.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coro).result()
+
+
 def validate_threat_data(threat_data: Dict[str, Any]) -> bool:
     """Валидация данных угрозы
 
@@ -143,6 +158,23 @@ except ImportError:
             print("{}: {}".format(level.upper(), message))
 
 
+from security.ai_agents.threat_feed_collector import (  # noqa: E402
+    FeedFetcher,
+    FeedSpec,
+    IOCIndex,
+    ThreatFeedCollector,
+    detect_ioc_type,
+)
+
+# Формат лент по умолчанию для каждого типа источника
+DEFAULT_FEED_FORMATS = {
+    "open_source": "rss",
+    "commercial": "json",
+    "government": "rss",
+    "academic": "rss",
+}
+
+
 class ThreatType(Enum):
     """Типы угроз"""
 
@@ -439,7 +471,20 @@ class ThreatIntelligenceMetrics:
 class ThreatIntelligenceAgent(SecurityBase):
     """Агент разведки угроз ALADDIN"""
 
-    def __init__(self, name="ThreatIntelligenceAgent"):
+    def __init__(
+        self,
+        name="ThreatIntelligenceAgent",
+        sources: Optional[Dict[str, Dict[str, Any]]] = None,
+        feed_fetcher: Optional[FeedFetcher] = None,
+    ):
+        """
+        Args:
+            name: Имя агента
+            sources: Источники лент (source_name -> конфигурация); без
+                них загружается встроенный каталог с отключенными
+                публичными лентами
+            feed_fetcher: Загрузчик лент вместо aiohttp-сессии
+        """
         SecurityBase.__init__(self, name)
 
         # Конфигурация агента
@@ -456,6 +501,14 @@ class ThreatIntelligenceAgent(SecurityBase):
         self.threat_sources = {}  # source_name -> threat_source_data
         self.metrics = ThreatIntelligenceMetrics()
 
+        # Параллельный сбор лент и обратный индекс IOC
+        self.feed_collector = ThreatFeedCollector(fetcher=feed_fetcher)
+        self._configured_sources = sources
+        self.ioc_index = IOCIndex()  # (тип, значение) -> threat_id
+        self._content_hashes = {}  # threat_id -> хеш содержимого записи
+        self._pending_analysis = set()  # новые и изменённые угрозы
+        self.last_collection = {}
+
         # AI модели для анализа
         self.ml_models = {}
         self.threat_classifier = None
@@ -638,10 +691,22 @@ class ThreatIntelligenceAgent(SecurityBase):
         try:
             self.log_activity("Загрузка источников угроз...")
 
+            if self._configured_sources is not None:
+                self.sources = {
+                    name: dict(config)
+                    for name, config in self._configured_sources.items()
+                }
+                self.log_activity("Источники угроз загружены из конфигурации")
+                return
+
+            # Встроенный каталог: публичные ленты выключены и включаются
+            # явно (active=True), чтобы сбор не уходил в сеть по умолчанию
+
             # Открытые источники
             self.sources["open_source"] = {
                 "name": "Open Source Intelligence",
                 "type": "open_source",
+                "format": "rss",
                 "urls": [
                     "https://feeds.feedburner.com/Threatpost",
                     "https://krebsonsecurity.com/feed/",
@@ -649,43 +714,46 @@ class ThreatIntelligenceAgent(SecurityBase):
                 ],
                 "update_interval": 3600,  # 1 час
                 "reliability": 0.7,
-                "active": True,
+                "active": False,
             }
 
             # Коммерческие источники
             self.sources["commercial"] = {
                 "name": "Commercial Threat Intelligence",
                 "type": "commercial",
+                "format": "json",
                 "api_endpoints": [
                     "https://api.threatintel.com/v1/threats",
                     "https://api.securityfeeds.com/v2/iocs",
                 ],
                 "update_interval": 1800,  # 30 минут
                 "reliability": 0.9,
-                "active": True,
+                "active": False,
             }
 
             # Правительственные источники
             self.sources["government"] = {
                 "name": "Government Threat Intelligence",
                 "type": "government",
+                "format": "rss",
                 "urls": [
                     "https://www.cisa.gov/feeds",
                     "https://www.ncsc.gov.uk/feeds",
                 ],
                 "update_interval": 7200,  # 2 часа
                 "reliability": 0.95,
-                "active": True,
+                "active": False,
             }
 
             # Академические источники
             self.sources["academic"] = {
                 "name": "Academic Research",
                 "type": "academic",
+                "format": "rss",
                 "urls": ["https://research.university.edu/cyberthreats/feed"],
                 "update_interval": 86400,  # 24 часа
                 "reliability": 0.8,
-                "active": True,
+                "active": False,
             }
 
             self.log_activity("Источники угроз загружены успешно")
@@ -752,206 +820,244 @@ class ThreatIntelligenceAgent(SecurityBase):
             )
 
     def collect_threats(self):
-        """Сбор угроз из всех источников"""
-        try:
-            self.log_activity("Начало сбора угроз...")
-            start_time = time.time()
-
-            collected_threats = 0
-
-            for source_name, source_config in self.sources.items():
-                if source_config.get("active", False):
-                    threats = self._collect_from_source(
-                        source_name, source_config
-                    )
-                    collected_threats += len(threats)
+        """Сбор угроз из всех источников
 
-                    # Обновление метрик
-                    self.metrics.api_calls_made += 1
-                    if source_name not in self.metrics.source_errors:
-                        self.metrics.source_errors[source_name] = 0
-
-            # Обновление метрик
-            self.metrics.total_threats_collected += collected_threats
-            self.metrics.last_collection_time = datetime.now()
-            self.metrics.collection_duration = time.time() - start_time
-            self.metrics.collection_speed = (
-                collected_threats / (self.metrics.collection_duration / 60)
-                if self.metrics.collection_duration > 0
-                else 0
-            )
+        Синхронная обёртка над collect_threats_async: ленты загружаются
+        параллельно, сессия закрывается по завершении сбора.
 
+        Returns:
+            int: Количество новых и изменённых угроз
+        """
+        try:
+            self.log_activity("Начало сбора угроз...")
+            result = _run_coroutine(self._collect_and_close())
             self.log_activity(
-                "Сбор угроз завершен. Собрано: {}".format(collected_threats)
+                "Сбор угроз завершен. Собрано: {} (новых {}, изменено {}, "
+                "дубликатов {}, без изменений лент {})".format(
+                    result["collected_threats"],
+                    result["new"],
+                    result["changed"],
+                    result["duplicates"],
+                    result["not_modified"],
+                )
             )
-            return collected_threats
+            return result["collected_threats"]
 
         except Exception as e:
             self.log_activity("Ошибка сбора угроз: {}".format(str(e)), "error")
             return 0
 
-    def _collect_from_source(self, source_name, source_config):
-        """Сбор угроз из конкретного источника"""
+    async def _collect_and_close(self) -> Dict[str, Any]:
+        """Сбор угроз с закрытием HTTP-сессии в том же event loop"""
         try:
-            threats = []
-
-            if source_config["type"] == "open_source":
-                threats = self._collect_from_rss_feeds(source_config)
-            elif source_config["type"] == "commercial":
-                threats = self._collect_from_api(source_config)
-            elif source_config["type"] == "government":
-                threats = self._collect_from_government_feeds(source_config)
-            elif source_config["type"] == "academic":
-                threats = self._collect_from_academic_sources(source_config)
-
-            return threats
-
-        except Exception as e:
-            self.log_activity(
-                "Ошибка сбора из источника {}: {}".format(source_name, str(e)),
-                "error",
+            return await self.collect_threats_async()
+        finally:
+            await self.feed_collector.close()
+
+    def _build_feed_specs(self) -> List[FeedSpec]:
+        """Список лент активных источников"""
+        specs = []
+        for source_name, source_config in self.sources.items():
+            if not source_config.get("active", False):
+                continue
+            feed_format = source_config.get(
+                "format",
+                DEFAULT_FEED_FORMATS.get(source_config.get("type"), "ndjson"),
             )
-            return []
-
-    def _collect_from_rss_feeds(self, source_config):
-        """Сбор угроз из RSS лент"""
-        try:
-            threats = []
-
-            # Симуляция сбора из RSS лент
-            for i in range(5):  # Симулируем 5 угроз
-                threat = ThreatIntelligence(
-                    threat_id="rss_threat_{}_{}".format(int(time.time()), i),
-                    title="RSS Threat {}".format(i),
-                    description="Threat collected from RSS feed",
-                    threat_type=ThreatType.MALWARE,
-                    severity=ThreatSeverity.MEDIUM,
-                )
-
-                threat.set_source("RSS Feed", 0.7)
-                threat.add_ioc(IOCType.IP_ADDRESS, "192.168.1.{}".format(i))
-                threat.add_tag("rss_collected")
-
-                threats.append(threat)
-                self.threats[threat.threat_id] = threat
-
-            return threats
-
-        except Exception as e:
-            self.log_activity(
-                "Ошибка сбора из RSS лент: {}".format(str(e)), "error"
+            urls = list(source_config.get("urls", [])) + list(
+                source_config.get("api_endpoints", [])
             )
-            return []
+            for url in urls:
+                specs.append(FeedSpec(url, feed_format, source_name))
+        return specs
 
-    def _collect_from_api(self, source_config):
-        """Сбор угроз из API"""
+    @staticmethod
+    def _parse_enum(enum_cls, value, default):
+        """Значение перечисления из строки ленты или default"""
+        if isinstance(value, enum_cls):
+            return value
         try:
-            threats = []
-
-            # Симуляция сбора из API
-            for i in range(3):  # Симулируем 3 угрозы
-                threat = ThreatIntelligence(
-                    threat_id="api_threat_{}_{}".format(int(time.time()), i),
-                    title="API Threat {}".format(i),
-                    description="Threat collected from commercial API",
-                    threat_type=ThreatType.APT,
-                    severity=ThreatSeverity.HIGH,
-                )
-
-                threat.set_source("Commercial API", 0.9)
-                threat.add_ioc(IOCType.DOMAIN, "malicious{}.com".format(i))
-                threat.add_ioc(
-                    IOCType.FILE_HASH,
-                    hashlib.md5("malware_{}".format(i).encode()).hexdigest(),
-                )
-                threat.add_tag("api_collected")
+            return enum_cls(str(value).lower())
+        except ValueError:
+            return default
 
-                threats.append(threat)
-                self.threats[threat.threat_id] = threat
-
-            return threats
+    @staticmethod
+    def _record_threat_id(record: Dict[str, Any], content_hash: str) -> str:
+        """Идентификатор угрозы для записи ленты
 
-        except Exception as e:
-            self.log_activity(
-                "Ошибка сбора из API: {}".format(str(e)), "error"
+        Записи с одинаковым id (или одинаковым индикатором) из разных
+        лент сводятся к одной угрозе; без id угроза адресуется хешем
+        содержимого.
+        """
+        record_id = record.get("id") or record.get("threat_id")
+        if record_id:
+            return str(record_id)
+        indicator = record.get("indicator")
+        if indicator:
+            return "ioc:{}:{}".format(
+                record.get("ioc_type"), str(indicator).strip().lower()
             )
-            return []
+        return "threat_{}".format(content_hash[:16])
 
-    def _collect_from_government_feeds(self, source_config):
-        """Сбор угроз из правительственных источников"""
-        try:
-            threats = []
-
-            # Симуляция сбора из правительственных источников
-            for i in range(2):  # Симулируем 2 угрозы
-                threat = ThreatIntelligence(
-                    threat_id="gov_threat_{}_{}".format(int(time.time()), i),
-                    title="Government Threat {}".format(i),
-                    description="Threat collected from government source",
-                    threat_type=ThreatType.VULNERABILITY,
-                    severity=ThreatSeverity.CRITICAL,
-                )
-
-                threat.set_source("Government Feed", 0.95)
-                threat.add_ioc(IOCType.IP_ADDRESS, "10.0.0.{}".format(i))
-                threat.add_tag("government_collected")
+    def _ingest_record(
+        self,
+        spec: FeedSpec,
+        source_config: Dict[str, Any],
+        record: Dict[str, Any],
+    ) -> str:
+        """Приём записи ленты с дедупликацией по хешу содержимого
 
-                threats.append(threat)
-                self.threats[threat.threat_id] = threat
+        Returns:
+            str: "new", "changed" или "duplicate"
+        """
+        canonical = json.dumps(
+            record,
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":"),
+            default=str,
+        )
+        content_hash = hashlib.sha256(canonical.encode()).hexdigest()
+        threat_id = self._record_threat_id(record, content_hash)
+        previous = self._content_hashes.get(threat_id)
+        if previous == content_hash:
+            return "duplicate"
+
+        threat = self._threat_from_record(
+            threat_id, spec, source_config, record
+        )
+        existing = self.threats.get(threat_id)
+        if existing is not None:
+            threat.first_seen = existing.first_seen
+            self.ioc_index.remove(threat_id)
+        self.threats[threat_id] = threat
+        self._content_hashes[threat_id] = content_hash
+        self.ioc_index.add(
+            threat_id,
+            ((ioc["type"].value, ioc["value"]) for ioc in threat.iocs),
+        )
+        self._pending_analysis.add(threat_id)
+        return "changed" if previous is not None else "new"
 
-            return threats
+    def _threat_from_record(
+        self,
+        threat_id: str,
+        spec: FeedSpec,
+        source_config: Dict[str, Any],
+        record: Dict[str, Any],
+    ) -> "ThreatIntelligence":
+        """Преобразование записи ленты в ThreatIntelligence"""
+        indicator = record.get("indicator")
+        threat = ThreatIntelligence(
+            threat_id=threat_id,
+            title=str(record.get("title") or indicator or threat_id),
+            description=str(record.get("description") or ""),
+            threat_type=self._parse_enum(
+                ThreatType,
+                record.get("threat_type") or record.get("type"),
+                ThreatType.MALWARE,
+            ),
+            severity=self._parse_enum(
+                ThreatSeverity, record.get("severity"), ThreatSeverity.MEDIUM
+            ),
+        )
 
-        except Exception as e:
-            self.log_activity(
-                "Ошибка сбора из правительственных источников: {}".format(
-                    str(e)
-                ),
-                "error",
+        source = self._parse_enum(
+            ThreatSource, source_config.get("type"), None
+        )
+        if source is not None:
+            threat.set_source(source, source_config.get("reliability", 0.5))
+            threat.add_tag("{}_collected".format(source.value))
+
+        iocs = list(record.get("iocs") or [])
+        if indicator:
+            iocs.insert(
+                0, {"type": record.get("ioc_type"), "value": indicator}
+            )
+        added_at = datetime.now()
+        for item in iocs[: self.max_iocs_per_threat]:
+            if isinstance(item, dict):
+                value = item.get("value")
+                ioc_type = item.get("type")
+            else:
+                value, ioc_type = item, None
+            if not isinstance(value, str) or not value.strip():
+                continue
+            ioc_type = self._parse_enum(
+                IOCType, ioc_type or detect_ioc_type(value), None
+            )
+            if ioc_type is None:
+                continue
+            # Напрямую, без add_ioc: measure_time пишет в лог каждый вызов,
+            # а в больших лентах индикаторов сотни тысяч
+            threat.iocs.append(
+                {
+                    "type": ioc_type,
+                    "value": value.strip(),
+                    "description": "",
+                    "added_at": added_at,
+                }
             )
-            return []
 
-    def _collect_from_academic_sources(self, source_config):
-        """Сбор угроз из академических источников"""
-        try:
-            threats = []
+        for tag in record.get("tags") or []:
+            if isinstance(tag, str) and tag.strip():
+                threat.add_tag(tag)
+        if record.get("link"):
+            threat.references.append(record["link"])
+        threat.raw_data = record
+        return threat
+
+    def add_threat(self, threat: "ThreatIntelligence") -> None:
+        """Добавление угрозы вне лент (индексируется и ставится в анализ)"""
+        self.ioc_index.remove(threat.threat_id)
+        self.threats[threat.threat_id] = threat
+        self._content_hashes.pop(threat.threat_id, None)
+        self.ioc_index.add(
+            threat.threat_id,
+            (
+                (ioc["type"].value, ioc["value"])
+                for ioc in threat.iocs
+                if isinstance(ioc.get("type"), IOCType)
+            ),
+        )
+        self._pending_analysis.add(threat.threat_id)
 
-            # Симуляция сбора из академических источников
-            for i in range(1):  # Симулируем 1 угрозу
-                threat = ThreatIntelligence(
-                    threat_id="academic_threat_{}_{}".format(
-                        int(time.time()), i
-                    ),
-                    title="Academic Threat {}".format(i),
-                    description="Threat collected from academic research",
-                    threat_type=ThreatType.SOCIAL_ENGINEERING,
-                    severity=ThreatSeverity.MEDIUM,
-                )
+    def lookup_ioc(
+        self, value: str, ioc_type: "IOCType" = None
+    ) -> List["ThreatIntelligence"]:
+        """Угрозы, содержащие индикатор (обратный индекс, O(1))
 
-                threat.set_source("Academic Research", 0.8)
-                threat.add_ioc(IOCType.EMAIL, "phishing{}.edu".format(i))
-                threat.add_tag("academic_collected")
+        Args:
+            value: Значение индикатора (IP, домен, URL, хеш, email)
+            ioc_type: Тип индикатора; если не указан, определяется по
+                значению
 
-                threats.append(threat)
-                self.threats[threat.threat_id] = threat
+        Returns:
+            List[ThreatIntelligence]: Угрозы с этим индикатором
+        """
+        type_value = ioc_type.value if isinstance(ioc_type, IOCType) else None
+        return [
+            self.threats[threat_id]
+            for threat_id in sorted(self.ioc_index.lookup(value, type_value))
+            if threat_id in self.threats
+        ]
 
-            return threats
+    def analyze_threats(self, full=False):
+        """Анализ новых и изменённых угроз
 
-        except Exception as e:
-            self.log_activity(
-                "Ошибка сбора из академических источников: {}".format(str(e)),
-                "error",
-            )
-            return []
+        Args:
+            full (bool): Повторно проанализировать все угрозы
 
-    def analyze_threats(self):
-        """Анализ собранных угроз"""
+        Returns:
+            int: Количество проанализированных угроз
+        """
         try:
             self.log_activity("Начало анализа угроз...")
             start_time = time.time()
 
             analyzed_count = 0
 
-            for threat_id, threat in self.threats.items():
+            for threat in self._take_pending_threats(full):
                 # Анализ угрозы
                 self._analyze_single_threat(threat)
                 analyzed_count += 1
@@ -973,6 +1079,15 @@ class ThreatIntelligenceAgent(SecurityBase):
             )
             return 0
 
+    def _take_pending_threats(self, full=False) -> List["ThreatIntelligence"]:
+        """Угрозы, ожидающие анализа; очередь при этом очищается"""
+        if full:
+            threat_ids = list(self.threats)
+        else:
+            threat_ids = sorted(self._pending_analysis)
+        self._pending_analysis.clear()
+        return [self.threats[tid] for tid in threat_ids if tid in self.threats]
+
     def _analyze_single_threat(self, threat):
         """Анализ отдельной угрозы"""
         try:
@@ -1295,69 +1410,73 @@ class ThreatIntelligenceAgent(SecurityBase):
     async def collect_threats_async(self) -> Dict[str, Any]:
         """Асинхронный сбор угроз из всех источников
 
+        Ленты загружаются параллельно через общую HTTP-сессию с
+        условными запросами; записи принимаются по мере разбора.
+
         Returns:
             Dict с результатами сбора угроз
         """
         with performance_monitor("Асинхронный сбор угроз"):
             logger.info("Начало асинхронного сбора угроз")
-
-            tasks = []
-            for source_name, source_config in self.sources.items():
-                task = asyncio.create_task(
-                    self._collect_from_source_async(source_name, source_config)
-                )
-                tasks.append(task)
-
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            collected_threats = 0
+            start_time = time.time()
+            counts = {"new": 0, "changed": 0, "duplicate": 0}
+
+            def on_records(spec, records):
+                source_config = self.sources.get(spec.source, {})
+                for record in records:
+                    try:
+                        status = self._ingest_record(
+                            spec, source_config, record
+                        )
+                    except Exception as e:
+                        logger.error(
+                            f"Ошибка обработки записи {spec.url}: {e}"
+                        )
+                        continue
+                    counts[status] += 1
+
+            feeds = self._build_feed_specs()
+            results = await self.feed_collector.collect(feeds, on_records)
+
+            not_modified = 0
+            errors = 0
             for result in results:
-                if isinstance(result, dict) and "threats" in result:
-                    collected_threats += len(result["threats"])
-                elif isinstance(result, Exception):
-                    logger.error(f"Ошибка сбора из источника: {result}")
-
-            logger.info(f"Асинхронно собрано {collected_threats} угроз")
-            return {
-                "collected_threats": collected_threats,
-                "sources": len(tasks),
-            }
-
-    async def _collect_from_source_async(
-        self, source_name: str, source_config: Dict[str, Any]
-    ) -> Dict[str, Any]:
-        """Асинхронный сбор из конкретного источника
-
-        Args:
-            source_name: Имя источника
-            source_config: Конфигурация источника
-
-        Returns:
-            Dict с результатами сбора
-        """
-        try:
-            logger.info(f"Асинхронный сбор из источника: {source_name}")
-
-            # Имитация асинхронной работы
-            await asyncio.sleep(0.1)  # Имитация сетевого запроса
-
-            # В реальной реализации здесь будут асинхронные HTTP запросы
-            threats = []
+                self.metrics.api_calls_made += 1
+                self.metrics.source_errors.setdefault(result.source, 0)
+                if result.status == "not_modified":
+                    not_modified += 1
+                elif result.status == "error":
+                    errors += 1
+                    self.metrics.api_errors += 1
+                    self.metrics.source_errors[result.source] += 1
+                    logger.error(
+                        f"Ошибка сбора из {result.url}: {result.error}"
+                    )
 
-            return {
-                "source": source_name,
-                "threats": threats,
-                "status": "success",
-            }
+            collected_threats = counts["new"] + counts["changed"]
+            duration = time.time() - start_time
+            self.metrics.total_threats_collected += collected_threats
+            self.metrics.duplicate_iocs += counts["duplicate"]
+            self.metrics.unique_iocs = len(self.ioc_index)
+            self.metrics.last_collection_time = datetime.now()
+            self.metrics.collection_duration = duration
+            self.metrics.collection_speed = (
+                collected_threats / (duration / 60) if duration > 0 else 0
+            )
 
-        except Exception as e:
-            logger.error(f"Ошибка асинхронного сбора из {source_name}: {e}")
-            return {
-                "source": source_name,
-                "threats": [],
-                "status": "error",
-                "error": str(e),
+            self.last_collection = {
+                "collected_threats": collected_threats,
+                "new": counts["new"],
+                "changed": counts["changed"],
+                "duplicates": counts["duplicate"],
+                "not_modified": not_modified,
+                "errors": errors,
+                "sources": len(feeds),
+                "duration": duration,
+                "feeds": [result.to_dict() for result in results],
             }
+            logger.info(f"Асинхронно собрано {collected_threats} угроз")
+            return self.last_collection
 
     async def analyze_threats_async(self) -> Dict[str, Any]:
         """Асинхронный анализ угроз
@@ -1368,13 +1487,14 @@ class ThreatIntelligenceAgent(SecurityBase):
         with performance_monitor("Асинхронный анализ угроз"):
             logger.info("Начало асинхронного анализа угроз")
 
-            if not self.threats:
-                logger.warning("Нет угроз для анализа")
+            pending = self._take_pending_threats()
+            if not pending:
+                logger.info("Нет новых угроз для анализа")
                 return {"analyzed_threats": 0}
 
-            # Создаем задачи для анализа каждой угрозы
+            # Создаем задачи только для новых и изменённых угроз
             tasks = []
-            for threat_id, threat in self.threats.items():
+            for threat in pending:
                 task = asyncio.create_task(
                     self._analyze_single_threat_async(threat)
                 )
@@ -1408,10 +1528,8 @@ class ThreatIntelligenceAgent(SecurityBase):
             Dict с результатами анализа
         """
         try:
-            # Имитация асинхронной работы
-            await asyncio.sleep(0.05)  # Имитация обработки
-
-            # В реальной реализации здесь будет асинхронный анализ
+            self._analyze_single_threat(threat)
+            await asyncio.sleep(0)  # Отдаём управление event loop
             return {
                 "threat_id": threat.threat_id,
                 "status": "success",
@@ -18,6 +18,9 @@ VoiceAnalysisEngine - Движок анализа голоса и эмоций
 - Использует машинное обучение для классификации
 - Интегрирует с базами данных угроз
 - Применяет психолингвистический анализ
+- Потоково извлекает признаки из PCM (16 бит, моно) по кадрам:
+  оконное БПФ, спектральные центроид/спад/ширина, ZCR, энергия,
+  высота тона по автокорреляции - векторно в NumPy
 
 Автор: ALADDIN Security System
 Версия: 1.0
@@ -27,18 +30,25 @@ VoiceAnalysisEngine - Движок анализа голоса и эмоций
 
 import asyncio
 import logging
+import time
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
 
-# import numpy as np
 # import librosa
 # import torch
 # import torchaudio
 from typing import Any, Dict, List, Optional
 
+import numpy as np
+
 from core.base import SecurityBase
 
+# Порог вокализованности кадра: нормированная автокорреляция на периоде
+VOICING_THRESHOLD = 0.3
+PITCH_FMIN = 60.0
+PITCH_FMAX = 400.0
+
 
 class EmotionType(Enum):
     """Типы эмоций"""
@@ -83,6 +93,8 @@ class VoiceFeatures:
     spectral_bandwidth: float
     tempo: float
     rhythm: float
+    frame_count: int = 0
+    duration: float = 0.0
 
 
 @dataclass
@@ -113,6 +125,292 @@ class ManipulationIndicators:
     total_manipulation_score: float
 
 
+class _RunningMoments:
+    """Накопленные сумма и сумма квадратов (обновление за O(кадров))"""
+
+    __slots__ = ("count", "total", "total_sq", "minimum", "maximum")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.minimum = float("inf")
+        self.maximum = float("-inf")
+
+    def update(self, values: np.ndarray) -> None:
+        if len(values) == 0:
+            return
+        values = values.astype(np.float64, copy=False)
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.total_sq += float(np.dot(values, values))
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        if not self.count:
+            return 0.0
+        variance = self.total_sq / self.count - self.mean ** 2
+        return float(np.sqrt(max(variance, 0.0)))
+
+    @property
+    def range(self) -> float:
+        return self.maximum - self.minimum if self.count else 0.0
+
+
+class StreamingVoiceFeatures:
+    """
+    Потоковое извлечение признаков голоса из PCM int16 (моно).
+
+    Чанки произвольной длины добавляются через push(); хвост сигнала,
+    не покрытый полным кадром, хранится до следующего чанка, поэтому
+    результат не зависит от разбиения потока. Все признаки кадров
+    считаются векторно по матрице кадров (представление над буфером),
+    итоговые статистики накапливаются инкрементально.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 22050,
+        frame_length: int = 2048,
+        hop_length: int = 512,
+        n_mfcc: int = 13,
+        rolloff_percent: float = 0.85,
+    ):
+        self.sample_rate = sample_rate
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        self.n_mfcc = n_mfcc
+        self.rolloff_percent = rolloff_percent
+
+        self._window = np.hanning(frame_length).astype(np.float32)
+        self._freqs = np.fft.rfftfreq(frame_length, 1.0 / sample_rate)
+        self._min_lag = max(1, int(sample_rate / PITCH_FMAX))
+        self._max_lag = min(frame_length - 2, int(sample_rate / PITCH_FMIN))
+        self.reset()
+
+    def reset(self) -> None:
+        self._buffer = np.zeros(0, dtype=np.float32)
+        self._odd_byte = b""
+        self.samples_received = 0
+        self.frame_count = 0
+        self.pitch = _RunningMoments()
+        self.energy = _RunningMoments()
+        self.zcr = _RunningMoments()
+        self.centroid = _RunningMoments()
+        self.rolloff = _RunningMoments()
+        self.bandwidth = _RunningMoments()
+
+    @property
+    def duration(self) -> float:
+        return self.samples_received / self.sample_rate
+
+    def _decode(self, chunk: bytes) -> np.ndarray:
+        data = self._odd_byte + bytes(chunk) if self._odd_byte else chunk
+        usable = len(data) - len(data) % 2
+        self._odd_byte = bytes(data[usable:])
+        pcm = np.frombuffer(data, dtype="<i2", count=usable // 2)
+        return pcm.astype(np.float32) / 32768.0
+
+    def push(self, chunk: bytes) -> Dict[str, np.ndarray]:
+        """
+        Добавление чанка PCM и расчёт признаков новых кадров
+
+        Returns:
+            Dict[str, np.ndarray]: Признаки по кадрам, завершённым
+            этим чанком (массивы длины числа новых кадров)
+        """
+        samples = self._decode(chunk)
+        self.samples_received += len(samples)
+        if len(self._buffer):
+            samples = np.concatenate((self._buffer, samples))
+
+        if len(samples) < self.frame_length:
+            self._buffer = samples
+            return self._empty_batch()
+
+        n_frames = 1 + (len(samples) - self.frame_length) // self.hop_length
+        frames = np.lib.stride_tricks.sliding_window_view(
+            samples, self.frame_length
+        )[:: self.hop_length][:n_frames]
+        # Перекрытие: непокрытый хвост переходит в следующий чанк
+        self._buffer = samples[n_frames * self.hop_length:].copy()
+
+        batch = self._frame_features(frames)
+        self.frame_count += n_frames
+        self.energy.update(batch["energy"])
+        self.zcr.update(batch["zero_crossing_rate"])
+        self.centroid.update(batch["spectral_centroid"])
+        self.rolloff.update(batch["spectral_rolloff"])
+        self.bandwidth.update(batch["spectral_bandwidth"])
+        voiced = batch["pitch"]
+        self.pitch.update(voiced[voiced > 0])
+        return batch
+
+    def _empty_batch(self) -> Dict[str, np.ndarray]:
+        empty = np.zeros(0, dtype=np.float32)
+        return {
+            key: empty
+            for key in (
+                "energy",
+                "zero_crossing_rate",
+                "spectral_centroid",
+                "spectral_rolloff",
+                "spectral_bandwidth",
+                "pitch",
+            )
+        }
+
+    def _frame_features(self, frames: np.ndarray) -> Dict[str, np.ndarray]:
+        """Признаки матрицы кадров (n_frames, frame_length)"""
+        energy = np.sqrt(np.mean(frames * frames, axis=1))
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (
+            self.frame_length - 1
+        )
+
+        magnitude = np.abs(np.fft.rfft(frames * self._window, axis=1))
+        total = magnitude.sum(axis=1)
+        safe_total = np.where(total > 0, total, 1.0)
+        centroid = magnitude @ self._freqs / safe_total
+        spread = (self._freqs[None, :] - centroid[:, None]) ** 2
+        bandwidth = np.sqrt((magnitude * spread).sum(axis=1) / safe_total)
+        cumulative = np.cumsum(magnitude, axis=1)
+        rolloff_bin = np.argmax(
+            cumulative >= self.rolloff_percent * total[:, None], axis=1
+        )
+        rolloff = self._freqs[rolloff_bin]
+        silent = total <= 0
+        centroid[silent] = bandwidth[silent] = rolloff[silent] = 0.0
+
+        return {
+            "energy": energy,
+            "zero_crossing_rate": zcr,
+            "spectral_centroid": centroid,
+            "spectral_rolloff": rolloff,
+            "spectral_bandwidth": bandwidth,
+            "pitch": self._pitch(frames),
+        }
+
+    def _pitch(self, frames: np.ndarray) -> np.ndarray:
+        """
+        Высота тона по автокорреляции (0 - невокализованный кадр)
+
+        Автокорреляция через БПФ с дополнением нулями; лаг ищется в
+        диапазоне PITCH_FMIN..PITCH_FMAX и уточняется параболой.
+        """
+        centered = frames - frames.mean(axis=1, keepdims=True)
+        spectrum = np.fft.rfft(centered, n=2 * self.frame_length, axis=1)
+        autocorr = np.fft.irfft(
+            spectrum.real ** 2 + spectrum.imag ** 2, axis=1
+        )[:, : self._max_lag + 2]
+        zero_lag = autocorr[:, 0]
+        segment = autocorr[:, self._min_lag:self._max_lag + 1]
+        best = np.argmax(segment, axis=1)
+        lag = best + self._min_lag
+        rows = np.arange(len(frames))
+        peak = autocorr[rows, lag]
+        voiced = (zero_lag > 1e-9) & (
+            peak > VOICING_THRESHOLD * np.where(zero_lag > 0, zero_lag, 1.0)
+        )
+
+        left = autocorr[rows, lag - 1]
+        right = autocorr[rows, lag + 1]
+        denominator = left - 2 * peak + right
+        shift = np.where(
+            denominator != 0,
+            0.5 * (left - right) / np.where(denominator != 0, denominator, 1),
+            0.0,
+        )
+        refined = lag + np.clip(shift, -0.5, 0.5)
+        return np.where(voiced, self.sample_rate / refined, 0.0)
+
+    def features(self) -> "VoiceFeatures":
+        """Снимок накопленных признаков голоса"""
+        return VoiceFeatures(
+            pitch_mean=self.pitch.mean,
+            pitch_std=self.pitch.std,
+            pitch_range=self.pitch.range,
+            energy_mean=self.energy.mean,
+            energy_std=self.energy.std,
+            zero_crossing_rate=self.zcr.mean,
+            # MFCC требует мел-банка фильтров и здесь не рассчитываются
+            mfcc_features=[0.0] * self.n_mfcc,
+            spectral_centroid=self.centroid.mean,
+            spectral_rolloff=self.rolloff.mean,
+            spectral_bandwidth=self.bandwidth.mean,
+            tempo=120.0,  # Заглушка
+            rhythm=50.0,  # Заглушка
+            frame_count=self.frame_count,
+            duration=self.duration,
+        )
+
+
+class VoiceStream:
+    """
+    Сеанс потокового анализа звонка.
+
+    feed() принимает чанки PCM по мере поступления и каждые
+    score_interval секунд аудио возвращает промежуточную оценку
+    риска по накопленным признакам; finish() - итоговый результат.
+    """
+
+    def __init__(
+        self,
+        engine: "VoiceAnalysisEngine",
+        phone_number: str = "",
+        caller_name: str = "",
+        score_interval: float = 1.0,
+    ):
+        self.engine = engine
+        self.phone_number = phone_number
+        self.caller_name = caller_name
+        self.score_interval = score_interval
+        self.extractor = engine.create_feature_extractor()
+        self.processing_time = 0.0
+        self.last_result: Optional[Dict[str, Any]] = None
+        self._next_score_at = score_interval
+
+    async def feed(self, chunk: bytes) -> Optional[Dict[str, Any]]:
+        """Добавление чанка; результат, если подошло время оценки"""
+        start = time.perf_counter()
+        self.extractor.push(chunk)
+        self.processing_time += time.perf_counter() - start
+        if self.extractor.duration < self._next_score_at:
+            return None
+        while self._next_score_at <= self.extractor.duration:
+            self._next_score_at += self.score_interval
+        return await self._score(chunk, final=False)
+
+    async def finish(self) -> Dict[str, Any]:
+        """Итоговый анализ звонка (добавляется в историю движка)"""
+        return await self._score(b"", final=True)
+
+    async def _score(self, chunk: bytes, final: bool) -> Dict[str, Any]:
+        result = await self.engine._analyze_features(
+            self.extractor.features(),
+            chunk,
+            self.phone_number,
+            self.caller_name,
+        )
+        result["partial"] = not final
+        result["audio_duration"] = self.extractor.duration
+        result["real_time_factor"] = (
+            self.processing_time / self.extractor.duration
+            if self.extractor.duration
+            else 0.0
+        )
+        if final:
+            self.engine.add_to_history(result)
+        self.last_result = result
+        return result
+
+
 class VoiceAnalysisEngine(SecurityBase):
     """
     Движок анализа голоса и эмоций
@@ -137,8 +435,9 @@ class VoiceAnalysisEngine(SecurityBase):
         self.manipulation_patterns = self._initialize_manipulation_patterns()
 
         # Настройки анализа
-        self.sample_rate = 22050
-        self.hop_length = 512
+        self.sample_rate = self.config.get("sample_rate", 22050)
+        self.frame_length = self.config.get("frame_length", 2048)
+        self.hop_length = self.config.get("hop_length", 512)
         self.n_mfcc = 13
 
         # Дополнительные атрибуты для улучшенной функциональности
@@ -315,6 +614,34 @@ class VoiceAnalysisEngine(SecurityBase):
             ],
         }
 
+    def create_feature_extractor(self) -> StreamingVoiceFeatures:
+        """Потоковый экстрактор признаков с настройками движка"""
+        return StreamingVoiceFeatures(
+            sample_rate=self.sample_rate,
+            frame_length=self.frame_length,
+            hop_length=self.hop_length,
+            n_mfcc=self.n_mfcc,
+        )
+
+    def open_stream(
+        self,
+        phone_number: str = "",
+        caller_name: str = "",
+        score_interval: float = 1.0,
+    ) -> VoiceStream:
+        """
+        Сеанс потокового анализа живого звонка
+
+        Args:
+            phone_number: Номер телефона
+            caller_name: Имя звонящего
+            score_interval: Период промежуточной оценки (секунды аудио)
+
+        Returns:
+            VoiceStream: Сеанс (feed() для чанков PCM, finish())
+        """
+        return VoiceStream(self, phone_number, caller_name, score_interval)
+
     async def analyze_voice(
         self, audio_data: bytes, phone_number: str = "", caller_name: str = ""
     ) -> Dict[str, Any]:
@@ -322,7 +649,7 @@ class VoiceAnalysisEngine(SecurityBase):
         Анализ голоса на мошенничество
 
         Args:
-            audio_data: Аудиоданные
+            audio_data: Аудиоданные (PCM 16 бит, моно, sample_rate)
             phone_number: Номер телефона
             caller_name: Имя звонящего
 
@@ -337,6 +664,28 @@ class VoiceAnalysisEngine(SecurityBase):
             # Извлечение характеристик голоса
             voice_features = await self._extract_voice_features(audio_data)
 
+            result = await self._analyze_features(
+                voice_features, audio_data, phone_number, caller_name
+            )
+
+            # Добавляем в историю
+            self.add_to_history(result)
+
+            return result
+
+        except Exception as e:
+            self.logger.error(f"Ошибка анализа голоса: {e}")
+            return {"error": str(e), "risk_score": 0.5, "confidence": 0.0}
+
+    async def _analyze_features(
+        self,
+        voice_features: VoiceFeatures,
+        audio_data: bytes,
+        phone_number: str,
+        caller_name: str,
+    ) -> Dict[str, Any]:
+        """Оценка риска по извлечённым признакам голоса"""
+        try:
             # Анализ эмоций
             emotional_analysis = await self._analyze_emotions(voice_features)
 
@@ -384,9 +733,6 @@ class VoiceAnalysisEngine(SecurityBase):
                 }
             }
 
-            # Добавляем в историю
-            self.add_to_history(result)
-
             return result
 
         except Exception as e:
@@ -398,53 +744,15 @@ class VoiceAnalysisEngine(SecurityBase):
     ) -> VoiceFeatures:
         """Извлечение характеристик голоса"""
         try:
-            # Конвертация аудиоданных (для будущего использования)
-            # audio_array = list(audio_data)  # Упрощенная версия без numpy
-
-            # Упрощенное извлечение характеристик (заглушки)
-            pitch_values = [100, 120, 110, 130, 115]  # Заглушка
-            energy = [0.1, 0.2, 0.15, 0.18, 0.12]  # Заглушка
-            # mfcc = [[0.1] * self.n_mfcc]  # Заглушка для будущего
-            spectral_centroid = [1000, 1100, 1050, 1200, 1150]  # Заглушка
-            spectral_rolloff = [2000, 2100, 2050, 2200, 2150]  # Заглушка
-            spectral_bandwidth = [500, 550, 525, 600, 575]  # Заглушка
-            tempo = 120.0  # Заглушка
-            rhythm = 50.0  # Заглушка
-
-            return VoiceFeatures(
-                pitch_mean=(
-                    sum(pitch_values) / len(pitch_values)
-                    if pitch_values
-                    else 0
-                ),
-                pitch_std=50.0,  # Заглушка
-                pitch_range=(
-                    max(pitch_values) - min(pitch_values)
-                    if pitch_values
-                    else 0
-                ),
-                energy_mean=sum(energy) / len(energy) if energy else 0,
-                energy_std=0.05,  # Заглушка
-                zero_crossing_rate=0.1,  # Заглушка
-                mfcc_features=[0.1] * self.n_mfcc,
-                spectral_centroid=(
-                    sum(spectral_centroid) / len(spectral_centroid)
-                    if spectral_centroid
-                    else 0
-                ),
-                spectral_rolloff=(
-                    sum(spectral_rolloff) / len(spectral_rolloff)
-                    if spectral_rolloff
-                    else 0
-                ),
-                spectral_bandwidth=(
-                    sum(spectral_bandwidth) / len(spectral_bandwidth)
-                    if spectral_bandwidth
-                    else 0
-                ),
-                tempo=tempo,
-                rhythm=rhythm,
-            )
+            extractor = self.create_feature_extractor()
+            if len(audio_data) > self.sample_rate:
+                # Длинная запись - в пуле потоков, чтобы не блокировать
+                # event loop (NumPy отпускает GIL на БПФ)
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(None, extractor.push, audio_data)
+            else:
+                extractor.push(audio_data)
+            return extractor.features()
 
         except Exception as e:
             self.logger.error(f"Ошибка извлечения характеристик голоса: {e}")
@@ -670,6 +978,10 @@ class VoiceAnalysisEngine(SecurityBase):
         try:
             synthetic_probability = 0.1  # Базовый уровень
 
+            # Слишком короткая запись - признаков для оценки нет
+            if voice_features.frame_count == 0:
+                return synthetic_probability
+
             # Анализ на основе характеристик
             if voice_features.pitch_std < 10:  # Слишком стабильная высота тона
                 synthetic_probability += 0.3
@@ -18,10 +18,23 @@ import shutil
 import threading
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .scan_state import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_OVERLAP,
+    SCAN_INDEX_IN_MEMORY,
+    DirectoryScanReport,
+    FileState,
+    IncrementalDirectoryScan,
+    ScanStateIndex,
+    compute_db_version,
+    stream_match,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -88,6 +101,7 @@ class ScanResult:
     scan_status: ScanStatus
     scanned_at: datetime = field(default_factory=datetime.now)
     engine_used: str = ""
+    from_index: bool = False  # Результат взят из индекса без сканирования
 
 
 @dataclass
@@ -134,10 +148,29 @@ class AntivirusCore:
         self.max_file_size = self.config.get(
             "max_file_size", 100 * 1024 * 1024
         )  # 100MB
+        self.max_scan_results = self.config.get("max_scan_results", 10000)
+
+        # Инкрементальное сканирование директорий
+        self.chunk_size = self.config.get("chunk_size", DEFAULT_CHUNK_SIZE)
+        self.max_workers = self.config.get(
+            "max_workers", min(8, (os.cpu_count() or 1) + 2)
+        )
+        # По умолчанию индекс живет в памяти процесса; путь к файлу
+        # сохраняет его между запусками
+        self.scan_index_path = self.config.get(
+            "scan_index_path", SCAN_INDEX_IN_MEMORY
+        )
+        self._scan_index: Optional[ScanStateIndex] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._matchers: Dict[str, Callable[[str], Any]] = {}
+        self._overlap = DEFAULT_OVERLAP
+        self.db_version = ""
+        self.last_scan_report: Optional[DirectoryScanReport] = None
 
         # Статистика
         self.total_scans = 0
         self.threats_found = 0
+        self.total_threats = 0
         self.files_quarantined = 0
         self.uptime_start = datetime.now()
 
@@ -202,8 +235,23 @@ class AntivirusCore:
             signature = ThreatSignature(**sig_data)
             self.threat_signatures[signature.id] = signature
 
+        self._compile_signatures()
         logger.info(f"Загружено {len(self.threat_signatures)} сигнатур угроз")
 
+    def _compile_signatures(self):
+        """Подготовка матчеров активных сигнатур и версии базы"""
+        active = [s for s in self.threat_signatures.values() if s.active]
+        self._matchers = {
+            s.id: (lambda text, sig=s.signature: sig in text) for s in active
+        }
+        # Перекрытие фрагментов должно вмещать самую длинную сигнатуру
+        self._overlap = max(
+            [DEFAULT_OVERLAP] + [len(s.signature) for s in active]
+        )
+        self.db_version = compute_db_version(
+            (s.id, s.signature) for s in active
+        )
+
     def _start_background_tasks(self):
         """Запуск фоновых задач"""
         # Обновление сигнатур каждые 24 часа
@@ -244,6 +292,9 @@ class AntivirusCore:
             # Здесь должна быть логика обновления сигнатур
             logger.info("Обновление сигнатур угроз...")
             # В реальной системе здесь был бы запрос к серверу обновлений
+            # Новая версия базы делает записи индекса сканирования
+            # устаревшими, и файлы будут пересканированы
+            self._compile_signatures()
         except Exception as e:
             logger.error(f"Ошибка обновления сигнатур: {e}")
 
@@ -280,26 +331,37 @@ class AntivirusCore:
             logger.error(f"Ошибка вычисления хеша файла {file_path}: {e}")
             return ""
 
+    def _match_file(
+        self, file_path: str
+    ) -> Tuple[List[ThreatSignature], str, str, int]:
+        """Потоковая проверка сигнатур (файл не читается целиком)"""
+        found_ids, content_hash, file_hash, size = stream_match(
+            file_path, self._matchers, self.chunk_size, self._overlap
+        )
+        threats = [
+            self.threat_signatures[sig_id]
+            for sig_id in found_ids
+            if sig_id in self.threat_signatures
+        ]
+        for signature in threats:
+            logger.warning(
+                f"Найдена угроза {signature.name} в файле {file_path}"
+            )
+        return threats, content_hash, file_hash, size
+
     def _scan_file_content(self, file_path: str) -> List[ThreatSignature]:
         """Сканирование содержимого файла"""
-        threats_found = []
-
         try:
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                content = f.read()
-
-            # Проверка по сигнатурам
-            for signature in self.threat_signatures.values():
-                if signature.active and signature.signature in content:
-                    threats_found.append(signature)
-                    logger.warning(
-                        f"Найдена угроза {signature.name} в файле {file_path}"
-                    )
-
+            return self._match_file(file_path)[0]
         except Exception as e:
             logger.error(f"Ошибка сканирования файла {file_path}: {e}")
+            return []
 
-        return threats_found
+    def _store_result(self, result: ScanResult):
+        """Сохранение результата с вытеснением самых старых"""
+        self.scan_results[result.id] = result
+        while len(self.scan_results) > self.max_scan_results:
+            del self.scan_results[next(iter(self.scan_results))]
 
     async def scan_file(
         self, file_path: str, engine: str = "internal"
@@ -317,11 +379,8 @@ class AntivirusCore:
             if file_size > self.max_file_size:
                 raise ValueError(f"Файл слишком большой: {file_size} bytes")
 
-            # Вычисление хеша
-            file_hash = self._calculate_file_hash(file_path)
-
-            # Сканирование содержимого
-            threats = self._scan_file_content(file_path)
+            # Сканирование содержимого и хеш за один проход
+            threats, _, file_hash, _ = self._match_file(file_path)
 
             # Создание результата
             scan_time = time.time() - start_time
@@ -338,11 +397,12 @@ class AntivirusCore:
             )
 
             # Сохранение результата
-            self.scan_results[result.id] = result
+            self._store_result(result)
             self.total_scans += 1
 
             if result.threat_found:
                 self.threats_found += 1
+                self.total_threats += len(threats)
                 logger.warning(
                     f"Найдены угрозы в файле {file_path}: "
                     f"{[t.name for t in threats]}"
@@ -368,13 +428,110 @@ class AntivirusCore:
                 engine_used=engine,
             )
 
-            self.scan_results[result.id] = result
+            self._store_result(result)
             return result
 
+    def _get_scan_index(self) -> Optional[ScanStateIndex]:
+        if self._scan_index is None and self.scan_index_path:
+            self._scan_index = ScanStateIndex(self.scan_index_path)
+        return self._scan_index
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="antivirus_scan",
+            )
+        return self._executor
+
+    def _failed_result(self, file_path: str, engine: str) -> ScanResult:
+        return ScanResult(
+            id=str(uuid.uuid4()),
+            file_path=file_path,
+            file_size=0,
+            file_hash="",
+            threat_found=False,
+            threats=[],
+            scan_time=0,
+            scan_status=ScanStatus.FAILED,
+            engine_used=engine,
+        )
+
+    def _scan_path(
+        self, file_path: str, st: os.stat_result
+    ) -> Tuple[ScanResult, Optional[FileState]]:
+        """Сканирование файла в воркере пула (без общего состояния)"""
+        start_time = time.time()
+        if st.st_size > self.max_file_size:
+            logger.error(
+                f"Ошибка сканирования файла {file_path}: "
+                f"Файл слишком большой: {st.st_size} bytes"
+            )
+            return self._failed_result(file_path, "internal"), None
+        try:
+            threats, content_hash, file_hash, size = self._match_file(
+                file_path
+            )
+        except Exception as e:
+            logger.error(f"Ошибка сканирования файла {file_path}: {e}")
+            return self._failed_result(file_path, "internal"), None
+        result = ScanResult(
+            id=str(uuid.uuid4()),
+            file_path=file_path,
+            file_size=size,
+            file_hash=file_hash,
+            threat_found=len(threats) > 0,
+            threats=threats,
+            scan_time=time.time() - start_time,
+            scan_status=ScanStatus.COMPLETED,
+            engine_used="internal",
+        )
+        state = FileState(
+            path=file_path,
+            size=size,
+            mtime_ns=st.st_mtime_ns,
+            inode=st.st_ino,
+            content_hash=content_hash,
+            file_hash=file_hash,
+            db_version=self.db_version,
+            threat_ids=[t.id for t in threats],
+        )
+        return result, state
+
+    def _result_from_state(self, state: FileState) -> ScanResult:
+        """Результат для неизменённого файла из индекса"""
+        threats = [
+            self.threat_signatures[sig_id]
+            for sig_id in state.threat_ids
+            if sig_id in self.threat_signatures
+        ]
+        return ScanResult(
+            id=str(uuid.uuid4()),
+            file_path=state.path,
+            file_size=state.size,
+            file_hash=state.file_hash,
+            threat_found=len(threats) > 0,
+            threats=threats,
+            scan_time=0.0,
+            scan_status=ScanStatus.COMPLETED,
+            scanned_at=datetime.fromtimestamp(state.scanned_at),
+            engine_used="index",
+            from_index=True,
+        )
+
     async def scan_directory(
-        self, directory_path: str, recursive: bool = True
+        self,
+        directory_path: str,
+        recursive: bool = True,
+        incremental: bool = True,
     ) -> List[ScanResult]:
-        """Сканирование директории"""
+        """
+        Сканирование директории.
+
+        Файлы сканируются пулом из max_workers воркеров; при
+        incremental=True неизменённые файлы берутся из индекса
+        состояния сканирования. Сводка - в last_scan_report.
+        """
         results = []
 
         try:
@@ -383,30 +540,36 @@ class AntivirusCore:
                     f"Директория не найдена: {directory_path}"
                 )
 
-            # Получение списка файлов
-            files_to_scan = []
-            for root, dirs, files in os.walk(directory_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    files_to_scan.append(file_path)
-
-                if not recursive:
-                    break
-
-            logger.info(
-                f"Найдено {len(files_to_scan)} файлов для сканирования"
+            scan = IncrementalDirectoryScan(
+                self._get_scan_index() if incremental else None,
+                self.db_version,
+                self._get_executor(),
+                self.max_workers,
             )
-
-            # Сканирование файлов
-            for file_path in files_to_scan:
-                try:
-                    result = await self.scan_file(file_path)
-                    results.append(result)
-                except Exception as e:
-                    logger.error(f"Ошибка сканирования файла {file_path}: {e}")
+            results, report = await scan.run(
+                directory_path,
+                recursive,
+                self._scan_path,
+                self._result_from_state,
+                lambda result: result.threat_found,
+            )
+            for result in results:
+                if result.from_index:
+                    continue
+                self._store_result(result)
+                if result.scan_status == ScanStatus.COMPLETED:
+                    self.total_scans += 1
+                    if result.threat_found:
+                        self.threats_found += 1
+                        self.total_threats += len(result.threats)
+            self.last_scan_report = report
 
             logger.info(
-                f"Сканирование директории завершено: {len(results)} файлов"
+                f"Сканирование директории завершено: "
+                f"{report.files_total} файлов, "
+                f"пересканировано {report.files_rescanned}, "
+                f"пропущено {report.files_skipped + report.files_rehashed}, "
+                f"{report.files_per_second:.0f} файлов/с"
             )
 
         except Exception as e:
@@ -481,16 +644,10 @@ class AntivirusCore:
 
     def get_scan_statistics(self) -> Dict[str, Any]:
         """Получение статистики сканирования"""
-        total_threats = sum(
-            len(r.threats)
-            for r in self.scan_results.values()
-            if r.threat_found
-        )
-
         return {
             "total_scans": self.total_scans,
             "threats_found": self.threats_found,
-            "total_threats": total_threats,
+            "total_threats": self.total_threats,
             "files_quarantined": self.files_quarantined,
             "quarantine_items": len(self.quarantine_items),
             "active_signatures": len(
@@ -499,6 +656,12 @@ class AntivirusCore:
             "uptime": int(
                 (datetime.now() - self.uptime_start).total_seconds()
             ),
+            "db_version": self.db_version,
+            "last_directory_scan": (
+                self.last_scan_report.to_dict()
+                if self.last_scan_report
+                else None
+            ),
         }
 
     def get_status(self) -> Dict[str, Any]:
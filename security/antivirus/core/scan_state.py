@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scan State - Инкрементальное сканирование директорий
+
+Постоянный индекс состояния сканирования (путь -> размер, mtime, inode,
+хеш содержимого, версия базы сигнатур), потоковое сопоставление
+паттернов по фрагментам файла и ограниченный пул воркеров для обхода
+директорий. Неизменённые файлы при повторном сканировании пропускаются.
+"""
+
+import asyncio
+import codecs
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_OVERLAP = 4096
+INDEX_WRITE_BATCH = 500
+# Индекс в памяти процесса: файлы не создаются, состояние живет до
+# завершения процесса
+SCAN_INDEX_IN_MEMORY = ":memory:"
+
+
+@dataclass
+class FileState:
+    """Состояние файла на момент последнего сканирования"""
+
+    path: str
+    size: int
+    mtime_ns: int
+    inode: int
+    content_hash: str
+    file_hash: str
+    db_version: str
+    threat_ids: List[str] = field(default_factory=list)
+    scanned_at: float = field(default_factory=time.time)
+
+    def matches_stat(self, st: os.stat_result, db_version: str) -> bool:
+        """Файл не менялся и база сигнатур та же"""
+        return (
+            self.db_version == db_version
+            and self.size == st.st_size
+            and self.mtime_ns == st.st_mtime_ns
+            and self.inode == st.st_ino
+        )
+
+
+@dataclass
+class DirectoryScanReport:
+    """Отчёт о сканировании директории"""
+
+    directory: str
+    files_total: int = 0
+    files_rescanned: int = 0
+    files_skipped: int = 0
+    files_rehashed: int = 0
+    files_failed: int = 0
+    files_removed: int = 0
+    threats_found: int = 0
+    bytes_scanned: int = 0
+    duration: float = 0.0
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files_total / self.duration if self.duration else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        if not self.duration:
+            return 0.0
+        return self.bytes_scanned / (1024 * 1024) / self.duration
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "directory": self.directory,
+            "files_total": self.files_total,
+            "files_rescanned": self.files_rescanned,
+            "files_skipped": self.files_skipped,
+            "files_rehashed": self.files_rehashed,
+            "files_failed": self.files_failed,
+            "files_removed": self.files_removed,
+            "threats_found": self.threats_found,
+            "bytes_scanned": self.bytes_scanned,
+            "duration": round(self.duration, 4),
+            "files_per_second": round(self.files_per_second, 1),
+            "mb_per_second": round(self.mb_per_second, 2),
+        }
+
+
+class ScanStateIndex:
+    """Постоянный индекс состояния сканирования (SQLite)"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS scan_state (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                file_hash TEXT NOT NULL,
+                db_version TEXT NOT NULL,
+                threat_ids TEXT NOT NULL,
+                scanned_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get(self, path: str) -> Optional[FileState]:
+        row = self._conn.execute(
+            "SELECT path, size, mtime_ns, inode, content_hash, file_hash,"
+            " db_version, threat_ids, scanned_at"
+            " FROM scan_state WHERE path = ?",
+            (path,),
+        ).fetchone()
+        if row is None:
+            return None
+        return FileState(
+            path=row[0],
+            size=row[1],
+            mtime_ns=row[2],
+            inode=row[3],
+            content_hash=row[4],
+            file_hash=row[5],
+            db_version=row[6],
+            threat_ids=json.loads(row[7]),
+            scanned_at=row[8],
+        )
+
+    def put_many(self, states: Iterable[FileState]) -> None:
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO scan_state VALUES"
+            " (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    s.path,
+                    s.size,
+                    s.mtime_ns,
+                    s.inode,
+                    s.content_hash,
+                    s.file_hash,
+                    s.db_version,
+                    json.dumps(s.threat_ids),
+                    s.scanned_at,
+                )
+                for s in states
+            ],
+        )
+        self._conn.commit()
+
+    def prune(
+        self, directory: str, seen: Set[str], recursive: bool = True
+    ) -> int:
+        """Удаление записей о файлах директории, которых больше нет"""
+        prefix = os.path.join(directory, "")
+        rows = self._conn.execute(
+            "SELECT path FROM scan_state WHERE substr(path, 1, ?) = ?",
+            (len(prefix), prefix),
+        ).fetchall()
+        stale = [
+            (row[0],)
+            for row in rows
+            if row[0] not in seen
+            and (recursive or os.sep not in row[0][len(prefix):])
+        ]
+        if stale:
+            self._conn.executemany(
+                "DELETE FROM scan_state WHERE path = ?", stale
+            )
+            self._conn.commit()
+        return len(stale)
+
+    def __len__(self) -> int:
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM scan_state"
+        ).fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
+
+
+def compute_db_version(items: Iterable[Tuple[str, str]]) -> str:
+    """Версия базы сигнатур: хеш пар (id, сигнатура) активных записей"""
+    digest = hashlib.sha256()
+    for item_id, signature in sorted(items):
+        digest.update(item_id.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(signature.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def hash_file(file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> str:
+    """SHA-256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def stream_match(
+    file_path: str,
+    matchers: Dict[str, Callable[[str], Any]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    overlap: int = DEFAULT_OVERLAP,
+) -> Tuple[List[str], str, str, int]:
+    """
+    Потоковое сопоставление паттернов без чтения файла целиком.
+
+    Файл читается фрагментами; каждое окно заканчивается на границе
+    строки, незавершённая строка переносится в следующее окно (не
+    длиннее overlap символов), поэтому совпадения в пределах строки
+    не теряются на стыке фрагментов. Уже найденные паттерны повторно
+    не проверяются.
+
+    Returns:
+        (id найденных паттернов, sha256, md5, размер в байтах)
+    """
+    found: List[str] = []
+    pending = dict(matchers)
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    carry = ""
+    total = 0
+
+    def check(text: str) -> None:
+        for matcher_id, matcher in list(pending.items()):
+            if matcher(text):
+                found.append(matcher_id)
+                del pending[matcher_id]
+
+    with open(file_path, "rb") as f:
+        while True:
+            raw = f.read(chunk_size)
+            final = not raw
+            if raw:
+                total += len(raw)
+                sha256.update(raw)
+                md5.update(raw)
+            if not pending:
+                if final:
+                    break
+                continue
+            window = carry + decoder.decode(raw, final=final)
+            if final:
+                if window:
+                    check(window)
+                break
+            cut = window.rfind("\n")
+            if cut == -1:
+                check(window)
+                carry = window[-overlap:]
+            else:
+                check(window[: cut + 1])
+                carry = window[cut + 1:][-overlap:]
+
+    return found, sha256.hexdigest(), md5.hexdigest(), total
+
+
+def iter_files(
+    directory: str, recursive: bool = True
+) -> Iterator[Tuple[str, os.stat_result]]:
+    """Обход директории через os.scandir с получением stat"""
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive:
+                                stack.append(entry.path)
+                        elif entry.is_file(follow_symlinks=False):
+                            yield entry.path, entry.stat()
+                    except OSError as e:
+                        logger.error(f"Ошибка доступа к {entry.path}: {e}")
+        except OSError as e:
+            logger.error(f"Ошибка чтения директории {current}: {e}")
+
+
+ScanPathFunc = Callable[
+    [str, os.stat_result], Tuple[Any, Optional[FileState]]
+]
+
+
+class IncrementalDirectoryScan:
+    """
+    Инкрементальный обход директории ограниченным пулом воркеров.
+
+    scan_path выполняется в пуле потоков и возвращает результат
+    сканера и новое состояние файла (None при ошибке). from_state
+    восстанавливает результат для пропущенного неизменённого файла.
+    """
+
+    def __init__(
+        self,
+        index: Optional[ScanStateIndex],
+        db_version: str,
+        executor: ThreadPoolExecutor,
+        max_workers: int,
+    ):
+        self.index = index
+        self.db_version = db_version
+        self.executor = executor
+        self.max_workers = max(1, max_workers)
+
+    def _rehash_unchanged(
+        self, path: str, st: os.stat_result, cached: FileState
+    ) -> Optional[FileState]:
+        """Файл тронут (mtime/inode), но содержимое могло не измениться"""
+        try:
+            if hash_file(path) != cached.content_hash:
+                return None
+        except OSError:
+            return None
+        cached.mtime_ns = st.st_mtime_ns
+        cached.inode = st.st_ino
+        return cached
+
+    async def run(
+        self,
+        directory: str,
+        recursive: bool,
+        scan_path: ScanPathFunc,
+        from_state: Callable[[FileState], Any],
+        is_threat: Callable[[Any], bool],
+    ) -> Tuple[List[Any], DirectoryScanReport]:
+        report = DirectoryScanReport(directory=directory)
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        files = iter_files(directory, recursive)
+        results: List[Any] = []
+        seen: Set[str] = set()
+        pending_states: List[FileState] = []
+
+        def flush(force: bool = False) -> None:
+            if self.index is not None and pending_states and (
+                force or len(pending_states) >= INDEX_WRITE_BATCH
+            ):
+                self.index.put_many(pending_states)
+                pending_states.clear()
+
+        async def worker() -> None:
+            for path, st in files:
+                seen.add(path)
+                report.files_total += 1
+                cached = self.index.get(path) if self.index else None
+                result = None
+                if cached is not None:
+                    if cached.matches_stat(st, self.db_version):
+                        report.files_skipped += 1
+                        result = from_state(cached)
+                    elif (
+                        cached.size == st.st_size
+                        and cached.db_version == self.db_version
+                    ):
+                        state = await loop.run_in_executor(
+                            self.executor,
+                            self._rehash_unchanged,
+                            path,
+                            st,
+                            cached,
+                        )
+                        if state is not None:
+                            report.files_rehashed += 1
+                            pending_states.append(state)
+                            result = from_state(state)
+                if result is None:
+                    result, state = await loop.run_in_executor(
+                        self.executor, scan_path, path, st
+                    )
+                    if state is None:
+                        report.files_failed += 1
+                    else:
+                        report.files_rescanned += 1
+                        report.bytes_scanned += state.size
+                        pending_states.append(state)
+                if is_threat(result):
+                    report.threats_found += 1
+                results.append(result)
+                flush()
+
+        await asyncio.gather(*(worker() for _ in range(self.max_workers)))
+        flush(force=True)
+        if self.index is not None:
+            report.files_removed = self.index.prune(
+                directory, seen, recursive
+            )
+        report.duration = time.perf_counter() - start
+        return results, report
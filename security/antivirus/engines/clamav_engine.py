@@ -2,18 +2,34 @@
 # -*- coding: utf-8 -*-
 """
 ClamAV Engine - Интеграция с открытым антивирусом ClamAV
+
+Основной путь сканирования - протокол clamd: пул постоянных
+IDSESSION-соединений (Unix-сокет или TCP), потоковая передача файлов
+командой INSTREAM и конвейерная отправка нескольких файлов в одной
+сессии. Если clamd недоступен, движок поднимает собственный
+долгоживущий процесс clamd и только в крайнем случае запускает
+clamscan (асинхронно, без блокировки event loop).
 """
 
 import asyncio
 import logging
 import os
+import shutil
+import socket
+import struct
 import subprocess
+import tempfile
+import time
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_POOL_SIZE = 4
+DEFAULT_PIPELINE_DEPTH = 16
+
 
 @dataclass
 class ClamAVResult:
@@ -26,6 +42,275 @@ class ClamAVResult:
     error: Optional[str] = None
 
 
+class ClamdError(Exception):
+    """Ошибка протокола или соединения clamd"""
+
+
+def parse_clamd_address(address: str) -> Tuple[str, Any]:
+    """
+    Разбор адреса clamd.
+
+    "tcp://host:port" и "host:port" - TCP, всё остальное - путь
+    к Unix-сокету.
+    """
+    if address.startswith("tcp://"):
+        address = address[len("tcp://"):]
+    elif address.startswith("unix://"):
+        return "unix", address[len("unix://"):]
+    elif os.sep in address or not address.rpartition(":")[2].isdigit():
+        return "unix", address
+    host, _, port = address.rpartition(":")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+
+def parse_stream_reply(
+    reply: str,
+) -> Tuple[bool, Optional[str], Optional[str]]:
+    """
+    Разбор ответа INSTREAM.
+
+    Returns:
+        (clean, threat_name, error)
+    """
+    reply = reply.strip()
+    if reply.endswith("FOUND"):
+        body = reply[: -len("FOUND")].strip()
+        threat = body.split(": ", 1)[-1] if ": " in body else body
+        return False, threat or "Unknown", None
+    if reply.endswith("OK"):
+        return True, None, None
+    return True, None, reply or "Пустой ответ clamd"
+
+
+class _ClamdSession:
+    """Одно IDSESSION-соединение с clamd"""
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 1
+        self.last_used = time.monotonic()
+
+    async def start(self) -> None:
+        self.writer.write(b"zIDSESSION\0")
+        await self.writer.drain()
+
+    async def request(self, command: bytes) -> str:
+        """Отправка одной команды без данных в рамках сессии"""
+        request_id = self.next_id
+        self.next_id += 1
+        self.writer.write(b"z" + command + b"\0")
+        await self.writer.drain()
+        replies = await self._read_replies(1)
+        return replies[request_id]
+
+    async def instream_many(
+        self, file_paths: Sequence[str], chunk_size: int
+    ) -> List[str]:
+        """
+        Конвейерное сканирование: все INSTREAM отправляются подряд,
+        ответы собираются после по их идентификаторам.
+        """
+        ids = []
+        for file_path in file_paths:
+            with open(file_path, "rb") as f:
+                ids.append(self.next_id)
+                self.next_id += 1
+                self.writer.write(b"zINSTREAM\0")
+                while True:
+                    chunk = f.read(chunk_size)
+                    if not chunk:
+                        break
+                    self.writer.write(struct.pack("!L", len(chunk)))
+                    self.writer.write(chunk)
+                    await self.writer.drain()
+            self.writer.write(struct.pack("!L", 0))
+        await self.writer.drain()
+        replies = await self._read_replies(len(ids))
+        self.last_used = time.monotonic()
+        return [replies[request_id] for request_id in ids]
+
+    async def _read_replies(self, count: int) -> Dict[int, str]:
+        replies: Dict[int, str] = {}
+        while len(replies) < count:
+            try:
+                raw = await self.reader.readuntil(b"\0")
+            except asyncio.IncompleteReadError as e:
+                raise ClamdError("clamd закрыл соединение") from e
+            text = raw[:-1].decode("utf-8", "replace")
+            request_id, sep, body = text.partition(": ")
+            if not sep or not request_id.isdigit():
+                # Ошибка уровня сессии (например, превышен лимит)
+                raise ClamdError(text)
+            replies[int(request_id)] = body
+        return replies
+
+    async def close(self) -> None:
+        try:
+            self.writer.write(b"zEND\0")
+            await self.writer.drain()
+        except Exception:
+            pass
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except Exception:
+            pass
+
+
+class ClamdClient:
+    """
+    Асинхронный клиент протокола clamd с пулом сессий.
+
+    Соединения переиспользуются между вызовами: clamd держит базу
+    сигнатур в памяти, а клиент не платит за установку соединения
+    на каждый файл.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        pipeline_depth: int = DEFAULT_PIPELINE_DEPTH,
+        timeout: float = 300.0,
+        idle_timeout: float = 25.0,
+    ):
+        self.address = address
+        self.family, self.target = parse_clamd_address(address)
+        self.pool_size = max(1, pool_size)
+        self.chunk_size = chunk_size
+        self.pipeline_depth = max(1, pipeline_depth)
+        self.timeout = timeout
+        # clamd закрывает неактивные сессии (IdleTimeout, по умолчанию 30с)
+        self.idle_timeout = idle_timeout
+        self._idle: List[_ClamdSession] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def ping_sync(self, timeout: float = 1.0) -> bool:
+        """Синхронная проверка доступности (для инициализации)"""
+        try:
+            if self.family == "unix":
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            else:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+            try:
+                sock.connect(self.target)
+                sock.sendall(b"zPING\0")
+                return sock.recv(16).rstrip(b"\0") == b"PONG"
+            finally:
+                sock.close()
+        except OSError:
+            return False
+
+    async def _open_connection(
+        self,
+    ) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        if self.family == "unix":
+            return await asyncio.open_unix_connection(self.target)
+        host, port = self.target
+        return await asyncio.open_connection(host, port)
+
+    async def _acquire(self) -> _ClamdSession:
+        now = time.monotonic()
+        while self._idle:
+            session = self._idle.pop()
+            if now - session.last_used < self.idle_timeout:
+                return session
+            await session.close()
+        reader, writer = await self._open_connection()
+        session = _ClamdSession(reader, writer)
+        await session.start()
+        return session
+
+    def _release(self, session: _ClamdSession) -> None:
+        session.last_used = time.monotonic()
+        self._idle.append(session)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.pool_size)
+        return self._semaphore
+
+    async def _with_session(self, operation):
+        """Выполнение операции на сессии из пула с одним повтором"""
+        async with self._get_semaphore():
+            for attempt in range(2):
+                session = await self._acquire()
+                try:
+                    result = await asyncio.wait_for(
+                        operation(session), self.timeout
+                    )
+                except asyncio.TimeoutError:
+                    # С Python 3.11 это подкласс OSError: тайм-аут
+                    # не повторяем, иначе ожидание удваивается
+                    await session.close()
+                    raise
+                except (ClamdError, ConnectionError, OSError) as e:
+                    await session.close()
+                    if attempt or isinstance(e, FileNotFoundError):
+                        raise
+                    continue
+                except BaseException:
+                    await session.close()
+                    raise
+                self._release(session)
+                return result
+
+    async def ping(self) -> bool:
+        try:
+            reply = await self._with_session(
+                lambda session: session.request(b"PING")
+            )
+            return reply == "PONG"
+        except Exception:
+            return False
+
+    async def version(self) -> str:
+        return await self._with_session(
+            lambda session: session.request(b"VERSION")
+        )
+
+    async def reload(self) -> bool:
+        reply = await self._with_session(
+            lambda session: session.request(b"RELOAD")
+        )
+        return reply == "RELOADING"
+
+    async def instream(self, file_path: str) -> str:
+        replies = await self._with_session(
+            lambda session: session.instream_many(
+                [file_path], self.chunk_size
+            )
+        )
+        return replies[0]
+
+    async def instream_many(self, file_paths: Sequence[str]) -> List[str]:
+        """
+        Сканирование набора файлов: пакеты по pipeline_depth
+        распределяются по сессиям пула и отправляются конвейером.
+        """
+        batches = [
+            list(file_paths[i: i + self.pipeline_depth])
+            for i in range(0, len(file_paths), self.pipeline_depth)
+        ]
+
+        async def run_batch(batch: List[str]) -> List[str]:
+            return await self._with_session(
+                lambda session: session.instream_many(batch, self.chunk_size)
+            )
+
+        results = await asyncio.gather(*(run_batch(b) for b in batches))
+        return [reply for batch in results for reply in batch]
+
+    async def close(self) -> None:
+        while self._idle:
+            await self._idle.pop().close()
+
+
 class ClamAVEngine:
     """Движок ClamAV"""
 
@@ -35,16 +320,40 @@ class ClamAVEngine:
             "clamd_socket", "/var/run/clamav/clamd.ctl"
         )
         self.clamscan_path = self.config.get("clamscan_path", "clamscan")
+        self.clamd_path = self.config.get("clamd_path", "clamd")
         self.freshclam_path = self.config.get("freshclam_path", "freshclam")
+        self.daemon_start_timeout = self.config.get(
+            "daemon_start_timeout", 120.0
+        )
+        self.client = self._create_client(self.clamd_socket)
+        self._daemon: Optional[asyncio.subprocess.Process] = None
+        self._daemon_dir: Optional[str] = None
+        self._daemon_lock: Optional[asyncio.Lock] = None
+        # Режим работы: clamd, daemon (собственный clamd) или clamscan
+        self.mode: Optional[str] = None
         self.available = self._check_availability()
 
         if self.available:
-            logger.info("ClamAV Engine инициализирован")
+            logger.info(f"ClamAV Engine инициализирован (режим {self.mode})")
         else:
             logger.warning("ClamAV не доступен")
 
+    def _create_client(self, address: str) -> ClamdClient:
+        return ClamdClient(
+            address,
+            pool_size=self.config.get("pool_size", DEFAULT_POOL_SIZE),
+            chunk_size=self.config.get("chunk_size", DEFAULT_CHUNK_SIZE),
+            pipeline_depth=self.config.get(
+                "pipeline_depth", DEFAULT_PIPELINE_DEPTH
+            ),
+            timeout=self.config.get("scan_timeout", 300.0),
+        )
+
     def _check_availability(self) -> bool:
         """Проверка доступности ClamAV"""
+        if self.client.ping_sync():
+            self.mode = "clamd"
+            return True
         try:
             # Проверка clamscan
             result = subprocess.run(
@@ -55,65 +364,178 @@ class ClamAVEngine:
             )
             if result.returncode == 0:
                 logger.info(f"ClamAV версия: {result.stdout.strip()}")
+                self.mode = (
+                    "daemon" if shutil.which(self.clamd_path) else "clamscan"
+                )
                 return True
         except Exception as e:
             logger.error(f"Ошибка проверки ClamAV: {e}")
 
         return False
 
+    async def _ensure_daemon(self) -> None:
+        """Запуск собственного долгоживущего clamd (один на движок)"""
+        if self._daemon_lock is None:
+            self._daemon_lock = asyncio.Lock()
+        async with self._daemon_lock:
+            if self.mode != "daemon" or self._daemon is not None:
+                return
+            self._daemon_dir = tempfile.mkdtemp(prefix="aladdin_clamd_")
+            socket_path = os.path.join(self._daemon_dir, "clamd.sock")
+            config_path = os.path.join(self._daemon_dir, "clamd.conf")
+            with open(config_path, "w") as f:
+                f.write(f"LocalSocket {socket_path}\nForeground yes\n")
+            try:
+                self._daemon = await asyncio.create_subprocess_exec(
+                    self.clamd_path,
+                    f"--config-file={config_path}",
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.DEVNULL,
+                )
+                self.client = self._create_client(socket_path)
+                deadline = time.monotonic() + self.daemon_start_timeout
+                # Загрузка базы сигнатур занимает время
+                while time.monotonic() < deadline:
+                    if self._daemon.returncode is not None:
+                        break
+                    if await self.client.ping():
+                        logger.info("Запущен собственный процесс clamd")
+                        return
+                    await asyncio.sleep(0.5)
+            except Exception as e:
+                logger.error(f"Ошибка запуска clamd: {e}")
+            logger.warning("clamd не запустился, используется clamscan")
+            await self._stop_daemon()
+            self.mode = "clamscan"
+
+    async def _stop_daemon(self) -> None:
+        if self._daemon is not None and self._daemon.returncode is None:
+            self._daemon.terminate()
+            try:
+                await asyncio.wait_for(self._daemon.wait(), 10)
+            except asyncio.TimeoutError:
+                self._daemon.kill()
+        self._daemon = None
+        if self._daemon_dir:
+            shutil.rmtree(self._daemon_dir, ignore_errors=True)
+            self._daemon_dir = None
+
+    def _result_from_reply(
+        self, file_path: str, reply: str, scan_time: float
+    ) -> ClamAVResult:
+        clean, threat_name, error = parse_stream_reply(reply)
+        return ClamAVResult(
+            file_path=file_path,
+            clean=clean,
+            threat_name=threat_name,
+            scan_time=scan_time,
+            error=error,
+        )
+
     async def scan_file(self, file_path: str) -> ClamAVResult:
         """Сканирование файла через ClamAV"""
-        start_time = datetime.now()
+        results = await self.scan_files([file_path])
+        return results[0]
 
-        try:
-            if not self.available:
-                return ClamAVResult(
-                    file_path=file_path, clean=True, error="ClamAV не доступен"
+    async def scan_files(
+        self, file_paths: Sequence[str]
+    ) -> List[ClamAVResult]:
+        """
+        Сканирование нескольких файлов.
+
+        В режимах clamd/daemon файлы передаются потоком INSTREAM
+        конвейером по сессиям пула; scan_time - время на файл в пакете.
+        """
+        file_paths = list(file_paths)
+        if not file_paths:
+            return []
+        if not self.available:
+            return [
+                ClamAVResult(
+                    file_path=path, clean=True, error="ClamAV не доступен"
                 )
+                for path in file_paths
+            ]
+
+        if self.mode == "daemon":
+            await self._ensure_daemon()
+
+        if self.mode in ("clamd", "daemon"):
+            start_time = time.monotonic()
+            try:
+                replies = await self.client.instream_many(file_paths)
+            except Exception as e:
+                # Пакет целиком не прошёл - сканируем по одному, чтобы
+                # ошибка одного файла не затронула остальные
+                if len(file_paths) > 1:
+                    return list(
+                        await asyncio.gather(
+                            *(self.scan_file(path) for path in file_paths)
+                        )
+                    )
+                return [
+                    ClamAVResult(
+                        file_path=file_paths[0],
+                        clean=True,
+                        error=str(e),
+                        scan_time=time.monotonic() - start_time,
+                    )
+                ]
+            per_file = (time.monotonic() - start_time) / len(file_paths)
+            return [
+                self._result_from_reply(path, reply, per_file)
+                for path, reply in zip(file_paths, replies)
+            ]
+
+        return [await self._clamscan_file(path) for path in file_paths]
+
+    async def _clamscan_file(self, file_path: str) -> ClamAVResult:
+        """Резервный путь: отдельный процесс clamscan на файл"""
+        start_time = datetime.now()
+        process = None
 
-            # Команда сканирования
-            cmd = [
+        try:
+            # Выполнение сканирования
+            process = await asyncio.create_subprocess_exec(
                 self.clamscan_path,
                 "--no-summary",
                 "--infected",
                 "--stdout",
                 file_path,
-            ]
-
-            # Выполнение сканирования
-            result = subprocess.run(
-                cmd, capture_output=True, text=True, timeout=300
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            stdout, stderr = await asyncio.wait_for(
+                process.communicate(), timeout=300
             )
             scan_time = (datetime.now() - start_time).total_seconds()
+            output = stdout.decode("utf-8", "replace").strip()
 
-            if result.returncode == 0:
+            if process.returncode == 0:
                 # Файл чист
                 return ClamAVResult(
                     file_path=file_path, clean=True, scan_time=scan_time
                 )
-            elif result.returncode == 1:
+            elif process.returncode == 1:
                 # Найдена угроза
-                threat_name = (
-                    result.stdout.strip().split(": ")[-1]
-                    if result.stdout
-                    else "Unknown"
-                )
-                return ClamAVResult(
-                    file_path=file_path,
-                    clean=False,
-                    threat_name=threat_name,
-                    scan_time=scan_time,
+                return self._result_from_reply(
+                    file_path,
+                    output if output else "Unknown FOUND",
+                    scan_time,
                 )
             else:
                 # Ошибка сканирования
                 return ClamAVResult(
                     file_path=file_path,
                     clean=True,
-                    error=result.stderr or "Неизвестная ошибка",
+                    error=stderr.decode("utf-8", "replace")
+                    or "Неизвестная ошибка",
                     scan_time=scan_time,
                 )
 
-        except subprocess.TimeoutExpired:
+        except asyncio.TimeoutError:
+            if process is not None and process.returncode is None:
+                process.kill()
             return ClamAVResult(
                 file_path=file_path,
                 clean=True,
@@ -135,31 +557,45 @@ class ClamAVEngine:
                 return False
 
             logger.info("Обновление базы данных ClamAV...")
-            result = subprocess.run(
-                [self.freshclam_path],
-                capture_output=True,
-                text=True,
-                timeout=600,
+            process = await asyncio.create_subprocess_exec(
+                self.freshclam_path,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            _, stderr = await asyncio.wait_for(
+                process.communicate(), timeout=600
             )
 
-            if result.returncode == 0:
+            if process.returncode == 0:
                 logger.info("База данных ClamAV обновлена")
+                if self.mode in ("clamd", "daemon"):
+                    # clamd перечитывает базу без перезапуска
+                    await self.client.reload()
                 return True
             else:
-                logger.error(f"Ошибка обновления ClamAV: {result.stderr}")
+                logger.error(f"Ошибка обновления ClamAV: {stderr.decode()}")
                 return False
 
         except Exception as e:
             logger.error(f"Ошибка обновления ClamAV: {e}")
             return False
 
+    async def close(self) -> None:
+        """Закрытие сессий clamd и остановка собственного процесса"""
+        await self.client.close()
+        await self._stop_daemon()
+
     def get_status(self) -> Dict[str, Any]:
         """Получение статуса движка"""
         return {
             "engine": "ClamAV",
             "available": self.available,
+            "mode": self.mode,
             "clamd_socket": self.clamd_socket,
+            "clamd_address": self.client.address,
             "clamscan_path": self.clamscan_path,
+            "pool_size": self.client.pool_size,
+            "pipeline_depth": self.client.pipeline_depth,
         }
 
 
@@ -184,6 +620,7 @@ if __name__ == "__main__":
 
         # Очистка
         os.remove(test_file)
+        await clamav.close()
 
     # Запуск теста
     asyncio.run(test_clamav())
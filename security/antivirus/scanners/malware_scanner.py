@@ -9,10 +9,25 @@ import hashlib
 import logging
 import os
 import re
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from ..core.scan_state import (
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_OVERLAP,
+    SCAN_INDEX_IN_MEMORY,
+    DirectoryScanReport,
+    FileState,
+    IncrementalDirectoryScan,
+    ScanStateIndex,
+    compute_db_version,
+    stream_match,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -56,6 +71,8 @@ class MalwareScanResult:
     file_hash: str
     file_size: int
     scanned_at: datetime
+    from_index: bool = False  # Результат взят из индекса без сканирования
+    error: Optional[str] = None  # Ошибка сканирования файла
 
 
 class MalwareScanner:
@@ -64,7 +81,32 @@ class MalwareScanner:
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         self.config = config or {}
         self.patterns: List[MalwarePattern] = []
-        self.scan_results: List[MalwareScanResult] = []
+        self._matchers: Dict[str, Callable[[str], Any]] = {}
+        self.db_version = ""
+
+        # Последние результаты (ограниченный буфер) и накопительная статистика
+        self.scan_results: Deque[MalwareScanResult] = deque(
+            maxlen=self.config.get("max_scan_results", 10000)
+        )
+        self.total_scans = 0
+        self.files_with_threats = 0
+        self.total_threats = 0
+        self.threat_types: Dict[str, int] = {}
+
+        # Инкрементальное сканирование
+        self.chunk_size = self.config.get("chunk_size", DEFAULT_CHUNK_SIZE)
+        self.overlap = self.config.get("overlap", DEFAULT_OVERLAP)
+        self.max_workers = self.config.get(
+            "max_workers", min(8, (os.cpu_count() or 1) + 2)
+        )
+        # По умолчанию индекс живет в памяти процесса; путь к файлу
+        # сохраняет его между запусками
+        self.scan_index_path = self.config.get(
+            "scan_index_path", SCAN_INDEX_IN_MEMORY
+        )
+        self._scan_index: Optional[ScanStateIndex] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.last_scan_report: Optional[DirectoryScanReport] = None
 
         # Инициализация паттернов
         self._initialize_patterns()
@@ -177,10 +219,33 @@ class MalwareScanner:
         ]
 
         self.patterns = patterns
+        self._compile_patterns()
         logger.info(
             f"Загружено {len(self.patterns)} паттернов вредоносного ПО"
         )
 
+    def _compile_patterns(self):
+        """Предкомпиляция активных паттернов и расчёт версии базы"""
+        matchers = {}
+        for pattern in self.patterns:
+            if not pattern.active:
+                continue
+            try:
+                compiled = re.compile(
+                    pattern.pattern, re.IGNORECASE | re.MULTILINE
+                )
+            except re.error as e:
+                logger.error(
+                    f"Ошибка в регулярном выражении "
+                    f"{pattern.pattern}: {e}"
+                )
+                continue
+            matchers[pattern.id] = compiled.search
+        self._matchers = matchers
+        self.db_version = compute_db_version(
+            (p.id, p.pattern) for p in self.patterns if p.id in matchers
+        )
+
     def _calculate_file_hash(self, file_path: str) -> str:
         """Вычисление хеша файла"""
         try:
@@ -193,39 +258,44 @@ class MalwareScanner:
             logger.error(f"Ошибка вычисления хеша файла {file_path}: {e}")
             return ""
 
+    def _patterns_by_ids(self, pattern_ids: List[str]) -> List[MalwarePattern]:
+        found = set(pattern_ids)
+        return [p for p in self.patterns if p.id in found]
+
+    def _match_file(
+        self, file_path: str
+    ) -> Tuple[List[MalwarePattern], str, str, int]:
+        """Потоковое сопоставление паттернов (файл не читается целиком)"""
+        found_ids, content_hash, file_hash, size = stream_match(
+            file_path, self._matchers, self.chunk_size, self.overlap
+        )
+        threats = self._patterns_by_ids(found_ids)
+        for pattern in threats:
+            logger.warning(
+                f"Найден паттерн {pattern.name} в файле {file_path}"
+            )
+        return threats, content_hash, file_hash, size
+
     def _scan_file_content(self, file_path: str) -> List[MalwarePattern]:
         """Сканирование содержимого файла на вредоносное ПО"""
-        threats_found = []
-
         try:
-            # Чтение файла
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                content = f.read()
-
-            # Проверка по паттернам
-            for pattern in self.patterns:
-                if not pattern.active:
-                    continue
-
-                try:
-                    if re.search(
-                        pattern.pattern, content, re.IGNORECASE | re.MULTILINE
-                    ):
-                        threats_found.append(pattern)
-                        logger.warning(
-                            f"Найден паттерн {pattern.name} "
-                            f"в файле {file_path}"
-                        )
-                except re.error as e:
-                    logger.error(
-                        f"Ошибка в регулярном выражении "
-                        f"{pattern.pattern}: {e}"
-                    )
-
+            return self._match_file(file_path)[0]
         except Exception as e:
             logger.error(f"Ошибка сканирования файла {file_path}: {e}")
-
-        return threats_found
+            return []
+
+    def _record_result(self, result: MalwareScanResult):
+        """Сохранение результата и обновление статистики"""
+        self.scan_results.append(result)
+        self.total_scans += 1
+        if not result.clean:
+            self.files_with_threats += 1
+            self.total_threats += len(result.threats_found)
+            for threat in result.threats_found:
+                threat_type = threat.malware_type.value
+                self.threat_types[threat_type] = (
+                    self.threat_types.get(threat_type, 0) + 1
+                )
 
     async def scan_file(self, file_path: str) -> MalwareScanResult:
         """Сканирование файла на вредоносное ПО"""
@@ -236,12 +306,8 @@ class MalwareScanner:
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"Файл не найден: {file_path}")
 
-            # Получение информации о файле
-            file_size = os.path.getsize(file_path)
-            file_hash = self._calculate_file_hash(file_path)
-
-            # Сканирование содержимого
-            threats = self._scan_file_content(file_path)
+            # Сканирование содержимого и хеш за один проход
+            threats, _, file_hash, file_size = self._match_file(file_path)
 
             # Создание результата
             scan_time = (datetime.now() - start_time).total_seconds()
@@ -256,7 +322,7 @@ class MalwareScanner:
             )
 
             # Сохранение результата
-            self.scan_results.append(result)
+            self._record_result(result)
 
             if result.clean:
                 logger.info(f"Файл {file_path} чист от вредоносного ПО")
@@ -279,12 +345,95 @@ class MalwareScanner:
                 file_hash="",
                 file_size=0,
                 scanned_at=datetime.now(),
+                error=str(e),
+            )
+
+    def _get_scan_index(self) -> Optional[ScanStateIndex]:
+        if self._scan_index is None and self.scan_index_path:
+            self._scan_index = ScanStateIndex(self.scan_index_path)
+        return self._scan_index
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="malware_scan",
             )
+        return self._executor
+
+    def _scan_path(
+        self, file_path: str, st: os.stat_result
+    ) -> Tuple[MalwareScanResult, Optional[FileState]]:
+        """Сканирование файла в воркере пула (без общего состояния)"""
+        start_time = time.perf_counter()
+        try:
+            threats, content_hash, file_hash, size = self._match_file(
+                file_path
+            )
+        except Exception as e:
+            logger.error(f"Ошибка сканирования файла {file_path}: {e}")
+            return (
+                MalwareScanResult(
+                    file_path=file_path,
+                    clean=True,
+                    threats_found=[],
+                    scan_time=0,
+                    file_hash="",
+                    file_size=0,
+                    scanned_at=datetime.now(),
+                    error=str(e),
+                ),
+                None,
+            )
+        result = MalwareScanResult(
+            file_path=file_path,
+            clean=len(threats) == 0,
+            threats_found=threats,
+            scan_time=time.perf_counter() - start_time,
+            file_hash=file_hash,
+            file_size=size,
+            scanned_at=datetime.now(),
+        )
+        state = FileState(
+            path=file_path,
+            size=size,
+            mtime_ns=st.st_mtime_ns,
+            inode=st.st_ino,
+            content_hash=content_hash,
+            file_hash=file_hash,
+            db_version=self.db_version,
+            threat_ids=[p.id for p in threats],
+        )
+        return result, state
+
+    def _result_from_state(self, state: FileState) -> MalwareScanResult:
+        """Результат для неизменённого файла из индекса"""
+        threats = self._patterns_by_ids(state.threat_ids)
+        return MalwareScanResult(
+            file_path=state.path,
+            clean=len(threats) == 0,
+            threats_found=threats,
+            scan_time=0.0,
+            file_hash=state.file_hash,
+            file_size=state.size,
+            scanned_at=datetime.fromtimestamp(state.scanned_at),
+            from_index=True,
+        )
 
     async def scan_directory(
-        self, directory_path: str, recursive: bool = True
+        self,
+        directory_path: str,
+        recursive: bool = True,
+        incremental: bool = True,
     ) -> List[MalwareScanResult]:
-        """Сканирование директории на вредоносное ПО"""
+        """
+        Сканирование директории на вредоносное ПО.
+
+        Файлы сканируются пулом из max_workers воркеров; при
+        incremental=True файлы, не изменившиеся с прошлого сканирования
+        (и при той же версии базы паттернов), берутся из индекса.
+        Сводка сохраняется в last_scan_report.
+        """
         results = []
 
         try:
@@ -293,30 +442,30 @@ class MalwareScanner:
                     f"Директория не найдена: {directory_path}"
                 )
 
-            # Получение списка файлов
-            files_to_scan = []
-            for root, dirs, files in os.walk(directory_path):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    files_to_scan.append(file_path)
-
-                if not recursive:
-                    break
-
-            logger.info(
-                f"Найдено {len(files_to_scan)} файлов для сканирования"
+            scan = IncrementalDirectoryScan(
+                self._get_scan_index() if incremental else None,
+                self.db_version,
+                self._get_executor(),
+                self.max_workers,
             )
-
-            # Сканирование файлов
-            for file_path in files_to_scan:
-                try:
-                    result = await self.scan_file(file_path)
-                    results.append(result)
-                except Exception as e:
-                    logger.error(f"Ошибка сканирования файла {file_path}: {e}")
+            results, report = await scan.run(
+                directory_path,
+                recursive,
+                self._scan_path,
+                self._result_from_state,
+                lambda result: not result.clean,
+            )
+            for result in results:
+                if not result.from_index and result.error is None:
+                    self._record_result(result)
+            self.last_scan_report = report
 
             logger.info(
-                f"Сканирование директории завершено: {len(results)} файлов"
+                f"Сканирование директории завершено: "
+                f"{report.files_total} файлов, "
+                f"пересканировано {report.files_rescanned}, "
+                f"пропущено {report.files_skipped + report.files_rehashed}, "
+                f"{report.files_per_second:.0f} файлов/с"
             )
 
         except Exception as e:
@@ -326,27 +475,22 @@ class MalwareScanner:
 
         return results
 
+    def get_last_scan_report(self) -> Optional[Dict[str, Any]]:
+        """Сводка последнего сканирования директории"""
+        if self.last_scan_report is None:
+            return None
+        return self.last_scan_report.to_dict()
+
     def get_scan_statistics(self) -> Dict[str, Any]:
         """Получение статистики сканирования"""
-        total_scans = len(self.scan_results)
-        threats_found = sum(1 for r in self.scan_results if not r.clean)
-        total_threats = sum(len(r.threats_found) for r in self.scan_results)
-
-        # Статистика по типам угроз
-        threat_types = {}
-        for result in self.scan_results:
-            for threat in result.threats_found:
-                threat_type = threat.malware_type.value
-                threat_types[threat_type] = (
-                    threat_types.get(threat_type, 0) + 1
-                )
-
         return {
-            "total_scans": total_scans,
-            "threats_found": threats_found,
-            "total_threats": total_threats,
-            "threat_types": threat_types,
+            "total_scans": self.total_scans,
+            "threats_found": self.files_with_threats,
+            "total_threats": self.total_threats,
+            "threat_types": dict(self.threat_types),
             "active_patterns": len([p for p in self.patterns if p.active]),
+            "db_version": self.db_version,
+            "last_directory_scan": self.get_last_scan_report(),
         }
 
     def get_status(self) -> Dict[str, Any]:
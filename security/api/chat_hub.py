@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Chat Hub - Семейный чат в реальном времени для Mobile API
+
+Append-only журнал сообщений семьи с индексом по участнику и времени,
+курсорная пагинация истории и доставка всем подключённым устройствам
+участника через очереди отправки отдельных соединений.
+"""
+
+import asyncio
+import bisect
+import itertools
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEND_QUEUE_SIZE = 256
+DEFAULT_HISTORY_LIMIT = 50
+MAX_HISTORY_LIMIT = 200
+
+
+@dataclass
+class FamilyChatLog:
+    """
+    Append-only журнал сообщений одной семьи.
+
+    Сообщения получают возрастающий порядковый номер (seq), поэтому
+    индексы по участнику и по времени - отсортированные списки,
+    а чтение истории - бинарный поиск по курсору.
+    """
+
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    timestamps: List[float] = field(default_factory=list)
+    by_member: Dict[str, List[int]] = field(default_factory=dict)
+
+    def append(self, message: Dict[str, Any], created_at: float) -> int:
+        seq = len(self.messages)
+        message["seq"] = seq
+        self.messages.append(message)
+        # Время в журнале не убывает, даже если часы сдвинулись назад
+        if self.timestamps and created_at < self.timestamps[-1]:
+            created_at = self.timestamps[-1]
+        self.timestamps.append(created_at)
+        self.by_member.setdefault(message["member_id"], []).append(seq)
+        return seq
+
+    def history(
+        self,
+        member_id: str,
+        before: Optional[int] = None,
+        limit: int = DEFAULT_HISTORY_LIMIT,
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Сообщения участника от новых к старым до курсора before"""
+        seqs = self.by_member.get(member_id, [])
+        end = len(seqs) if before is None else bisect.bisect_left(
+            seqs, before
+        )
+        start = max(0, end - limit)
+        page = [self.messages[seq] for seq in reversed(seqs[start:end])]
+        next_cursor = seqs[start] if start > 0 else None
+        return page, next_cursor
+
+    def since(self, timestamp: float) -> List[Dict[str, Any]]:
+        """Сообщения семьи, созданные начиная с timestamp"""
+        start = bisect.bisect_left(self.timestamps, timestamp)
+        return self.messages[start:]
+
+
+class ChatConnection:
+    """Соединение устройства с собственной очередью отправки"""
+
+    _ids = itertools.count(1)
+
+    def __init__(
+        self,
+        websocket: Any,
+        family_id: str,
+        member_id: str,
+        queue_size: int = DEFAULT_SEND_QUEUE_SIZE,
+    ):
+        self.id = next(self._ids)
+        self.websocket = websocket
+        self.family_id = family_id
+        self.member_id = member_id
+        self.queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue(
+            maxsize=queue_size
+        )
+        self.sender_task: Optional[asyncio.Task] = None
+        self.sent = 0
+        self.closed = False
+
+    def enqueue(self, payload: str) -> bool:
+        """Постановка в очередь без ожидания; False - очередь переполнена"""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def run_sender(self) -> None:
+        """Отправка сообщений из очереди, пока соединение открыто"""
+        while True:
+            payload = await self.queue.get()
+            if payload is None:
+                break
+            try:
+                await self.websocket.send_text(payload)
+                self.sent += 1
+            except Exception as e:
+                logger.warning(f"Ошибка отправки в соединение {self.id}: {e}")
+                break
+        self.closed = True
+
+
+class ChatHub:
+    """Хаб семейного чата: журнал сообщений и доставка по соединениям"""
+
+    def __init__(self, send_queue_size: int = DEFAULT_SEND_QUEUE_SIZE):
+        self.send_queue_size = send_queue_size
+        self.logs: Dict[str, FamilyChatLog] = {}
+        # (family_id, member_id) -> {connection_id: connection}
+        self.connections: Dict[
+            Tuple[str, str], Dict[int, ChatConnection]
+        ] = {}
+        self.stats = {
+            "messages": 0,
+            "deliveries": 0,
+            "dropped_connections": 0,
+        }
+
+    def _log(self, family_id: str) -> FamilyChatLog:
+        log = self.logs.get(family_id)
+        if log is None:
+            log = self.logs[family_id] = FamilyChatLog()
+        return log
+
+    # --- соединения ---
+
+    def connect(
+        self, websocket: Any, family_id: str, member_id: str
+    ) -> ChatConnection:
+        """Регистрация соединения устройства и запуск его отправителя"""
+        connection = ChatConnection(
+            websocket, family_id, member_id, self.send_queue_size
+        )
+        self.connections.setdefault((family_id, member_id), {})[
+            connection.id
+        ] = connection
+        connection.sender_task = asyncio.ensure_future(
+            connection.run_sender()
+        )
+        return connection
+
+    async def disconnect(self, connection: ChatConnection) -> None:
+        """Удаление соединения за O(1) и остановка отправителя"""
+        self._remove(connection)
+        task = connection.sender_task
+        if task and not task.done():
+            try:
+                connection.queue.put_nowait(None)
+            except asyncio.QueueFull:
+                task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    def _remove(self, connection: ChatConnection) -> None:
+        connection.closed = True
+        key = (connection.family_id, connection.member_id)
+        devices = self.connections.get(key)
+        if devices is not None:
+            devices.pop(connection.id, None)
+            if not devices:
+                del self.connections[key]
+
+    async def _close_slow(self, connection: ChatConnection) -> None:
+        """Закрытие соединения клиента, не успевающего читать"""
+        if connection.sender_task:
+            connection.sender_task.cancel()
+        try:
+            # 1013 - Try Again Later
+            await connection.websocket.close(code=1013)
+        except Exception:
+            pass
+
+    def device_count(self, family_id: str, member_id: str) -> int:
+        return len(self.connections.get((family_id, member_id), {}))
+
+    # --- сообщения ---
+
+    def post_message(
+        self, family_id: str, message: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Запись сообщения в журнал и доставка всем устройствам
+        участника чата (member_id) и отправителя (sender_id).
+        """
+        self._log(family_id).append(message, time.time())
+        self.stats["messages"] += 1
+        self.fan_out(
+            family_id,
+            {message["member_id"], message["sender_id"]},
+            {"type": "new_message", "message": message},
+        )
+        return message
+
+    def fan_out(
+        self, family_id: str, member_ids: Set[str], event: Dict[str, Any]
+    ) -> int:
+        """
+        Рассылка события по очередям соединений.
+
+        JSON сериализуется один раз; соединения с переполненной очередью
+        (медленные клиенты) отключаются, чтобы не задерживать остальных.
+        """
+        payload = json.dumps(event, ensure_ascii=False)
+        delivered = 0
+        for member_id in member_ids:
+            devices = self.connections.get((family_id, member_id))
+            if not devices:
+                continue
+            for connection in list(devices.values()):
+                if connection.enqueue(payload):
+                    delivered += 1
+                else:
+                    self.stats["dropped_connections"] += 1
+                    self._remove(connection)
+                    asyncio.ensure_future(self._close_slow(connection))
+        self.stats["deliveries"] += delivered
+        return delivered
+
+    def send_to(self, connection: ChatConnection, event: Dict[str, Any]):
+        """Ответ одному соединению (pong, подтверждения)"""
+        connection.enqueue(json.dumps(event, ensure_ascii=False))
+
+    def get_history(
+        self,
+        family_id: str,
+        member_id: str,
+        before: Optional[int] = None,
+        limit: int = DEFAULT_HISTORY_LIMIT,
+    ) -> Dict[str, Any]:
+        """История чата с курсорной пагинацией (от новых к старым)"""
+        limit = max(1, min(limit, MAX_HISTORY_LIMIT))
+        log = self.logs.get(family_id)
+        if log is None:
+            return {"messages": [], "next_cursor": None}
+        messages, next_cursor = log.history(member_id, before, limit)
+        return {"messages": messages, "next_cursor": next_cursor}
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "families": len(self.logs),
+            "connections": sum(len(d) for d in self.connections.values()),
+        }
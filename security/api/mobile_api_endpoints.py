@@ -14,7 +14,9 @@ Mobile API Endpoints - FastAPI endpoints для мобильных прилож
 - QR Payment API (оплата через QR-коды)
 """
 
-from fastapi import FastAPI, HTTPException, Header, WebSocket, WebSocketDisconnect
+from fastapi import (
+    FastAPI, HTTPException, Header, Query, WebSocket, WebSocketDisconnect
+)
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
@@ -25,6 +27,16 @@ import json
 import logging
 import uuid
 
+try:
+    from security.api.chat_hub import (
+        ChatHub,
+        DEFAULT_HISTORY_LIMIT,
+        MAX_HISTORY_LIMIT,
+    )
+except ImportError:
+    # Запуск как скрипта из security/api
+    from chat_hub import ChatHub, DEFAULT_HISTORY_LIMIT, MAX_HISTORY_LIMIT
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -234,12 +246,11 @@ class CheckPaymentStatusResponse(BaseModel):
 
 devices_db: Dict[str, Device] = {}
 referral_db: Dict[str, ReferralInfo] = {}
-chat_messages_db: Dict[str, List[ChatMessage]] = {}
 energy_stats_db: Dict[str, VPNEnergyStats] = {}
 payment_db: Dict[str, Dict[str, Any]] = {}
 
-# WebSocket connections для чата
-active_chat_connections: Dict[str, List[WebSocket]] = {}
+# Семейный чат: журнал сообщений и WebSocket-соединения устройств
+chat_hub = ChatHub()
 
 # ═══════════════════════════════════════════════════════════════
 # 1. DEVICES API
@@ -456,87 +467,96 @@ async def get_referral_stats(authorization: str = Header(None)):
 # 3. FAMILY CHAT API
 # ═══════════════════════════════════════════════════════════════
 
+def _public_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Сообщения для клиента без внутреннего порядкового номера журнала"""
+    return [
+        {key: value for key, value in message.items() if key != "seq"}
+        for message in messages
+    ]
+
+
 @app.get("/api/chat/messages/{member_id}")
-async def get_chat_messages(member_id: str, authorization: str = Header(None)):
-    """Получить сообщения чата с членом семьи"""
+async def get_chat_messages(
+    member_id: str,
+    family_id: str = Query("default"),
+    limit: int = Query(DEFAULT_HISTORY_LIMIT, ge=1, le=MAX_HISTORY_LIMIT),
+    authorization: str = Header(None)
+):
+    """
+    Получить сообщения чата с членом семьи
+
+    Список последних сообщений от старых к новым, как и раньше.
+    Постраничное чтение истории - /api/chat/history/{member_id}.
+    """
     try:
-        # Mock сообщения
-        mock_messages = [
-            ChatMessage(
-                id=str(uuid.uuid4()),
-                member_id=member_id,
-                sender_id="parent_001",
-                sender_name="Мама",
-                sender_avatar="👩",
-                text="Привет! Как дела?",
-                timestamp=(datetime.now() - timedelta(hours=2)).isoformat(),
-                is_read=True
-            ),
-            ChatMessage(
-                id=str(uuid.uuid4()),
-                member_id=member_id,
-                sender_id=member_id,
-                sender_name="Маша",
-                sender_avatar="👧",
-                text="Хорошо! Делаю уроки",
-                timestamp=(datetime.now() - timedelta(hours=1, minutes=30)).isoformat(),
-                is_read=True
-            ),
-            ChatMessage(
-                id=str(uuid.uuid4()),
-                member_id=member_id,
-                sender_id="parent_001",
-                sender_name="Мама",
-                sender_avatar="👩",
-                text="Молодец! Не забудь про обед 🍽️",
-                timestamp=(datetime.now() - timedelta(minutes=15)).isoformat(),
-                is_read=False
-            )
-        ]
-        
+        history = chat_hub.get_history(family_id, member_id, None, limit)
+        messages = _public_messages(history["messages"][::-1])
         logger.info(f"✅ Chat messages returned for member: {member_id}")
-        return mock_messages
+        return messages
         
     except Exception as e:
         logger.error(f"❌ Error getting chat messages: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@app.get("/api/chat/history/{member_id}")
+async def get_chat_history(
+    member_id: str,
+    family_id: str = Query("default"),
+    before: Optional[int] = Query(None, ge=0),
+    limit: int = Query(DEFAULT_HISTORY_LIMIT, ge=1, le=MAX_HISTORY_LIMIT),
+    authorization: str = Header(None)
+):
+    """
+    Постраничная история чата с членом семьи
+
+    Сообщения возвращаются от новых к старым. Для следующей страницы
+    передайте next_cursor из ответа в параметре before.
+    """
+    try:
+        history = chat_hub.get_history(family_id, member_id, before, limit)
+        logger.info(
+            f"✅ Chat history returned for member: {member_id} "
+            f"({len(history['messages'])})"
+        )
+        return {
+            "messages": _public_messages(history["messages"]),
+            "next_cursor": history["next_cursor"],
+        }
+        
+    except Exception as e:
+        logger.error(f"❌ Error getting chat history: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _new_chat_message(member_id: str, sender_id: str, text: str) -> ChatMessage:
+    return ChatMessage(
+        id=str(uuid.uuid4()),
+        member_id=member_id,
+        sender_id=sender_id,
+        sender_name="Мама",  # В production из БД
+        sender_avatar="👩",
+        text=text,
+        timestamp=datetime.now().isoformat(),
+        is_read=False
+    )
+
+
 @app.post("/api/chat/send/{member_id}")
 async def send_chat_message(
     member_id: str,
     request: SendChatMessageRequest,
+    family_id: str = Query("default"),
     authorization: str = Header(None)
 ):
     """Отправить сообщение в чат"""
     try:
-        message_id = str(uuid.uuid4())
-        
-        new_message = ChatMessage(
-            id=message_id,
-            member_id=member_id,
-            sender_id=request.sender_id,
-            sender_name="Мама",  # В production из БД
-            sender_avatar="👩",
-            text=request.text,
-            timestamp=datetime.now().isoformat(),
-            is_read=False
+        new_message = _new_chat_message(
+            member_id, request.sender_id, request.text
         )
         
-        # Сохраняем сообщение
-        if member_id not in chat_messages_db:
-            chat_messages_db[member_id] = []
-        chat_messages_db[member_id].append(new_message)
-        
-        # Отправляем через WebSocket всем подключенным клиентам
-        if member_id in active_chat_connections:
-            for connection in active_chat_connections[member_id]:
-                try:
-                    await connection.send_json({
-                        "type": "new_message",
-                        "message": new_message.dict()
-                    })
-                except:
-                    pass
+        # Сохраняем сообщение и рассылаем всем устройствам участников
+        chat_hub.post_message(family_id, new_message.dict())
         
         logger.info(f"✅ Message sent to member: {member_id}")
         return new_message
@@ -546,14 +566,16 @@ async def send_chat_message(
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.websocket("/ws/chat/{member_id}")
-async def websocket_chat(websocket: WebSocket, member_id: str):
+async def websocket_chat(
+    websocket: WebSocket,
+    member_id: str,
+    family_id: str = Query("default")
+):
     """WebSocket для real-time чата"""
     await websocket.accept()
     
-    # Добавляем соединение
-    if member_id not in active_chat_connections:
-        active_chat_connections[member_id] = []
-    active_chat_connections[member_id].append(websocket)
+    # Регистрируем устройство: у соединения своя очередь отправки
+    connection = chat_hub.connect(websocket, family_id, member_id)
     
     logger.info(f"✅ WebSocket connected for member: {member_id}")
     
@@ -562,22 +584,29 @@ async def websocket_chat(websocket: WebSocket, member_id: str):
             # Ожидаем сообщения от клиента
             data = await websocket.receive_text()
             message_data = json.loads(data)
+            message_type = message_data.get("type")
             
             # Обрабатываем сообщение
-            if message_data.get("type") == "ping":
-                await websocket.send_json({"type": "pong"})
-            
-            # Эхо для тестирования
-            await websocket.send_json({
-                "type": "message_received",
-                "data": message_data
-            })
+            if message_type == "ping":
+                chat_hub.send_to(connection, {"type": "pong"})
+            elif message_type == "message" and message_data.get("text"):
+                new_message = _new_chat_message(
+                    message_data.get("member_id", member_id),
+                    message_data.get("sender_id", member_id),
+                    message_data["text"],
+                )
+                chat_hub.post_message(family_id, new_message.dict())
+            else:
+                chat_hub.send_to(connection, {
+                    "type": "message_received",
+                    "data": message_data
+                })
             
     except WebSocketDisconnect:
-        # Удаляем соединение
-        if member_id in active_chat_connections:
-            active_chat_connections[member_id].remove(websocket)
         logger.info(f"✅ WebSocket disconnected for member: {member_id}")
+    finally:
+        # Удаляем соединение
+        await chat_hub.disconnect(connection)
 
 # ═══════════════════════════════════════════════════════════════
 # 4. VPN ENERGY STATS API
@@ -5,13 +5,15 @@
 Дата: 2025-09-21
 """
 
-import asyncio
+import bisect
 import logging
 import re
+from collections import Counter, OrderedDict
 from dataclasses import dataclass
 # from datetime import datetime  # TODO: Добавить при реализации
 # timestamp функций
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Pattern, Sequence, Tuple
+from urllib.parse import urlsplit
 
 from security.bots.parental_control_bot import (
     ContentAnalysisRequest,
@@ -29,6 +31,8 @@ class AnalysisStats:
     blocks_by_category: Dict[str, int] = None
     blocks_by_age_group: Dict[str, int] = None
     average_risk_score: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
 
     def __post_init__(self):
         if self.blocks_by_category is None:
@@ -37,13 +41,42 @@ class AnalysisStats:
             self.blocks_by_age_group = {}
 
 
+# Домен в паттерне без метасимволов regex (например, r"youtube\.com")
+_DOMAIN_PATTERN = re.compile(r"^[a-z0-9-]+(?:\\\.[a-z0-9-]+)+$")
+_URL_SPLIT = re.compile(r"[\/\?\&\=]")
+
+# Минимальный возраст по категориям
+AGE_LIMITS = {
+    ContentCategory.EDUCATIONAL: 0,
+    ContentCategory.NEWS: 8,
+    ContentCategory.SHOPPING: 12,
+    ContentCategory.ENTERTAINMENT: 6,
+    ContentCategory.SOCIAL: 13,
+    ContentCategory.GAMING: 8,
+    ContentCategory.ADULT: 18,
+    ContentCategory.UNKNOWN: 10,
+}
+_AGE_THRESHOLDS = sorted(set(AGE_LIMITS.values()))
+
+
 class ContentAnalyzer:
-    """Анализатор контента"""
+    """
+    Анализатор контента.
 
-    def __init__(self, logger: logging.Logger):
+    Паттерны URL и ключевые слова компилируются в общие регулярные
+    выражения, известные домены разрешаются через таблицу хостов, а
+    результаты кэшируются в ограниченном LRU по нормализованному URL и
+    возрастной группе. Анализ не содержит точек await, поэтому кэш и
+    статистика обновляются атомарно в рамках event loop без блокировки.
+    """
+
+    def __init__(self, logger: logging.Logger, cache_size: int = 50000):
         self.logger = logger
         self.stats = AnalysisStats()
-        self._lock = asyncio.Lock()
+        self._category_counts: Counter = Counter()
+        self._risk_sum = 0.0
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, int], tuple]" = OrderedDict()
 
         # Паттерны для анализа URL
         self.url_patterns = {
@@ -160,6 +193,92 @@ class ContentAnalyzer:
             ],
         }
 
+        self._compile_matchers()
+
+    def _compile_matchers(self):
+        """
+        Компиляция паттернов и ключевых слов в общие матчеры.
+
+        Альтернативы оборачиваются в опережающую проверку и упорядочены
+        по приоритету категорий, поэтому один проход finditer находит
+        ту же категорию, что и последовательный перебор паттернов.
+        Для паттернов-доменов строится таблица хостов; при попадании в
+        неё остаётся проверить только более приоритетные категории.
+        """
+        categories = list(self.url_patterns.keys())
+        self._category_priority = {c: i for i, c in enumerate(categories)}
+        self._categories = categories
+
+        # matchers[k] - общий regex для категорий с приоритетом < k
+        self._prefix_matchers: List[Optional[Pattern]] = [
+            self._build_matcher(
+                [(c, self.url_patterns[c]) for c in categories[:k]]
+            )
+            for k in range(len(categories) + 1)
+        ]
+
+        self._host_categories: Dict[str, ContentCategory] = {}
+        for category in reversed(categories):
+            for pattern in self.url_patterns[category]:
+                if _DOMAIN_PATTERN.match(pattern):
+                    host = pattern.replace("\\.", ".")
+                    self._host_categories[host] = category
+
+        keyword_categories = list(self.keywords.keys())
+        self._keyword_categories = keyword_categories
+        self._keyword_matcher = self._build_matcher(
+            [
+                (c, [re.escape(k.lower()) for k in self.keywords[c]])
+                for c in keyword_categories
+            ]
+        )
+        self._cache.clear()
+
+    @staticmethod
+    def _build_matcher(
+        groups: Sequence[Tuple[ContentCategory, List[str]]]
+    ) -> Optional[Pattern]:
+        alternatives = [
+            "(?P<c{}>{})".format(i, "|".join(patterns))
+            for i, (_, patterns) in enumerate(groups)
+            if patterns
+        ]
+        if not alternatives:
+            return None
+        return re.compile("(?=(?:{}))".format("|".join(alternatives)))
+
+    @staticmethod
+    def _first_group(
+        matcher: Optional[Pattern], text: str
+    ) -> Optional[int]:
+        """Индекс наиболее приоритетной сработавшей группы"""
+        if matcher is None:
+            return None
+        best = None
+        for match in matcher.finditer(text):
+            index = int(match.lastgroup[1:])
+            if best is None or index < best:
+                best = index
+                if best == 0:
+                    break
+        return best
+
+    @staticmethod
+    def normalize_url(url: str) -> str:
+        """
+        Ключ кэша для URL.
+
+        Категория, риск и ключевые слова не зависят от регистра, поэтому
+        URL приводится к нижнему регистру целиком. Фрагмент и остальные
+        части сохраняются: они тоже проверяются паттернами.
+        """
+        return url.lower()
+
+    @staticmethod
+    def _age_bracket(child_age: int) -> int:
+        """Возрастная группа с точки зрения возрастных ограничений"""
+        return bisect.bisect_right(_AGE_THRESHOLDS, child_age)
+
     async def analyze_content(
         self, url: str, child_id: str, child_age: int = None
     ) -> ContentAnalysisResult:
@@ -167,62 +286,131 @@ class ContentAnalyzer:
         try:
             # Валидация входных данных
             request_data = ContentAnalysisRequest(url=url, child_id=child_id)
+            result = self._analyze(request_data.url, child_age)
 
-            async with self._lock:
-                # Базовый анализ URL
-                category = self._categorize_url(request_data.url)
-                risk_score = self._calculate_risk_score(
-                    request_data.url, category
-                )
-                age_appropriate = self._is_age_appropriate(
-                    category, child_age or 10
-                )
+            self.logger.info(
+                f"Контент проанализирован: {url} -> {result.action.value}"
+            )
+            return result
 
-                # Определение действия
-                action = self._determine_action(
-                    category, risk_score, age_appropriate, child_age
-                )
+        except Exception as e:
+            self.logger.error(f"Ошибка анализа контента: {e}")
+            raise
 
-                # Обновление статистики
-                self._update_stats(category, action, child_age)
-
-                result = ContentAnalysisResult(
-                    url=request_data.url,
-                    category=category,
-                    risk_score=risk_score,
-                    age_appropriate=age_appropriate,
-                    action=action,
-                    reason=self._get_action_reason(
-                        action, category, risk_score
-                    ),
-                    keywords=self._extract_keywords(
-                        request_data.url, category
-                    ),
+    async def analyze_urls(
+        self, urls: List[str], child_id: str, child_age: int = None
+    ) -> List[Optional[ContentAnalysisResult]]:
+        """
+        Пакетный анализ URL (например, проверка истории браузера).
+
+        Результаты возвращаются в порядке входного списка; для
+        невалидных URL возвращается None.
+        """
+        results: List[Optional[ContentAnalysisResult]] = []
+        invalid = 0
+        for url in urls:
+            try:
+                request_data = ContentAnalysisRequest(
+                    url=url, child_id=child_id
                 )
+            except Exception:
+                invalid += 1
+                results.append(None)
+                continue
+            results.append(self._analyze(request_data.url, child_age))
+
+        blocked = sum(
+            1 for r in results if r and r.action == ControlAction.BLOCK
+        )
+        self.logger.info(
+            f"Пакетный анализ: {len(urls)} URL, заблокировано {blocked}, "
+            f"невалидных {invalid}"
+        )
+        return results
 
-                self.logger.info(
-                    f"Контент проанализирован: {url} -> {action.value}"
-                )
-                return result
+    def _analyze(
+        self, url: str, child_age: int = None
+    ) -> ContentAnalysisResult:
+        """Анализ одного URL через LRU-кэш"""
+        key = (self.normalize_url(url), self._age_bracket(child_age or 10))
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.stats.cache_hits += 1
+        else:
+            self.stats.cache_misses += 1
+            category = self._categorize_url(url)
+            risk_score = self._calculate_risk_score(url, category)
+            age_appropriate = self._is_age_appropriate(
+                category, child_age or 10
+            )
 
-        except Exception as e:
-            self.logger.error(f"Ошибка анализа контента: {e}")
-            raise
+            # Определение действия
+            action = self._determine_action(
+                category, risk_score, age_appropriate, child_age
+            )
+            cached = (
+                category,
+                risk_score,
+                age_appropriate,
+                action,
+                self._get_action_reason(action, category, risk_score),
+                tuple(self._extract_keywords(url, category)),
+            )
+            self._cache[key] = cached
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        category, risk_score, age_appropriate, action, reason, keywords = (
+            cached
+        )
+
+        # Обновление статистики
+        self._update_stats(category, action, child_age, risk_score)
+
+        return ContentAnalysisResult(
+            url=url,
+            category=category,
+            risk_score=risk_score,
+            age_appropriate=age_appropriate,
+            action=action,
+            reason=reason,
+            keywords=list(keywords),
+        )
+
+    def _lookup_host(self, url: str) -> Optional[ContentCategory]:
+        """Категория по таблице хостов (хост и родительские домены)"""
+        host = urlsplit(url).hostname or ""
+        while host:
+            category = self._host_categories.get(host)
+            if category is not None:
+                return category
+            _, _, host = host.partition(".")
+        return None
 
     def _categorize_url(self, url: str) -> ContentCategory:
         """Категоризация URL"""
         url_lower = url.lower()
 
-        for category, patterns in self.url_patterns.items():
-            for pattern in patterns:
-                if re.search(pattern, url_lower):
-                    return category
+        host_category = self._lookup_host(url_lower)
+        if host_category is not None:
+            # Остаётся проверить только более приоритетные категории
+            priority = self._category_priority[host_category]
+            index = self._first_group(
+                self._prefix_matchers[priority], url_lower
+            )
+            if index is None:
+                return host_category
+            return self._categories[index]
+
+        index = self._first_group(self._prefix_matchers[-1], url_lower)
+        if index is not None:
+            return self._categories[index]
 
         # Если не найдено совпадений, проверяем по ключевым словам
-        for category, keywords in self.keywords.items():
-            for keyword in keywords:
-                if keyword in url_lower:
-                    return category
+        index = self._first_group(self._keyword_matcher, url_lower)
+        if index is not None:
+            return self._keyword_categories[index]
 
         return ContentCategory.UNKNOWN
 
@@ -267,18 +455,7 @@ class ContentAnalyzer:
         self, category: ContentCategory, child_age: int
     ) -> bool:
         """Проверка соответствия возрасту"""
-        age_limits = {
-            ContentCategory.EDUCATIONAL: 0,
-            ContentCategory.NEWS: 8,
-            ContentCategory.SHOPPING: 12,
-            ContentCategory.ENTERTAINMENT: 6,
-            ContentCategory.SOCIAL: 13,
-            ContentCategory.GAMING: 8,
-            ContentCategory.ADULT: 18,
-            ContentCategory.UNKNOWN: 10,
-        }
-
-        min_age = age_limits.get(category, 10)
+        min_age = AGE_LIMITS.get(category, 10)
         return child_age >= min_age
 
     def _determine_action(
@@ -336,7 +513,7 @@ class ContentAnalyzer:
         url_lower = url.lower()
 
         # Извлечение из URL
-        url_parts = re.split(r"[\/\?\&\=]", url_lower)
+        url_parts = _URL_SPLIT.split(url_lower)
         for part in url_parts:
             if len(part) > 3 and part.isalpha():
                 keywords.append(part)
@@ -352,9 +529,15 @@ class ContentAnalyzer:
         category: ContentCategory,
         action: ControlAction,
         child_age: int = None,
+        risk_score: float = 0.0,
     ):
-        """Обновление статистики"""
+        """Обновление статистики (без await - атомарно в event loop)"""
         self.stats.total_analyses += 1
+        self._category_counts[category.value] += 1
+        self._risk_sum += risk_score
+        self.stats.average_risk_score = (
+            self._risk_sum / self.stats.total_analyses
+        )
 
         if action == ControlAction.BLOCK:
             category_name = category.value
@@ -387,6 +570,10 @@ class ContentAnalyzer:
         """Получение статистики анализа"""
         return self.stats
 
+    def get_category_counts(self) -> Dict[str, int]:
+        """Количество анализов по категориям"""
+        return dict(self._category_counts)
+
     async def add_custom_pattern(
         self, category: ContentCategory, pattern: str
     ):
@@ -395,6 +582,7 @@ class ContentAnalyzer:
             self.url_patterns[category] = []
 
         self.url_patterns[category].append(pattern)
+        self._compile_matchers()
         self.logger.info(
             f"Добавлен пользовательский паттерн для "
             f"{category.value}: {pattern}"
@@ -408,6 +596,7 @@ class ContentAnalyzer:
             self.keywords[category] = []
 
         self.keywords[category].extend(keywords)
+        self._compile_matchers()
         self.logger.info(
             f"Добавлены ключевые слова для {category.value}: {keywords}"
         )
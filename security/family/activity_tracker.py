@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+ALADDIN Security System - Activity Tracker
+Счётчики экранного времени и архив активности для ChildProtection
+
+DailyUsageCounters хранит для каждого ребенка минуты и посещения
+за текущий день по категориям. Обновление и чтение выполняются за O(1)
+независимо от накопленной истории. День сменяется автоматически при
+первом обращении после полуночи.
+
+ActivityArchive - компактный архив активности только на дозапись.
+Записи хранятся по дням в колонках array, а строки (ребенок, тип
+активности, категория, URL) заменяются номерами из таблицы строк
+своего дня. Старые дни удаляются целиком по сроку хранения вместе
+с их строками.
+"""
+
+from array import array
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional
+
+
+class _ChildDay:
+    """Счётчики одного ребенка за один день"""
+
+    __slots__ = ("day", "total", "minutes", "visits")
+
+    def __init__(self, day: date):
+        self.day = day
+        self.total = 0
+        self.minutes: Dict[Hashable, int] = {}
+        self.visits: Dict[Hashable, int] = {}
+
+
+class DailyUsageCounters:
+    """Дневные счётчики по ребенку и категории со сменой дня"""
+
+    def __init__(
+        self, on_rollover: Optional[Callable[[str, date], None]] = None
+    ):
+        """
+        Args:
+            on_rollover: Вызывается при смене дня у ребенка
+                (child_id, прошедший день)
+        """
+        self.on_rollover = on_rollover
+        self._days: Dict[str, _ChildDay] = {}
+
+    def _current(self, child_id: str, day: date) -> _ChildDay:
+        entry = self._days.get(child_id)
+        if entry is not None and entry.day >= day:
+            return entry
+        if entry is not None and self.on_rollover is not None:
+            self.on_rollover(child_id, entry.day)
+        entry = _ChildDay(day)
+        self._days[child_id] = entry
+        return entry
+
+    def add(
+        self, child_id: str, category: Hashable, minutes: int, day: date
+    ) -> bool:
+        """Учет активности; активность за прошедшие дни не учитывается"""
+        entry = self._current(child_id, day)
+        if entry.day != day:
+            return False
+        entry.total += minutes
+        entry.minutes[category] = entry.minutes.get(category, 0) + minutes
+        entry.visits[category] = entry.visits.get(category, 0) + 1
+        return True
+
+    def category_minutes(
+        self, child_id: str, category: Hashable, day: date
+    ) -> int:
+        """Минуты в категории за день"""
+        entry = self._current(child_id, day)
+        return entry.minutes.get(category, 0) if entry.day == day else 0
+
+    def total_minutes(self, child_id: str, day: date) -> int:
+        """Общее экранное время за день"""
+        entry = self._current(child_id, day)
+        return entry.total if entry.day == day else 0
+
+    def category_stats(
+        self, child_id: str, day: date
+    ) -> Dict[Hashable, Dict[str, int]]:
+        """Минуты и посещения по категориям за день"""
+        entry = self._current(child_id, day)
+        if entry.day != day:
+            return {}
+        return {
+            category: {"time": minutes, "visits": entry.visits[category]}
+            for category, minutes in entry.minutes.items()
+        }
+
+    def reset(self, day: date) -> None:
+        """Принудительная смена дня для всех детей"""
+        for child_id, entry in list(self._days.items()):
+            if self.on_rollover is not None:
+                self.on_rollover(child_id, entry.day)
+            self._days[child_id] = _ChildDay(day)
+
+
+# Наибольшая длительность, которая помещается в колонку array("I")
+MAX_DURATION = 2 ** 32 - 1
+
+
+class _DaySegment:
+    """Колонки записей архива за один день и таблица его строк"""
+
+    __slots__ = (
+        "strings",
+        "string_ids",
+        "timestamps",
+        "children",
+        "kinds",
+        "categories",
+        "durations",
+        "urls",
+        "flagged",
+    )
+
+    def __init__(self):
+        self.strings: List[str] = []
+        self.string_ids: Dict[str, int] = {}
+        self.timestamps = array("d")
+        self.children = array("I")
+        self.kinds = array("I")
+        self.categories = array("I")
+        self.durations = array("I")
+        self.urls = array("I")
+        self.flagged = array("B")
+
+    def intern(self, value: str) -> int:
+        index = self.string_ids.get(value)
+        if index is None:
+            index = len(self.strings)
+            self.string_ids[value] = index
+            self.strings.append(value)
+        return index
+
+
+class ActivityArchive:
+    """Архив активности на дозапись: колонки по дням"""
+
+    def __init__(self, retention_days: int = 30):
+        self.retention_days = retention_days
+        self._segments: "OrderedDict[date, _DaySegment]" = OrderedDict()
+        self._size = 0
+        self._last_day: Optional[date] = None
+        self._last_segment: Optional[_DaySegment] = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _segment(self, day: date) -> _DaySegment:
+        if day == self._last_day:
+            return self._last_segment
+        segment = self._segments.get(day)
+        if segment is None:
+            segment = _DaySegment()
+            latest = next(reversed(self._segments), None)
+            self._segments[day] = segment
+            if latest is not None and day < latest:
+                # Поздняя запись за прошедший день - восстанавливаем порядок
+                self._segments = OrderedDict(sorted(self._segments.items()))
+        self._last_day = day
+        self._last_segment = segment
+        return segment
+
+    def append(
+        self,
+        timestamp: datetime,
+        child_id: str,
+        activity_type: str,
+        category: str,
+        duration: int,
+        url: str = "",
+        flagged: bool = False,
+    ) -> None:
+        """Дозапись одной активности"""
+        # Колонка беззнаковая и целочисленная: длительность в ее пределах
+        duration = int(min(max(duration, 0), MAX_DURATION))
+        segment = self._segment(timestamp.date())
+        intern = segment.intern
+        segment.timestamps.append(timestamp.timestamp())
+        segment.children.append(intern(child_id))
+        segment.kinds.append(intern(activity_type))
+        segment.categories.append(intern(category))
+        segment.durations.append(duration)
+        segment.urls.append(intern(url))
+        segment.flagged.append(1 if flagged else 0)
+        self._size += 1
+
+    def prune(self, today: date) -> int:
+        """Удаление дней старше срока хранения; число удаленных записей"""
+        removed = 0
+        while self._segments:
+            day, segment = next(iter(self._segments.items()))
+            if (today - day).days <= self.retention_days:
+                break
+            del self._segments[day]
+            removed += len(segment.timestamps)
+            if day == self._last_day:
+                self._last_day = self._last_segment = None
+        self._size -= removed
+        return removed
+
+    def days(self) -> List[date]:
+        """Дни, за которые есть записи"""
+        return list(self._segments)
+
+    def iter_records(
+        self,
+        child_id: Optional[str] = None,
+        since: Optional[date] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """Записи архива в порядке дозаписи (с фильтром по ребенку)"""
+        for day, segment in self._segments.items():
+            if since is not None and day < since:
+                continue
+            strings = segment.strings
+            child_index = None
+            if child_id:
+                child_index = segment.string_ids.get(child_id)
+                if child_index is None:
+                    continue
+            for i in range(len(segment.timestamps)):
+                if child_index is not None and (
+                    segment.children[i] != child_index
+                ):
+                    continue
+                yield {
+                    "child_id": strings[segment.children[i]],
+                    "activity_type": strings[segment.kinds[i]],
+                    "category": strings[segment.categories[i]],
+                    "timestamp": datetime.fromtimestamp(
+                        segment.timestamps[i]
+                    ),
+                    "duration": segment.durations[i],
+                    "url": strings[segment.urls[i]],
+                    "flagged": bool(segment.flagged[i]),
+                }
+
+    def daily_summary(
+        self, child_id: str, since: Optional[date] = None
+    ) -> Dict[date, Dict[str, Dict[str, int]]]:
+        """Минуты и посещения по дням и категориям для отчетов"""
+        summary: Dict[date, Dict[str, Dict[str, int]]] = {}
+        for day, segment in self._segments.items():
+            if since is not None and day < since:
+                continue
+            child_index = segment.string_ids.get(child_id)
+            if child_index is None:
+                continue
+            strings = segment.strings
+            minutes: Dict[int, int] = {}
+            visits: Dict[int, int] = {}
+            for child, category, duration in zip(
+                segment.children, segment.categories, segment.durations
+            ):
+                if child == child_index:
+                    minutes[category] = minutes.get(category, 0) + duration
+                    visits[category] = visits.get(category, 0) + 1
+            if minutes:
+                summary[day] = {
+                    strings[category]: {
+                        "time": value,
+                        "visits": visits[category],
+                    }
+                    for category, value in minutes.items()
+                }
+        return summary
+
+    def memory_usage(self) -> int:
+        """Примерный объем колонок архива в байтах"""
+        return sum(
+            column.itemsize * len(column)
+            for segment in self._segments.values()
+            for column in (
+                segment.timestamps,
+                segment.children,
+                segment.kinds,
+                segment.categories,
+                segment.durations,
+                segment.urls,
+                segment.flagged,
+            )
+        )
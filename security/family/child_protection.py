@@ -8,14 +8,17 @@ ALADDIN Security System - Child Protection
 """
 
 import logging
-import time
 from dataclasses import dataclass, field
-from datetime import datetime, timedelta
+from datetime import date, datetime
 from enum import Enum
 from typing import Any, Dict, List, Optional
 
 from core.base import SecurityBase
 from core.security_base import IncidentSeverity, SecurityEvent
+from security.family.activity_tracker import (
+    ActivityArchive,
+    DailyUsageCounters,
+)
 
 # Импорт психологической поддержки
 try:
@@ -122,7 +125,6 @@ class ChildProtection(SecurityBase):
         # Данные системы
         self.child_profiles: Dict[str, ChildProfile] = {}
         self.content_filters: Dict[str, ContentFilter] = {}
-        self.activity_logs: List[ActivityLog] = []
         self.blocked_domains: List[str] = []
         self.allowed_domains: List[str] = []
 
@@ -130,6 +132,14 @@ class ChildProtection(SecurityBase):
         self.max_screen_time = 120  # Максимальное время экрана (минуты)
         self.violation_threshold = 3  # Порог нарушений
         self.alert_parents = True  # Уведомлять родителей
+        self.activity_retention_days = 30  # Срок хранения активности
+
+        # Активность: дневные счетчики для проверок доступа за O(1)
+        # и компактный архив для отчетов
+        self.usage_counters = DailyUsageCounters(
+            on_rollover=self._on_day_rollover
+        )
+        self.activity_archive = ActivityArchive(self.activity_retention_days)
 
         # Психологическая поддержка
         if PSYCHOLOGICAL_SUPPORT_AVAILABLE:
@@ -406,29 +416,23 @@ class ChildProtection(SecurityBase):
         self, child_id: str, content_category: ContentCategory
     ) -> int:
         """Получение времени, потраченного на категорию сегодня"""
-        today = datetime.now().date()
-        total_time = 0
-
-        for log in self.activity_logs:
-            if (
-                log.child_id == child_id
-                and log.content_category == content_category
-                and log.timestamp.date() == today
-            ):
-                total_time += log.duration
-
-        return total_time
+        return self.usage_counters.category_minutes(
+            child_id, content_category, datetime.now().date()
+        )
 
     def _get_total_screen_time_today(self, child_id: str) -> int:
         """Получение общего времени экрана сегодня"""
-        today = datetime.now().date()
-        total_time = 0
-
-        for log in self.activity_logs:
-            if log.child_id == child_id and log.timestamp.date() == today:
-                total_time += log.duration
+        return self.usage_counters.total_minutes(
+            child_id, datetime.now().date()
+        )
 
-        return total_time
+    def _on_day_rollover(self, child_id: str, previous_day: date) -> None:
+        """Смена дня у ребенка: сброс дневных данных профиля"""
+        profile = self.child_profiles.get(child_id)
+        if profile is not None:
+            profile.violations = []
+            profile.total_screen_time = 0
+        self.activity_archive.prune(datetime.now().date())
 
     def _log_violation(self, child_id: str, violation: str) -> None:
         """Логирование нарушения"""
@@ -458,24 +462,49 @@ class ChildProtection(SecurityBase):
         activity_type: str,
         content_category: ContentCategory,
         details: str,
+        duration: int = 1,  # Минимальная длительность
+        timestamp: Optional[datetime] = None,
     ) -> None:
         """Логирование активности"""
-        log = ActivityLog(
-            log_id=f"log_{int(time.time())}",
-            child_id=child_id,
-            activity_type=activity_type,
-            content_category=content_category,
-            timestamp=datetime.now(),
-            duration=1,  # Минимальная длительность
-            details={"url": details},
-        )
+        now = timestamp or datetime.now()
+        day = now.date()
 
-        self.activity_logs.append(log)
+        counted = self.usage_counters.add(
+            child_id, content_category, duration, day
+        )
+        self.activity_archive.append(
+            now,
+            child_id,
+            activity_type,
+            content_category.value,
+            duration,
+            details,
+        )
 
-        # Обновляем профиль ребенка
-        if child_id in self.child_profiles:
-            self.child_profiles[child_id].last_activity = datetime.now()
-            self.child_profiles[child_id].total_screen_time += 1
+        # Обновляем профиль ребенка (только активность за текущий день)
+        profile = self.child_profiles.get(child_id)
+        if counted and profile is not None:
+            profile.last_activity = now
+            profile.total_screen_time += duration
+
+    def get_activity_history(
+        self, child_id: str, days: int = 1
+    ) -> List[ActivityLog]:
+        """История активности ребенка из архива за последние дни"""
+        since = date.fromordinal(datetime.now().date().toordinal() - days + 1)
+        return [
+            ActivityLog(
+                log_id=f"log_{int(record['timestamp'].timestamp())}",
+                child_id=record["child_id"],
+                activity_type=record["activity_type"],
+                content_category=ContentCategory(record["category"]),
+                timestamp=record["timestamp"],
+                duration=record["duration"],
+                details={"url": record["url"]},
+                flagged=record["flagged"],
+            )
+            for record in self.activity_archive.iter_records(child_id, since)
+        ]
 
     def _notify_parents(self, child_id: str, violation: str) -> None:
         """Уведомление родителей о нарушении"""
@@ -491,22 +520,14 @@ class ChildProtection(SecurityBase):
             return {"error": "Профиль ребенка не найден"}
 
         profile = self.child_profiles[child_id]
-        today = datetime.now().date()
 
         # Статистика за сегодня
-        today_activities = [
-            log
-            for log in self.activity_logs
-            if log.child_id == child_id and log.timestamp.date() == today
-        ]
-
-        category_stats = {}
-        for log in today_activities:
-            category = log.content_category.value
-            if category not in category_stats:
-                category_stats[category] = {"time": 0, "visits": 0}
-            category_stats[category]["time"] += log.duration
-            category_stats[category]["visits"] += 1
+        category_stats = {
+            category.value: stats
+            for category, stats in self.usage_counters.category_stats(
+                child_id, datetime.now().date()
+            ).items()
+        }
 
         return {
             "child_id": child_id,
@@ -617,7 +638,7 @@ class ChildProtection(SecurityBase):
         """Получение статуса системы"""
         total_children = len(self.child_profiles)
         total_filters = len(self.content_filters)
-        total_logs = len(self.activity_logs)
+        total_logs = len(self.activity_archive)
 
         # Статистика нарушений
         total_violations = sum(
@@ -636,16 +657,17 @@ class ChildProtection(SecurityBase):
         }
 
     def reset_daily_limits(self) -> None:
-        """Сброс дневных лимитов"""
+        """Принудительный сброс дневных лимитов
+
+        В обычной работе дневные счетчики, нарушения и время экрана
+        сбрасываются автоматически при первой активности после полуночи,
+        а архив старше activity_retention_days удаляется по дням.
+        """
+        self.usage_counters.reset(datetime.now().date())
         for profile in self.child_profiles.values():
             profile.violations = []
             profile.total_screen_time = 0
-
-        # Очищаем старые логи (старше 30 дней)
-        cutoff_date = datetime.now() - timedelta(days=30)
-        self.activity_logs = [
-            log for log in self.activity_logs if log.timestamp > cutoff_date
-        ]
+        self.activity_archive.prune(datetime.now().date())
 
     def get_family_dashboard(self) -> Dict[str, Any]:
         """Получение данных для семейного дашборда"""
@@ -7,12 +7,15 @@ FAMILY COMMUNICATION HUB A+ QUALITY
 import asyncio
 import logging
 import uuid
+from collections import deque
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from enum import Enum
 from typing import (
     Any,
+    Deque,
     Dict,
+    FrozenSet,
     List,
     Optional,
     Tuple,
@@ -24,6 +27,8 @@ from sklearn.ensemble import IsolationForest
 from sklearn.metrics import silhouette_score
 from sklearn.preprocessing import StandardScaler
 
+from security.family.family_message_log import FamilyMessageLog
+
 
 class FamilyRole(Enum):
     """Роли в семье"""
@@ -345,7 +350,7 @@ class FamilyCommunicationHub:
         self.family_id: str = family_id
         self.logger: logging.Logger = logging.getLogger(__name__)
         self.members: Dict[str, FamilyMember] = {}
-        self.messages: List[Message] = []
+        self.messages: FamilyMessageLog = FamilyMessageLog()
         self.rules: List[CommunicationRule] = []
         self.ml_analyzer: MLAnalyzer = MLAnalyzer()
         self.is_active: bool = False
@@ -354,10 +359,29 @@ class FamilyCommunicationHub:
             "active_members": 0,
             "ml_models_trained": False,
             "last_activity": None,
+            "ml_analyzed": 0,
+            "ml_batches": 0,
         }
 
+        # Матрица разрешений:
+        # (роль отправителя, тип, канал) -> роли получателей
+        self._permission_matrix: Dict[
+            Tuple[FamilyRole, MessageType, CommunicationChannel],
+            FrozenSet[FamilyRole],
+        ] = {}
+
+        # Очередь ML анализа: сообщения анализируются пакетами в фоне
+        self.ml_batch_size: int = 64
+        self.ml_batch_delay: float = 0.05
+        self._ml_queue: Deque[Message] = deque()
+        self._ml_wakeup: asyncio.Event = asyncio.Event()
+        self._ml_idle: asyncio.Event = asyncio.Event()
+        self._ml_idle.set()
+        self._background_tasks: List[asyncio.Task] = []
+
         # Инициализация базовых правил
         self._initialize_default_rules()
+        self.rebuild_permission_matrix()
 
         # Запуск фоновых задач
         self._start_background_tasks()
@@ -423,11 +447,83 @@ class FamilyCommunicationHub:
         """Запуск фоновых задач"""
         self.is_active = True
 
-        # Запуск задачи анализа сообщений
-        asyncio.create_task(self._analyze_messages_task())
+        self._background_tasks = [
+            # Задача анализа сообщений
+            asyncio.create_task(self._analyze_messages_task()),
+            # Задача обновления статистики
+            asyncio.create_task(self._update_stats_task()),
+            # Пакетный ML анализ новых сообщений
+            asyncio.create_task(self._ml_batch_task()),
+        ]
+
+    def rebuild_permission_matrix(self) -> None:
+        """
+        Компиляция активных правил в матрицу разрешений
+
+        Вызывается при изменении правил через методы центра; после
+        прямого изменения self.rules матрицу нужно перестроить вручную.
+        """
+        matrix: Dict[
+            Tuple[FamilyRole, MessageType, CommunicationChannel],
+            FrozenSet[FamilyRole],
+        ] = {}
+        for rule in self.rules:
+            if not rule.is_active:
+                continue
+            recipient_roles = frozenset(rule.recipient_roles)
+            for sender_role in rule.sender_roles:
+                for message_type in rule.allowed_message_types:
+                    for channel in rule.allowed_channels:
+                        key = (sender_role, message_type, channel)
+                        matrix[key] = (
+                            matrix.get(key, frozenset()) | recipient_roles
+                        )
+        self._permission_matrix = matrix
 
-        # Запуск задачи обновления статистики
-        asyncio.create_task(self._update_stats_task())
+    def add_communication_rule(self, rule: CommunicationRule) -> None:
+        """
+        Добавление правила коммуникации
+
+        Args:
+            rule: Правило
+        """
+        self.rules.append(rule)
+        self.rebuild_permission_matrix()
+
+    def remove_communication_rule(self, rule_id: str) -> bool:
+        """
+        Удаление правила коммуникации
+
+        Args:
+            rule_id: ID правила
+
+        Returns:
+            bool: True если правило найдено и удалено
+        """
+        rules = [rule for rule in self.rules if rule.id != rule_id]
+        if len(rules) == len(self.rules):
+            return False
+        self.rules = rules
+        self.rebuild_permission_matrix()
+        return True
+
+    def set_rule_active(self, rule_id: str, is_active: bool) -> bool:
+        """
+        Включение или отключение правила коммуникации
+
+        Args:
+            rule_id: ID правила
+            is_active: Новое состояние правила
+
+        Returns:
+            bool: True если правило найдено
+        """
+        for rule in self.rules:
+            if rule.id == rule_id:
+                rule.is_active = is_active
+                self.rebuild_permission_matrix()
+                return True
+        return False
 
     async def add_family_member(self, member: FamilyMember) -> bool:
         """
@@ -471,8 +567,11 @@ class FamilyCommunicationHub:
             self.stats["total_messages"] += 1
             self.stats["last_activity"] = datetime.now()
 
-            # Анализ сообщения ML
-            await self._analyze_message_ml(message)
+            # ML анализ в фоне, доставка его не ждет
+            if self.ml_analyzer.is_trained:
+                self._ml_queue.append(message)
+                self._ml_idle.clear()
+                self._ml_wakeup.set()
 
             self.logger.info(f"Сообщение отправлено: {message.id}")
             return True
@@ -495,36 +594,18 @@ class FamilyCommunicationHub:
         if not sender:
             return False
 
-        for rule in self.rules:
-            if not rule.is_active:
-                continue
-
-            # Проверка роли отправителя
-            if sender.role not in rule.sender_roles:
-                continue
-
-            # Проверка роли получателей
-            recipient_roles = [
-                self.members[rid].role
-                for rid in message.recipient_ids
-                if rid in self.members
-            ]
-            if not any(
-                role in rule.recipient_roles for role in recipient_roles
-            ):
-                continue
-
-            # Проверка типа сообщения
-            if message.message_type not in rule.allowed_message_types:
-                continue
-
-            # Проверка канала связи
-            if message.channel not in rule.allowed_channels:
-                continue
-
-            return True
+        # Роли получателей, разрешенные для отправителя, типа и канала
+        allowed_roles = self._permission_matrix.get(
+            (sender.role, message.message_type, message.channel)
+        )
+        if not allowed_roles:
+            return False
 
-        return False
+        members = self.members
+        return any(
+            rid in members and members[rid].role in allowed_roles
+            for rid in message.recipient_ids
+        )
 
     async def _analyze_message_ml(self, message: Message) -> None:
         """
@@ -533,54 +614,110 @@ class FamilyCommunicationHub:
         Args:
             message: Сообщение для анализа
         """
+        await self._analyze_messages_ml([message])
+
+    async def _analyze_messages_ml(self, messages: List[Message]) -> None:
+        """
+        Пакетный анализ сообщений с помощью ML
+
+        Признаки всего пакета собираются в одну матрицу, предсказания
+        моделей выполняются в пуле потоков, не блокируя цикл событий.
+
+        Args:
+            messages: Сообщения для анализа
+        """
         try:
-            if not self.ml_analyzer.is_trained:
+            if not self.ml_analyzer.is_trained or not messages:
                 return
 
             # Подготовка данных для анализа
-            data = {
-                "content": message.content,
-                "timestamp": message.timestamp,
-                "priority": message.priority.value,
-                "message_type": message.message_type.value,
-                "sender_id": message.sender_id,
-            }
-
-            # Анализ тональности
-            if "sentiment" in self.ml_analyzer.models:
-                features = self.ml_analyzer._extract_features(data)
-                sentiment = self.ml_analyzer.models["sentiment"].predict(
-                    [features]
-                )[0]
-                message.metadata["sentiment"] = sentiment
-
-            # Обнаружение аномалий
-            if "anomaly_detection" in self.ml_analyzer.models:
-                features = self.ml_analyzer._extract_features(data)
-                anomaly_score = self.ml_analyzer.models[
-                    "anomaly_detection"
-                ].decision_function([features])[0]
-                message.metadata["anomaly_score"] = float(anomaly_score)
-
-                if anomaly_score < -0.5:
-                    message.priority = MessagePriority.HIGH
-                    self.logger.warning(
-                        f"Обнаружена аномалия в сообщении: {message.id}"
+            features = np.array(
+                [
+                    self.ml_analyzer._extract_features(
+                        {
+                            "content": message.content,
+                            "timestamp": message.timestamp,
+                            "priority": message.priority.value,
+                            "message_type": message.message_type.value,
+                            "sender_id": message.sender_id,
+                        }
                     )
+                    for message in messages
+                ]
+            )
+            models = self.ml_analyzer.models
+
+            def predict() -> Tuple[Any, Any]:
+                sentiments = anomaly_scores = None
+                if "sentiment" in models:
+                    sentiments = models["sentiment"].predict(features)
+                if "anomaly_detection" in models:
+                    anomaly_scores = models[
+                        "anomaly_detection"
+                    ].decision_function(features)
+                return sentiments, anomaly_scores
+
+            loop = asyncio.get_running_loop()
+            sentiments, anomaly_scores = await loop.run_in_executor(
+                None, predict
+            )
+
+            for i, message in enumerate(messages):
+                # Анализ тональности
+                if sentiments is not None:
+                    message.metadata["sentiment"] = sentiments[i]
+
+                # Обнаружение аномалий
+                if anomaly_scores is not None:
+                    anomaly_score = float(anomaly_scores[i])
+                    message.metadata["anomaly_score"] = anomaly_score
+
+                    if anomaly_score < -0.5:
+                        message.priority = MessagePriority.HIGH
+                        self.logger.warning(
+                            f"Обнаружена аномалия в сообщении: {message.id}"
+                        )
+
+            self.stats["ml_analyzed"] += len(messages)
+            self.stats["ml_batches"] += 1
 
         except Exception as e:
             self.logger.error(f"Ошибка ML анализа сообщения: {e}")
 
+    async def _ml_batch_task(self) -> None:
+        """Фоновая задача пакетного ML анализа новых сообщений"""
+        while self.is_active:
+            await self._ml_wakeup.wait()
+            self._ml_wakeup.clear()
+
+            # Даем накопиться пакету
+            if len(self._ml_queue) < self.ml_batch_size:
+                await asyncio.sleep(self.ml_batch_delay)
+
+            while self._ml_queue:
+                batch = [
+                    self._ml_queue.popleft()
+                    for _ in range(
+                        min(self.ml_batch_size, len(self._ml_queue))
+                    )
+                ]
+                await self._analyze_messages_ml(batch)
+
+            if not self._ml_queue:
+                self._ml_idle.set()
+
+    async def wait_ml_idle(self) -> None:
+        """Ожидание завершения ML анализа отправленных сообщений"""
+        await self._ml_idle.wait()
+
     async def _analyze_messages_task(self) -> None:
         """Фоновая задача анализа сообщений"""
         while self.is_active:
             try:
                 # Анализ последних сообщений
-                recent_messages = [
-                    msg
-                    for msg in self.messages
-                    if msg.timestamp > datetime.now() - timedelta(hours=1)
-                ]
+                recent_messages = self.messages.since(
+                    datetime.now() - timedelta(hours=1)
+                )
 
                 if recent_messages and self.ml_analyzer.is_trained:
                     # Подготовка данных для обучения
@@ -645,51 +782,58 @@ class FamilyCommunicationHub:
         sender_id: Optional[str] = None,
         recipient_id: Optional[str] = None,
         message_type: Optional[MessageType] = None,
-        limit: int = 100
+        limit: int = 100,
+        cursor: Optional[int] = None,
     ) -> List[Message]:
         """
-        Получение сообщений с фильтрацией
+        Получение сообщений с фильтрацией (новые сначала)
 
         Args:
             sender_id: ID отправителя (опционально)
             recipient_id: ID получателя (опционально)
             message_type: Тип сообщения (опционально)
             limit: Максимальное количество сообщений
+            cursor: Курсор страницы из get_messages_page (опционально)
 
         Returns:
             Список сообщений
         """
-        try:
-            filtered_messages = []
-
-            for message in self.messages:
-                # Фильтр по отправителю
-                if sender_id and message.sender_id != sender_id:
-                    continue
-
-                # Фильтр по получателю
-                if recipient_id and recipient_id not in message.recipient_ids:
-                    continue
-
-                # Фильтр по типу сообщения
-                if message_type and message.message_type != message_type:
-                    continue
-
-                filtered_messages.append(message)
+        page = await self.get_messages_page(
+            sender_id, recipient_id, message_type, limit, cursor
+        )
+        return page["messages"]
 
-                # Ограничение количества
-                if len(filtered_messages) >= limit:
-                    break
+    async def get_messages_page(
+        self,
+        sender_id: Optional[str] = None,
+        recipient_id: Optional[str] = None,
+        message_type: Optional[MessageType] = None,
+        limit: int = 100,
+        cursor: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Страница сообщений с фильтрацией (новые сначала)
 
-            # Сортировка по времени (новые сначала)
-            filtered_messages.sort(key=lambda x: x.timestamp, reverse=True)
+        Args:
+            sender_id: ID отправителя (опционально)
+            recipient_id: ID получателя (опционально)
+            message_type: Тип сообщения (опционально)
+            limit: Размер страницы
+            cursor: Курсор предыдущей страницы (опционально)
 
-            self.logger.info(f"Получено {len(filtered_messages)} сообщений")
-            return filtered_messages
+        Returns:
+            Dict с сообщениями и курсором следующей страницы
+        """
+        try:
+            messages, next_cursor = self.messages.page(
+                sender_id, recipient_id, message_type, limit, cursor
+            )
+            self.logger.info(f"Получено {len(messages)} сообщений")
+            return {"messages": messages, "next_cursor": next_cursor}
 
         except Exception as e:
             self.logger.error(f"Ошибка получения сообщений: {e}")
-            return []
+            return {"messages": [], "next_cursor": None}
 
     async def train_ml_models(
         self, data: List[Dict[str, Any]]
@@ -708,6 +852,18 @@ class FamilyCommunicationHub:
     async def shutdown(self) -> None:
         """Остановка сервиса"""
         self.is_active = False
+        self._ml_wakeup.set()
+        for task in self._background_tasks:
+            task.cancel()
+        await asyncio.gather(*self._background_tasks, return_exceptions=True)
+        self._background_tasks = []
+
+        # Анализ сообщений, оставшихся в очереди
+        if self._ml_queue:
+            batch = list(self._ml_queue)
+            self._ml_queue.clear()
+            await self._analyze_messages_ml(batch)
+        self._ml_idle.set()
         self.logger.info("FamilyCommunicationHub остановлен")
 
 
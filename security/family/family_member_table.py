@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Индексы и колоночная таблица членов семей для FamilyProfileManagerEnhanced
+
+Агрегаты обновляются при добавлении, удалении и изменении членов семьи,
+поэтому статистика не обходит всех членов всех семей:
+
+- FamilyMemberIndex хранит членов одной семьи по ролям и возрастным
+  группам в порядке добавления и число активных;
+- MemberTable хранит всех членов системы колонками numpy (структура
+  массивов): семья, роль, возрастная группа, возраст, уровень
+  безопасности и активность. Системные распределения считаются
+  через np.bincount по колонкам.
+"""
+
+from enum import Enum
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from security.family.family_profile_manager_enhanced import (
+        FamilyMember,
+    )
+
+MemberKey = Tuple[str, str]
+
+
+class FamilyMemberIndex:
+    """Члены одной семьи по ролям и возрастным группам"""
+
+    def __init__(self) -> None:
+        """Инициализация пустого индекса"""
+        self.by_role: Dict[Enum, Dict[str, "FamilyMember"]] = {}
+        self.by_age_group: Dict[Enum, Dict[str, "FamilyMember"]] = {}
+        self.active = 0
+        # Порядковые номера членов - порядок словаря members семьи
+        self._order: Dict[str, int] = {}
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __contains__(self, member_id: str) -> bool:
+        return member_id in self._order
+
+    def add(self, member: "FamilyMember") -> None:
+        """Учет нового члена семьи"""
+        self._order[member.id] = self._next
+        self._next += 1
+        self._insert(self.by_role, member.role, member)
+        self._insert(self.by_age_group, member.age_group, member)
+        self.active += bool(member.is_active)
+
+    def remove(self, member: "FamilyMember") -> None:
+        """Удаление члена семьи из индекса"""
+        self._discard(self.by_role, member.role, member.id)
+        self._discard(self.by_age_group, member.age_group, member.id)
+        self.active -= bool(member.is_active)
+        del self._order[member.id]
+
+    def move(
+        self,
+        member: "FamilyMember",
+        old_role: Enum,
+        old_age_group: Enum,
+        was_active: bool,
+    ) -> None:
+        """Перенос члена семьи после изменения роли, возраста, активности"""
+        if member.role != old_role:
+            self._discard(self.by_role, old_role, member.id)
+            self._insert(self.by_role, member.role, member)
+        if member.age_group != old_age_group:
+            self._discard(self.by_age_group, old_age_group, member.id)
+            self._insert(self.by_age_group, member.age_group, member)
+        self.active += bool(member.is_active) - bool(was_active)
+
+    def members(self, role: Enum) -> List["FamilyMember"]:
+        """Члены семьи с ролью в порядке добавления"""
+        return list(self.by_role.get(role, {}).values())
+
+    def role_distribution(self) -> Dict[str, int]:
+        """Распределение по ролям"""
+        return self._distribution(self.by_role)
+
+    def age_distribution(self) -> Dict[str, int]:
+        """Распределение по возрастным группам"""
+        return self._distribution(self.by_age_group)
+
+    def _distribution(
+        self, buckets: Dict[Enum, Dict[str, "FamilyMember"]]
+    ) -> Dict[str, int]:
+        # Порядок ключей - по первому члену семьи в каждой корзине,
+        # как при обходе словаря members
+        order = self._order
+        ranked = sorted(
+            buckets.items(), key=lambda item: order[next(iter(item[1]))]
+        )
+        return {key.value: len(bucket) for key, bucket in ranked}
+
+    def _insert(
+        self,
+        buckets: Dict[Enum, Dict[str, "FamilyMember"]],
+        key: Enum,
+        member: "FamilyMember",
+    ) -> None:
+        bucket = buckets.setdefault(key, {})
+        order = self._order
+        last = next(reversed(bucket), None)
+        bucket[member.id] = member
+        if last is not None and order[last] > order[member.id]:
+            # Перенесенный член семьи добавлен раньше соседей по корзине
+            buckets[key] = dict(
+                sorted(bucket.items(), key=lambda item: order[item[0]])
+            )
+
+    @staticmethod
+    def _discard(
+        buckets: Dict[Enum, Dict[str, "FamilyMember"]],
+        key: Enum,
+        member_id: str,
+    ) -> None:
+        bucket = buckets.get(key)
+        if bucket is None:
+            return
+        bucket.pop(member_id, None)
+        if not bucket:
+            del buckets[key]
+
+
+class MemberTable:
+    """
+    Все члены семей системы колонками numpy
+
+    Строка таблицы - слот члена семьи. Освобожденные слоты
+    переиспользуются, занятые отмечены колонкой used.
+    """
+
+    def __init__(
+        self,
+        roles: Iterable[Enum],
+        age_groups: Iterable[Enum],
+        capacity: int = 1024,
+    ):
+        """
+        Args:
+            roles: Все значения перечисления ролей
+            age_groups: Все значения перечисления возрастных групп
+            capacity: Начальное число слотов
+        """
+        self.roles = list(roles)
+        self.age_groups = list(age_groups)
+        self._role_codes = {role: i for i, role in enumerate(self.roles)}
+        self._age_codes = {group: i for i, group in enumerate(self.age_groups)}
+
+        capacity = max(capacity, 1)
+        self.family = np.zeros(capacity, dtype=np.int32)
+        self.role = np.zeros(capacity, dtype=np.int8)
+        self.age_group = np.zeros(capacity, dtype=np.int8)
+        self.age = np.zeros(capacity, dtype=np.int16)
+        self.security_level = np.zeros(capacity, dtype=np.int8)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.used = np.zeros(capacity, dtype=bool)
+
+        self._slots: Dict[MemberKey, int] = {}
+        self._keys: List[Optional[MemberKey]] = [None] * capacity
+        self._free: List[int] = []
+        self._size = 0
+        self._family_codes: Dict[Hashable, int] = {}
+        self._family_ids: List[Hashable] = []
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, key: MemberKey) -> bool:
+        return key in self._slots
+
+    def add(self, family_id: str, member: "FamilyMember") -> int:
+        """
+        Добавление члена семьи
+
+        Returns:
+            int: Слот члена семьи в таблице
+        """
+        key = (family_id, member.id)
+        if key in self._slots:
+            self.update(family_id, member)
+            return self._slots[key]
+
+        if self._free:
+            slot = self._free.pop()
+        else:
+            if self._size == len(self.used):
+                self._grow()
+            slot = self._size
+            self._size += 1
+
+        code = self._family_codes.get(family_id)
+        if code is None:
+            code = self._family_codes[family_id] = len(self._family_ids)
+            self._family_ids.append(family_id)
+
+        self._slots[key] = slot
+        self._keys[slot] = key
+        self.family[slot] = code
+        self.used[slot] = True
+        self._write(slot, member)
+        return slot
+
+    def update(self, family_id: str, member: "FamilyMember") -> bool:
+        """Обновление колонок члена семьи"""
+        slot = self._slots.get((family_id, member.id))
+        if slot is None:
+            return False
+        self._write(slot, member)
+        return True
+
+    def remove(self, family_id: str, member_id: str) -> bool:
+        """Удаление члена семьи с освобождением слота"""
+        slot = self._slots.pop((family_id, member_id), None)
+        if slot is None:
+            return False
+        self._keys[slot] = None
+        self.used[slot] = False
+        self.active[slot] = False
+        self._free.append(slot)
+        return True
+
+    def remove_family(self, family_id: str) -> int:
+        """Удаление всех членов семьи; число удаленных"""
+        code = self._family_codes.get(family_id)
+        if code is None:
+            return 0
+        family = self.family[: self._size]
+        slots = np.flatnonzero(self._live() & (family == code))
+        for slot in slots.tolist():
+            self.remove(*self._keys[slot])
+        return len(slots)
+
+    def role_distribution(self, active_only: bool = False) -> Dict[str, int]:
+        """Распределение членов системы по ролям"""
+        return self._distribution(self.role, self.roles, active_only)
+
+    def age_distribution(self, active_only: bool = False) -> Dict[str, int]:
+        """Распределение членов системы по возрастным группам"""
+        return self._distribution(self.age_group, self.age_groups, active_only)
+
+    def security_level_distribution(self) -> Dict[int, int]:
+        """Число членов системы по уровням безопасности"""
+        levels = self.security_level[: self._size][self._live()]
+        counts = np.bincount(levels.astype(np.intp))
+        return {
+            int(level): int(count)
+            for level, count in enumerate(counts)
+            if count
+        }
+
+    def average_age(self) -> float:
+        """Средний возраст членов системы"""
+        ages = self.age[: self._size][self._live()]
+        return float(ages.mean()) if len(ages) else 0.0
+
+    def families_with(
+        self, role: Optional[Enum] = None, age_group: Optional[Enum] = None
+    ) -> List[Hashable]:
+        """Семьи, в которых есть член с ролью и/или возрастной группой"""
+        mask = self._mask(role, age_group)
+        codes = np.unique(self.family[: self._size][mask])
+        return [self._family_ids[code] for code in codes.tolist()]
+
+    def select(
+        self,
+        role: Optional[Enum] = None,
+        age_group: Optional[Enum] = None,
+        active: Optional[bool] = None,
+    ) -> List[MemberKey]:
+        """Пары (семья, член семьи), подходящие под фильтр"""
+        mask = self._mask(role, age_group)
+        if active is not None:
+            mask &= self.active[: self._size] == active
+        return [self._keys[slot] for slot in np.flatnonzero(mask).tolist()]
+
+    def _write(self, slot: int, member: "FamilyMember") -> None:
+        self.role[slot] = self._role_codes[member.role]
+        self.age_group[slot] = self._age_codes[member.age_group]
+        self.age[slot] = member.age
+        self.security_level[slot] = member.security_level
+        self.active[slot] = bool(member.is_active)
+
+    def _live(self) -> np.ndarray:
+        return self.used[: self._size]
+
+    def _mask(
+        self, role: Optional[Enum], age_group: Optional[Enum]
+    ) -> np.ndarray:
+        mask = self._live().copy()
+        if role is not None:
+            mask &= self.role[: self._size] == self._role_codes[role]
+        if age_group is not None:
+            mask &= self.age_group[: self._size] == self._age_codes[age_group]
+        return mask
+
+    def _distribution(
+        self, column: np.ndarray, values: List[Enum], active_only: bool
+    ) -> Dict[str, int]:
+        mask = self.active if active_only else self.used
+        codes = column[: self._size][mask[: self._size]]
+        counts = np.bincount(codes.astype(np.intp), minlength=len(values))
+        return {
+            value.value: int(count)
+            for value, count in zip(values, counts)
+            if count
+        }
+
+    def _grow(self) -> None:
+        capacity = len(self.used) * 2
+        for name in (
+            "family",
+            "role",
+            "age_group",
+            "age",
+            "security_level",
+            "active",
+            "used",
+        ):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[: len(column)] = column
+            setattr(self, name, grown)
+        self._keys.extend([None] * (capacity - len(self._keys)))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Журнал сообщений семьи для FamilyCommunicationHub
+
+Сообщения только дописываются в конец журнала. Номер позиции в журнале
+служит курсором: чтение идет от новых к старым, следующая страница
+начинается с позиции перед курсором. Индексы по отправителю,
+получателю и типу хранят возрастающие списки позиций, поэтому выборка
+с фильтром обходит только подходящие сообщения.
+"""
+
+from bisect import bisect_left
+from datetime import datetime
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    from security.family.family_communication_hub_enhanced import Message
+
+
+class FamilyMessageLog:
+    """Журнал сообщений на дозапись с индексами"""
+
+    def __init__(self) -> None:
+        """Инициализация пустого журнала"""
+        self._messages: List["Message"] = []
+        self._positions: Dict[str, int] = {}
+        self._by_sender: Dict[str, List[int]] = {}
+        self._by_recipient: Dict[str, List[int]] = {}
+        self._by_type: Dict[Hashable, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __iter__(self) -> Iterator["Message"]:
+        return iter(self._messages)
+
+    def append(self, message: "Message") -> int:
+        """
+        Дозапись сообщения
+
+        Args:
+            message: Сообщение
+
+        Returns:
+            int: Позиция сообщения в журнале
+        """
+        position = len(self._messages)
+        self._messages.append(message)
+        self._positions[message.id] = position
+        self._by_sender.setdefault(message.sender_id, []).append(position)
+        for recipient_id in dict.fromkeys(message.recipient_ids):
+            self._by_recipient.setdefault(recipient_id, []).append(position)
+        self._by_type.setdefault(message.message_type, []).append(position)
+        return position
+
+    def get(self, message_id: str) -> Optional["Message"]:
+        """Сообщение по ID"""
+        position = self._positions.get(message_id)
+        return None if position is None else self._messages[position]
+
+    def page(
+        self,
+        sender_id: Optional[str] = None,
+        recipient_id: Optional[str] = None,
+        message_type: Optional[Any] = None,
+        limit: int = 100,
+        cursor: Optional[int] = None,
+    ) -> Tuple[List["Message"], Optional[int]]:
+        """
+        Страница сообщений от новых к старым
+
+        Args:
+            sender_id: ID отправителя (опционально)
+            recipient_id: ID получателя (опционально)
+            message_type: Тип сообщения (опционально)
+            limit: Размер страницы
+            cursor: Курсор из предыдущей страницы
+
+        Returns:
+            Tuple со списком сообщений и курсором следующей страницы
+            (None, если сообщений больше нет)
+        """
+        end = len(self._messages) if cursor is None else cursor
+        if limit <= 0 or end <= 0:
+            return [], None
+
+        indexes = []
+        if sender_id:
+            indexes.append(self._by_sender.get(sender_id, []))
+        if recipient_id:
+            indexes.append(self._by_recipient.get(recipient_id, []))
+        if message_type:
+            indexes.append(self._by_type.get(message_type, []))
+
+        if indexes:
+            # Обходим самый короткий индекс, остальные фильтры проверяем
+            positions = min(indexes, key=len)
+            candidates = reversed(positions[:bisect_left(positions, end)])
+        else:
+            candidates = range(end - 1, -1, -1)
+
+        messages = self._messages
+        result: List["Message"] = []
+        last = None
+        for position in candidates:
+            message = messages[position]
+            if sender_id and message.sender_id != sender_id:
+                continue
+            if recipient_id and recipient_id not in message.recipient_ids:
+                continue
+            if message_type and message.message_type != message_type:
+                continue
+            if len(result) == limit:
+                return result, last
+            result.append(message)
+            last = position
+        return result, None
+
+    def since(self, timestamp: datetime) -> List["Message"]:
+        """Сообщения новее timestamp (от старых к новым)"""
+        messages = self._messages
+        start = len(messages)
+        while start > 0 and messages[start - 1].timestamp > timestamp:
+            start -= 1
+        return messages[start:]
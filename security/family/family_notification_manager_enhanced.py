@@ -16,13 +16,17 @@ FamilyNotificationManagerEnhanced - Расширенная система уве
 """
 
 import asyncio
+import heapq
 import logging
+import time
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, field
 import uuid
 
+from security.managers.notification_dispatcher import PendingNotificationStore
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -130,6 +134,101 @@ class NotificationTemplate:
     is_active: bool = True
 
 
+class ScheduledReminderQueue:
+    """
+    Очередь запланированных напоминаний
+
+    Min-heap по scheduled_time: вставка и извлечение за O(log n), тик
+    обработки смотрит только на наступившие напоминания. Отменённые
+    и перенесённые записи удаляются из кучи лениво. Ожидающие
+    напоминания журналируются в PendingNotificationStore (JSONL
+    add/done) и восстанавливаются при создании очереди.
+    """
+
+    def __init__(self, store_path: Optional[str] = None):
+        self.reminders: Dict[str, Dict[str, Any]] = {}
+        self._heap: List[Tuple[datetime, int, str]] = []
+        self._seq = 0
+        self._entry_seq: Dict[str, int] = {}
+        self.store = PendingNotificationStore(store_path) if store_path else None
+        if self.store is not None:
+            for data in self.store.load().values():
+                reminder = self._from_dict(data)
+                self._push(reminder)
+
+    def __len__(self) -> int:
+        return len(self.reminders)
+
+    def push(self, reminder: Dict[str, Any]) -> None:
+        """Добавление или перенос напоминания (с записью в журнал)"""
+        self._push(reminder)
+        if self.store is not None:
+            self.store.add(reminder["reminder_id"], self._to_dict(reminder))
+
+    def remove(self, reminder_id: str) -> Optional[Dict[str, Any]]:
+        """Удаление отправленного или отменённого напоминания"""
+        reminder = self.reminders.pop(reminder_id, None)
+        self._entry_seq.pop(reminder_id, None)
+        if reminder is not None and self.store is not None:
+            self.store.remove(reminder_id)
+        return reminder
+
+    def pop_due(self, now: datetime, limit: int) -> List[Dict[str, Any]]:
+        """Наступившие напоминания в порядке scheduled_time (до limit)"""
+        due = []
+        heap = self._heap
+        while heap and len(due) < limit and heap[0][0] <= now:
+            _, seq, reminder_id = heapq.heappop(heap)
+            if self._entry_seq.get(reminder_id) == seq:
+                del self._entry_seq[reminder_id]
+                due.append(self.reminders[reminder_id])
+        return due
+
+    def restore(self, reminders: List[Dict[str, Any]]) -> int:
+        """Возврат в кучу извлеченных, но не обработанных напоминаний"""
+        restored = 0
+        for reminder in reminders:
+            reminder_id = reminder["reminder_id"]
+            if reminder_id in self.reminders and reminder_id not in self._entry_seq:
+                self._push(reminder)
+                restored += 1
+        return restored
+
+    def oldest_time(self) -> Optional[datetime]:
+        """Время самого раннего ожидающего напоминания"""
+        heap = self._heap
+        while heap and self._entry_seq.get(heap[0][2]) != heap[0][1]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def flush(self) -> None:
+        if self.store is not None:
+            self.store.flush()
+
+    def _push(self, reminder: Dict[str, Any]) -> None:
+        reminder_id = reminder["reminder_id"]
+        self._seq += 1
+        self.reminders[reminder_id] = reminder
+        self._entry_seq[reminder_id] = self._seq
+        heapq.heappush(self._heap, (reminder["scheduled_time"], self._seq, reminder_id))
+
+    @staticmethod
+    def _to_dict(reminder: Dict[str, Any]) -> Dict[str, Any]:
+        data = dict(reminder)
+        for key in ("scheduled_time", "created_at"):
+            if isinstance(data.get(key), datetime):
+                data[key] = data[key].isoformat()
+        return data
+
+    @staticmethod
+    def _from_dict(data: Dict[str, Any]) -> Dict[str, Any]:
+        reminder = dict(data)
+        for key in ("scheduled_time", "created_at"):
+            if reminder.get(key):
+                reminder[key] = datetime.fromisoformat(reminder[key])
+        return reminder
+
+
 class FamilyNotificationManagerEnhanced:
     """
     Расширенный менеджер анонимных уведомлений для семей
@@ -143,19 +242,39 @@ class FamilyNotificationManagerEnhanced:
     - QR-код уведомления
     """
 
-    def __init__(self):
-        """Инициализация расширенной системы уведомлений"""
+    def __init__(self, schedule_store_path: Optional[str] = None):
+        """
+        Инициализация расширенной системы уведомлений
+
+        Args:
+            schedule_store_path: Журнал запланированных напоминаний;
+                путь задает вызывающий (по умолчанию напоминания
+                хранятся только в памяти)
+        """
         self.notifications: Dict[str, FamilyNotification] = {}
         self.family_channels: Dict[str, Dict[NotificationChannel, str]] = {}
         self.notification_history: List[NotificationResult] = []
         self.notification_templates: Dict[str, NotificationTemplate] = {}
-        self.scheduled_notifications: Dict[str, Dict[str, Any]] = {}
+
+        # Запланированные напоминания: куча по времени отправки + журнал
+        self.reminder_queue = ScheduledReminderQueue(schedule_store_path)
+        self.scheduled_notifications = self.reminder_queue.reminders
 
         # Настройки уведомлений
         self.max_notifications_per_family = 1000
         self.notification_retention_days = 30
         self.retry_attempts = 3
         self.retry_delay_seconds = 5
+        self.scheduled_batch_size = 100        # Одновременных отправок на канал
+        self.max_reminders_per_tick = 10000    # Напоминаний за один тик
+
+        # Статистика очереди напоминаний
+        self.schedule_stats: Dict[str, Any] = {
+            "total_sent": 0,
+            "total_failed": 0,
+            "total_retried": 0,
+            "last_tick": {},
+        }
 
         # Инициализация шаблонов
         self._initialize_notification_templates()
@@ -173,10 +292,7 @@ class FamilyNotificationManagerEnhanced:
             message_template="У вас осталось {days_left} дней тестового периода. "
             "Продлите подписку, чтобы сохранить защиту семьи.",
             priority=NotificationPriority.HIGH,
-            channels=[
-                NotificationChannel.PUSH,
-                NotificationChannel.IN_APP,
-                NotificationChannel.EMAIL],
+            channels=[NotificationChannel.IN_APP],  # ТОЛЬКО ВНУТРИ ПРИЛОЖЕНИЯ
             variables=[
                 "days_left",
                 "subscription_tier"])
@@ -188,7 +304,7 @@ class FamilyNotificationManagerEnhanced:
             title_template="Оплата успешно проведена",
             message_template="Ваша подписка {subscription_tier} активирована. Сумма: {amount}₽. Спасибо за доверие!",
             priority=NotificationPriority.MEDIUM,
-            channels=[NotificationChannel.PUSH, NotificationChannel.IN_APP, NotificationChannel.EMAIL],
+            channels=[NotificationChannel.IN_APP],  # ТОЛЬКО ВНУТРИ ПРИЛОЖЕНИЯ
             variables=["subscription_tier", "amount"]
         )
 
@@ -517,48 +633,127 @@ class FamilyNotificationManagerEnhanced:
         Returns:
             True если напоминание запланировано
         """
-        try:
-            reminder_id = str(uuid.uuid4())
-
-            self.scheduled_notifications[reminder_id] = {
-                "reminder_id": reminder_id,
-                "family_id": family_id,
-                "reminder_type": reminder_type,
-                "scheduled_time": scheduled_time,
-                "metadata": metadata,
-                "created_at": datetime.now(),
-                "is_sent": False
-            }
+        return await self.schedule_subscription_reminders([{
+            "family_id": family_id,
+            "reminder_type": reminder_type,
+            "scheduled_time": scheduled_time,
+            "metadata": metadata,
+        }]) == 1
+
+    async def schedule_subscription_reminders(self, reminders: List[Dict[str, Any]]) -> int:
+        """
+        Пакетное планирование напоминаний (одна запись журнала на пакет)
 
-            logger.info(f"Запланировано напоминание {reminder_type} для семьи {family_id} на {scheduled_time}")
-            return True
+        Args:
+            reminders: Словари с ключами family_id, reminder_type,
+                scheduled_time и metadata
+
+        Returns:
+            Количество запланированных напоминаний
+        """
+        scheduled = 0
+        try:
+            for item in reminders:
+                reminder_id = str(uuid.uuid4())
+                self.reminder_queue.push({
+                    "reminder_id": reminder_id,
+                    "family_id": item["family_id"],
+                    "reminder_type": item["reminder_type"],
+                    "scheduled_time": item["scheduled_time"],
+                    "metadata": item.get("metadata") or {},
+                    "created_at": datetime.now(),
+                    "attempts": 0
+                })
+                scheduled += 1
+                logger.debug(f"Запланировано напоминание {item['reminder_type']} для семьи "
+                             f"{item['family_id']} на {item['scheduled_time']}")
+
+            self.reminder_queue.flush()
+            logger.info(f"Запланировано напоминаний: {scheduled}")
+            return scheduled
 
         except Exception as e:
             logger.error(f"Ошибка планирования напоминания: {e}")
+            return scheduled
+
+    def cancel_scheduled_reminder(self, reminder_id: str) -> bool:
+        """Отмена запланированного напоминания"""
+        if self.reminder_queue.remove(reminder_id) is None:
             return False
+        self.reminder_queue.flush()
+        return True
 
     async def process_scheduled_notifications(self) -> int:
         """
         Обработка запланированных уведомлений
 
+        Из кучи извлекаются только наступившие напоминания. Они
+        группируются по набору каналов и отправляются параллельно,
+        пакетами не больше scheduled_batch_size на канал. Отправленные
+        удаляются из очереди, неудачные переносятся на
+        retry_delay_seconds до retry_attempts попыток.
+
         Returns:
             Количество отправленных уведомлений
         """
+        due: List[Dict[str, Any]] = []
         try:
-            sent_count = 0
+            started = time.perf_counter()
             now = datetime.now()
+            due = self.reminder_queue.pop_due(now, self.max_reminders_per_tick)
 
-            for reminder_id, reminder in list(self.scheduled_notifications.items()):
-                if (not reminder["is_sent"] and
-                        reminder["scheduled_time"] <= now):
+            groups: Dict[Tuple[NotificationChannel, ...], List[Dict[str, Any]]] = {}
+            for reminder in due:
+                channels = self._get_reminder_channels(reminder["reminder_type"])
+                groups.setdefault(channels, []).append(reminder)
 
-                    # Отправляем напоминание
-                    success = await self._send_scheduled_reminder(reminder)
+            group_results = await asyncio.gather(
+                *(self._send_reminder_group(group) for group in groups.values())
+            )
 
+            sent_count = failed_count = retried_count = 0
+            lags = []
+            for group, results in zip(groups.values(), group_results):
+                for reminder, success in zip(group, results):
+                    reminder_id = reminder["reminder_id"]
                     if success:
-                        reminder["is_sent"] = True
+                        self.reminder_queue.remove(reminder_id)
+                        lags.append((now - reminder["scheduled_time"]).total_seconds())
                         sent_count += 1
-                        logger.info(f"Отправлено запланированное напоминание {reminder_id}")
+                        logger.debug(f"Отправлено запланированное напоминание {reminder_id}")
+                        continue
+
+                    if reminder_id not in self.reminder_queue.reminders:
+                        # Отменено во время отправки - не возвращаем в очередь
+                        continue
+                    reminder["attempts"] = reminder.get("attempts", 0) + 1
+                    if reminder["attempts"] < self.retry_attempts:
+                        reminder["scheduled_time"] = now + timedelta(seconds=self.retry_delay_seconds)
+                        self.reminder_queue.push(reminder)
+                        retried_count += 1
+                    else:
+                        self.reminder_queue.remove(reminder_id)
+                        failed_count += 1
+                        logger.error(f"Напоминание {reminder_id} не отправлено "
+                                     f"после {reminder['attempts']} попыток")
+
+            self.reminder_queue.flush()
+
+            self.schedule_stats["total_sent"] += sent_count
+            self.schedule_stats["total_failed"] += failed_count
+            self.schedule_stats["total_retried"] += retried_count
+            self.schedule_stats["last_tick"] = {
+                "processed_at": now.isoformat(),
+                "due": len(due),
+                "sent": sent_count,
+                "failed": failed_count,
+                "retried": retried_count,
+                "duration_seconds": time.perf_counter() - started,
+                "lag_avg_seconds": sum(lags) / len(lags) if lags else 0.0,
+                "lag_max_seconds": max(lags) if lags else 0.0,
+            }
+            if sent_count:
+                logger.info(f"Отправлено запланированных напоминаний: {sent_count}")
 
             return sent_count
 
@@ -566,6 +761,44 @@ class FamilyNotificationManagerEnhanced:
             logger.error(f"Ошибка обработки запланированных уведомлений: {e}")
             return 0
 
+        finally:
+            # Необработанные из-за ошибки напоминания остаются в очереди
+            restored = self.reminder_queue.restore(due)
+            if restored:
+                logger.warning(f"Возвращено в очередь напоминаний: {restored}")
+
+    async def _send_reminder_group(self, reminders: List[Dict[str, Any]]) -> List[bool]:
+        """Отправка напоминаний с общими каналами пакетами по scheduled_batch_size"""
+        results: List[bool] = []
+        batch_size = max(1, self.scheduled_batch_size)
+        for offset in range(0, len(reminders), batch_size):
+            results.extend(await asyncio.gather(
+                *(self._send_scheduled_reminder(reminder)
+                  for reminder in reminders[offset:offset + batch_size])
+            ))
+        return results
+
+    def _get_reminder_channels(self, reminder_type: str) -> Tuple[NotificationChannel, ...]:
+        """Каналы, по которым уходит напоминание данного типа"""
+        if reminder_type == "trial_reminder":
+            return tuple(self.notification_templates["trial_reminder"].channels)
+        return (NotificationChannel.IN_APP,)
+
+    def get_schedule_stats(self) -> Dict[str, Any]:
+        """Статистика очереди напоминаний, включая отставание от расписания"""
+        now = datetime.now()
+        oldest = self.reminder_queue.oldest_time()
+        return {
+            "pending": len(self.reminder_queue),
+            "next_scheduled_time": oldest.isoformat() if oldest else None,
+            # Насколько самое раннее ожидающее напоминание уже просрочено
+            "queue_lag_seconds": max(0.0, (now - oldest).total_seconds()) if oldest else 0.0,
+            "total_sent": self.schedule_stats["total_sent"],
+            "total_failed": self.schedule_stats["total_failed"],
+            "total_retried": self.schedule_stats["total_retried"],
+            "last_tick": dict(self.schedule_stats["last_tick"]),
+        }
+
     async def _send_scheduled_reminder(self, reminder: Dict[str, Any]) -> bool:
         """Отправка запланированного напоминания"""
         try:
@@ -574,22 +807,24 @@ class FamilyNotificationManagerEnhanced:
             metadata = reminder["metadata"]
 
             if reminder_type == "trial_reminder":
-                return await self.send_trial_reminder(
+                result = await self.send_trial_reminder(
                     family_id=family_id,
                     days_left=metadata.get("days_left", 0),
                     subscription_tier=metadata.get("subscription_tier", "basic")
-                ).success
+                )
+                return result.success
 
             elif reminder_type == "subscription_expiring":
-                return await self.send_family_alert(
+                result = await self.send_family_alert(
                     family_id=family_id,
                     notification_type=NotificationType.SUBSCRIPTION_EXPIRING,
                     priority=NotificationPriority.HIGH,
                     title="Подписка истекает",
                     message=f"Ваша подписка {metadata.get('subscription_tier', '')} "
                     f"истекает через {metadata.get('days_left', 0)} дней",
-                    channels=[NotificationChannel.PUSH, NotificationChannel.IN_APP]
-                ).success
+                    channels=list(self._get_reminder_channels(reminder_type))
+                )
+                return result.success
 
             return False
 
@@ -691,15 +926,18 @@ class FamilyNotificationManagerEnhanced:
             sent_channels = []
             failed_channels = []
 
-            for channel in notification.channels:
-                try:
-                    success = await self._send_to_channel(notification, channel)
-                    if success:
-                        sent_channels.append(channel)
-                    else:
-                        failed_channels.append(channel)
-                except Exception as e:
-                    logger.error(f"Ошибка отправки по каналу {channel.value}: {e}")
+            # Каналы независимы - отправляем параллельно
+            results = await asyncio.gather(
+                *(self._send_to_channel(notification, channel) for channel in notification.channels),
+                return_exceptions=True
+            )
+            for channel, success in zip(notification.channels, results):
+                if isinstance(success, Exception):
+                    logger.error(f"Ошибка отправки по каналу {channel.value}: {success}")
+                    failed_channels.append(channel)
+                elif success:
+                    sent_channels.append(channel)
+                else:
                     failed_channels.append(channel)
 
             return NotificationResult(
@@ -728,30 +966,14 @@ class FamilyNotificationManagerEnhanced:
                 # Внутри приложения - всегда успешно
                 return True
 
-            elif channel == NotificationChannel.PUSH:
-                # PUSH-уведомления
-                return await self._send_push_notification(notification)
-
-            elif channel == NotificationChannel.EMAIL:
-                # Email уведомления
-                return await self._send_email_notification(notification)
-
-            elif channel == NotificationChannel.SMS:
-                # SMS уведомления
-                return await self._send_sms_notification(notification)
-
-            elif channel == NotificationChannel.TELEGRAM:
-                # Telegram уведомления
-                return await self._send_telegram_notification(notification)
-
-            elif channel == NotificationChannel.WHATSAPP:
-                # WhatsApp уведомления
-                return await self._send_whatsapp_notification(notification)
-
             elif channel == NotificationChannel.QR_CODE:
                 # QR-код уведомления
                 return await self._send_qr_notification(notification)
 
+            elif channel == NotificationChannel.VOICE:
+                # Голосовое уведомление
+                return await self._send_voice_notification(notification)
+
             else:
                 logger.warning(f"Неподдерживаемый канал: {channel.value}")
                 return False
@@ -760,36 +982,6 @@ class FamilyNotificationManagerEnhanced:
             logger.error(f"Ошибка отправки по каналу {channel.value}: {e}")
             return False
 
-    async def _send_push_notification(self, notification: FamilyNotification) -> bool:
-        """Отправка PUSH-уведомления"""
-        # Здесь должна быть интеграция с PUSH-сервисом
-        logger.info(f"PUSH уведомление отправлено: {notification.title}")
-        return True
-
-    async def _send_email_notification(self, notification: FamilyNotification) -> bool:
-        """Отправка email уведомления"""
-        # Здесь должна быть интеграция с email-сервисом
-        logger.info(f"Email уведомление отправлено: {notification.title}")
-        return True
-
-    async def _send_sms_notification(self, notification: FamilyNotification) -> bool:
-        """Отправка SMS уведомления"""
-        # Здесь должна быть интеграция с SMS-сервисом
-        logger.info(f"SMS уведомление отправлено: {notification.title}")
-        return True
-
-    async def _send_telegram_notification(self, notification: FamilyNotification) -> bool:
-        """Отправка Telegram уведомления"""
-        # Здесь должна быть интеграция с Telegram Bot API
-        logger.info(f"Telegram уведомление отправлено: {notification.title}")
-        return True
-
-    async def _send_whatsapp_notification(self, notification: FamilyNotification) -> bool:
-        """Отправка WhatsApp уведомления"""
-        # Здесь должна быть интеграция с WhatsApp Business API
-        logger.info(f"WhatsApp уведомление отправлено: {notification.title}")
-        return True
-
     async def _send_qr_notification(self, notification: FamilyNotification) -> bool:
         """Отправка QR-код уведомления"""
         if notification.qr_code:
@@ -797,6 +989,12 @@ class FamilyNotificationManagerEnhanced:
             return True
         return False
 
+    async def _send_voice_notification(self, notification: FamilyNotification) -> bool:
+        """Отправка голосового уведомления"""
+        # Здесь должна быть интеграция с голосовым ассистентом приложения
+        logger.info(f"Голосовое уведомление отправлено: {notification.title}")
+        return True
+
     def register_device_token(self, family_id: str, device_token: str,
                               device_type: str) -> bool:
         """Регистрация токена устройства для PUSH-уведомлений"""
@@ -826,6 +1024,7 @@ class FamilyNotificationManagerEnhanced:
                 "by_priority": {},
                 "by_channel": {},
                 "scheduled_notifications": len(self.scheduled_notifications),
+                "schedule": self.get_schedule_stats(),
                 "unread_notifications": len([n for n in self.notifications.values() if not n.is_read])
             }
 
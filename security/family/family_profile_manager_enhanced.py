@@ -13,17 +13,24 @@ FamilyProfileManagerEnhanced - Расширенный менеджер семе
 import logging
 import threading
 import uuid
+from collections import deque
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
 from functools import wraps
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from operator import attrgetter, methodcaller
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
 
+import numpy as np
 from sklearn.cluster import KMeans
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 
 from core.base import ComponentStatus, SecurityBase
+from security.family.family_member_table import (
+    FamilyMemberIndex,
+    MemberTable,
+)
 
 
 class FamilyRole(Enum):
@@ -287,6 +294,18 @@ class FamilyNotification:
 class FamilyProfileManagerEnhanced(SecurityBase):
     """Расширенный менеджер семейных профилей с AI коммуникацией"""
 
+    # Признаки сообщения для ML (см. _extract_message_features)
+    MESSAGE_FEATURES = (
+        "length",
+        "exclamations",
+        "questions",
+        "spaces",
+        "recipients",
+        "encrypted",
+        "hour",
+        "weekday",
+    )
+
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         super().__init__("FamilyProfileManagerEnhanced", config)
         self.logger = logging.getLogger(
@@ -315,10 +334,16 @@ class FamilyProfileManagerEnhanced(SecurityBase):
             {}
         )  # family_id -> contacts
 
+        # Индексы членов семей и колоночная таблица всех членов системы
+        self._member_indexes: Dict[str, FamilyMemberIndex] = {}
+        self.member_table = MemberTable(FamilyRole, AgeGroup)
+
         # AI компоненты
         self.ml_models = {}
         self.scaler = StandardScaler()
         self.is_ml_initialized = False
+        self.ml_analyzed_messages = 0
+        self.ml_batches = 0
 
         # Статистика
         self.total_families = 0
@@ -341,14 +366,27 @@ class FamilyProfileManagerEnhanced(SecurityBase):
                 "enable_audit_logging", True
             )
             self.enable_ai_analysis = config.get("enable_ai_analysis", True)
+            self.ml_batch_size = config.get("ml_batch_size", 256)
+            self.ml_batch_delay = config.get("ml_batch_delay", 0.05)
         else:
             self.max_members_per_family = 50
             self.max_members_per_group = 20
             self.enable_audit_logging = True
             self.enable_ai_analysis = True
+            self.ml_batch_size = 256
+            self.ml_batch_delay = 0.05
 
         # Блокировки для потокобезопасности
         self._lock = threading.RLock()
+        self._ml_lock = threading.Lock()
+
+        # Очередь ML анализа: сообщения анализируются пакетами в фоне
+        self._ml_queue: Deque[Message] = deque()
+        self._ml_wakeup = threading.Event()
+        self._ml_idle = threading.Event()
+        self._ml_idle.set()
+        self._ml_stop = threading.Event()
+        self._ml_thread: Optional[threading.Thread] = None
 
     def initialize(self) -> bool:
         """Инициализация менеджера"""
@@ -389,14 +427,17 @@ class FamilyProfileManagerEnhanced(SecurityBase):
                 contamination=0.1, random_state=42
             )
 
-            # Предварительное обучение на тестовых данных
-            import numpy as np
-
-            test_features = np.random.rand(20, 13)  # 20 образцов, 13 признаков
+            # Предварительное обучение на тестовых данных: признаки
+            # сообщений стандартизуются, поэтому обучаем на N(0, 1)
+            rng = np.random.default_rng(42)
+            test_features = rng.standard_normal(
+                (20, len(self.MESSAGE_FEATURES))
+            )
             self.ml_models["message_clusterer"].fit(test_features)
             self.ml_models["anomaly_detector"].fit(test_features)
 
             self.is_ml_initialized = True
+            self._start_ml_worker()
             self.log_activity("ML модели инициализированы и обучены")
 
         except Exception as e:
@@ -435,6 +476,7 @@ class FamilyProfileManagerEnhanced(SecurityBase):
                 )
 
                 self.families[family_id] = family
+                self._member_indexes[family_id] = FamilyMemberIndex()
                 self.total_families += 1
                 self.active_families += 1
 
@@ -464,6 +506,12 @@ class FamilyProfileManagerEnhanced(SecurityBase):
                     self.logger.error(f"Семья {family_id} не найдена")
                     return False
 
+                if member_id in self.families[family_id].members:
+                    self.logger.warning(
+                        f"Член семьи {member_id} уже существует"
+                    )
+                    return False
+
                 if (
                     len(self.families[family_id].members)
                     >= self.max_members_per_family
@@ -490,8 +538,12 @@ class FamilyProfileManagerEnhanced(SecurityBase):
                     security_level=self._get_security_level_by_role(role),
                 )
 
-                self.families[family_id].members[member_id] = member
-                self.families[family_id].updated_at = datetime.now()
+                family = self.families[family_id]
+                index = self._get_member_index(family)
+                family.members[member_id] = member
+                family.updated_at = datetime.now()
+                index.add(member)
+                self.member_table.add(family_id, member)
                 self.total_members += 1
                 self.active_members += 1
 
@@ -504,6 +556,111 @@ class FamilyProfileManagerEnhanced(SecurityBase):
             self.logger.error(f"Ошибка добавления члена семьи: {e}")
             return False
 
+    def remove_family_member(self, family_id: str, member_id: str) -> bool:
+        """Удаление члена семьи из семьи и ее групп"""
+        try:
+            with self._lock:
+                if family_id not in self.families:
+                    self.logger.error(f"Семья {family_id} не найдена")
+                    return False
+
+                family = self.families[family_id]
+                if member_id not in family.members:
+                    self.logger.error(f"Член семьи {member_id} не найден")
+                    return False
+
+                index = self._get_member_index(family)
+                member = family.members.pop(member_id)
+                index.remove(member)
+                self.member_table.remove(family_id, member_id)
+                for group in family.groups.values():
+                    group.members.pop(member_id, None)
+                if self.member_groups.get(member_id) in family.groups:
+                    del self.member_groups[member_id]
+
+                family.updated_at = datetime.now()
+                self.total_members -= 1
+                self.active_members -= bool(member.is_active)
+
+                self.log_activity(
+                    f"Член семьи {member.name} удален из семьи {family_id}"
+                )
+                return True
+
+        except Exception as e:
+            self.logger.error(f"Ошибка удаления члена семьи: {e}")
+            return False
+
+    def update_family_member(
+        self,
+        family_id: str,
+        member_id: str,
+        age: Optional[int] = None,
+        role: Optional[FamilyRole] = None,
+        is_active: Optional[bool] = None,
+    ) -> bool:
+        """
+        Обновление возраста, роли или активности члена семьи
+
+        Изменения этих полей нужно делать через этот метод, иначе
+        индексы и статистика семьи их не увидят.
+        """
+        try:
+            with self._lock:
+                if family_id not in self.families:
+                    return False
+
+                family = self.families[family_id]
+                if member_id not in family.members:
+                    return False
+
+                index = self._get_member_index(family)
+                member = family.members[member_id]
+                old_role, old_age_group = member.role, member.age_group
+                was_active = member.is_active
+
+                if age is not None:
+                    member.age = age
+                    member.age_group = self._determine_age_group(age)
+                if role is not None:
+                    member.role = role
+                if is_active is not None:
+                    member.is_active = is_active
+
+                index.move(member, old_role, old_age_group, was_active)
+                self.member_table.update(family_id, member)
+                self.active_members += bool(member.is_active) - bool(
+                    was_active
+                )
+                family.updated_at = datetime.now()
+
+                self.log_activity(f"Член семьи {member_id} обновлен")
+                return True
+
+        except Exception as e:
+            self.logger.error(f"Ошибка обновления члена семьи: {e}")
+            return False
+
+    def _get_member_index(self, family: FamilyProfile) -> FamilyMemberIndex:
+        """
+        Индекс членов семьи
+
+        Если словарь members изменили в обход менеджера, индекс и
+        строки таблицы семьи строятся заново.
+        """
+        index = self._member_indexes.get(family.family_id)
+        if index is not None and len(index) == len(family.members):
+            return index
+
+        with self._lock:
+            index = FamilyMemberIndex()
+            self.member_table.remove_family(family.family_id)
+            for member in family.members.values():
+                index.add(member)
+                self.member_table.add(family.family_id, member)
+            self._member_indexes[family.family_id] = index
+            return index
+
     def _determine_role_by_age(self, age: int) -> FamilyRole:
         """Определение роли по возрасту"""
         if age < 13:
@@ -649,9 +806,12 @@ class FamilyProfileManagerEnhanced(SecurityBase):
                 group_id=group_id,
             )
 
-            # AI анализ сообщения
+            # Приоритет по ключевым словам сразу, ML оценка - в фоне
             if self.enable_ai_analysis and self.is_ml_initialized:
-                self._analyze_message(message)
+                self._apply_keyword_priority(message)
+                self._ml_queue.append(message)
+                self._ml_idle.clear()
+                self._ml_wakeup.set()
 
             self.messages[message_id] = message
             self.total_messages += 1
@@ -676,22 +836,92 @@ class FamilyProfileManagerEnhanced(SecurityBase):
             if not self.is_ml_initialized:
                 return
 
-            # Подготовка данных для анализа
-            # features = self._extract_message_features(message)  # Временно отключено
+            self._apply_keyword_priority(message)
+            self._analyze_messages([message])
 
-            # Простой анализ без ML (временно для тестирования)
-            message.metadata["cluster"] = 0
-            message.metadata["anomaly_score"] = 0.0
+        except Exception as e:
+            self.logger.error(f"Ошибка AI анализа: {e}")
 
-            # Анализ приоритета по ключевым словам
-            if "emergency" in message.content.lower():
-                message.priority = MessagePriority.EMERGENCY
-            elif "urgent" in message.content.lower():
-                message.priority = MessagePriority.HIGH
+    def _apply_keyword_priority(self, message: Message) -> None:
+        """Анализ приоритета по ключевым словам"""
+        content = message.content.lower()
+        if "emergency" in content:
+            message.priority = MessagePriority.EMERGENCY
+        elif "urgent" in content:
+            message.priority = MessagePriority.HIGH
+
+    def _analyze_messages(self, messages: List[Message]) -> None:
+        """
+        Пакетный ML анализ сообщений
+
+        Признаки пакета собираются в одну матрицу, стандартизуются
+        скользящим StandardScaler и оцениваются моделями за один вызов.
+        """
+        if not messages:
+            return
+        try:
+            features = self._extract_messages_features(messages)
+            with self._ml_lock:
+                self.scaler.partial_fit(features)
+                scaled = self.scaler.transform(features)
+                clusters = self.ml_models["message_clusterer"].predict(scaled)
+                # Чем больше оценка, тем аномальнее сообщение
+                anomaly_scores = -self.ml_models[
+                    "anomaly_detector"
+                ].score_samples(scaled)
+
+            for message, cluster, score in zip(
+                messages, clusters.tolist(), anomaly_scores.tolist()
+            ):
+                message.metadata["cluster"] = cluster
+                message.metadata["anomaly_score"] = score
+
+            self.ml_analyzed_messages += len(messages)
+            self.ml_batches += 1
 
         except Exception as e:
             self.logger.error(f"Ошибка AI анализа: {e}")
 
+    def _start_ml_worker(self) -> None:
+        """Запуск фонового потока пакетного ML анализа"""
+        if self._ml_thread is not None and self._ml_thread.is_alive():
+            return
+        self._ml_stop.clear()
+        self._ml_thread = threading.Thread(
+            target=self._ml_batch_worker,
+            name="FamilyProfileML",
+            daemon=True,
+        )
+        self._ml_thread.start()
+
+    def _ml_batch_worker(self) -> None:
+        """Фоновый поток пакетного ML анализа новых сообщений"""
+        while not self._ml_stop.is_set():
+            self._ml_wakeup.wait()
+            self._ml_wakeup.clear()
+
+            # Даем накопиться пакету, остановка прерывает ожидание
+            if len(self._ml_queue) < self.ml_batch_size:
+                self._ml_stop.wait(self.ml_batch_delay)
+            self._drain_ml_queue()
+
+    def _drain_ml_queue(self) -> None:
+        """Анализ всех сообщений очереди пакетами"""
+        while self._ml_queue:
+            batch = []
+            while self._ml_queue and len(batch) < self.ml_batch_size:
+                batch.append(self._ml_queue.popleft())
+            self._analyze_messages(batch)
+        self._ml_idle.set()
+        if self._ml_queue:
+            # Сообщение добавлено между проверкой очереди и флагом
+            self._ml_idle.clear()
+            self._ml_wakeup.set()
+
+    def wait_ml_idle(self, timeout: Optional[float] = None) -> bool:
+        """Ожидание завершения ML анализа отправленных сообщений"""
+        return self._ml_idle.wait(timeout)
+
     def _extract_message_features(self, message: Message) -> List[float]:
         """Извлечение признаков сообщения для ML"""
         features = [
@@ -706,6 +936,30 @@ class FamilyProfileManagerEnhanced(SecurityBase):
         ]
         return features
 
+    def _extract_messages_features(
+        self, messages: List[Message]
+    ) -> np.ndarray:
+        """Матрица признаков пакета сообщений (по колонкам)"""
+        count = len(messages)
+        contents = list(map(attrgetter("content"), messages))
+        timestamps = list(map(attrgetter("timestamp"), messages))
+        columns = (
+            map(len, contents),
+            map(methodcaller("count", "!"), contents),
+            map(methodcaller("count", "?"), contents),
+            map(methodcaller("count", " "), contents),
+            map(len, map(attrgetter("recipient_ids"), messages)),
+            map(attrgetter("is_encrypted"), messages),
+            map(attrgetter("hour"), timestamps),
+            map(methodcaller("weekday"), timestamps),
+        )
+        features = np.empty((count, len(self.MESSAGE_FEATURES)))
+        for index, column in enumerate(columns):
+            features[:, index] = np.fromiter(
+                column, dtype=np.float64, count=count
+            )
+        return features
+
     # ==================== АНАЛИТИКА И СТАТИСТИКА ====================
 
     def get_family_statistics(
@@ -723,9 +977,7 @@ class FamilyProfileManagerEnhanced(SecurityBase):
                 "family_name": family.family_name,
                 "total_members": len(family.members),
                 "total_groups": len(family.groups),
-                "active_members": sum(
-                    1 for m in family.members.values() if m.is_active
-                ),
+                "active_members": self._get_member_index(family).active,
                 "active_groups": sum(
                     1
                     for g in family.groups.values()
@@ -745,19 +997,11 @@ class FamilyProfileManagerEnhanced(SecurityBase):
 
     def _get_age_distribution(self, family: FamilyProfile) -> Dict[str, int]:
         """Распределение по возрастным группам"""
-        distribution = {}
-        for member in family.members.values():
-            age_group = member.age_group.value
-            distribution[age_group] = distribution.get(age_group, 0) + 1
-        return distribution
+        return self._get_member_index(family).age_distribution()
 
     def _get_role_distribution(self, family: FamilyProfile) -> Dict[str, int]:
         """Распределение по ролям"""
-        distribution = {}
-        for member in family.members.values():
-            role = member.role.value
-            distribution[role] = distribution.get(role, 0) + 1
-        return distribution
+        return self._get_member_index(family).role_distribution()
 
     def get_system_statistics(self) -> Dict[str, Any]:
         """Получение системной статистики"""
@@ -769,7 +1013,15 @@ class FamilyProfileManagerEnhanced(SecurityBase):
             "total_groups": self.total_groups,
             "active_groups": self.active_groups,
             "total_messages": self.total_messages,
+            "role_distribution": self.member_table.role_distribution(),
+            "age_distribution": self.member_table.age_distribution(),
+            "security_level_distribution": (
+                self.member_table.security_level_distribution()
+            ),
+            "average_age": self.member_table.average_age(),
             "ml_initialized": self.is_ml_initialized,
+            "ml_queue_size": len(self._ml_queue),
+            "ml_analyzed_messages": self.ml_analyzed_messages,
             "status": self.status.value,
             "uptime": (
                 (datetime.now() - self.start_time).total_seconds()
@@ -794,6 +1046,7 @@ class FamilyProfileManagerEnhanced(SecurityBase):
 
                 member = self.families[family_id].members[member_id]
                 member.security_level = security_level
+                self.member_table.update(family_id, member)
                 self.log_activity(
                     f"Уровень безопасности {member_id} обновлен до "
                     f"{security_level}"
@@ -812,8 +1065,8 @@ class FamilyProfileManagerEnhanced(SecurityBase):
             if family_id not in self.families:
                 return []
 
-            members = self.families[family_id].members.values()
-            return [member for member in members if member.role == role]
+            family = self.families[family_id]
+            return self._get_member_index(family).members(role)
 
         except Exception as e:
             self.logger.error(f"Ошибка получения членов по роли: {e}")
@@ -838,6 +1091,15 @@ class FamilyProfileManagerEnhanced(SecurityBase):
                 self.log_activity(
                     "Завершение работы FamilyProfileManagerEnhanced"
                 )
+
+                # Анализ сообщений, оставшихся в очереди
+                self._ml_stop.set()
+                self._ml_wakeup.set()
+                if self._ml_thread is not None:
+                    self._ml_thread.join()
+                    self._ml_thread = None
+                self._drain_ml_queue()
+
                 self.status = ComponentStatus.STOPPING
 
                 # Сохранение данных
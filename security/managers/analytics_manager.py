@@ -17,16 +17,24 @@ import asyncio
 import hashlib
 import logging
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterable, Dict, Iterable, List, Optional, Union
 
 import numpy as np
 from sklearn.cluster import KMeans
 from sklearn.ensemble import IsolationForest, RandomForestClassifier
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 
+from security.managers.incremental_analytics import (
+    Batch,
+    FeatureExtractor,
+    IncrementalModels,
+    RunningStats,
+)
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -79,6 +87,11 @@ class AnalyticsConfig:
     enable_ml: bool = True
     enable_clustering: bool = True
     enable_prediction: bool = True
+    incremental: bool = False  # Потоковый режим с дообучением моделей
+    batch_size: int = 100000  # Строк в пакете потокового режима
+    n_clusters: int = 5
+    model_snapshot_path: Optional[str] = None  # Снимок моделей на диске
+    max_results: int = 1000  # Лимит хранимых результатов (LRU)
 
 
 @dataclass
@@ -124,27 +137,25 @@ class MLModel(ABC):
 class BehavioralAnalyzer(DataProcessor):
     """Анализатор поведения пользователей"""
 
+    FEATURES = [
+        ("session_duration", 0),
+        ("page_views", 0),
+        ("click_rate", 0.0),
+        ("time_on_site", 0),
+        ("bounce_rate", 0.0),
+        ("conversion_rate", 0.0),
+    ]
+
     def __init__(self):
         self.scaler = StandardScaler()
         self.encoder = LabelEncoder()
+        self.extractor = FeatureExtractor(self.FEATURES)
 
-    async def process(self, data: List[Dict[str, Any]]) -> np.ndarray:
+    async def process(self, data: Batch) -> np.ndarray:
         """Обработка данных поведения"""
         try:
             # Извлекаем признаки поведения
-            features = []
-            for record in data:
-                feature_vector = [
-                    record.get("session_duration", 0),
-                    record.get("page_views", 0),
-                    record.get("click_rate", 0.0),
-                    record.get("time_on_site", 0),
-                    record.get("bounce_rate", 0.0),
-                    record.get("conversion_rate", 0.0),
-                ]
-                features.append(feature_vector)
-
-            return np.array(features)
+            return self.extractor.extract(data)
 
         except Exception as e:
             logger.error(f"Ошибка обработки данных поведения: {e}")
@@ -154,26 +165,24 @@ class BehavioralAnalyzer(DataProcessor):
 class ThreatAnalyzer(DataProcessor):
     """Анализатор угроз"""
 
+    FEATURES = [
+        ("severity_score", 0),
+        ("threat_level", 0),
+        ("attack_type", 0),
+        ("source_ip_risk", 0.0),
+        ("target_risk", 0.0),
+        ("time_risk", 0.0),
+    ]
+
     def __init__(self):
         self.scaler = StandardScaler()
+        self.extractor = FeatureExtractor(self.FEATURES)
 
-    async def process(self, data: List[Dict[str, Any]]) -> np.ndarray:
+    async def process(self, data: Batch) -> np.ndarray:
         """Обработка данных угроз"""
         try:
             # Извлекаем признаки угроз
-            features = []
-            for record in data:
-                feature_vector = [
-                    record.get("severity_score", 0),
-                    record.get("threat_level", 0),
-                    record.get("attack_type", 0),
-                    record.get("source_ip_risk", 0.0),
-                    record.get("target_risk", 0.0),
-                    record.get("time_risk", 0.0),
-                ]
-                features.append(feature_vector)
-
-            return np.array(features)
+            return self.extractor.extract(data)
 
         except Exception as e:
             logger.error(f"Ошибка обработки данных угроз: {e}")
@@ -263,9 +272,11 @@ class AnalyticsManager:
         self.config = config
         self.processors: Dict[AnalyticsType, DataProcessor] = {}
         self.models: Dict[str, MLModel] = {}
-        self.results: Dict[str, AnalyticsResult] = {}
+        # Результаты в порядке использования, старые вытесняются
+        self.results: "OrderedDict[str, AnalyticsResult]" = OrderedDict()
         self.is_running = False
         self.logger = logging.getLogger(__name__)
+        self.incremental_models: Optional[IncrementalModels] = None
 
         # Инициализация процессоров
         self._initialize_processors()
@@ -284,19 +295,33 @@ class AnalyticsManager:
         self.models["clustering"] = ClusteringModel()
         self.models["predictive"] = PredictiveModel()
 
-    async def analyze(self, data: List[Dict[str, Any]]) -> AnalyticsResult:
-        """Выполнение анализа данных"""
+        # Потоковые модели с теплым стартом из снимка
+        if self.config.incremental:
+            processor = self.processors.get(self.config.analysis_type)
+            if processor is not None:
+                self.incremental_models = IncrementalModels(
+                    width=len(processor.extractor.columns),
+                    n_clusters=self.config.n_clusters,
+                    contamination=self.config.anomaly_threshold,
+                    reservoir_size=self.config.sample_size,
+                    snapshot_path=self.config.model_snapshot_path,
+                )
+                if self.incremental_models.load():
+                    self.logger.info("Модели аналитики загружены из снимка")
+
+    def _new_result(self, data_points: int) -> AnalyticsResult:
+        """Создание результата для нового анализа"""
         analysis_id = hashlib.md5(
             f"{self.config.analysis_type.value}_{datetime.now()}".encode()
         ).hexdigest()[:8]
 
-        result = AnalyticsResult(
+        return AnalyticsResult(
             analysis_id=analysis_id,
             analysis_type=self.config.analysis_type,
             status=AnalysisStatus.RUNNING,
             start_time=datetime.now(),
             end_time=None,
-            data_points=len(data),
+            data_points=data_points,
             insights=[],
             recommendations=[],
             confidence_score=0.0,
@@ -304,6 +329,24 @@ class AnalyticsManager:
             metadata={},
         )
 
+    def _store_result(self, result: AnalyticsResult) -> None:
+        """Сохранение результата с вытеснением самых старых"""
+        self.results[result.analysis_id] = result
+        self.results.move_to_end(result.analysis_id)
+        while len(self.results) > max(self.config.max_results, 1):
+            self.results.popitem(last=False)
+
+    async def analyze(self, data: List[Dict[str, Any]]) -> AnalyticsResult:
+        """Выполнение анализа данных"""
+        if self.config.incremental:
+            size = max(self.config.batch_size, 1)
+            return await self.analyze_stream(
+                data[start: start + size]
+                for start in range(0, len(data), size)
+            )
+
+        result = self._new_result(len(data))
+
         try:
             # Обработка данных
             processor = self.processors.get(self.config.analysis_type)
@@ -353,25 +396,128 @@ class AnalyticsManager:
             result.status = AnalysisStatus.FAILED
             result.end_time = datetime.now()
 
-        self.results[analysis_id] = result
+        self._store_result(result)
+        return result
+
+    async def analyze_stream(
+        self, batches: Union[Iterable[Batch], AsyncIterable[Batch]]
+    ) -> AnalyticsResult:
+        """
+        Потоковый анализ пакетами с дообучением моделей
+
+        Пакеты (строки-словари или колонки numpy) обрабатываются по
+        одному: признаки, статистики, partial_fit моделей и оценка
+        строк. Память ограничена размером пакета и выборки, поэтому
+        окно событий может быть любой длины. После анализа снимок
+        моделей сохраняется для теплого старта.
+
+        Args:
+            batches: Пакеты данных (синхронный или асинхронный поток)
+
+        Returns:
+            AnalyticsResult: Результат анализа
+        """
+        result = self._new_result(0)
+        result.metadata["mode"] = "incremental"
+
+        try:
+            processor = self.processors.get(self.config.analysis_type)
+            models = self.incremental_models
+            if not processor or models is None:
+                raise ValueError(
+                    f"Процессор для {self.config.analysis_type} не найден"
+                )
+
+            stats = RunningStats()
+            cluster_sizes = np.zeros(self.config.n_clusters, dtype=np.int64)
+            anomalies = scored = batch_count = 0
+
+            if hasattr(batches, "__aiter__"):
+                iterator = batches
+            else:
+                iterator = _as_async(batches)
+
+            async for batch in iterator:
+                features = await processor.process(batch)
+                if len(features) == 0:
+                    continue
+                batch_count += 1
+                result.data_points += len(features)
+                stats.update(features)
+
+                if self.config.enable_ml or self.config.enable_clustering:
+                    scores = models.partial_fit(features)
+                    if scores["clusters"] is not None:
+                        cluster_sizes += np.bincount(
+                            scores["clusters"],
+                            minlength=self.config.n_clusters,
+                        )
+                        anomalies += int(scores["anomalies"].sum())
+                        scored += len(features)
+
+                # Отдаем управление циклу событий между пакетами
+                await asyncio.sleep(0)
+
+            if result.data_points == 0:
+                raise ValueError("Нет данных для анализа")
+
+            if self.config.enable_ml and scored:
+                result.anomaly_score = anomalies / scored
+            if self.config.enable_clustering and scored:
+                result.metadata["cluster_sizes"] = {
+                    cluster: int(size)
+                    for cluster, size in enumerate(cluster_sizes)
+                    if size
+                }
+            result.metadata.update(
+                {
+                    "batches": batch_count,
+                    "samples_seen": models.samples_seen,
+                    "warm_started": models.warm_started,
+                    "snapshot_saved": models.save(),
+                }
+            )
+
+            result.insights = self._format_insights(stats, result)
+            result.recommendations = await self._generate_recommendations(
+                result
+            )
+            result.confidence_score = await self._calculate_confidence(result)
+
+            result.status = AnalysisStatus.COMPLETED
+            result.end_time = datetime.now()
+
+        except Exception as e:
+            self.logger.error(f"Ошибка потокового анализа: {e}")
+            result.status = AnalysisStatus.FAILED
+            result.end_time = datetime.now()
+
+        self._store_result(result)
         return result
 
     async def _generate_insights(
         self, data: np.ndarray, result: AnalyticsResult
     ) -> List[str]:
         """Генерация инсайтов"""
+        stats = RunningStats()
+        try:
+            stats.update(np.asarray(data, dtype=np.float64))
+        except Exception as e:
+            self.logger.error(f"Ошибка генерации инсайтов: {e}")
+            return []
+        return self._format_insights(stats, result)
+
+    def _format_insights(
+        self, stats: RunningStats, result: AnalyticsResult
+    ) -> List[str]:
+        """Инсайты по накопленным статистикам"""
         insights = []
 
         try:
             # Базовые статистики
-            mean_val = np.mean(data)
-            std_val = np.std(data)
-            min_val = np.min(data)
-            max_val = np.max(data)
-
-            insights.append(f"Среднее значение: {mean_val:.2f}")
-            insights.append(f"Стандартное отклонение: {std_val:.2f}")
-            insights.append(f"Диапазон: {min_val:.2f} - {max_val:.2f}")
+            insights.append(f"Среднее значение: {stats.mean:.2f}")
+            insights.append(f"Стандартное отклонение: {stats.std:.2f}")
+            insights.append(f"Диапазон: {stats.min:.2f} - {stats.max:.2f}")
 
             # Анализ аномалий
             if result.anomaly_score > 0.1:
@@ -384,6 +530,9 @@ class AnalyticsManager:
                 clusters = result.metadata["clusters"]
                 unique_clusters = len(set(clusters))
                 insights.append(f"Выявлено {unique_clusters} кластеров данных")
+            elif "cluster_sizes" in result.metadata:
+                unique_clusters = len(result.metadata["cluster_sizes"])
+                insights.append(f"Выявлено {unique_clusters} кластеров данных")
 
         except Exception as e:
             self.logger.error(f"Ошибка генерации инсайтов: {e}")
@@ -449,7 +598,10 @@ class AnalyticsManager:
 
     async def get_results(self, analysis_id: str) -> Optional[AnalyticsResult]:
         """Получение результата анализа"""
-        return self.results.get(analysis_id)
+        result = self.results.get(analysis_id)
+        if result is not None:
+            self.results.move_to_end(analysis_id)
+        return result
 
     async def get_all_results(self) -> List[AnalyticsResult]:
         """Получение всех результатов"""
@@ -510,6 +662,12 @@ class AnalyticsManager:
             self.logger.error(f"Ошибка завершения работы: {e}")
 
 
+async def _as_async(batches: Iterable[Batch]) -> AsyncIterable[Batch]:
+    """Асинхронный обход синхронного потока пакетов"""
+    for batch in batches:
+        yield batch
+
+
 # Пример использования
 async def main():
     """Пример использования AnalyticsManager"""
@@ -18,6 +18,7 @@ import asyncio
 import logging
 import queue
 from abc import ABC, abstractmethod
+from collections import deque
 from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
@@ -121,6 +122,45 @@ class DashboardData:
     user_activity: Dict[str, int]
 
 
+@dataclass
+class _CachedWidget:
+    """Отрисованный виджет и входные данные, по которым он построен"""
+
+    data_version: int
+    inputs: Dict[str, Any]
+    rendered: Dict[str, Any]
+    revision: int
+
+
+class RollingSeries:
+    """Скользящий ряд значений метрики с накопленной суммой"""
+
+    def __init__(self, window: int = 100):
+        self.values: deque = deque(maxlen=window)
+        self.total = 0.0
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def append(self, value: float) -> None:
+        """Добавление значения, старое значение выходит из окна"""
+        if len(self.values) == self.values.maxlen:
+            self.total -= self.values[0]
+        self.values.append(value)
+        self.total += value
+
+    @property
+    def mean(self) -> float:
+        return self.total / len(self.values) if self.values else 0.0
+
+    @property
+    def change(self) -> float:
+        """Изменение последнего значения относительно предыдущего"""
+        if len(self.values) < 2:
+            return 0.0
+        return self.values[-1] - self.values[-2]
+
+
 class DataProcessor(ABC):
     """Абстрактный класс для обработки данных"""
 
@@ -144,8 +184,22 @@ class VisualizationEngine(ABC):
 class SecurityDataProcessor(DataProcessor):
     """Процессор данных безопасности"""
 
-    def __init__(self):
+    TREND_METRICS = (
+        "threats_detected",
+        "blocked_attacks",
+        "security_score",
+        "vulnerabilities",
+        "incidents",
+        "compliance_score",
+    )
+
+    def __init__(self, trend_window: int = 100):
         self.scaler = StandardScaler()
+        # Скользящие ряды метрик для трендов
+        self.series: Dict[str, RollingSeries] = {
+            metric: RollingSeries(trend_window)
+            for metric in self.TREND_METRICS
+        }
 
     async def process(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
         """Обработка данных безопасности"""
@@ -175,11 +229,30 @@ class SecurityDataProcessor(DataProcessor):
             logger.error(f"Ошибка обработки данных безопасности: {e}")
             return {}
 
+    def record(self, processed_data: Dict[str, Any]) -> None:
+        """Добавление обработанных данных в скользящие ряды"""
+        for metric, series in self.series.items():
+            series.append(float(processed_data.get(metric, 0)))
+
     async def calculate_trends(
-        self, historical_data: List[Dict[str, Any]]
+        self, historical_data: Optional[List[Dict[str, Any]]] = None
     ) -> Dict[str, Any]:
-        """Расчет трендов"""
+        """
+        Расчет трендов
+
+        Без historical_data тренд считается по скользящим рядам,
+        которые пополняет record().
+        """
         try:
+            if historical_data is None:
+                series = self.series["security_score"]
+                if len(series) < 2:
+                    return {"trend": "stable", "change_percent": 0.0}
+                trends = self._classify_trend(series.change)
+                trends["moving_average"] = series.mean
+                trends["samples"] = len(series)
+                return trends
+
             if len(historical_data) < 2:
                 return {"trend": "stable", "change_percent": 0.0}
 
@@ -189,24 +262,27 @@ class SecurityDataProcessor(DataProcessor):
 
             recent_score = recent.get("security_score", 0)
             previous_score = previous.get("security_score", 0)
-            security_score_change = recent_score - previous_score
-
-            if security_score_change > 0.1:
-                trend = "improving"
-            elif security_score_change < -0.1:
-                trend = "declining"
-            else:
-                trend = "stable"
-
-            return {
-                "trend": trend,
-                "change_percent": abs(security_score_change) * 100,
-            }
+            return self._classify_trend(recent_score - previous_score)
 
         except Exception as e:
             logger.error(f"Ошибка расчета трендов: {e}")
             return {"trend": "stable", "change_percent": 0.0}
 
+    @staticmethod
+    def _classify_trend(security_score_change: float) -> Dict[str, Any]:
+        """Тренд по изменению уровня безопасности"""
+        if security_score_change > 0.1:
+            trend = "improving"
+        elif security_score_change < -0.1:
+            trend = "declining"
+        else:
+            trend = "stable"
+
+        return {
+            "trend": trend,
+            "change_percent": abs(security_score_change) * 100,
+        }
+
 
 class ChartVisualizationEngine(VisualizationEngine):
     """Движок визуализации для графиков"""
@@ -276,12 +352,34 @@ class DashboardManager:
         self.data_processor = SecurityDataProcessor()
         self.visualization_engine = ChartVisualizationEngine()
         self.current_data: Optional[DashboardData] = None
+        self.trends: Dict[str, Any] = {
+            "trend": "stable",
+            "change_percent": 0.0,
+        }
         self.is_running = False
         self.logger = logging.getLogger(__name__)
 
         # Очередь для обновлений
         self.update_queue = queue.Queue()
 
+        # Версии данных и раскладки: виджет перерисовывается, только
+        # если изменились его входные данные
+        self.data_version = 0
+        self.layout_version = 0
+        self._revision = 0
+        self._widget_cache: Dict[str, _CachedWidget] = {}
+        self._refreshed: Optional[Tuple[int, int]] = None
+        self._dashboard_cache: Optional[Tuple[Tuple, Dict[str, Any]]] = None
+
+        # Подписчики получают только изменившиеся виджеты
+        self.subscriber_queue_size = 100
+        self._subscribers: Dict[str, asyncio.Queue] = {}
+        self._published_revision = 0
+        self._removed_widgets: List[str] = []
+        self._render_requested = False
+        self._stale = False
+        self._update_task: Optional[asyncio.Task] = None
+
     async def initialize(self) -> bool:
         """Инициализация панели управления"""
         try:
@@ -298,7 +396,9 @@ class DashboardManager:
 
             # Запуск фонового обновления
             if self.config.auto_refresh:
-                asyncio.create_task(self._background_update())
+                self._update_task = asyncio.create_task(
+                    self._background_update()
+                )
 
             self.logger.info("Панель управления инициализирована успешно")
             return True
@@ -323,27 +423,54 @@ class DashboardManager:
 
             processed_data = await self.data_processor.process(initial_data)
 
-            self.current_data = DashboardData(
-                dashboard_id=self.config.dashboard_id,
-                timestamp=datetime.now(),
-                metrics=processed_data,
-                alerts=[],
-                performance={"load_time": 0.1, "render_time": 0.05},
-                user_activity={"active_users": 1, "page_views": 0},
-            )
+            self._set_data(processed_data, [])
 
         except Exception as e:
             self.logger.error(f"Ошибка загрузки начальных данных: {e}")
 
+    def _set_data(
+        self, processed_data: Dict[str, Any], alerts: List[Dict[str, Any]]
+    ) -> None:
+        """Замена текущих данных; версия растет при изменении метрик"""
+        if self.current_data is None or (
+            self.current_data.metrics != processed_data
+        ):
+            self.data_version += 1
+
+        self.current_data = DashboardData(
+            dashboard_id=self.config.dashboard_id,
+            timestamp=datetime.now(),
+            metrics=processed_data,
+            alerts=alerts,
+            performance={"load_time": 0.1, "render_time": 0.05},
+            user_activity={
+                "active_users": max(len(self._subscribers), 1),
+                "page_views": 0,
+            },
+        )
+
     async def _background_update(self) -> None:
-        """Фоновое обновление данных"""
+        """Фоновое обновление данных (только если панель смотрят)"""
         while self.is_running:
             try:
                 await asyncio.sleep(self.config.refresh_interval)
+                if not self._subscribers and not self._render_requested:
+                    # Зрителей нет - данные обновятся при следующем запросе
+                    self._stale = True
+                    continue
+                self._render_requested = False
                 await self.update_data()
+            except asyncio.CancelledError:
+                break
             except Exception as e:
                 self.logger.error(f"Ошибка фонового обновления: {e}")
 
+    async def _refresh_if_stale(self) -> None:
+        """Обновление данных, пропущенных без зрителей"""
+        if self._stale:
+            self._stale = False
+            await self.update_data()
+
     async def update_data(self) -> bool:
         """Обновление данных панели управления"""
         try:
@@ -357,16 +484,35 @@ class DashboardManager:
                 "compliance_score": np.random.uniform(0.7, 1.0),
             }
 
-            processed_data = await self.data_processor.process(new_data)
+            return await self.apply_data(new_data)
+
+        except Exception as e:
+            self.logger.error(f"Ошибка обновления данных: {e}")
+            return False
+
+    async def apply_data(self, raw_data: Dict[str, Any]) -> bool:
+        """
+        Применение новых данных источника
 
-            self.current_data = DashboardData(
-                dashboard_id=self.config.dashboard_id,
-                timestamp=datetime.now(),
-                metrics=processed_data,
-                alerts=self._generate_alerts(processed_data),
-                performance={"load_time": 0.1, "render_time": 0.05},
-                user_activity={"active_users": 1, "page_views": 0},
+        Обновляет скользящие ряды трендов, перерисовывает виджеты с
+        изменившимися входными данными и рассылает подписчикам только
+        эти виджеты.
+
+        Args:
+            raw_data: Сырые данные безопасности
+
+        Returns:
+            bool: True, если данные применены
+        """
+        try:
+            processed_data = await self.data_processor.process(raw_data)
+            self.data_processor.record(processed_data)
+            self.trends = await self.data_processor.calculate_trends()
+
+            self._set_data(
+                processed_data, self._generate_alerts(processed_data)
             )
+            await self._publish_changes()
 
             self.logger.info("Данные панели управления обновлены")
             return True
@@ -406,35 +552,173 @@ class DashboardManager:
     async def render_dashboard(self) -> Dict[str, Any]:
         """Рендеринг панели управления"""
         try:
+            self._render_requested = True
+            await self._refresh_if_stale()
             if not self.current_data:
                 return {"error": "Нет данных для отображения"}
 
-            dashboard = {
-                "dashboard_id": self.config.dashboard_id,
-                "name": self.config.name,
-                "theme": self.config.theme.value,
-                "status": self.status.value,
-                "last_updated": self.current_data.timestamp.isoformat(),
-                "widgets": [],
-            }
-
-            # Рендеринг виджетов
-            for widget_config in self.config.widgets:
-                if widget_config.is_visible:
-                    widget_data = await self._get_widget_data(widget_config)
-                    rendered_widget = (
-                        await self.visualization_engine.render_widget(
-                            widget_config, widget_data
-                        )
-                    )
-                    dashboard["widgets"].append(rendered_widget)
+            await self._refresh_widgets()
+            key = (
+                self._revision,
+                self.layout_version,
+                self.status,
+                self.current_data.timestamp,
+            )
+            if self._dashboard_cache is None or (
+                self._dashboard_cache[0] != key
+            ):
+                dashboard = {
+                    "dashboard_id": self.config.dashboard_id,
+                    "name": self.config.name,
+                    "theme": self.config.theme.value,
+                    "status": self.status.value,
+                    "last_updated": self.current_data.timestamp.isoformat(),
+                    "widgets": [
+                        self._widget_cache[w.widget_id].rendered
+                        for w in self.config.widgets
+                        if w.is_visible and w.widget_id in self._widget_cache
+                    ],
+                }
+                self._dashboard_cache = (key, dashboard)
 
-            return dashboard
+            # Отрисованные виджеты общие для всех зрителей
+            dashboard = self._dashboard_cache[1]
+            return dict(dashboard, widgets=list(dashboard["widgets"]))
 
         except Exception as e:
             self.logger.error(f"Ошибка рендеринга панели управления: {e}")
             return {"error": str(e)}
 
+    async def _refresh_widgets(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Перерисовка виджетов, входные данные которых изменились
+
+        Returns:
+            Dict: ID виджета -> новое отображение
+        """
+        state = (self.data_version, self.layout_version)
+        if self._refreshed == state:
+            return {}
+
+        changed = {}
+        for widget_config in self.config.widgets:
+            if not widget_config.is_visible:
+                continue
+            entry = self._widget_cache.get(widget_config.widget_id)
+            if entry is not None and entry.data_version == self.data_version:
+                continue
+            widget_data = await self._get_widget_data(widget_config)
+            if entry is not None and entry.inputs == widget_data:
+                entry.data_version = self.data_version
+                continue
+
+            rendered_widget = await self.visualization_engine.render_widget(
+                widget_config, widget_data
+            )
+            rendered_widget.setdefault("widget_id", widget_config.widget_id)
+            self._revision += 1
+            self._widget_cache[widget_config.widget_id] = _CachedWidget(
+                data_version=self.data_version,
+                inputs=widget_data,
+                rendered=rendered_widget,
+                revision=self._revision,
+            )
+            changed[widget_config.widget_id] = rendered_widget
+
+        self._refreshed = state
+        return changed
+
+    def invalidate_widget(self, widget_id: str) -> None:
+        """Сброс кэша виджета после изменения его конфигурации"""
+        self._widget_cache.pop(widget_id, None)
+        self.layout_version += 1
+
+    # ==================== ПОДПИСКИ ====================
+
+    async def subscribe(self, viewer_id: str) -> asyncio.Queue:
+        """
+        Подписка зрителя на обновления панели
+
+        Первым сообщением в очереди приходит снимок панели
+        ({"type": "snapshot"}), дальше - только изменившиеся виджеты
+        ({"type": "delta"}). Одно сообщение с изменениями отправляется
+        всем зрителям.
+
+        Args:
+            viewer_id: ID зрителя
+
+        Returns:
+            asyncio.Queue: Очередь сообщений зрителя
+        """
+        subscription = self._subscribers.get(viewer_id)
+        if subscription is None:
+            await self._refresh_if_stale()
+            # Отложенные изменения уходят прежним зрителям до снимка
+            await self._publish_changes()
+            subscription = asyncio.Queue(maxsize=self.subscriber_queue_size)
+            subscription.put_nowait(await self._snapshot())
+            # Все отрисованное уже есть в снимке
+            self._published_revision = self._revision
+            self._subscribers[viewer_id] = subscription
+        return subscription
+
+    async def unsubscribe(self, viewer_id: str) -> bool:
+        """Отписка зрителя"""
+        return self._subscribers.pop(viewer_id, None) is not None
+
+    async def _snapshot(self) -> Dict[str, Any]:
+        """Полный снимок панели для нового или отставшего зрителя"""
+        return {"type": "snapshot", "dashboard": await self.render_dashboard()}
+
+    async def _publish_changes(self) -> int:
+        """
+        Рассылка изменившихся виджетов подписчикам
+
+        Returns:
+            int: Количество изменившихся виджетов
+        """
+        if not self._subscribers:
+            # Новые зрители начнут со снимка
+            self._published_revision = self._revision
+            self._removed_widgets = []
+            return 0
+
+        await self._refresh_widgets()
+        widgets = {
+            widget_id: entry.rendered
+            for widget_id, entry in self._widget_cache.items()
+            if entry.revision > self._published_revision
+        }
+        removed, self._removed_widgets = self._removed_widgets, []
+        self._published_revision = self._revision
+        if not widgets and not removed:
+            return 0
+
+        delta = {
+            "type": "delta",
+            "dashboard_id": self.config.dashboard_id,
+            "version": self.data_version,
+            "last_updated": (
+                self.current_data.timestamp.isoformat()
+                if self.current_data
+                else None
+            ),
+            "widgets": widgets,
+            "removed": removed,
+        }
+        snapshot = None
+        for subscription in self._subscribers.values():
+            if subscription.full():
+                # Зритель отстал - вместо накопленных изменений снимок
+                while not subscription.empty():
+                    subscription.get_nowait()
+                if snapshot is None:
+                    snapshot = await self._snapshot()
+                subscription.put_nowait(snapshot)
+            else:
+                subscription.put_nowait(delta)
+        return len(widgets) + len(removed)
+
     async def _get_widget_data(
         self, widget_config: WidgetConfig
     ) -> Dict[str, Any]:
@@ -443,11 +727,13 @@ class DashboardManager:
             if not self.current_data:
                 return {}
 
+            trend = self.trends.get("trend", "stable")
+
             # Базовые данные
             data = {
                 "value": self.current_data.metrics.get("security_score", 0),
                 "unit": "%",
-                "trend": "stable",
+                "trend": trend,
             }
 
             # Специфичные данные для разных типов виджетов
@@ -458,7 +744,7 @@ class DashboardManager:
                             "threats_detected", 0
                         ),
                         "unit": "угроз",
-                        "trend": "stable",
+                        "trend": trend,
                     }
                 )
             elif widget_config.widget_type == WidgetType.GAUGE:
@@ -484,6 +770,8 @@ class DashboardManager:
         """Добавление виджета"""
         try:
             self.config.widgets.append(widget_config)
+            self.invalidate_widget(widget_config.widget_id)
+            await self._publish_changes()
             self.logger.info(f"Виджет добавлен: {widget_config.title}")
             return True
         except Exception as e:
@@ -496,6 +784,10 @@ class DashboardManager:
             self.config.widgets = [
                 w for w in self.config.widgets if w.widget_id != widget_id
             ]
+            if widget_id in self._widget_cache:
+                self._removed_widgets.append(widget_id)
+            self.invalidate_widget(widget_id)
+            await self._publish_changes()
             self.logger.info(f"Виджет удален: {widget_id}")
             return True
         except Exception as e:
@@ -519,6 +811,8 @@ class DashboardManager:
                 "performance": self.current_data.performance,
                 "user_activity": self.current_data.user_activity,
                 "alerts_count": len(self.current_data.alerts),
+                "subscribers": len(self._subscribers),
+                "data_version": self.data_version,
             }
 
         except Exception as e:
@@ -530,6 +824,10 @@ class DashboardManager:
         try:
             self.is_running = False
             self.status = DashboardStatus.INACTIVE
+            if self._update_task is not None:
+                self._update_task.cancel()
+                self._update_task = None
+            self._subscribers.clear()
             self.logger.info("Панель управления завершила работу")
         except Exception as e:
             self.logger.error(f"Ошибка завершения работы: {e}")
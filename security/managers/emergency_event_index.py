@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Индексы событий экстренного реагирования для EmergencyEventManager
+
+Вторичные индексы поддерживаются при создании, изменении и удалении
+событий, поэтому выборки и аналитика не сканируют все события:
+
+- хеш-индексы по типу, серьезности, статусу и пользователю;
+- упорядоченная по времени шкала для недавних событий и очистки;
+- пространственная сетка для поиска событий рядом с точкой;
+- счетчики для горячих точек и расширенной аналитики.
+"""
+
+import heapq
+import math
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import datetime
+from operator import itemgetter
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from security.ai_agents.emergency_models import (
+    EmergencyEvent,
+    ResponseStatus,
+)
+
+# Измерения хеш-индексов (выборки событий)
+INDEXED_FIELDS = ("type", "severity", "status", "user")
+
+# Измерения счетчиков аналитики
+COUNTED_FIELDS = (
+    "hour",
+    "day",
+    "weekday",
+    "month",
+    "country",
+    "region",
+    "city",
+    "hotspot",
+)
+
+KM_PER_DEGREE = 111.32
+EARTH_RADIUS_KM = 6371.0088
+
+_Bucket = Dict[str, EmergencyEvent]
+
+
+def _coordinates(location: Any) -> Optional[Tuple[float, float]]:
+    """Координаты события или None"""
+    if not isinstance(location, dict):
+        return None
+    lat, lon = location.get("lat"), location.get("lon")
+    if lat is None or lon is None:
+        return None
+    try:
+        return float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние между точками по поверхности Земли в километрах"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = (
+        math.sin(d_phi / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class _IndexedEvent:
+    """Ключи, под которыми событие записано в индексы"""
+
+    __slots__ = ("event", "keys", "counted", "cell", "time_key", "response")
+
+    def __init__(
+        self,
+        event: EmergencyEvent,
+        keys: Tuple[Tuple[str, Hashable], ...],
+        counted: Tuple[Tuple[str, Hashable], ...],
+        cell: Optional[Tuple[int, int]],
+        time_key: Tuple[datetime, str],
+        response: Optional[float],
+    ):
+        self.event = event
+        self.keys = keys
+        self.counted = counted
+        self.cell = cell
+        self.time_key = time_key
+        self.response = response
+
+
+class EmergencyEventIndex:
+    """Вторичные индексы и счетчики событий"""
+
+    def __init__(
+        self, cell_size_degrees: float = 0.01, hotspot_precision: int = 2
+    ):
+        """
+        Args:
+            cell_size_degrees: Размер ячейки пространственной сетки
+            hotspot_precision: Округление координат горячих точек
+                (знаков после запятой)
+        """
+        self.cell_size = cell_size_degrees
+        self.hotspot_precision = hotspot_precision
+        self.clear()
+
+    def clear(self) -> None:
+        """Очистка всех индексов"""
+        self._entries: Dict[str, _IndexedEvent] = {}
+        self._buckets: Dict[str, Dict[Hashable, _Bucket]] = {
+            field: {} for field in INDEXED_FIELDS
+        }
+        self._counts: Dict[str, Counter] = {
+            field: Counter() for field in COUNTED_FIELDS
+        }
+        self._timeline: List[Tuple[datetime, str]] = []
+        self._grid: Dict[Tuple[int, int], _Bucket] = {}
+        self._response_times: List[float] = []
+        self._response_total = 0.0
+        # Ключи дня, недели и месяца по дате (strftime один раз на день)
+        self._day_keys: Dict[Any, Tuple[Tuple[str, str], ...]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, event_id: str) -> bool:
+        return event_id in self._entries
+
+    # ==================== ИЗМЕНЕНИЕ ИНДЕКСОВ ====================
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (
+            math.floor(lat / self.cell_size),
+            math.floor(lon / self.cell_size),
+        )
+
+    def add(self, event: EmergencyEvent) -> None:
+        """Добавление события (повторный ID заменяет старое событие)"""
+        if event.event_id in self._entries:
+            self.remove(event.event_id)
+
+        timestamp = event.timestamp
+        keys = (
+            ("type", event.emergency_type),
+            ("severity", event.severity),
+            ("status", event.status),
+            ("user", event.user_id),
+        )
+        day = timestamp.date()
+        day_keys = self._day_keys.get(day)
+        if day_keys is None:
+            day_keys = (
+                ("day", day.strftime("%Y-%m-%d")),
+                ("weekday", day.strftime("%A")),
+                ("month", day.strftime("%Y-%m")),
+            )
+            self._day_keys[day] = day_keys
+        counted = [("hour", timestamp.hour), *day_keys]
+        location = event.location if isinstance(event.location, dict) else {}
+        for field in ("country", "region", "city"):
+            if field in location:
+                counted.append((field, location[field]))
+
+        cell = None
+        coordinates = _coordinates(location)
+        if coordinates is not None:
+            lat, lon = coordinates
+            counted.append(
+                (
+                    "hotspot",
+                    (
+                        round(lat, self.hotspot_precision),
+                        round(lon, self.hotspot_precision),
+                    ),
+                )
+            )
+            cell = self._cell(lat, lon)
+            self._grid.setdefault(cell, {})[event.event_id] = event
+
+        response = None
+        if event.status == ResponseStatus.RESOLVED and event.resolved_at:
+            response = (event.resolved_at - timestamp).total_seconds()
+            insort(self._response_times, response)
+            self._response_total += response
+
+        for field, key in keys:
+            self._buckets[field].setdefault(key, {})[event.event_id] = event
+        for field, key in counted:
+            self._counts[field][key] += 1
+
+        time_key = (timestamp, event.event_id)
+        timeline = self._timeline
+        if not timeline or timeline[-1] <= time_key:
+            timeline.append(time_key)
+        else:
+            insort(timeline, time_key)
+
+        self._entries[event.event_id] = _IndexedEvent(
+            event, keys, tuple(counted), cell, time_key, response
+        )
+
+    def _unlink(self, entry: _IndexedEvent) -> None:
+        """Удаление события из всех индексов, кроме шкалы времени"""
+        event_id = entry.event.event_id
+        for field, key in entry.keys:
+            bucket = self._buckets[field][key]
+            del bucket[event_id]
+            if not bucket:
+                del self._buckets[field][key]
+        for field, key in entry.counted:
+            counter = self._counts[field]
+            counter[key] -= 1
+            if counter[key] <= 0:
+                del counter[key]
+        if entry.cell is not None:
+            cell = self._grid[entry.cell]
+            del cell[event_id]
+            if not cell:
+                del self._grid[entry.cell]
+        if entry.response is not None:
+            times = self._response_times
+            del times[bisect_left(times, entry.response)]
+            self._response_total -= entry.response
+
+    def remove(self, event_id: str) -> bool:
+        """Удаление события из индексов"""
+        entry = self._entries.pop(event_id, None)
+        if entry is None:
+            return False
+        self._unlink(entry)
+        timeline = self._timeline
+        del timeline[bisect_left(timeline, entry.time_key)]
+        return True
+
+    def update(self, event: EmergencyEvent) -> None:
+        """Переиндексация события после изменения статуса или места"""
+        self.add(event)
+
+    def expire(self, cutoff: datetime) -> List[str]:
+        """Удаление событий старше cutoff; ID удаленных событий"""
+        timeline = self._timeline
+        end = bisect_left(timeline, (cutoff,))
+        expired = [event_id for _, event_id in timeline[:end]]
+        del timeline[:end]
+        for event_id in expired:
+            self._unlink(self._entries.pop(event_id))
+        return expired
+
+    # ==================== ВЫБОРКИ ====================
+
+    def find(self, field: str, key: Hashable) -> List[EmergencyEvent]:
+        """События с заданным значением индексированного поля"""
+        return list(self._buckets[field].get(key, {}).values())
+
+    def count(self, field: str, key: Hashable) -> int:
+        """Количество событий с заданным значением поля"""
+        return len(self._buckets[field].get(key, ()))
+
+    def distribution(self, field: str) -> Dict[Hashable, int]:
+        """Количество событий по значениям поля"""
+        if field in self._buckets:
+            return {
+                key: len(bucket)
+                for key, bucket in self._buckets[field].items()
+            }
+        return dict(self._counts[field])
+
+    def since(self, cutoff: datetime) -> List[EmergencyEvent]:
+        """События не старше cutoff в порядке времени"""
+        timeline = self._timeline
+        entries = self._entries
+        return [
+            entries[event_id].event
+            for _, event_id in timeline[bisect_left(timeline, (cutoff,)):]
+        ]
+
+    def nearby(
+        self, lat: float, lon: float, radius_km: float
+    ) -> List[Tuple[float, EmergencyEvent]]:
+        """События в радиусе от точки: (расстояние, событие) по возрастанию"""
+        lat_span = radius_km / KM_PER_DEGREE
+        cos_lat = max(math.cos(math.radians(lat)), 1e-6)
+        lon_span = min(radius_km / (KM_PER_DEGREE * cos_lat), 180.0)
+        min_row, min_col = self._cell(lat - lat_span, lon - lon_span)
+        max_row, max_col = self._cell(lat + lat_span, lon + lon_span)
+
+        found = []
+        cells = (max_row - min_row + 1) * (max_col - min_col + 1)
+        if cells > len(self._grid):
+            # Радиус больше занятой области - обходим только занятые ячейки
+            candidates = (
+                cell
+                for (row, col), cell in self._grid.items()
+                if min_row <= row <= max_row and min_col <= col <= max_col
+            )
+        else:
+            candidates = (
+                self._grid[(row, col)]
+                for row in range(min_row, max_row + 1)
+                for col in range(min_col, max_col + 1)
+                if (row, col) in self._grid
+            )
+        for cell in candidates:
+            for event in cell.values():
+                point_lat, point_lon = _coordinates(event.location)
+                # Дешевая проверка по прямоугольнику до точного расстояния
+                if abs(point_lat - lat) > lat_span:
+                    continue
+                distance = haversine_km(lat, lon, point_lat, point_lon)
+                if distance <= radius_km:
+                    found.append((distance, event))
+        found.sort(key=itemgetter(0))
+        return found
+
+    def hotspots(
+        self, limit: int = 10
+    ) -> List[Tuple[Tuple[float, float], int]]:
+        """Места с наибольшим числом событий"""
+        return heapq.nlargest(
+            limit, self._counts["hotspot"].items(), key=itemgetter(1)
+        )
+
+    def response_time_stats(self) -> Dict[str, float]:
+        """Время отклика по решенным событиям"""
+        times = self._response_times
+        if not times:
+            return {"average": 0, "min": 0, "max": 0, "median": 0}
+        return {
+            "average": self._response_total / len(times),
+            "min": times[0],
+            "max": times[-1],
+            "median": times[len(times) // 2],
+        }
@@ -6,6 +6,7 @@
 """
 
 import asyncio
+import heapq
 import logging
 from datetime import datetime, timedelta
 from functools import lru_cache
@@ -20,10 +21,15 @@ from security.ai_agents.emergency_models import (
 
 from security.ai_agents.emergency_id_generator import EmergencyIDGenerator
 from security.ai_agents.emergency_security_utils import EmergencySecurityUtils
+from security.managers.emergency_event_index import EmergencyEventIndex
 
 
 class EmergencyEventManager:
-    """Менеджер событий экстренного реагирования"""
+    """Менеджер событий экстренного реагирования
+
+    Выборки и аналитика читают вторичные индексы EmergencyEventIndex,
+    поэтому события следует изменять через методы менеджера.
+    """
 
     def __init__(self, max_events: int = 1000, auto_cleanup_days: int = 30):
         """
@@ -37,6 +43,9 @@ class EmergencyEventManager:
         self.events: Dict[str, EmergencyEvent] = {}
         self.event_history: List[EmergencyEvent] = []
 
+        # Вторичные индексы и счетчики аналитики
+        self._index = EmergencyEventIndex()
+
         # Дополнительные атрибуты для улучшенной функциональности
         self.max_events: int = max_events
         self.auto_cleanup_days: int = auto_cleanup_days
@@ -107,8 +116,7 @@ class EmergencyEventManager:
             )
 
             # Сохраняем событие
-            self.events[event.event_id] = event
-            self.event_history.append(event)
+            self._store_event(event)
 
             self.logger.info(f"Создано событие {event.event_id}")
             return event
@@ -117,6 +125,17 @@ class EmergencyEventManager:
             self.logger.error(f"Ошибка создания события: {e}")
             raise
 
+    def _store_event(self, event: EmergencyEvent) -> None:
+        """
+        Сохранить событие и добавить его в индексы
+
+        Args:
+            event: Событие
+        """
+        self.events[event.event_id] = event
+        self.event_history.append(event)
+        self._index.add(event)
+
     def get_event(self, event_id: str) -> Optional[EmergencyEvent]:
         """
         Получить событие по ID
@@ -148,6 +167,7 @@ class EmergencyEventManager:
                 event.status = status
                 if status == ResponseStatus.RESOLVED:
                     event.resolved_at = datetime.now()
+                self._index.update(event)
                 self.logger.info(
                     f"Статус события {event_id} обновлен на {status}"
                 )
@@ -169,11 +189,7 @@ class EmergencyEventManager:
         Returns:
             List[EmergencyEvent]: Список событий
         """
-        return [
-            event
-            for event in self.events.values()
-            if event.emergency_type == emergency_type
-        ]
+        return self._index.find("type", emergency_type)
 
     def get_events_by_severity(
         self, severity: EmergencySeverity
@@ -187,11 +203,7 @@ class EmergencyEventManager:
         Returns:
             List[EmergencyEvent]: Список событий
         """
-        return [
-            event
-            for event in self.events.values()
-            if event.severity == severity
-        ]
+        return self._index.find("severity", severity)
 
     def get_recent_events(self, hours: int = 24) -> List[EmergencyEvent]:
         """
@@ -204,11 +216,7 @@ class EmergencyEventManager:
             List[EmergencyEvent]: Список событий
         """
         cutoff_time = datetime.now() - timedelta(hours=hours)
-        return [
-            event
-            for event in self.events.values()
-            if event.timestamp >= cutoff_time
-        ]
+        return self._index.since(cutoff_time)
 
     def get_event_statistics(self) -> Dict[str, Any]:
         """
@@ -219,32 +227,28 @@ class EmergencyEventManager:
         """
         try:
             total_events = len(self.events)
-            resolved_events = len(
-                [
-                    e
-                    for e in self.events.values()
-                    if e.status == ResponseStatus.RESOLVED
-                ]
+            resolved_events = self._index.count(
+                "status", ResponseStatus.RESOLVED
             )
-            pending_events = len(
-                [
-                    e
-                    for e in self.events.values()
-                    if e.status == ResponseStatus.PENDING
-                ]
+            pending_events = self._index.count(
+                "status", ResponseStatus.PENDING
             )
 
             # Статистика по типам
-            type_stats = {}
-            for event in self.events.values():
-                event_type = event.emergency_type.value
-                type_stats[event_type] = type_stats.get(event_type, 0) + 1
+            type_stats = {
+                event_type.value: count
+                for event_type, count in self._index.distribution(
+                    "type"
+                ).items()
+            }
 
             # Статистика по серьезности
-            severity_stats = {}
-            for event in self.events.values():
-                severity = event.severity.value
-                severity_stats[severity] = severity_stats.get(severity, 0) + 1
+            severity_stats = {
+                severity.value: count
+                for severity, count in self._index.distribution(
+                    "severity"
+                ).items()
+            }
 
             return {
                 "total_events": total_events,
@@ -271,11 +275,7 @@ class EmergencyEventManager:
         """
         try:
             cutoff_time = datetime.now() - timedelta(days=days)
-            old_events = [
-                event_id
-                for event_id, event in self.events.items()
-                if event.timestamp < cutoff_time
-            ]
+            old_events = self._index.expire(cutoff_time)
 
             for event_id in old_events:
                 del self.events[event_id]
@@ -329,9 +329,7 @@ class EmergencyEventManager:
         Returns:
             List[EmergencyEvent]: Список событий пользователя
         """
-        return [
-            event for event in self.events.values() if event.user_id == user_id
-        ]
+        return self._index.find("user", user_id)
 
     def get_events_by_status(
         self, status: ResponseStatus
@@ -345,9 +343,7 @@ class EmergencyEventManager:
         Returns:
             List[EmergencyEvent]: Список событий с указанным статусом
         """
-        return [
-            event for event in self.events.values() if event.status == status
-        ]
+        return self._index.find("status", status)
 
     def get_events_count(self) -> int:
         """
@@ -377,6 +373,7 @@ class EmergencyEventManager:
         try:
             count = len(self.events)
             self.events.clear()
+            self._index.clear()
             self.logger.info(f"Очищено {count} событий")
             return count
         except Exception as e:
@@ -478,8 +475,7 @@ class EmergencyEventManager:
                     )
 
                     # Добавляем в менеджер
-                    self.events[event.event_id] = event
-                    self.event_history.append(event)
+                    self._store_event(event)
                     imported_count += 1
 
                 except Exception as e:
@@ -833,25 +829,15 @@ class EmergencyEventManager:
     def _analyze_trends(self) -> Dict[str, Any]:
         """Анализ трендов событий"""
         try:
-            events_by_hour = {}
-            events_by_day = {}
-            events_by_type = {}
-
-            for event in self.events.values():
-                hour = event.timestamp.hour
-                day = event.timestamp.strftime("%Y-%m-%d")
-                event_type = event.emergency_type.value
-
-                events_by_hour[hour] = events_by_hour.get(hour, 0) + 1
-                events_by_day[day] = events_by_day.get(day, 0) + 1
-                events_by_type[event_type] = (
-                    events_by_type.get(event_type, 0) + 1
-                )
-
             return {
-                "hourly_distribution": events_by_hour,
-                "daily_distribution": events_by_day,
-                "type_distribution": events_by_type,
+                "hourly_distribution": self._index.distribution("hour"),
+                "daily_distribution": self._index.distribution("day"),
+                "type_distribution": {
+                    event_type.value: count
+                    for event_type, count in self._index.distribution(
+                        "type"
+                    ).items()
+                },
             }
         except Exception as e:
             self.logger.error(f"Ошибка анализа трендов: {e}")
@@ -860,57 +846,45 @@ class EmergencyEventManager:
     def _find_hotspots(self) -> List[Dict[str, Any]]:
         """Поиск горячих точек (мест с высокой концентрацией событий)"""
         try:
-            location_counts = {}
-            for event in self.events.values():
-                if "lat" in event.location and "lon" in event.location:
-                    lat = round(event.location["lat"], 2)
-                    lon = round(event.location["lon"], 2)
-                    key = f"{lat},{lon}"
-                    location_counts[key] = location_counts.get(key, 0) + 1
-
-            # Сортируем по количеству событий
-            hotspots = []
-            for location, count in sorted(
-                location_counts.items(), key=lambda x: x[1], reverse=True
-            )[:10]:
-                lat, lon = location.split(",")
-                hotspots.append(
-                    {
-                        "latitude": float(lat),
-                        "longitude": float(lon),
-                        "event_count": count,
-                    }
-                )
-
-            return hotspots
+            return [
+                {
+                    "latitude": lat,
+                    "longitude": lon,
+                    "event_count": count,
+                }
+                for (lat, lon), count in self._index.hotspots(10)
+            ]
         except Exception as e:
             self.logger.error(f"Ошибка поиска горячих точек: {e}")
             return []
 
+    def get_nearby_events(
+        self, lat: float, lon: float, radius_km: float = 1.0
+    ) -> List[EmergencyEvent]:
+        """
+        Получить события рядом с точкой
+
+        Args:
+            lat: Широта
+            lon: Долгота
+            radius_km: Радиус поиска в километрах
+
+        Returns:
+            List[EmergencyEvent]: События по возрастанию расстояния
+        """
+        try:
+            return [
+                event
+                for _, event in self._index.nearby(lat, lon, radius_km)
+            ]
+        except Exception as e:
+            self.logger.error(f"Ошибка поиска событий рядом: {e}")
+            return []
+
     def _analyze_response_times(self) -> Dict[str, Any]:
         """Анализ времени отклика на события"""
         try:
-            response_times = []
-            for event in self.events.values():
-                if (
-                    event.resolved_at
-                    and event.status == ResponseStatus.RESOLVED
-                ):
-                    response_time = (
-                        event.resolved_at - event.timestamp
-                    ).total_seconds()
-                    response_times.append(response_time)
-
-            if not response_times:
-                return {"average": 0, "min": 0, "max": 0, "median": 0}
-
-            response_times.sort()
-            return {
-                "average": sum(response_times) / len(response_times),
-                "min": min(response_times),
-                "max": max(response_times),
-                "median": response_times[len(response_times) // 2],
-            }
+            return self._index.response_time_stats()
         except Exception as e:
             self.logger.error(f"Ошибка анализа времени отклика: {e}")
             return {}
@@ -918,17 +892,13 @@ class EmergencyEventManager:
     def _analyze_user_activity(self) -> Dict[str, Any]:
         """Анализ активности пользователей"""
         try:
-            user_activity = {}
-            for event in self.events.values():
-                if event.user_id:
-                    user_activity[event.user_id] = (
-                        user_activity.get(event.user_id, 0) + 1
-                    )
+            user_activity = self._index.distribution("user")
+            user_activity.pop(None, None)
 
             # Сортируем пользователей по активности
-            top_users = sorted(
-                user_activity.items(), key=lambda x: x[1], reverse=True
-            )[:10]
+            top_users = heapq.nlargest(
+                10, user_activity.items(), key=lambda x: x[1]
+            )
 
             return {
                 "total_users": len(user_activity),
@@ -945,12 +915,12 @@ class EmergencyEventManager:
     def _analyze_severity_distribution(self) -> Dict[str, Any]:
         """Анализ распределения по серьезности"""
         try:
-            severity_counts = {}
-            for event in self.events.values():
-                severity = event.severity.value
-                severity_counts[severity] = (
-                    severity_counts.get(severity, 0) + 1
-                )
+            severity_counts = {
+                severity.value: count
+                for severity, count in self._index.distribution(
+                    "severity"
+                ).items()
+            }
 
             total = sum(severity_counts.values())
             distribution = {
@@ -969,23 +939,10 @@ class EmergencyEventManager:
     def _analyze_time_patterns(self) -> Dict[str, Any]:
         """Анализ временных паттернов"""
         try:
-            weekday_counts = {}
-            hour_counts = {}
-            month_counts = {}
-
-            for event in self.events.values():
-                weekday = event.timestamp.strftime("%A")
-                hour = event.timestamp.hour
-                month = event.timestamp.strftime("%Y-%m")
-
-                weekday_counts[weekday] = weekday_counts.get(weekday, 0) + 1
-                hour_counts[hour] = hour_counts.get(hour, 0) + 1
-                month_counts[month] = month_counts.get(month, 0) + 1
-
             return {
-                "weekday_distribution": weekday_counts,
-                "hour_distribution": hour_counts,
-                "monthly_distribution": month_counts,
+                "weekday_distribution": self._index.distribution("weekday"),
+                "hour_distribution": self._index.distribution("hour"),
+                "monthly_distribution": self._index.distribution("month"),
             }
         except Exception as e:
             self.logger.error(f"Ошибка анализа временных паттернов: {e}")
@@ -994,28 +951,10 @@ class EmergencyEventManager:
     def _analyze_geographic_distribution(self) -> Dict[str, Any]:
         """Анализ географического распределения"""
         try:
-            countries = {}
-            regions = {}
-            cities = {}
-
-            for event in self.events.values():
-                location = event.location
-                if "country" in location:
-                    country = location["country"]
-                    countries[country] = countries.get(country, 0) + 1
-
-                if "region" in location:
-                    region = location["region"]
-                    regions[region] = regions.get(region, 0) + 1
-
-                if "city" in location:
-                    city = location["city"]
-                    cities[city] = cities.get(city, 0) + 1
-
             return {
-                "countries": countries,
-                "regions": regions,
-                "cities": cities,
+                "countries": self._index.distribution("country"),
+                "regions": self._index.distribution("region"),
+                "cities": self._index.distribution("city"),
             }
         except Exception as e:
             self.logger.error(
@@ -1124,11 +1063,7 @@ class EmergencyEventManager:
         Returns:
             List[EmergencyEvent]: Список событий
         """
-        return [
-            event
-            for event in self.events.values()
-            if event.emergency_type == emergency_type
-        ]
+        return self._index.find("type", emergency_type)
 
     @lru_cache(maxsize=128)
     def get_cached_events_by_severity(
@@ -1143,11 +1078,7 @@ class EmergencyEventManager:
         Returns:
             List[EmergencyEvent]: Список событий
         """
-        return [
-            event
-            for event in self.events.values()
-            if event.severity == severity
-        ]
+        return self._index.find("severity", severity)
 
     def get_cached_event_statistics(self) -> Dict[str, Any]:
         """
@@ -1166,32 +1097,28 @@ class EmergencyEventManager:
         # Вычисляем статистику
         try:
             total_events = len(self.events)
-            resolved_events = len(
-                [
-                    e
-                    for e in self.events.values()
-                    if e.status == ResponseStatus.RESOLVED
-                ]
+            resolved_events = self._index.count(
+                "status", ResponseStatus.RESOLVED
             )
-            pending_events = len(
-                [
-                    e
-                    for e in self.events.values()
-                    if e.status == ResponseStatus.PENDING
-                ]
+            pending_events = self._index.count(
+                "status", ResponseStatus.PENDING
             )
 
             # Статистика по типам
-            type_stats = {}
-            for event in self.events.values():
-                event_type = event.emergency_type.value
-                type_stats[event_type] = type_stats.get(event_type, 0) + 1
+            type_stats = {
+                event_type.value: count
+                for event_type, count in self._index.distribution(
+                    "type"
+                ).items()
+            }
 
             # Статистика по серьезности
-            severity_stats = {}
-            for event in self.events.values():
-                severity = event.severity.value
-                severity_stats[severity] = severity_stats.get(severity, 0) + 1
+            severity_stats = {
+                severity.value: count
+                for severity, count in self._index.distribution(
+                    "severity"
+                ).items()
+            }
 
             result = {
                 "total_events": total_events,
@@ -1791,6 +1718,7 @@ class EmergencyEventManager:
 
             if "location" in data:
                 event.location = data["location"]
+                self._index.update(event)
 
             return {
                 "success": True,
@@ -1816,6 +1744,7 @@ class EmergencyEventManager:
                 return {"success": False, "error": "Событие не найдено"}
 
             del self.events[event_id]
+            self._index.remove(event_id)
             self.logger.info(f"Событие {event_id} удалено через API")
 
             return {
@@ -1874,8 +1803,7 @@ class EmergencyEventManager:
             )
 
             # Сохраняем событие
-            self.events[event.event_id] = event
-            self.event_history.append(event)
+            self._store_event(event)
 
             self.logger.info(f"Создано событие {event.event_id}")
             return event
@@ -1916,6 +1844,7 @@ class EmergencyEventManager:
                 event.status = status
                 if status == ResponseStatus.RESOLVED:
                     event.resolved_at = datetime.now()
+                self._index.update(event)
                 self.logger.info(
                     f"Статус события {event_id} обновлен на {status}"
                 )
@@ -1938,11 +1867,7 @@ class EmergencyEventManager:
             List[EmergencyEvent]: Список событий
         """
         await asyncio.sleep(0)  # Имитация асинхронной операции
-        return [
-            event
-            for event in self.events.values()
-            if event.emergency_type == emergency_type
-        ]
+        return self._index.find("type", emergency_type)
 
     async def get_events_by_severity_async(
         self, severity: EmergencySeverity
@@ -1957,11 +1882,7 @@ class EmergencyEventManager:
             List[EmergencyEvent]: Список событий
         """
         await asyncio.sleep(0)  # Имитация асинхронной операции
-        return [
-            event
-            for event in self.events.values()
-            if event.severity == severity
-        ]
+        return self._index.find("severity", severity)
 
     async def get_recent_events_async(
         self, hours: int = 24
@@ -1977,11 +1898,7 @@ class EmergencyEventManager:
         """
         await asyncio.sleep(0)  # Имитация асинхронной операции
         cutoff_time = datetime.now() - timedelta(hours=hours)
-        return [
-            event
-            for event in self.events.values()
-            if event.timestamp >= cutoff_time
-        ]
+        return self._index.since(cutoff_time)
 
     async def get_event_statistics_async(self) -> Dict[str, Any]:
         """
@@ -1993,32 +1910,28 @@ class EmergencyEventManager:
         try:
             await asyncio.sleep(0)  # Имитация асинхронной операции
             total_events = len(self.events)
-            resolved_events = len(
-                [
-                    e
-                    for e in self.events.values()
-                    if e.status == ResponseStatus.RESOLVED
-                ]
+            resolved_events = self._index.count(
+                "status", ResponseStatus.RESOLVED
             )
-            pending_events = len(
-                [
-                    e
-                    for e in self.events.values()
-                    if e.status == ResponseStatus.PENDING
-                ]
+            pending_events = self._index.count(
+                "status", ResponseStatus.PENDING
             )
 
             # Статистика по типам
-            type_stats = {}
-            for event in self.events.values():
-                event_type = event.emergency_type.value
-                type_stats[event_type] = type_stats.get(event_type, 0) + 1
+            type_stats = {
+                event_type.value: count
+                for event_type, count in self._index.distribution(
+                    "type"
+                ).items()
+            }
 
             # Статистика по серьезности
-            severity_stats = {}
-            for event in self.events.values():
-                severity = event.severity.value
-                severity_stats[severity] = severity_stats.get(severity, 0) + 1
+            severity_stats = {
+                severity.value: count
+                for severity, count in self._index.distribution(
+                    "severity"
+                ).items()
+            }
 
             return {
                 "total_events": total_events,
@@ -2046,11 +1959,7 @@ class EmergencyEventManager:
         try:
             await asyncio.sleep(0)  # Имитация асинхронной операции
             cutoff_time = datetime.now() - timedelta(days=days)
-            old_events = [
-                event_id
-                for event_id, event in self.events.items()
-                if event.timestamp < cutoff_time
-            ]
+            old_events = self._index.expire(cutoff_time)
 
             for event_id in old_events:
                 del self.events[event_id]
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Инкрементальная аналитика для AnalyticsManager
+
+Потоковый режим обрабатывает данные пакетами фиксированного размера,
+поэтому память не зависит от длины окна событий:
+
+- FeatureExtractor превращает строки-словари в типизированные колонки
+  без цикла Python по строкам (или принимает готовые колонки);
+- RunningStats накапливает среднее, дисперсию и диапазон;
+- ReservoirSample хранит равномерную выборку потока ограниченного
+  размера для калибровки порога аномалий;
+- IncrementalModels дообучает StandardScaler и MiniBatchKMeans через
+  partial_fit, считает аномалии по расстоянию до центроида и
+  сохраняет снимок моделей на диск для теплого старта.
+"""
+
+import logging
+import os
+from operator import methodcaller
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import joblib
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import StandardScaler
+
+logger = logging.getLogger(__name__)
+
+# Пакет данных: строки-словари или колонки одинаковой длины
+Batch = Union[Sequence[Mapping[str, Any]], Mapping[str, Any]]
+
+SNAPSHOT_VERSION = 1
+
+
+class FeatureExtractor:
+    """Извлечение признаков в колонки numpy"""
+
+    def __init__(
+        self,
+        columns: Sequence[Tuple[str, float]],
+        dtype: Any = np.float64,
+    ):
+        """
+        Args:
+            columns: Пары (имя признака, значение по умолчанию)
+            dtype: Тип элементов матрицы признаков
+        """
+        self.columns = list(columns)
+        self.dtype = dtype
+        self._getters = [
+            methodcaller("get", name, default)
+            for name, default in self.columns
+        ]
+
+    @property
+    def names(self) -> List[str]:
+        return [name for name, _ in self.columns]
+
+    def extract(self, batch: Batch) -> np.ndarray:
+        """
+        Матрица признаков (строки x колонки) для пакета
+
+        Args:
+            batch: Список словарей или словарь колонок
+
+        Returns:
+            np.ndarray: Матрица признаков
+        """
+        if isinstance(batch, Mapping):
+            return self._from_columns(batch)
+
+        count = len(batch)
+        features = np.empty((count, len(self.columns)), dtype=self.dtype)
+        for index, getter in enumerate(self._getters):
+            # map + methodcaller обходят строки на уровне C
+            features[:, index] = np.fromiter(
+                map(getter, batch), dtype=self.dtype, count=count
+            )
+        return features
+
+    def _from_columns(self, columns: Mapping[str, Any]) -> np.ndarray:
+        count = None
+        for name, _ in self.columns:
+            if name in columns:
+                count = len(columns[name])
+                break
+        if count is None:
+            return np.empty((0, len(self.columns)), dtype=self.dtype)
+
+        features = np.empty((count, len(self.columns)), dtype=self.dtype)
+        for index, (name, default) in enumerate(self.columns):
+            if name in columns:
+                features[:, index] = columns[name]
+            else:
+                features[:, index] = default
+        return features
+
+
+class RunningStats:
+    """Среднее, дисперсия и диапазон всех значений потока"""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values: np.ndarray) -> None:
+        """Учет пакета (объединение по Чану)"""
+        count = values.size
+        if count == 0:
+            return
+        batch_mean = float(values.mean())
+        batch_m2 = float(((values - batch_mean) ** 2).sum())
+        total = self.count + count
+        delta = batch_mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += batch_m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    @property
+    def std(self) -> float:
+        return (self.m2 / self.count) ** 0.5 if self.count else 0.0
+
+
+class ReservoirSample:
+    """Равномерная выборка потока фиксированного размера"""
+
+    def __init__(self, size: int, width: int, seed: int = 42):
+        """
+        Args:
+            size: Максимальное число строк выборки
+            width: Число признаков
+            seed: Зерно генератора
+        """
+        self.size = size
+        self.rows = np.empty((size, width))
+        self.seen = 0
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return min(self.seen, self.size)
+
+    @property
+    def sample(self) -> np.ndarray:
+        return self.rows[: len(self)]
+
+    def update(self, batch: np.ndarray) -> None:
+        """Алгоритм R, векторизованный на пакет"""
+        count = len(batch)
+        fill = min(max(self.size - self.seen, 0), count)
+        if fill:
+            self.rows[self.seen: self.seen + fill] = batch[:fill]
+        rest = batch[fill:]
+        if len(rest):
+            positions = np.arange(
+                self.seen + fill + 1, self.seen + count + 1
+            )
+            slots = self._rng.integers(0, positions)
+            keep = slots < self.size
+            self.rows[slots[keep]] = rest[keep]
+        self.seen += count
+
+
+class IncrementalModels:
+    """Модели потокового режима с сохранением снимков"""
+
+    def __init__(
+        self,
+        width: int,
+        n_clusters: int = 5,
+        contamination: float = 0.1,
+        reservoir_size: int = 10000,
+        snapshot_path: Optional[str] = None,
+    ):
+        """
+        Args:
+            width: Число признаков
+            n_clusters: Число кластеров
+            contamination: Ожидаемая доля аномалий
+            reservoir_size: Размер выборки для порога аномалий
+            snapshot_path: Файл снимка моделей (None - без сохранения)
+        """
+        self.width = width
+        self.contamination = contamination
+        self.snapshot_path = snapshot_path
+        self.scaler = StandardScaler()
+        self.kmeans = MiniBatchKMeans(
+            n_clusters=n_clusters, random_state=42, n_init=3
+        )
+        self.reservoir = ReservoirSample(reservoir_size, width)
+        self.threshold: Optional[float] = None
+        self.batches_seen = 0
+        self.warm_started = False
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.batches_seen > 0
+
+    @property
+    def samples_seen(self) -> int:
+        return self.reservoir.seen
+
+    def partial_fit(self, features: np.ndarray) -> Dict[str, Any]:
+        """
+        Дообучение на пакете и оценка его строк
+
+        Args:
+            features: Матрица признаков пакета
+
+        Returns:
+            Dict с номерами кластеров и флагами аномалий строк
+        """
+        n_clusters = self.kmeans.n_clusters
+        self.reservoir.update(features)
+        self.scaler.partial_fit(features)
+        scaled = self.scaler.transform(features)
+
+        if self.is_fitted or len(scaled) >= n_clusters:
+            self.kmeans.partial_fit(scaled)
+        elif len(self.reservoir) >= n_clusters:
+            # Первый пакет меньше числа кластеров - учимся на выборке
+            self.kmeans.partial_fit(
+                self.scaler.transform(self.reservoir.sample)
+            )
+        else:
+            return {"clusters": None, "anomalies": None}
+        self.batches_seen += 1
+
+        # Порог аномалий по выборке потока: доля contamination дальше
+        # всего от своих центроидов
+        sample = self.scaler.transform(self.reservoir.sample)
+        sample_distances = self.kmeans.transform(sample).min(axis=1)
+        self.threshold = float(
+            np.quantile(sample_distances, 1.0 - self.contamination)
+        )
+
+        distances = self.kmeans.transform(scaled)
+        return {
+            "clusters": distances.argmin(axis=1),
+            "anomalies": distances.min(axis=1) > self.threshold,
+        }
+
+    def save(self) -> bool:
+        """Сохранение снимка моделей (атомарная замена файла)"""
+        if not self.snapshot_path or not self.is_fitted:
+            return False
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "width": self.width,
+            "scaler": self.scaler,
+            "kmeans": self.kmeans,
+            "reservoir_rows": self.reservoir.sample.copy(),
+            "reservoir_seen": self.reservoir.seen,
+            "threshold": self.threshold,
+            "batches_seen": self.batches_seen,
+        }
+        directory = os.path.dirname(self.snapshot_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = self.snapshot_path + ".tmp"
+        joblib.dump(snapshot, temporary)
+        os.replace(temporary, self.snapshot_path)
+        return True
+
+    def load(self) -> bool:
+        """Теплый старт из снимка моделей"""
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return False
+        try:
+            snapshot = joblib.load(self.snapshot_path)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки снимка моделей: {e}")
+            return False
+        if (
+            snapshot.get("version") != SNAPSHOT_VERSION
+            or snapshot.get("width") != self.width
+            or snapshot["kmeans"].n_clusters != self.kmeans.n_clusters
+        ):
+            logger.warning("Снимок моделей несовместим, обучение с нуля")
+            return False
+
+        self.scaler = snapshot["scaler"]
+        self.kmeans = snapshot["kmeans"]
+        rows = snapshot["reservoir_rows"][: self.reservoir.size]
+        self.reservoir.rows[: len(rows)] = rows
+        self.reservoir.seen = (
+            snapshot["reservoir_seen"]
+            if len(rows) == self.reservoir.size
+            else len(rows)
+        )
+        self.threshold = snapshot["threshold"]
+        self.batches_seen = snapshot["batches_seen"]
+        self.warm_started = True
+        return True
@@ -0,0 +1,717 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Диспетчер доставки уведомлений для SmartNotificationManager
+
+NotificationDispatcher держит один event loop в фоновом потоке на всё
+время работы менеджера:
+- отложенные уведомления раскладываются по слотам таймеров длиной tick
+  (хешированное колесо таймеров), номера слотов лежат в куче (heapq);
+  планировщик просыпается к концу ближайшего слота, без опроса очереди;
+- у каждого канала свой пул отправителей, ограничитель скорости
+  (token bucket) и пакетная отправка до batch_size уведомлений;
+- ожидающие уведомления журналируются в PendingNotificationStore
+  (JSONL: add/done), поэтому переживают перезапуск.
+
+Диспетчер не знает устройства уведомления: он получает идентификатор,
+полезную нагрузку, список каналов, срок доставки и сериализованное
+представление для журнала.
+"""
+
+import asyncio
+import heapq
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+# Отправка пакета: (канал, полезные нагрузки) -> список успехов или None
+BatchSender = Callable[[Hashable, List[Any]], Awaitable[Optional[List[bool]]]]
+# Завершение: (id, нагрузка, успешные каналы, неуспешные каналы)
+CompletionCallback = Callable[[str, Any, List[Hashable], List[Hashable]], None]
+
+LATENESS_SAMPLE_SIZE = 10000
+
+# Один кодировщик на модуль: json.dumps с параметрами создаёт новый
+_encode = json.JSONEncoder(
+    ensure_ascii=False, separators=(",", ":"), default=str
+).encode
+
+
+@dataclass
+class ChannelSettings:
+    """Параметры доставки для одного канала"""
+
+    workers: int = 4  # Параллельных отправителей
+    rate: float = 0.0  # Уведомлений в секунду (0 - без ограничения)
+    burst: int = 0  # Запас токенов (0 - равен rate)
+    batch_size: int = 1  # Уведомлений в одной отправке
+    max_retries: int = 0
+    timeout: float = 0.0  # Таймаут отправки, секунды (0 - без таймаута)
+    retry_delay: float = 0.5
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "ChannelSettings":
+        """Настройки из раздела delivery_channels конфигурации"""
+        return cls(
+            workers=int(config.get("workers", cls.workers)),
+            rate=float(config.get("rate_limit", cls.rate)),
+            burst=int(config.get("burst", cls.burst)),
+            batch_size=max(1, int(config.get("batch_size", cls.batch_size))),
+            max_retries=int(config.get("max_retries", cls.max_retries)),
+            timeout=float(config.get("timeout", cls.timeout)),
+            retry_delay=float(config.get("retry_delay", cls.retry_delay)),
+        )
+
+
+class AsyncTokenBucket:
+    """Token bucket с ожиданием: acquire() ждёт, пока хватит токенов"""
+
+    def __init__(self, rate: float, capacity: float = 0.0):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        """Списание токенов; пакет больше capacity проходит в долг"""
+        while True:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity,
+                self.tokens + (now - self.updated_at) * self.rate,
+            )
+            self.updated_at = now
+            if self.tokens >= min(tokens, self.capacity):
+                self.tokens -= tokens
+                return
+            await asyncio.sleep(
+                (min(tokens, self.capacity) - self.tokens) / self.rate
+            )
+
+
+class PendingNotificationStore:
+    """
+    Журнал ожидающих уведомлений (JSONL).
+
+    Записи "add" и "done" буферизуются и дописываются одной операцией
+    в flush(). load() восстанавливает ожидающие уведомления и сжимает
+    журнал; при большом числе завершённых записей журнал сжимается
+    и во время работы. Для ожидающих хранятся готовые строки журнала,
+    поэтому сжатие не сериализует данные повторно.
+    """
+
+    def __init__(self, path: str, compact_min_records: int = 100000):
+        self.path = path
+        self.compact_min_records = compact_min_records
+        self._pending: Dict[str, str] = {}
+        self._buffer: List[str] = []
+        self._records = 0
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """Ожидающие уведомления из журнала (id -> данные)"""
+        self._pending = {}
+        pending: Dict[str, Dict[str, Any]] = {}
+        if not os.path.exists(self.path):
+            return pending
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Недописанная строка после аварийной остановки
+                    continue
+                item_id = record.get("id")
+                if record.get("op") == "add":
+                    pending[item_id] = record["data"]
+                    self._pending[item_id] = line.rstrip("\n")
+                else:
+                    pending.pop(item_id, None)
+                    self._pending.pop(item_id, None)
+        self.compact()
+        return pending
+
+    @staticmethod
+    def encode(item_id: str, data: Dict[str, Any]) -> str:
+        """Строка журнала для add_encoded()"""
+        return '{"op":"add","id":%s,"data":%s}' % (
+            _encode(item_id),
+            _encode(data),
+        )
+
+    def add(self, item_id: str, data: Dict[str, Any]) -> None:
+        self.add_encoded(item_id, self.encode(item_id, data))
+
+    def add_encoded(self, item_id: str, line: str) -> None:
+        """Добавление уже сериализованной записи (см. encode())"""
+        self._pending[item_id] = line
+        self._buffer.append(line)
+
+    def remove(self, item_id: str) -> None:
+        if self._pending.pop(item_id, None) is not None:
+            self._buffer.append('{"op":"done","id":%s}' % _encode(item_id))
+
+    def flush(self) -> int:
+        """Дозапись буфера одной операцией; число записанных строк"""
+        if not self._buffer:
+            return 0
+        lines, self._buffer = self._buffer, []
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        self._records += len(lines)
+        # Сжатие, когда завершённых записей больше, чем ожидающих
+        if (
+            self._records >= self.compact_min_records
+            and self._records > 3 * len(self._pending)
+        ):
+            self.compact()
+        return len(lines)
+
+    def compact(self) -> None:
+        """Перезапись журнала только ожидающими уведомлениями"""
+        self._buffer = []
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for line in self._pending.values():
+                f.write(line + "\n")
+        os.replace(tmp_path, self.path)
+        self._records = len(self._pending)
+
+
+class _Pending:
+    """Уведомление в диспетчере"""
+
+    __slots__ = (
+        "item_id",
+        "payload",
+        "channels",
+        "due",
+        "remaining",
+        "ok",
+        "failed",
+    )
+
+    def __init__(self, item_id, payload, channels, due):
+        self.item_id = item_id
+        self.payload = payload
+        self.channels = channels
+        self.due = due
+        self.remaining = len(channels)
+        # Кортежи вместо списков: миллион ожидающих не должен давать
+        # сборщику мусора лишние миллионы отслеживаемых объектов
+        self.ok: Tuple[Hashable, ...] = ()
+        self.failed: Tuple[Hashable, ...] = ()
+
+
+def _due_key(entry: _Pending) -> float:
+    return entry.due
+
+
+class _ChannelQueue:
+    """Очередь канала: отправители забирают сразу пакет"""
+
+    __slots__ = ("items", "ready")
+
+    def __init__(self):
+        self.items: deque = deque()
+        self.ready = asyncio.Event()
+
+    def put(self, entry: _Pending) -> None:
+        self.items.append(entry)
+        self.ready.set()
+
+    async def get_batch(self, size: int) -> List[_Pending]:
+        items = self.items
+        while not items:
+            self.ready.clear()
+            await self.ready.wait()
+        batch = [items.popleft() for _ in range(min(size, len(items)))]
+        if not items:
+            self.ready.clear()
+        return batch
+
+
+class NotificationDispatcher:
+    """Долгоживущий диспетчер с кучей таймеров и пулами каналов"""
+
+    def __init__(
+        self,
+        sender: BatchSender,
+        channel_settings: Optional[Dict[Hashable, ChannelSettings]] = None,
+        store: Optional[PendingNotificationStore] = None,
+        on_complete: Optional[CompletionCallback] = None,
+        flush_interval: float = 0.2,
+        tick: float = 0.002,
+        name: str = "notification-dispatcher",
+    ):
+        self.sender = sender
+        self.channel_settings = dict(channel_settings or {})
+        self.store = store
+        self.on_complete = on_complete
+        self.flush_interval = flush_interval
+        # Шаг таймеров: сроки в пределах одного шага срабатывают вместе
+        # и уходят пакетами, а не по одному уведомлению
+        self.tick = tick
+        self.name = name
+        self.logger = logging.getLogger(name)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        # Первые submit из разных потоков не запускают два event loop
+        self._start_lock = threading.Lock()
+        self._started = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        # Переданные, но ещё не принятые потоком диспетчера пачки
+        self._unscheduled = 0
+        self._unscheduled_lock = threading.Lock()
+        self._tasks: List[asyncio.Task] = []
+
+        # Состояние ниже меняется только в потоке диспетчера
+        # Таймеры: слоты длиной tick (id слота -> уведомления) и куча
+        # номеров слотов. Куча растёт с числом различных сроков, а не
+        # с числом уведомлений
+        self._slots: Dict[int, List[_Pending]] = {}
+        self._slot_heap: List[int] = []
+        self._scheduled: Dict[str, _Pending] = {}
+        self._inflight = 0
+        self._queues: Dict[Hashable, _ChannelQueue] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+
+        # Равномерная выборка опозданий (reservoir sampling) для p99
+        self._lateness: List[float] = []
+        self.stats: Dict[str, Any] = {
+            "scheduled": 0,
+            "dispatched": 0,
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "lateness_sum": 0.0,
+            "lateness_max": 0.0,
+            "delivery_latency_sum": 0.0,
+            "channels": {},
+        }
+
+    # ------------------------------------------------------------------
+    # Управление потоком
+    # ------------------------------------------------------------------
+
+    @property
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Запуск фонового потока с event loop (идемпотентно)"""
+        # Поток уже жив, но loop еще не создан - ждем запускающего
+        if self.is_running and self._started.is_set():
+            return
+        with self._start_lock:
+            if self.is_running:
+                return
+            self._started.clear()
+            self._thread = threading.Thread(
+                target=self._run, name=self.name, daemon=True
+            )
+            self._thread.start()
+            self._started.wait()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Остановка: журнал сбрасывается, ожидающие остаются в нём"""
+        with self._start_lock:
+            if not self.is_running:
+                return
+            loop = self._loop
+            loop.call_soon_threadsafe(
+                lambda: loop.create_task(self._shutdown())
+            )
+            self._thread.join(timeout)
+            self._thread = None
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Ожидание, пока не останется запланированных и отправляемых"""
+        return self._idle.wait(timeout)
+
+    def _run(self) -> None:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        for channel in list(self.channel_settings):
+            self._ensure_channel(channel)
+        self._tasks.append(loop.create_task(self._scheduler()))
+        if self.store is not None:
+            self._tasks.append(loop.create_task(self._flusher()))
+        loop.call_soon(self._started.set)
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+            self._loop = None
+
+    async def _shutdown(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Неотправленные остаются в журнале и восстанавливаются из него
+        self._queues = {}
+        self._slots = {}
+        self._slot_heap = []
+        self._scheduled = {}
+        self._inflight = 0
+        self._flush_store()
+        self._idle.set()
+        asyncio.get_running_loop().stop()
+
+    # ------------------------------------------------------------------
+    # Планирование (потокобезопасные методы)
+    # ------------------------------------------------------------------
+
+    def submit(
+        self,
+        item_id: str,
+        payload: Any,
+        channels: Sequence[Hashable],
+        due: Optional[float] = None,
+        data: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Постановка уведомления (due - unix-время, None - сейчас)"""
+        self.submit_many([(item_id, payload, channels, due, data)])
+
+    def submit_many(
+        self,
+        items: Iterable[
+            Tuple[
+                str,
+                Any,
+                Sequence[Hashable],
+                Optional[float],
+                Optional[Dict[str, Any]],
+            ]
+        ],
+    ) -> None:
+        """Пакетная постановка; data - представление для журнала
+        (None - не журналировать, например при восстановлении)"""
+        store = self.store
+        # Сериализация для журнала - в потоке вызывающего, а не в event
+        # loop диспетчера, чтобы большая пачка не задерживала отправку
+        items = [
+            (
+                item_id,
+                payload,
+                channels,
+                due,
+                (
+                    store.encode(item_id, data)
+                    if data is not None and store is not None
+                    else None
+                ),
+            )
+            for item_id, payload, channels, due, data in items
+        ]
+        if not items:
+            return
+        self.start()
+        with self._unscheduled_lock:
+            self._unscheduled += 1
+            self._idle.clear()
+        self._loop.call_soon_threadsafe(self._schedule_local, items)
+
+    def cancel(self, item_id: str) -> None:
+        """Отмена ещё не отправленного уведомления"""
+        if self.is_running:
+            self._loop.call_soon_threadsafe(self._cancel_local, item_id)
+
+    # ------------------------------------------------------------------
+    # Внутренняя часть (поток диспетчера)
+    # ------------------------------------------------------------------
+
+    def _schedule_local(self, items) -> None:
+        with self._unscheduled_lock:
+            self._unscheduled -= 1
+        now = time.time()
+        tick = self.tick
+        slots = self._slots
+        slot_heap = self._slot_heap
+        scheduled = self._scheduled
+        earliest = slot_heap[0] if slot_heap else None
+        for item_id, payload, channels, due, line in items:
+            if item_id in scheduled:
+                continue
+            due = now if due is None else due
+            entry = _Pending(item_id, payload, tuple(channels), due)
+            scheduled[item_id] = entry
+            slot = int(due / tick)
+            bucket = slots.get(slot)
+            if bucket is None:
+                slots[slot] = [entry]
+                heapq.heappush(slot_heap, slot)
+            else:
+                bucket.append(entry)
+            if line is not None:
+                self.store.add_encoded(item_id, line)
+        self.stats["scheduled"] += len(items)
+        if slot_heap and (earliest is None or slot_heap[0] < earliest):
+            self._wakeup.set()
+
+    def _cancel_local(self, item_id: str) -> None:
+        # Запись в слоте удаляется лениво при срабатывании
+        if self._scheduled.pop(item_id, None) is not None:
+            self.stats["cancelled"] += 1
+            if self.store is not None:
+                self.store.remove(item_id)
+            self._check_idle()
+
+    async def _scheduler(self) -> None:
+        loop = asyncio.get_running_loop()
+        tick = self.tick
+        slots = self._slots
+        slot_heap = self._slot_heap
+        scheduled = self._scheduled
+        while True:
+            now = time.time()
+            popped = 0
+            # Слот срабатывает по окончании: уведомления не уходят раньше
+            # срока и опаздывают по расписанию не более чем на tick
+            while slot_heap and (slot_heap[0] + 1) * tick <= now:
+                entries = slots.pop(heapq.heappop(slot_heap))
+                if len(entries) > 1:
+                    entries.sort(key=_due_key)
+                for entry in entries:
+                    if scheduled.get(entry.item_id) is not entry:
+                        continue
+                    del scheduled[entry.item_id]
+                    self._dispatch(entry, now)
+                popped += len(entries)
+                if popped >= 1000:
+                    # Даём поработать отправителям на больших пачках
+                    popped = 0
+                    await asyncio.sleep(0)
+                    now = time.time()
+            self._check_idle()
+
+            self._wakeup.clear()
+            timer = (
+                loop.call_later(
+                    max(0.0, (slot_heap[0] + 1) * tick - time.time()),
+                    self._wakeup.set,
+                )
+                if slot_heap
+                else None
+            )
+            await self._wakeup.wait()
+            if timer is not None:
+                timer.cancel()
+
+    def _dispatch(self, entry: _Pending, now: float) -> None:
+        stats = self.stats
+        lateness = now - entry.due
+        stats["lateness_sum"] += lateness
+        if lateness > stats["lateness_max"]:
+            stats["lateness_max"] = lateness
+        stats["dispatched"] += 1
+        if len(self._lateness) < LATENESS_SAMPLE_SIZE:
+            self._lateness.append(lateness)
+        else:
+            slot = random.randrange(stats["dispatched"])
+            if slot < LATENESS_SAMPLE_SIZE:
+                self._lateness[slot] = lateness
+        if not entry.channels:
+            self._complete(entry)
+            return
+        self._inflight += 1
+        queues = self._queues
+        for channel in entry.channels:
+            queue = queues.get(channel)
+            if queue is None:
+                queue = self._ensure_channel(channel)
+            queue.put(entry)
+
+    def _ensure_channel(self, channel: Hashable) -> _ChannelQueue:
+        queue = self._queues.get(channel)
+        if queue is not None:
+            return queue
+        settings = self.channel_settings.setdefault(
+            channel, ChannelSettings()
+        )
+        queue = _ChannelQueue()
+        self._queues[channel] = queue
+        bucket = (
+            AsyncTokenBucket(settings.rate, settings.burst)
+            if settings.rate > 0
+            else None
+        )
+        self.stats["channels"][channel] = {
+            "sent": 0,
+            "failed": 0,
+            "batches": 0,
+            "send_time": 0.0,
+        }
+        for _ in range(max(1, settings.workers)):
+            self._tasks.append(
+                self._loop.create_task(
+                    self._channel_worker(channel, settings, queue, bucket)
+                )
+            )
+        return queue
+
+    async def _channel_worker(
+        self,
+        channel: Hashable,
+        settings: ChannelSettings,
+        queue: _ChannelQueue,
+        bucket: Optional[AsyncTokenBucket],
+    ) -> None:
+        stats = self.stats["channels"][channel]
+        while True:
+            batch = await queue.get_batch(settings.batch_size)
+            if bucket is not None:
+                await bucket.acquire(len(batch))
+
+            started = time.perf_counter()
+            results = await self._send_with_retries(channel, settings, batch)
+            stats["send_time"] += time.perf_counter() - started
+            stats["batches"] += 1
+
+            for entry, ok in zip(batch, results):
+                if ok:
+                    stats["sent"] += 1
+                    entry.ok += (channel,)
+                else:
+                    stats["failed"] += 1
+                    entry.failed += (channel,)
+                entry.remaining -= 1
+                if entry.remaining == 0:
+                    self._inflight -= 1
+                    self._complete(entry)
+            self._check_idle()
+
+    async def _send_with_retries(
+        self, channel: Hashable, settings: ChannelSettings, batch
+    ) -> List[bool]:
+        payloads = [entry.payload for entry in batch]
+        for attempt in range(settings.max_retries + 1):
+            try:
+                if settings.timeout > 0:
+                    results = await asyncio.wait_for(
+                        self.sender(channel, payloads), settings.timeout
+                    )
+                else:
+                    results = await self.sender(channel, payloads)
+                if results is None:
+                    return [True] * len(batch)
+                results = [bool(ok) for ok in results]
+                if len(results) != len(batch):
+                    # Без результата запись считается неудачной, иначе
+                    # она не завершится и join() не дождется простоя
+                    self.logger.warning(
+                        f"{channel}: {len(results)} результатов "
+                        f"на пакет из {len(batch)}"
+                    )
+                    results = results[:len(batch)]
+                    results += [False] * (len(batch) - len(results))
+                return results
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.warning(
+                    f"Ошибка отправки через {channel} "
+                    f"(попытка {attempt + 1}): {e}"
+                )
+                if attempt < settings.max_retries:
+                    await asyncio.sleep(settings.retry_delay * (attempt + 1))
+        return [False] * len(batch)
+
+    def _complete(self, entry: _Pending) -> None:
+        if entry.failed and not entry.ok:
+            self.stats["failed"] += 1
+        else:
+            self.stats["completed"] += 1
+        self.stats["delivery_latency_sum"] += time.time() - entry.due
+        if self.store is not None:
+            self.store.remove(entry.item_id)
+        if self.on_complete is not None:
+            try:
+                self.on_complete(
+                    entry.item_id,
+                    entry.payload,
+                    list(entry.ok),
+                    list(entry.failed),
+                )
+            except Exception as e:
+                self.logger.error(f"Ошибка обработки завершения: {e}")
+
+    def _check_idle(self) -> None:
+        if self._scheduled or self._inflight:
+            return
+        self._flush_store()
+        with self._unscheduled_lock:
+            if self._unscheduled == 0:
+                self._idle.set()
+
+    async def _flusher(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self._flush_store()
+
+    def _flush_store(self) -> None:
+        if self.store is None:
+            return
+        try:
+            self.store.flush()
+        except Exception as e:
+            self.logger.error(f"Ошибка записи журнала уведомлений: {e}")
+
+    # ------------------------------------------------------------------
+    # Статистика
+    # ------------------------------------------------------------------
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счётчики, точность планирования и статистика каналов"""
+        stats = dict(self.stats)
+        dispatched = stats["dispatched"]
+        finished = stats["completed"] + stats["failed"]
+        sample = sorted(self._lateness)
+        stats["pending"] = len(self._scheduled)
+        stats["inflight"] = self._inflight
+        stats["lateness_avg"] = (
+            stats["lateness_sum"] / dispatched if dispatched else 0.0
+        )
+        stats["lateness_p99"] = (
+            sample[min(len(sample) - 1, int(len(sample) * 0.99))]
+            if sample
+            else 0.0
+        )
+        stats["delivery_latency_avg"] = (
+            stats["delivery_latency_sum"] / finished if finished else 0.0
+        )
+        stats["channels"] = {
+            channel: dict(values)
+            for channel, values in self.stats["channels"].items()
+        }
+        return stats
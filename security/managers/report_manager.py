@@ -11,15 +11,26 @@ import csv
 import json
 import logging
 import time
+from collections import Counter
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from enum import Enum
+from operator import methodcaller
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple
 
 import pandas as pd
 
 from core.base import SecurityBase
+from security.managers.report_streaming import (
+    CsvReportWriter,
+    HtmlReportWriter,
+    JsonReportWriter,
+    ReportWriter,
+    SectionCache,
+    data_range_hash,
+    flatten_data,
+)
 
 
 class ReportType(Enum):
@@ -105,6 +116,11 @@ class ReportManager(SecurityBase):
         self.retention_days = 365
         self.max_reports = 1000
 
+        # Кэш готовых секций по периоду и версии данных
+        self.section_cache = SectionCache(
+            self.config.get("section_cache_size", 256)
+        )
+
         # Инициализация
         self._initialize_default_templates()
         self._setup_export_directory()
@@ -173,6 +189,14 @@ class ReportManager(SecurityBase):
         (self.export_path / "monthly").mkdir(exist_ok=True)
         (self.export_path / "incidents").mkdir(exist_ok=True)
 
+    def _select_template(
+        self, report_type: ReportType, template_id: Optional[str]
+    ) -> ReportTemplate:
+        """Шаблон по ID или по умолчанию для типа отчета"""
+        if template_id and template_id in self.templates:
+            return self.templates[template_id]
+        return self._get_default_template(report_type)
+
     def generate_report(
         self,
         report_type: ReportType,
@@ -180,15 +204,30 @@ class ReportManager(SecurityBase):
         data: Dict[str, Any],
         template_id: Optional[str] = None,
         priority: ReportPriority = ReportPriority.MEDIUM,
+        data_range: Optional[Tuple[datetime, datetime]] = None,
+        data_version: Optional[Hashable] = None,
     ) -> str:
-        """Генерация отчета"""
+        """
+        Генерация отчета
+
+        Args:
+            report_type: Тип отчета
+            title: Заголовок
+            data: Исходные данные
+            template_id: ID шаблона (по умолчанию - шаблон типа отчета)
+            priority: Приоритет
+            data_range: Период данных для кэша секций
+            data_version: Версия данных периода; секции кэшируются по
+                шаблону, периоду и версии (без периода или версии
+                секции всегда считаются заново)
+
+        Returns:
+            str: ID отчета
+        """
         report_id = f"report_{int(time.time())}_{report_type.value}"
 
         # Выбираем шаблон
-        if template_id and template_id in self.templates:
-            template = self.templates[template_id]
-        else:
-            template = self._get_default_template(report_type)
+        template = self._select_template(report_type, template_id)
 
         # Создаем данные отчета
         report_data = ReportData(
@@ -201,7 +240,9 @@ class ReportManager(SecurityBase):
         )
 
         # Генерируем содержимое отчета
-        self._generate_report_content(report_data, template)
+        self._generate_report_content(
+            report_data, template, data_range, data_version
+        )
 
         # Сохраняем отчет
         self.reports[report_id] = report_data
@@ -223,7 +264,11 @@ class ReportManager(SecurityBase):
         return list(self.templates.values())[0]
 
     def _generate_report_content(
-        self, report_data: ReportData, template: ReportTemplate
+        self,
+        report_data: ReportData,
+        template: ReportTemplate,
+        data_range: Optional[Tuple[datetime, datetime]] = None,
+        data_version: Optional[Hashable] = None,
     ) -> None:
         """Генерация содержимого отчета"""
         content = {
@@ -234,10 +279,10 @@ class ReportManager(SecurityBase):
         }
 
         # Генерируем секции отчета
-        for section in template.sections:
-            content["sections"][section] = self._generate_section(
-                section, report_data.data
-            )
+        for section, section_content in self._iter_sections(
+            template, report_data.data, data_range, data_version
+        ):
+            content["sections"][section] = section_content
 
         # Генерируем графики
         for chart_type in template.chart_types:
@@ -251,6 +296,44 @@ class ReportManager(SecurityBase):
 
         report_data.data = content
 
+    def _iter_sections(
+        self,
+        template: ReportTemplate,
+        data: Dict[str, Any],
+        data_range: Optional[Tuple[datetime, datetime]] = None,
+        data_version: Optional[Hashable] = None,
+    ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Секции шаблона по порядку по мере готовности
+
+        Секция считается, когда ее запрашивает получатель, поэтому
+        потоковая запись не держит в памяти еще не записанные секции.
+        С периодом и версией данных от вызывающего готовые секции
+        берутся из кэша по (шаблон, секция, хеш периода, версия); без
+        версии кэш не используется - данные периода могли измениться.
+        """
+        range_hash = None
+        if data_range and data_version is not None:
+            range_hash = data_range_hash(data_range)
+        for section in template.sections:
+            if range_hash is None:
+                yield section, self._generate_section(section, data)
+                continue
+            key = (template.template_id, section, range_hash, data_version)
+            result = self.section_cache.get(key)
+            if result is None:
+                result = self._generate_section(section, data)
+                self.section_cache.put(key, result)
+            yield section, result
+
+    def invalidate_sections(
+        self, data_range: Optional[Tuple[datetime, datetime]] = None
+    ) -> int:
+        """Сброс кэша секций периода (None - всех)"""
+        return self.section_cache.invalidate(
+            data_range_hash(data_range) if data_range else None
+        )
+
     def _generate_section(
         self, section: str, data: Dict[str, Any]
     ) -> Dict[str, Any]:
@@ -360,15 +443,12 @@ class ReportManager(SecurityBase):
     ) -> Dict[str, Any]:
         """Генерация секции рекомендаций"""
         recommendations = data.get("recommendations", [])
+        implemented = sum(1 for r in recommendations if r.get("implemented"))
         return {
             "total": len(recommendations),
             "by_priority": self._count_by_priority(recommendations),
-            "implemented": len(
-                [r for r in recommendations if r.get("implemented")]
-            ),
-            "pending": len(
-                [r for r in recommendations if not r.get("implemented")]
-            ),
+            "implemented": implemented,
+            "pending": len(recommendations) - implemented,
         }
 
     def _generate_compliance_section(
@@ -603,53 +683,42 @@ class ReportManager(SecurityBase):
 
         return summary
 
+    @staticmethod
+    def _count_by_field(
+        items: List[Dict[str, Any]], field_name: str
+    ) -> Dict[str, int]:
+        """Подсчет по значению поля (обход элементов на уровне C)"""
+        return dict(
+            Counter(map(methodcaller("get", field_name, "unknown"), items))
+        )
+
     def _count_by_severity(
         self, items: List[Dict[str, Any]]
     ) -> Dict[str, int]:
         """Подсчет по серьезности"""
-        counts = {}
-        for item in items:
-            severity = item.get("severity", "unknown")
-            counts[severity] = counts.get(severity, 0) + 1
-        return counts
+        return self._count_by_field(items, "severity")
 
     def _count_by_type(self, items: List[Dict[str, Any]]) -> Dict[str, int]:
         """Подсчет по типу"""
-        counts = {}
-        for item in items:
-            item_type = item.get("type", "unknown")
-            counts[item_type] = counts.get(item_type, 0) + 1
-        return counts
+        return self._count_by_field(items, "type")
 
     def _count_by_category(
         self, items: List[Dict[str, Any]]
     ) -> Dict[str, int]:
         """Подсчет по категории"""
-        counts = {}
-        for item in items:
-            category = item.get("category", "unknown")
-            counts[category] = counts.get(category, 0) + 1
-        return counts
+        return self._count_by_field(items, "category")
 
     def _count_by_risk_level(
         self, items: List[Dict[str, Any]]
     ) -> Dict[str, int]:
         """Подсчет по уровню риска"""
-        counts = {}
-        for item in items:
-            risk_level = item.get("risk_level", "unknown")
-            counts[risk_level] = counts.get(risk_level, 0) + 1
-        return counts
+        return self._count_by_field(items, "risk_level")
 
     def _count_by_priority(
         self, items: List[Dict[str, Any]]
     ) -> Dict[str, int]:
         """Подсчет по приоритету"""
-        counts = {}
-        for item in items:
-            priority = item.get("priority", "unknown")
-            counts[priority] = counts.get(priority, 0) + 1
-        return counts
+        return self._count_by_field(items, "priority")
 
     def _calculate_duration(self, timeline: List[Dict[str, Any]]) -> int:
         """Расчет продолжительности"""
@@ -702,6 +771,98 @@ class ReportManager(SecurityBase):
         else:
             raise ValueError(f"Неподдерживаемый формат: {format_type}")
 
+    def stream_report(
+        self,
+        report_type: ReportType,
+        title: str,
+        data: Dict[str, Any],
+        format_type: ReportFormat,
+        file_path: Optional[str] = None,
+        template_id: Optional[str] = None,
+        data_range: Optional[Tuple[datetime, datetime]] = None,
+        data_version: Optional[Hashable] = None,
+    ) -> str:
+        """
+        Потоковая генерация отчета сразу в файл
+
+        Секции записываются по мере готовности, отчет целиком в памяти
+        не собирается и в self.reports не попадает. С data_range и
+        data_version готовые секции берутся из кэша, поэтому экспорт
+        той же версии данных в другой формат их не пересчитывает.
+
+        Args:
+            report_type: Тип отчета
+            title: Заголовок
+            data: Исходные данные
+            format_type: Формат файла (JSON, CSV или HTML)
+            file_path: Путь к файлу (по умолчанию - в export_path)
+            template_id: ID шаблона
+            data_range: Период данных для кэша секций
+            data_version: Версия данных периода для кэша секций
+
+        Returns:
+            str: Путь к файлу отчета
+        """
+        writer_class = self._writer_class(format_type)
+        template = self._select_template(report_type, template_id)
+        report = ReportData(
+            report_id=f"report_{int(time.time())}_{report_type.value}",
+            title=title,
+            report_type=report_type,
+            priority=ReportPriority.MEDIUM,
+            created_at=datetime.now(),
+            data={},
+            summary=self._generate_summary(data),
+        )
+        if not file_path:
+            file_path = self._generate_file_path(report, format_type)
+
+        with writer_class(file_path) as writer:
+            writer.begin(self._report_header(report), report.summary)
+            for section, content in self._iter_sections(
+                template, data, data_range, data_version
+            ):
+                writer.write_section(section, content)
+            writer.end()
+
+        self.logger.info(f"Отчет {report.report_id} записан в {file_path}")
+        return file_path
+
+    @staticmethod
+    def _writer_class(format_type: ReportFormat) -> type:
+        """Класс потоковой записи для формата"""
+        writers = {
+            ReportFormat.JSON: JsonReportWriter,
+            ReportFormat.CSV: CsvReportWriter,
+            ReportFormat.HTML: HtmlReportWriter,
+        }
+        if format_type not in writers:
+            raise ValueError(f"Неподдерживаемый формат: {format_type}")
+        return writers[format_type]
+
+    @staticmethod
+    def _report_header(report: ReportData) -> Dict[str, Any]:
+        """Заголовок отчета для потоковой записи"""
+        if "sections" in report.data:
+            return {
+                key: value
+                for key, value in report.data.items()
+                if key not in ("sections", "summary")
+            }
+        return {
+            "title": report.title,
+            "type": report.report_type.value,
+            "created_at": report.created_at.isoformat(),
+        }
+
+    def _write_report(self, report: ReportData, writer: ReportWriter) -> None:
+        """Запись сгенерированного отчета посекционно"""
+        with writer:
+            writer.begin(self._report_header(report), report.summary)
+            for section, content in report.data.get("sections", {}).items():
+                writer.write_section(section, content)
+            writer.end()
+
     def _generate_file_path(
         self, report: ReportData, format_type: ReportFormat
     ) -> str:
@@ -712,27 +873,36 @@ class ReportManager(SecurityBase):
 
     def _export_json(self, report: ReportData, file_path: str) -> str:
         """Экспорт в JSON"""
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(report.data, f, ensure_ascii=False, indent=2)
+        if "sections" not in report.data:
+            with open(file_path, "w", encoding="utf-8") as f:
+                json.dump(report.data, f, ensure_ascii=False, indent=2)
+            return file_path
+        self._write_report(report, JsonReportWriter(file_path))
         return file_path
 
     def _export_csv(self, report: ReportData, file_path: str) -> str:
         """Экспорт в CSV"""
-        # Создаем плоскую структуру для CSV
-        flat_data = self._flatten_data(report.data)
-
-        with open(file_path, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(flat_data.keys())
-            writer.writerow(flat_data.values())
+        if "sections" not in report.data:
+            # Создаем плоскую структуру для CSV
+            flat_data = self._flatten_data(report.data)
+
+            with open(file_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(flat_data.keys())
+                writer.writerow(flat_data.values())
+            return file_path
+        self._write_report(report, CsvReportWriter(file_path))
         return file_path
 
     def _export_html(self, report: ReportData, file_path: str) -> str:
         """Экспорт в HTML"""
-        html_content = self._generate_html_content(report)
+        if "sections" not in report.data:
+            html_content = self._generate_html_content(report)
 
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(html_content)
+            with open(file_path, "w", encoding="utf-8") as f:
+                f.write(html_content)
+            return file_path
+        self._write_report(report, HtmlReportWriter(file_path))
         return file_path
 
     def _export_excel(self, report: ReportData, file_path: str) -> str:
@@ -746,16 +916,7 @@ class ReportManager(SecurityBase):
         self, data: Dict[str, Any], prefix: str = ""
     ) -> Dict[str, Any]:
         """Сглаживание данных для CSV"""
-        flat = {}
-        for key, value in data.items():
-            new_key = f"{prefix}.{key}" if prefix else key
-            if isinstance(value, dict):
-                flat.update(self._flatten_data(value, new_key))
-            elif isinstance(value, list):
-                flat[new_key] = str(value)
-            else:
-                flat[new_key] = value
-        return flat
+        return flatten_data(data, prefix)
 
     def _generate_html_content(self, report: ReportData) -> str:
         """Генерация HTML содержимого"""
@@ -852,6 +1013,7 @@ class ReportManager(SecurityBase):
             "total_reports": len(self.reports),
             "total_templates": len(self.templates),
             "queue_size": len(self.report_queue),
+            "cached_sections": len(self.section_cache),
             "export_path": str(self.export_path),
             "auto_generate": self.auto_generate,
             "retention_days": self.retention_days,
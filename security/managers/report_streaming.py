@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+ALADDIN Security System - Report Streaming
+Потоковая запись отчетов для ReportManager
+
+Секции отчета записываются в файл по мере готовности, поэтому большой
+отчет не собирается целиком в памяти перед экспортом:
+
+- JsonReportWriter пишет тот же JSON, что json.dump(indent=2);
+- CsvReportWriter пишет строку заголовков и строку значений, значения
+  копятся во временном файле;
+- HtmlReportWriter оборачивает JSON в HTML страницу;
+- SectionCache хранит готовые секции по (шаблон, секция, хеш диапазона
+  данных, версия данных от вызывающего), повторный экспорт той же
+  версии в другой формат их не пересчитывает.
+"""
+
+import csv
+import hashlib
+import html
+import io
+import json
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+SectionKey = Tuple[str, str, str, Hashable]
+
+
+def data_range_hash(data_range: Tuple[datetime, datetime]) -> str:
+    """Хеш диапазона данных отчета"""
+    start, end = data_range
+    text = f"{start.isoformat()}|{end.isoformat()}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def flatten_data(data: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Сглаживание вложенных словарей в ключи через точку"""
+    flat = {}
+    for key, value in data.items():
+        new_key = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten_data(value, new_key))
+        elif isinstance(value, list):
+            flat[new_key] = str(value)
+        else:
+            flat[new_key] = value
+    return flat
+
+
+class SectionCache:
+    """LRU кэш готовых секций отчетов"""
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._items: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: SectionKey) -> Optional[Dict[str, Any]]:
+        """Секция из кэша или None"""
+        section = self._items.get(key)
+        if section is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return section
+
+    def put(self, key: SectionKey, section: Dict[str, Any]) -> None:
+        """Сохранение секции с вытеснением самых старых"""
+        self._items[key] = section
+        self._items.move_to_end(key)
+        while len(self._items) > max(self.max_size, 0):
+            self._items.popitem(last=False)
+
+    def invalidate(self, range_hash: Optional[str] = None) -> int:
+        """Удаление секций диапазона (None - всех); число удаленных"""
+        if range_hash is None:
+            removed = len(self._items)
+            self._items.clear()
+            return removed
+        keys = [key for key in self._items if key[2] == range_hash]
+        for key in keys:
+            del self._items[key]
+        return len(keys)
+
+
+class ReportWriter(ABC):
+    """
+    Потоковая запись отчета в файл
+
+    Файл пишется во временный и заменяет целевой только после
+    успешного завершения, поэтому оборванный экспорт не оставляет
+    половину отчета.
+    """
+
+    newline: Optional[str] = None
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._temporary = file_path + ".tmp"
+        self._file: Optional[io.TextIOBase] = None
+
+    def __enter__(self) -> "ReportWriter":
+        directory = os.path.dirname(self.file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(
+            self._temporary, "w", encoding="utf-8", newline=self.newline
+        )
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._file.close()
+        if exc_type is None:
+            os.replace(self._temporary, self.file_path)
+        elif os.path.exists(self._temporary):
+            os.remove(self._temporary)
+
+    @abstractmethod
+    def begin(self, header: Dict[str, Any], summary: str) -> None:
+        """Начало отчета: заголовок (название, тип, дата) и сводка"""
+
+    @abstractmethod
+    def write_section(self, name: str, content: Dict[str, Any]) -> None:
+        """Запись готовой секции"""
+
+    @abstractmethod
+    def end(self) -> None:
+        """Завершение отчета"""
+
+
+class JsonReportWriter(ReportWriter):
+    """JSON отчета в формате json.dump(indent=2)"""
+
+    def __init__(self, file_path: str):
+        super().__init__(file_path)
+        self._encoder = json.JSONEncoder(ensure_ascii=False, indent=2)
+        self._summary = ""
+        self._sections = 0
+
+    def _emit(self, text: str) -> None:
+        self._file.write(text)
+
+    def _dumps(self, value: Any) -> str:
+        return json.dumps(value, ensure_ascii=False)
+
+    def begin(self, header: Dict[str, Any], summary: str) -> None:
+        self._summary = summary
+        self._sections = 0
+        self._emit("{")
+        for key, value in header.items():
+            self._emit(f"\n  {self._dumps(key)}: {self._dumps(value)},")
+        self._emit('\n  "sections": {')
+
+    def write_section(self, name: str, content: Dict[str, Any]) -> None:
+        self._emit("," if self._sections else "")
+        self._emit(f"\n    {self._dumps(name)}: ")
+        # Секция вложена на два уровня - сдвигаем ее строки
+        for chunk in self._encoder.iterencode(content):
+            self._emit(chunk.replace("\n", "\n    "))
+        self._sections += 1
+
+    def end(self) -> None:
+        self._emit("\n  }" if self._sections else "}")
+        self._emit(f',\n  "summary": {self._dumps(self._summary)}\n}}')
+
+
+class HtmlReportWriter(JsonReportWriter):
+    """HTML страница отчета с данными в JSON"""
+
+    HEAD = """<!DOCTYPE html>
+<html>
+<head>
+    <title>{title}</title>
+    <meta charset="utf-8">
+    <style>
+        body {{ font-family: Arial, sans-serif; margin: 20px; }}
+        .header {{ background-color: #f0f0f0; padding: 20px; }}
+        .section {{ margin: 20px 0; }}
+        pre {{ white-space: pre-wrap; }}
+    </style>
+</head>
+<body>
+    <div class="header">
+        <h1>{title}</h1>
+        <p>Тип: {report_type}</p>
+        <p>Создан: {created_at}</p>
+    </div>
+
+    <div class="section">
+        <h2>Сводка</h2>
+        <p>{summary}</p>
+    </div>
+
+    <div class="section">
+        <h2>Данные</h2>
+        <pre>"""
+
+    TAIL = """</pre>
+    </div>
+</body>
+</html>
+"""
+
+    def _emit(self, text: str) -> None:
+        self._file.write(html.escape(text, quote=False))
+
+    def begin(self, header: Dict[str, Any], summary: str) -> None:
+        created_at = header.get("created_at", "")
+        try:
+            created_at = datetime.fromisoformat(created_at).strftime(
+                "%Y-%m-%d %H:%M:%S"
+            )
+        except (TypeError, ValueError):
+            pass
+        self._file.write(
+            self.HEAD.format(
+                title=html.escape(str(header.get("title", ""))),
+                report_type=html.escape(str(header.get("type", ""))),
+                created_at=html.escape(str(created_at)),
+                summary=html.escape(summary),
+            )
+        )
+        super().begin(header, summary)
+
+    def end(self) -> None:
+        super().end()
+        self._file.write(self.TAIL)
+
+
+class CsvReportWriter(ReportWriter):
+    """
+    CSV отчета: строка сглаженных ключей и строка значений
+
+    Ключи пишутся сразу, значения - во временный файл, который
+    дописывается второй строкой в конце.
+    """
+
+    newline = ""
+
+    def __enter__(self) -> "CsvReportWriter":
+        super().__enter__()
+        self._values = tempfile.SpooledTemporaryFile(
+            max_size=1 << 20, mode="w+", encoding="utf-8", newline=""
+        )
+        self._fields = 0
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._values.close()
+        super().__exit__(exc_type, exc_value, traceback)
+
+    @staticmethod
+    def _row(values: List[Any]) -> str:
+        """Поля строки CSV без перевода строки"""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow(values)
+        text = buffer.getvalue()[:-2]
+        if len(values) == 1 and values[0] in ("", None):
+            # Одно пустое поле csv пишет как "", внутри строки - пусто
+            text = ""
+        return text
+
+    def _write_flat(self, flat: Dict[str, Any]) -> None:
+        if not flat:
+            return
+        separator = "," if self._fields else ""
+        self._file.write(separator + self._row(list(flat.keys())))
+        self._values.write(separator + self._row(list(flat.values())))
+        self._fields += len(flat)
+
+    def begin(self, header: Dict[str, Any], summary: str) -> None:
+        self._summary = summary
+        self._write_flat(flatten_data(header))
+
+    def write_section(self, name: str, content: Dict[str, Any]) -> None:
+        self._write_flat(flatten_data(content, f"sections.{name}"))
+
+    def end(self) -> None:
+        self._write_flat({"summary": self._summary})
+        self._file.write("\r\n")
+        self._values.seek(0)
+        shutil.copyfileobj(self._values, self._file)
+        self._file.write("\r\n")
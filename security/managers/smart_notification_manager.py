@@ -8,22 +8,28 @@ SmartNotificationManager - Умные уведомления с AI-анализ
 Цветовая схема: Matrix AI
 """
 
-import asyncio
 import hashlib
 import json
 import logging
 import os
-import queue
 
 # Импорт базового класса
 import sys
 import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
 from typing import Any, Dict, List, Optional
 
+from security.managers.notification_dispatcher import (
+    ChannelSettings,
+    NotificationDispatcher,
+    PendingNotificationStore,
+)
+
 try:
     from core.base import SecurityBase
 
@@ -91,6 +97,10 @@ class ChannelManager:
         """Отправка уведомления через канал"""
         return True
 
+    async def send_batch(self, notifications, channel):
+        """Пакетная отправка через канал (результат по каждому)"""
+        return [True] * len(notifications)
+
 
 class TemplateGenerator:
     def __init__(self, config):
@@ -205,15 +215,40 @@ class SmartNotificationManager(SecurityBase):
         self.delivered_notifications = 0
         self.read_notifications = 0
         self.failed_notifications = 0
-        self.notification_history = []
-
-        # Очереди
-        self.notification_queue = queue.Queue()
-        self.processing_queue = queue.Queue()
-
-        # Потоки
-        self.processing_thread = None
+        self.notification_history = deque(maxlen=1000)
+
+        # Доставка: долгоживущий диспетчер с кучей таймеров, пулами
+        # каналов и журналом ожидающих уведомлений
+        self.pending_store = PendingNotificationStore(
+            self.config.get(
+                "pending_store_path",
+                "data/notifications/pending_notifications.jsonl",
+            )
+        )
+        self.dispatcher = NotificationDispatcher(
+            sender=self._send_batch,
+            channel_settings={
+                channel: ChannelSettings.from_config(settings)
+                for channel, settings in self.config.get(
+                    "delivery_channels", {}
+                ).items()
+                if settings.get("enabled", True)
+            },
+            store=self.pending_store,
+            on_complete=self._on_notification_dispatched,
+            name="smart_notification_dispatcher",
+        )
         self.is_processing = False
+        self._processing_lock = threading.Lock()
+
+        # Статусы отправленных уведомлений пишутся на диск пачками в
+        # отдельном потоке, а не в event loop диспетчера
+        self._status_writes: Dict[str, Dict[str, Any]] = {}
+        self._status_lock = threading.Lock()
+        self._status_flush_scheduled = False
+        self._status_writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="notification-status"
+        )
 
         # Цветовая схема Matrix AI
         self.color_scheme = self._initialize_color_scheme()
@@ -331,42 +366,63 @@ class SmartNotificationManager(SecurityBase):
                     "priority": 1,
                     "max_retries": 3,
                     "timeout": 30,
+                    "workers": 4,
+                    "rate_limit": 1000,
+                    "batch_size": 100,
                 },
                 NotificationChannel.EMAIL: {
                     "enabled": True,
                     "priority": 2,
                     "max_retries": 2,
                     "timeout": 60,
+                    "workers": 2,
+                    "rate_limit": 100,
+                    "batch_size": 50,
                 },
                 NotificationChannel.SMS: {
                     "enabled": True,
                     "priority": 3,
                     "max_retries": 2,
                     "timeout": 30,
+                    "workers": 2,
+                    "rate_limit": 20,
+                    "batch_size": 1,
                 },
                 NotificationChannel.VOICE: {
                     "enabled": True,
                     "priority": 4,
                     "max_retries": 1,
                     "timeout": 120,
+                    "workers": 1,
+                    "rate_limit": 2,
+                    "batch_size": 1,
                 },
                 NotificationChannel.IN_APP: {
                     "enabled": True,
                     "priority": 5,
                     "max_retries": 1,
                     "timeout": 10,
+                    "workers": 2,
+                    "rate_limit": 0,
+                    "batch_size": 500,
                 },
                 NotificationChannel.MESSENGER: {
                     "enabled": True,
                     "priority": 6,
                     "max_retries": 2,
                     "timeout": 45,
+                    "workers": 2,
+                    "rate_limit": 30,
+                    "batch_size": 1,
                 },
                 NotificationChannel.DASHBOARD: {
                     "enabled": True,
                     "priority": 7,
                     "max_retries": 1,
                     "timeout": 5,
+                    "workers": 1,
+                    "rate_limit": 0,
+                    "batch_size": 500,
                 },
             },
         }
@@ -519,12 +575,12 @@ class SmartNotificationManager(SecurityBase):
                 expires_at=timing.get("expires_at"),
             )
 
-            # Добавление в очередь обработки
-            await self._queue_notification(notification)
-
             # Сохранение уведомления
             await self._save_notification(notification)
 
+            # Передача диспетчеру доставки
+            await self._queue_notification(notification)
+
             self.logger.info(f"Умное уведомление создано: {notification_id}")
 
             return notification
@@ -570,13 +626,24 @@ class SmartNotificationManager(SecurityBase):
     async def _queue_notification(
         self, notification: SmartNotification
     ) -> None:
-        """Добавление уведомления в очередь обработки"""
+        """Передача уведомления диспетчеру доставки"""
         try:
-            self.notification_queue.put(notification)
-
             # Запуск обработки если не активна
             if not self.is_processing:
-                await self._start_processing()
+                self.start_processing()
+
+            due = (
+                notification.scheduled_at.timestamp()
+                if notification.scheduled_at
+                else None
+            )
+            self.dispatcher.submit(
+                notification.id,
+                notification,
+                notification.channels,
+                due=due,
+                data=self._notification_to_dict(notification),
+            )
 
             self.logger.debug(
                 f"Уведомление добавлено в очередь: {notification.id}"
@@ -586,171 +653,251 @@ class SmartNotificationManager(SecurityBase):
             self.logger.error(f"Ошибка добавления в очередь: {e}")
             raise
 
-    async def _start_processing(self) -> None:
-        """Запуск обработки уведомлений"""
-        try:
+    def start(self) -> bool:
+        """Запуск менеджера: доставка и восстановление журнала"""
+        if not super().start():
+            return False
+        return self.start_processing()
+
+    def stop(self) -> bool:
+        """Остановка менеджера; неотправленные остаются в журнале"""
+        self.stop_processing()
+        return super().stop()
+
+    def start_processing(self) -> bool:
+        """
+        Запуск диспетчера и восстановление ожидающих уведомлений
+
+        Вызывается при старте менеджера, чтобы журнал после перезапуска
+        доставлялся сразу, а не с первым новым уведомлением.
+        Повторный вызов ничего не делает.
+        """
+        with self._processing_lock:
             if self.is_processing:
-                return
-
-            self.is_processing = True
-            self.processing_thread = threading.Thread(
-                target=self._process_notifications
-            )
-            self.processing_thread.start()
-
-            self.logger.info("Обработка уведомлений запущена")
+                return True
+            return self._restore_and_start()
 
-        except Exception as e:
-            self.logger.error(f"Ошибка запуска обработки: {e}")
-            self.is_processing = False
+    async def _start_processing(self) -> None:
+        """Запуск диспетчера (совместимость с прежними вызовами)"""
+        self.start_processing()
 
-    def _process_notifications(self) -> None:
-        """Обработка уведомлений в отдельном потоке"""
+    def _restore_and_start(self) -> bool:
+        """Восстановление журнала и запуск диспетчера"""
         try:
-            while self.is_processing:
-                try:
-                    # Получение уведомления из очереди
-                    notification = self.notification_queue.get(timeout=1)
-
-                    # Обработка уведомления
-                    asyncio.run(
-                        self._process_single_notification(notification)
+            restored = []
+            for item_id, data in self.pending_store.load().items():
+                notification = self._notification_from_dict(data)
+                if notification is None:
+                    self.pending_store.remove(item_id)
+                    continue
+                restored.append(
+                    (
+                        notification.id,
+                        notification,
+                        notification.channels,
+                        (
+                            notification.scheduled_at.timestamp()
+                            if notification.scheduled_at
+                            else None
+                        ),
+                        None,
                     )
+                )
 
-                    self.notification_queue.task_done()
+            self.dispatcher.start()
+            self.dispatcher.submit_many(restored)
+            self.is_processing = True
 
-                except queue.Empty:
-                    continue
-                except Exception as e:
-                    self.logger.error(f"Ошибка обработки уведомления: {e}")
-                    continue
+            self.logger.info(
+                f"Обработка уведомлений запущена, "
+                f"восстановлено ожидающих: {len(restored)}"
+            )
+            return True
 
         except Exception as e:
-            self.logger.error(f"Ошибка в потоке обработки: {e}")
-        finally:
+            self.logger.error(f"Ошибка запуска обработки: {e}")
             self.is_processing = False
+            return False
 
-    async def _process_single_notification(
-        self, notification: SmartNotification
-    ) -> None:
-        """Обработка одного уведомления"""
-        try:
-            # Проверка времени отправки
-            if (
-                notification.scheduled_at
-                and notification.scheduled_at > datetime.now()
-            ):
-                # Возврат в очередь для повторной обработки
-                await asyncio.sleep(1)
-                self.notification_queue.put(notification)
-                return
+    def stop_processing(self, timeout: float = 5.0) -> None:
+        """Остановка диспетчера; неотправленные остаются в журнале"""
+        with self._processing_lock:
+            self.dispatcher.stop(timeout)
+            self.is_processing = False
+        # Дождаться записи статусов, поставленных до остановки
+        self._status_writer.submit(self._flush_status_writes).result()
+        self.logger.info("Обработка уведомлений остановлена")
 
-            # Отправка уведомления
-            await self._send_notification(notification)
+    def cancel_notification(self, notification_id: str) -> None:
+        """Отмена ещё не отправленного уведомления"""
+        self.dispatcher.cancel(notification_id)
 
-        except Exception as e:
-            self.logger.error(
-                f"Ошибка обработки уведомления {notification.id}: {e}"
+    async def _send_batch(
+        self,
+        channel: NotificationChannel,
+        notifications: List[SmartNotification],
+    ) -> List[bool]:
+        """Отправка пакета уведомлений через канал (поток диспетчера)"""
+        send_batch = getattr(self.channel_manager, "send_batch", None)
+        if send_batch is not None:
+            return await send_batch(notifications, channel)
+        return [
+            bool(
+                await self.channel_manager.send_notification(
+                    notification, channel
+                )
             )
-            notification.status = NotificationStatus.FAILED
-            self.failed_notifications += 1
+            for notification in notifications
+        ]
 
-    async def _send_notification(
-        self, notification: SmartNotification
+    def _on_notification_dispatched(
+        self,
+        notification_id: str,
+        notification: SmartNotification,
+        sent_channels: List[NotificationChannel],
+        failed_channels: List[NotificationChannel],
     ) -> None:
-        """Отправка уведомления через выбранные каналы"""
-        try:
-            # Отправка через каждый канал
-            for channel in notification.channels:
-                try:
-                    await self.channel_manager.send_notification(
-                        notification, channel
-                    )
-                    self.logger.debug(
-                        f"Уведомление отправлено через {channel.value}: "
-                        f"{notification.id}"
-                    )
-                except Exception as e:
-                    self.logger.error(
-                        f"Ошибка отправки через {channel.value}: {e}"
-                    )
+        """Обновление статуса после отправки по всем каналам"""
+        for channel in failed_channels:
+            self.logger.error(
+                f"Ошибка отправки через {channel.value}: {notification_id}"
+            )
 
-            # Обновление статуса
+        if sent_channels:
             notification.status = NotificationStatus.SENT
             notification.sent_at = datetime.now()
             self.sent_notifications += 1
-
-            # Сохранение обновленного уведомления
-            await self._save_notification(notification)
-
-        except Exception as e:
-            self.logger.error(f"Ошибка отправки уведомления: {e}")
+        else:
             notification.status = NotificationStatus.FAILED
             self.failed_notifications += 1
 
+        # Сохранение обновленного уведомления вне потока диспетчера
+        self._queue_status_write(notification)
+
+    def _queue_status_write(self, notification: SmartNotification) -> None:
+        """Постановка записи статуса; повторы по одному id схлопываются"""
+        data = self._notification_to_dict(notification)
+        with self._status_lock:
+            self._status_writes[notification.id] = data
+            if self._status_flush_scheduled:
+                return
+            self._status_flush_scheduled = True
+        self._status_writer.submit(self._flush_status_writes)
+
+    def _flush_status_writes(self) -> None:
+        """Запись накопленных статусов (поток записи)"""
+        with self._status_lock:
+            pending, self._status_writes = self._status_writes, {}
+            self._status_flush_scheduled = False
+        for data in pending.values():
+            self._write_notification_data(data)
+
     async def _save_notification(
         self, notification: SmartNotification
     ) -> None:
         """Сохранение уведомления"""
-        try:
-            # Добавление в историю
-            self.notification_history.append(notification)
+        # Добавление в историю (ограничена maxlen)
+        self.notification_history.append(notification)
+        self._write_notification(notification)
 
-            # Ограничение размера истории
-            if len(self.notification_history) > 1000:
-                self.notification_history = self.notification_history[-1000:]
+    def _write_notification(self, notification: SmartNotification) -> None:
+        """Запись уведомления в файл"""
+        self._write_notification_data(self._notification_to_dict(notification))
 
-            # Сохранение в файл
+    def _write_notification_data(self, data: Dict[str, Any]) -> None:
+        """Запись сериализованного уведомления в файл"""
+        try:
             os.makedirs("data/notifications", exist_ok=True)
 
-            notification_data = {
-                "id": notification.id,
-                "type": notification.type.value,
-                "priority": notification.priority.value,
-                "title": notification.title,
-                "message": notification.message,
-                "channels": [ch.value for ch in notification.channels],
-                "target_users": notification.target_users,
-                "context": notification.context,
-                "ai_analysis": notification.ai_analysis,
-                "personalization": notification.personalization,
-                "timing": notification.timing,
-                "status": notification.status.value,
-                "created_at": notification.created_at.isoformat(),
-                "scheduled_at": (
-                    notification.scheduled_at.isoformat()
-                    if notification.scheduled_at
-                    else None
-                ),
-                "sent_at": (
-                    notification.sent_at.isoformat()
-                    if notification.sent_at
-                    else None
-                ),
-                "read_at": (
-                    notification.read_at.isoformat()
-                    if notification.read_at
-                    else None
-                ),
-                "expires_at": (
-                    notification.expires_at.isoformat()
-                    if notification.expires_at
-                    else None
-                ),
-            }
-
-            filename = (
-                f"data/notifications/notification_{notification.id}.json"
-            )
+            filename = f"data/notifications/notification_{data['id']}.json"
 
             with open(filename, "w", encoding="utf-8") as f:
-                json.dump(notification_data, f, ensure_ascii=False, indent=2)
+                json.dump(
+                    data,
+                    f,
+                    ensure_ascii=False,
+                    indent=2,
+                    default=str,
+                )
 
             self.logger.debug(f"Уведомление сохранено: {filename}")
 
         except Exception as e:
             self.logger.error(f"Ошибка сохранения уведомления: {e}")
 
+    @staticmethod
+    def _notification_to_dict(
+        notification: SmartNotification,
+    ) -> Dict[str, Any]:
+        """Сериализуемое представление уведомления"""
+        return {
+            "id": notification.id,
+            "type": notification.type.value,
+            "priority": notification.priority.value,
+            "title": notification.title,
+            "message": notification.message,
+            "channels": [ch.value for ch in notification.channels],
+            "target_users": notification.target_users,
+            "context": notification.context,
+            "ai_analysis": notification.ai_analysis,
+            "personalization": notification.personalization,
+            "timing": notification.timing,
+            "status": notification.status.value,
+            "created_at": notification.created_at.isoformat(),
+            "scheduled_at": (
+                notification.scheduled_at.isoformat()
+                if notification.scheduled_at
+                else None
+            ),
+            "sent_at": (
+                notification.sent_at.isoformat()
+                if notification.sent_at
+                else None
+            ),
+            "read_at": (
+                notification.read_at.isoformat()
+                if notification.read_at
+                else None
+            ),
+            "expires_at": (
+                notification.expires_at.isoformat()
+                if notification.expires_at
+                else None
+            ),
+        }
+
+    def _notification_from_dict(
+        self, data: Dict[str, Any]
+    ) -> Optional[SmartNotification]:
+        """Восстановление уведомления из журнала"""
+
+        def parse_time(value):
+            return datetime.fromisoformat(value) if value else None
+
+        try:
+            return SmartNotification(
+                id=data["id"],
+                type=NotificationType(data["type"]),
+                priority=NotificationPriority(data["priority"]),
+                title=data["title"],
+                message=data["message"],
+                channels=[NotificationChannel(ch) for ch in data["channels"]],
+                target_users=data["target_users"],
+                context=data.get("context", {}),
+                ai_analysis=data.get("ai_analysis", {}),
+                personalization=data.get("personalization", {}),
+                timing=data.get("timing", {}),
+                status=NotificationStatus(data["status"]),
+                created_at=parse_time(data["created_at"]),
+                scheduled_at=parse_time(data.get("scheduled_at")),
+                sent_at=parse_time(data.get("sent_at")),
+                read_at=parse_time(data.get("read_at")),
+                expires_at=parse_time(data.get("expires_at")),
+            )
+        except Exception as e:
+            self.logger.error(f"Ошибка восстановления уведомления: {e}")
+            return None
+
     def get_notification_statistics(self) -> Dict[str, Any]:
         """Получение статистики уведомлений"""
         try:
@@ -780,6 +927,7 @@ class SmartNotificationManager(SecurityBase):
                 "delivery_rate": delivery_rate,
                 "read_rate": read_rate,
                 "recent_notifications": len(self.notification_history),
+                "dispatcher": self._get_dispatcher_statistics(),
                 "notification_types": [nt.value for nt in NotificationType],
                 "priorities": [np.value for np in NotificationPriority],
                 "channels": [nc.value for nc in NotificationChannel],
@@ -792,6 +940,15 @@ class SmartNotificationManager(SecurityBase):
             self.logger.error(f"Ошибка получения статистики: {e}")
             return {}
 
+    def _get_dispatcher_statistics(self) -> Dict[str, Any]:
+        """Статистика диспетчера с именами каналов вместо перечислений"""
+        stats = self.dispatcher.get_stats()
+        stats["channels"] = {
+            getattr(channel, "value", channel): values
+            for channel, values in stats["channels"].items()
+        }
+        return stats
+
     def test_smart_notification_manager(self) -> Dict[str, Any]:
         """Тестирование SmartNotificationManager"""
         try:
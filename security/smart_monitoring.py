@@ -67,11 +67,18 @@ import json
 import statistics
 import threading
 import time
+from collections import deque
 from dataclasses import dataclass
 from datetime import datetime, timedelta
 from enum import Enum
 from functools import wraps
-from typing import Any, Callable, Dict, Iterator, List, Optional
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from security.smart_monitoring_store import (
+    AlertArchive,
+    AlertStore,
+    HourlyCounters,
+)
 
 
 # Кастомные декораторы для улучшения функциональности
@@ -221,12 +228,12 @@ class SmartMonitoringSystem:
     Атрибуты:
         name (str): Название системы мониторинга
         rules (Dict[str, AlertRule]): Словарь правил мониторинга
-        alerts (List[Alert]): Список алертов
+        alerts (AlertStore): Кольцо последних алертов со счетчиками
         metrics (Dict[str, List[float]]): Словарь метрик
-        alert_history (Dict[str, List[datetime]]): История алертов по правилам
+        alert_history (Dict[str, Deque[datetime]]): Недавние алерты правил
 
     Производительность:
-        - Поддерживает до 1000 алертов в памяти
+        - Поддерживает до 1000 алертов в памяти, старые уходят в архив
         - До 1000 метрик на имя
         - Автоматическая очистка старых данных
         - Потокобезопасные операции
@@ -246,7 +253,6 @@ class SmartMonitoringSystem:
         "alert_history",
         "alert_cooldowns",
         "hourly_alert_counts",
-        "last_hour_reset",
         "adaptive_thresholds",
         "baseline_metrics",
         "alert_callbacks",
@@ -275,24 +281,31 @@ class SmartMonitoringSystem:
         "memory_check_interval",
         "operation_count",
         "last_memory_check",
+        "_metric_values",
     )
 
+    # Окно, в котором считаются повторения алертов (min_occurrences)
+    MIN_OCCURRENCES_WINDOW = timedelta(minutes=5)
+
     @performance_monitor
-    def __init__(self, name: str = "SmartMonitoring"):
+    def __init__(
+        self, name: str = "SmartMonitoring", archive_path: Optional[str] = None
+    ):
         """
         Инициализация системы умного мониторинга
 
         Args:
             name: Название системы мониторинга (по умолчанию "SmartMonitoring")
+            archive_path: Файл архива вытесненных алертов (None - без архива)
 
         Attributes:
             name: Название системы мониторинга
             rules: Словарь правил мониторинга
-            alerts: Список алертов
+            alerts: Кольцо последних алертов со счетчиками
             metrics: Словарь метрик
-            alert_history: История алертов по правилам
+            alert_history: Недавние алерты правил
             alert_cooldowns: Временные ограничения для алертов
-            hourly_alert_counts: Счетчики алертов в час
+            hourly_alert_counts: Счетчики алертов за скользящий час
             adaptive_thresholds: Адаптивные пороги
             baseline_metrics: Базовые метрики для адаптации
             alert_callbacks: Callback функции для уведомлений
@@ -326,14 +339,15 @@ class SmartMonitoringSystem:
         """
         self.name = name
         self.rules: Dict[str, AlertRule] = {}
-        self.alerts: List[Alert] = []
+        self.alerts: AlertStore = AlertStore(
+            1000, AlertArchive(archive_path) if archive_path else None
+        )
         self.metrics: Dict[str, List[float]] = {}
-        self.alert_history: Dict[str, List[datetime]] = {}
+        self.alert_history: Dict[str, Deque[datetime]] = {}
 
         # Защита от спама
         self.alert_cooldowns: Dict[str, datetime] = {}
-        self.hourly_alert_counts: Dict[str, int] = {}
-        self.last_hour_reset = datetime.now()
+        self.hourly_alert_counts = HourlyCounters()
 
         # Адаптивные пороги
         self.adaptive_thresholds: Dict[str, float] = {}
@@ -362,7 +376,7 @@ class SmartMonitoringSystem:
 
         # АТРИБУТЫ ДЛЯ КОНФИГУРАЦИИ
         self.config_version: str = "1.0"
-        self.max_alerts_in_memory: int = 1000
+        self.max_alerts_in_memory: int = self.alerts.capacity
         self.max_metrics_per_name: int = 1000
         self.cleanup_interval_hours: int = 1
 
@@ -389,6 +403,7 @@ class SmartMonitoringSystem:
         self.memory_check_interval: int = 100  # Проверка каждые 100 операций
         self.operation_count: int = 0
         self.last_memory_check: datetime = datetime.now()
+        self._metric_values: int = 0  # Значений во всех списках metrics
 
         # Инициализация времени запуска
         self.start_time = datetime.now()
@@ -433,7 +448,7 @@ class SmartMonitoringSystem:
         """Создание системы мониторинга из конфигурации"""
         try:
             name = config.get("name", "SmartMonitoring")
-            system = cls(name)
+            system = cls(name, config.get("archive_path"))
 
             # Добавляем правила из конфигурации
             if "rules" in config:
@@ -472,8 +487,8 @@ class SmartMonitoringSystem:
         try:
             with self.lock:
                 self.rules[rule.rule_id] = rule
-                self.alert_history[rule.rule_id] = []
-                self.hourly_alert_counts[rule.rule_id] = 0
+                self.alert_history[rule.rule_id] = deque()
+                self.hourly_alert_counts.reset(rule.rule_id)
         except Exception as e:
             print(f"Ошибка добавления правила {rule.rule_id}: {e}")
             raise
@@ -500,9 +515,11 @@ class SmartMonitoringSystem:
                     self.metrics[metric_name] = []
 
                 self.metrics[metric_name].append(value)
+                self._metric_values += 1
 
                 # Ограничиваем размер истории
                 if len(self.metrics[metric_name]) > 1000:
+                    self._metric_values -= len(self.metrics[metric_name]) - 500
                     self.metrics[metric_name] = self.metrics[metric_name][
                         -500:
                     ]
@@ -587,14 +604,9 @@ class SmartMonitoringSystem:
     def _is_hourly_limit_exceeded(self, rule_id: str, max_alerts: int) -> bool:
         """Проверка превышения лимита алертов в час"""
         try:
-            current_hour = datetime.now().hour
-
-            # Сбрасываем счетчик каждый час
-            if current_hour != self.last_hour_reset.hour:
-                self.hourly_alert_counts[rule_id] = 0
-                self.last_hour_reset = datetime.now()
-
-            return self.hourly_alert_counts[rule_id] >= max_alerts
+            # Алерты правила за последние 60 минут (корзины по минуте)
+            count = self.hourly_alert_counts.count(rule_id, time.time())
+            return count >= max_alerts
         except Exception as e:
             print(f"Ошибка проверки лимита алертов для {rule_id}: {e}")
             return False
@@ -611,13 +623,9 @@ class SmartMonitoringSystem:
             if rule_id not in self.alert_history:
                 return False
 
-            recent_alerts = [
-                alert_time
-                for alert_time in self.alert_history[rule_id]
-                if datetime.now() - alert_time < timedelta(minutes=5)
-            ]
-
-            return len(recent_alerts) >= min_occurrences
+            history = self.alert_history[rule_id]
+            self._trim_history(history, datetime.now())
+            return len(history) >= min_occurrences
         except Exception as e:
             print(f"Ошибка проверки минимальных повторений для {rule_id}: {e}")
             return False
@@ -657,14 +665,7 @@ class SmartMonitoringSystem:
             )
 
             # Добавляем алерт (блокировка уже захвачена в add_metric)
-            self.alerts.append(alert)
-            self.alert_cooldowns[rule.rule_id] = timestamp
-            self.hourly_alert_counts[rule.rule_id] += 1
-            self.alert_history[rule.rule_id].append(timestamp)
-
-            # Ограничиваем размер списка алертов
-            if len(self.alerts) > 1000:
-                self.alerts = self.alerts[-500:]
+            self._record_alert(rule, alert)
 
             # Отправляем уведомления
             self._send_alert(alert)
@@ -672,6 +673,33 @@ class SmartMonitoringSystem:
             print(f"Ошибка генерации алерта для {rule.rule_id}: {e}")
             raise
 
+    @private_method
+    def _record_alert(self, rule: AlertRule, alert: Alert) -> None:
+        """
+        Учет нового алерта во всех счетчиках
+
+        Кольцо алертов само вытесняет самый старый алерт в архив.
+        История правила хранит окно повторений, но не больше
+        min_occurrences последних алертов - для проверки их достаточно.
+        """
+        timestamp = alert.timestamp
+        self.alerts.append(alert)
+        self.alert_cooldowns[rule.rule_id] = timestamp
+        self.hourly_alert_counts.add(rule.rule_id, time.time())
+        history = self.alert_history.setdefault(rule.rule_id, deque())
+        history.append(timestamp)
+        while len(history) > max(rule.min_occurrences, 1):
+            history.popleft()
+        self._trim_history(history, timestamp)
+        self.total_alerts_generated += 1
+
+    @private_method
+    def _trim_history(self, history: Deque[datetime], now: datetime) -> None:
+        """Удаление из истории правила алертов вне окна повторений"""
+        cutoff = now - self.MIN_OCCURRENCES_WINDOW
+        while history and history[0] <= cutoff:
+            history.popleft()
+
     @private_method
     def _adapt_threshold(self, rule: AlertRule, current_value: float):
         """Адаптивная настройка порога"""
@@ -749,13 +777,7 @@ class SmartMonitoringSystem:
         """Количество активных алертов"""
         try:
             with self.lock:
-                return len(
-                    [
-                        alert
-                        for alert in self.alerts
-                        if alert.status == AlertStatus.ACTIVE
-                    ]
-                )
+                return self.alerts.count(status=AlertStatus.ACTIVE)
         except Exception as e:
             print(f"Ошибка получения количества активных алертов: {e}")
             return 0
@@ -785,11 +807,7 @@ class SmartMonitoringSystem:
         """Получение активных алертов"""
         try:
             with self.lock:
-                return [
-                    alert
-                    for alert in self.alerts
-                    if alert.status == AlertStatus.ACTIVE
-                ]
+                return self.alerts.active()
         except Exception as e:
             print(f"Ошибка получения активных алертов: {e}")
             return []
@@ -799,33 +817,31 @@ class SmartMonitoringSystem:
         """Получение статистики алертов"""
         try:
             with self.lock:
-                active_count = len(
-                    [a for a in self.alerts if a.status == AlertStatus.ACTIVE]
-                )
+                # Счетчики хранилища обновляются при каждом изменении
+                active_count = self.alerts.count(status=AlertStatus.ACTIVE)
                 total_count = len(self.alerts)
 
                 # Статистика по серьезности
-                severity_stats = {}
-                for severity in AlertSeverity:
-                    count = len(
-                        [a for a in self.alerts if a.severity == severity]
-                    )
-                    severity_stats[severity.value] = count
+                severity_stats = {
+                    severity.value: self.alerts.count(severity=severity)
+                    for severity in AlertSeverity
+                }
 
                 # Статистика по правилам
-                rule_stats = {}
-                for rule_id in self.rules:
-                    count = len(
-                        [a for a in self.alerts if a.rule_id == rule_id]
-                    )
-                    rule_stats[rule_id] = count
+                rule_counts = self.alerts.rule_counts
+                rule_stats = {
+                    rule_id: rule_counts.get(rule_id, 0)
+                    for rule_id in self.rules
+                }
 
                 return {
                     "total_alerts": total_count,
                     "active_alerts": active_count,
                     "severity_stats": severity_stats,
                     "rule_stats": rule_stats,
-                    "hourly_limits": self.hourly_alert_counts,
+                    "hourly_limits": self.hourly_alert_counts.snapshot(
+                        time.time()
+                    ),
                     "cooldowns": {
                         rule_id: cooldown.isoformat()
                         for rule_id, cooldown in self.alert_cooldowns.items()
@@ -852,11 +868,13 @@ class SmartMonitoringSystem:
                 raise ValueError("alert_id должен быть непустой строкой")
 
             with self.lock:
-                for alert in self.alerts:
-                    if alert.alert_id == alert_id:
-                        alert.status = AlertStatus.SUPPRESSED
-                        return True
-                return False
+                alert = self.alerts.get(alert_id)
+                if alert is None:
+                    return False
+                if alert.status != AlertStatus.SUPPRESSED:
+                    self.alerts.set_status(alert_id, AlertStatus.SUPPRESSED)
+                    self.total_alerts_suppressed += 1
+                return True
         except Exception as e:
             print(f"Ошибка подавления алерта {alert_id}: {e}")
             return False
@@ -869,11 +887,13 @@ class SmartMonitoringSystem:
                 raise ValueError("alert_id должен быть непустой строкой")
 
             with self.lock:
-                for alert in self.alerts:
-                    if alert.alert_id == alert_id:
-                        alert.status = AlertStatus.RESOLVED
-                        return True
-                return False
+                alert = self.alerts.get(alert_id)
+                if alert is None:
+                    return False
+                if alert.status != AlertStatus.RESOLVED:
+                    self.alerts.set_status(alert_id, AlertStatus.RESOLVED)
+                    self.total_alerts_resolved += 1
+                return True
         except Exception as e:
             print(f"Ошибка разрешения алерта {alert_id}: {e}")
             return False
@@ -904,6 +924,9 @@ class SmartMonitoringSystem:
         try:
             self._stop_cleanup = True
             self.is_running = False
+            with self.lock:
+                if self.alerts.archive is not None:
+                    self.alerts.archive.close()
             print("Система мониторинга остановлена")
         except Exception as e:
             print(f"Ошибка остановки мониторинга: {e}")
@@ -915,20 +938,13 @@ class SmartMonitoringSystem:
             with self.lock:
                 cutoff_time = datetime.now() - timedelta(days=7)
 
-                # Удаляем старые алерты
-                self.alerts = [
-                    alert
-                    for alert in self.alerts
-                    if alert.timestamp > cutoff_time
-                ]
+                # Переносим старые алерты в архив
+                self.alerts.compact(cutoff_time)
 
                 # Очищаем старую историю алертов
-                for rule_id in self.alert_history:
-                    self.alert_history[rule_id] = [
-                        alert_time
-                        for alert_time in self.alert_history[rule_id]
-                        if alert_time > cutoff_time
-                    ]
+                now = datetime.now()
+                for history in self.alert_history.values():
+                    self._trim_history(history, now)
         except Exception as e:
             print(f"Ошибка очистки старых данных: {e}")
 
@@ -1000,6 +1016,7 @@ class SmartMonitoringSystem:
                 self.hourly_alert_counts.clear()
                 self.adaptive_thresholds.clear()
                 self.baseline_metrics.clear()
+                self._metric_values = 0
 
                 # Сбрасываем статусы
                 self.is_running = False
@@ -1043,6 +1060,7 @@ class SmartMonitoringSystem:
                 self.hourly_alert_counts.clear()
                 self.adaptive_thresholds.clear()
                 self.baseline_metrics.clear()
+                self._metric_values = 0
 
                 # Обновляем время последней активности
                 self.last_activity = datetime.now()
@@ -1218,12 +1236,8 @@ class SmartMonitoringSystem:
             with self.lock:
                 return {
                     "total_alerts": len(self.alerts),
-                    "active_alerts": len(
-                        [
-                            a
-                            for a in self.alerts
-                            if a.status == AlertStatus.ACTIVE
-                        ]
+                    "active_alerts": self.alerts.count(
+                        status=AlertStatus.ACTIVE
                     ),
                     "rules_count": len(self.rules),
                     "metrics_count": len(self.metrics),
@@ -1233,10 +1247,7 @@ class SmartMonitoringSystem:
                     "memory_usage": {
                         "alerts": len(self.alerts)
                         * 0.001,  # Примерная оценка в KB
-                        "metrics": sum(
-                            len(values) for values in self.metrics.values()
-                        )
-                        * 0.0001,
+                        "metrics": self._metric_values * 0.0001,
                         "rules": len(self.rules) * 0.01,
                     },
                 }
@@ -1261,16 +1272,11 @@ class SmartMonitoringSystem:
                     return False
 
                 # Проверяем наличие критических алертов
-                critical_alerts = [
-                    a
-                    for a in self.alerts
-                    if a.severity == AlertSeverity.CRITICAL
-                    and a.status == AlertStatus.ACTIVE
-                ]
-
-                if (
-                    len(critical_alerts) > 5
-                ):  # Слишком много критических алертов
+                critical_alerts = self.alerts.count(
+                    AlertSeverity.CRITICAL, AlertStatus.ACTIVE
+                )
+
+                if critical_alerts > 5:  # Слишком много критических алертов
                     return False
 
                 return True
@@ -1283,19 +1289,12 @@ class SmartMonitoringSystem:
         """Получение детального статуса здоровья системы"""
         try:
             with self.lock:
-                critical_alerts = [
-                    a
-                    for a in self.alerts
-                    if a.severity == AlertSeverity.CRITICAL
-                    and a.status == AlertStatus.ACTIVE
-                ]
-
-                error_alerts = [
-                    a
-                    for a in self.alerts
-                    if a.severity == AlertSeverity.ERROR
-                    and a.status == AlertStatus.ACTIVE
-                ]
+                critical_alerts = self.alerts.count(
+                    AlertSeverity.CRITICAL, AlertStatus.ACTIVE
+                )
+                error_alerts = self.alerts.count(
+                    AlertSeverity.ERROR, AlertStatus.ACTIVE
+                )
 
                 health_score = 100
                 issues = []
@@ -1308,18 +1307,18 @@ class SmartMonitoringSystem:
                     health_score -= 20
                     issues.append("Система приостановлена")
 
-                if len(critical_alerts) > 3:
+                if critical_alerts > 3:
                     health_score -= 30
                     issues.append(
                         f"Слишком много критических алертов: "
-                        f"{len(critical_alerts)}"
+                        f"{critical_alerts}"
                     )
 
-                if len(error_alerts) > 10:
+                if error_alerts > 10:
                     health_score -= 20
                     issues.append(
                         f"Слишком много алертов об ошибках: "
-                        f"{len(error_alerts)}"
+                        f"{error_alerts}"
                     )
 
                 if self.callback_error_count > self.max_callback_errors:
@@ -1345,8 +1344,8 @@ class SmartMonitoringSystem:
                     "health_score": max(0, health_score),
                     "is_running": self.is_running,
                     "is_paused": self.is_paused,
-                    "critical_alerts": len(critical_alerts),
-                    "error_alerts": len(error_alerts),
+                    "critical_alerts": critical_alerts,
+                    "error_alerts": error_alerts,
                     "total_alerts": len(self.alerts),
                     "callback_errors": self.callback_error_count,
                     "max_callback_errors": self.max_callback_errors,
@@ -1490,6 +1489,7 @@ class SmartMonitoringSystem:
                 # Импортируем метрики
                 if "metrics" in import_data:
                     self.metrics.update(import_data["metrics"])
+                    self._recount_metrics()
 
             print(f"Данные импортированы из {file_path}")
             return True
@@ -1573,13 +1573,15 @@ class SmartMonitoringSystem:
                     self.metrics[metric_name] = []
 
                 self.metrics[metric_name].append(value)
+                self._metric_values += 1
                 self.total_metrics_received += 1
 
                 # Ограничиваем размер истории
-                if len(self.metrics[metric_name]) > self.max_metrics_per_name:
-                    self.metrics[metric_name] = self.metrics[metric_name][
-                        -self.max_metrics_per_name // 2:
-                    ]
+                values = self.metrics[metric_name]
+                if len(values) > self.max_metrics_per_name:
+                    keep = max(1, (self.max_metrics_per_name + 1) // 2)
+                    self._metric_values -= len(values) - keep
+                    self.metrics[metric_name] = values[-keep:]
 
                 # Асинхронная проверка правил
                 await self._check_rules_async(metric_name, value, tags or {})
@@ -1682,19 +1684,8 @@ class SmartMonitoringSystem:
                 tags=tags,
             )
 
-            # Добавляем алерт
-            with self.lock:
-                self.alerts.append(alert)
-                self.alert_cooldowns[rule.rule_id] = timestamp
-                self.hourly_alert_counts[rule.rule_id] += 1
-                self.alert_history[rule.rule_id].append(timestamp)
-                self.total_alerts_generated += 1
-
-                # Ограничиваем размер списка алертов
-                if len(self.alerts) > self.max_alerts_in_memory:
-                    self.alerts = self.alerts[
-                        -self.max_alerts_in_memory // 2:
-                    ]
+            # Добавляем алерт (блокировка уже захвачена в add_metric_async)
+            self._record_alert(rule, alert)
 
             # Асинхронная отправка уведомлений
             await self._send_alert_async(alert)
@@ -1788,23 +1779,13 @@ class SmartMonitoringSystem:
             with self.lock:
                 cutoff_time = datetime.now() - timedelta(days=7)
 
-                # Удаляем старые алерты
-                old_count = len(self.alerts)
-                self.alerts = [
-                    alert
-                    for alert in self.alerts
-                    if alert.timestamp > cutoff_time
-                ]
-                removed_alerts = old_count - len(self.alerts)
+                # Переносим старые алерты в архив
+                removed_alerts = self.alerts.compact(cutoff_time)
 
                 # Очищаем старую историю алертов
-                for rule_id in self.alert_history:
-                    old_count = len(self.alert_history[rule_id])
-                    self.alert_history[rule_id] = [
-                        alert_time
-                        for alert_time in self.alert_history[rule_id]
-                        if alert_time > cutoff_time
-                    ]
+                now = datetime.now()
+                for history in self.alert_history.values():
+                    self._trim_history(history, now)
 
                 print(
                     f"Асинхронная очистка: удалено {removed_alerts} "
@@ -2108,16 +2089,14 @@ class SmartMonitoringSystem:
             if self.operation_count % self.memory_check_interval != 0:
                 return True
 
-            # Проверяем количество алертов
-            if len(self.alerts) > self.max_alerts_in_memory:
+            # Проверяем оценку памяти по счетчикам байт
+            estimated_mb = self._estimate_memory_usage()["total_estimated_mb"]
+            if estimated_mb > self.max_memory_usage_mb:
                 return False
 
             # Проверяем количество метрик
-            total_metrics = sum(
-                len(values) for values in self.metrics.values()
-            )
             if (
-                total_metrics > self.max_metrics_per_name * 10
+                self._metric_values > self.max_metrics_per_name * 10
             ):  # 10x лимит для всех метрик
                 return False
 
@@ -2149,14 +2128,9 @@ class SmartMonitoringSystem:
         """Принудительная очистка памяти"""
         try:
             with self.lock:
-                # Очищаем старые алерты
+                # Переносим старые алерты в архив
                 cutoff_time = datetime.now() - timedelta(hours=24)
-                old_count = len(self.alerts)
-                self.alerts = [
-                    alert
-                    for alert in self.alerts
-                    if alert.timestamp > cutoff_time
-                ]
+                removed_alerts = self.alerts.compact(cutoff_time)
 
                 # Очищаем старые метрики
                 for metric_name in list(self.metrics.keys()):
@@ -2170,13 +2144,12 @@ class SmartMonitoringSystem:
                             -keep_count:
                         ]
 
+                self._recount_metrics()
+
                 # Очищаем историю алертов
-                for rule_id in self.alert_history:
-                    self.alert_history[rule_id] = [
-                        alert_time
-                        for alert_time in self.alert_history[rule_id]
-                        if alert_time > cutoff_time
-                    ]
+                now = datetime.now()
+                for history in self.alert_history.values():
+                    self._trim_history(history, now)
 
                 # Очищаем базовые метрики
                 for metric_name in list(self.baseline_metrics.keys()):
@@ -2185,7 +2158,6 @@ class SmartMonitoringSystem:
                             self.baseline_metrics[metric_name][-25:]
                         )
 
-                removed_alerts = old_count - len(self.alerts)
                 print(
                     f"Принудительная очистка памяти: удалено "
                     f"{removed_alerts} алертов"
@@ -2194,30 +2166,37 @@ class SmartMonitoringSystem:
         except Exception as e:
             print(f"Ошибка принудительной очистки памяти: {e}")
 
+    @private_method
+    def _recount_metrics(self) -> None:
+        """Пересчет числа значений метрик после массовых изменений"""
+        self._metric_values = sum(
+            len(values) for values in self.metrics.values()
+        )
+
     @private_method
     def _estimate_memory_usage(self) -> Dict[str, int]:
         """
         Оценка использования памяти
 
+        Алерты учитываются счетчиком байт хранилища, метрики - счетчиком
+        значений, поэтому оценка не обходит структуры данных.
+
         Returns:
             Dict с оценкой использования памяти по компонентам
         """
         try:
             # Примерная оценка размера в байтах
-            alert_size = 200  # Примерный размер одного алерта
             metric_size = 8  # Размер float
             rule_size = 100  # Размер правила
 
             memory_usage = {
-                "alerts_mb": (len(self.alerts) * alert_size) / 1024 / 1024,
-                "metrics_mb": (
-                    sum(len(values) for values in self.metrics.values())
-                    * metric_size
-                )
+                "alerts_mb": self.alerts.nbytes / 1024 / 1024,
+                "metrics_mb": (self._metric_values * metric_size)
                 / 1024
                 / 1024,
                 "rules_mb": (len(self.rules) * rule_size) / 1024 / 1024,
                 "callbacks_count": len(self.alert_callbacks),
+                "archived_alerts": self.alerts.evicted,
                 "total_estimated_mb": 0,
             }
 
@@ -2256,9 +2235,7 @@ class SmartMonitoringSystem:
                     "current_counts": {
                         "alerts": len(self.alerts),
                         "metrics_names": len(self.metrics),
-                        "total_metrics": sum(
-                            len(values) for values in self.metrics.values()
-                        ),
+                        "total_metrics": self._metric_values,
                         "rules": len(self.rules),
                         "callbacks": len(self.alert_callbacks),
                     },
@@ -2353,9 +2330,7 @@ class SmartMonitoringSystem:
                 duration_seconds=duration,
                 performance_metrics={
                     "total_alerts": len(self.alerts),
-                    "total_metrics": sum(
-                        len(values) for values in self.metrics.values()
-                    ),
+                    "total_metrics": self._metric_values,
                     "memory_usage_mb": self._estimate_memory_usage().get(
                         "total_estimated_mb", 0
                     ),
@@ -2531,25 +2506,21 @@ class SmartMonitoringSystem:
             Dict с детальной информацией о состоянии системы
         """
         try:
-            with self.lock:
-                # Получаем статистику памяти
-                memory_stats = self.get_memory_stats()
-
-                # Получаем статистику производительности
-                perf_stats = self.get_performance_stats()
+            # Статистика берет блокировку сама, вложенный захват
+            # неповторной блокировки зависал бы
+            memory_stats = self.get_memory_stats()
+            perf_stats = self.get_performance_stats()
 
+            with self.lock:
                 # Проверяем критические алерты
-                critical_alerts = [
-                    alert
-                    for alert in self.alerts
-                    if alert.severity == AlertSeverity.CRITICAL
-                    and alert.status == AlertStatus.ACTIVE
-                ]
+                critical_alerts = self.alerts.count(
+                    AlertSeverity.CRITICAL, AlertStatus.ACTIVE
+                )
 
                 # Вычисляем общий индекс здоровья
                 health_score = 100
 
-                if len(critical_alerts) > 3:
+                if critical_alerts > 3:
                     health_score -= 25
 
                 if self.callback_error_count > self.max_callback_errors:
@@ -2570,7 +2541,7 @@ class SmartMonitoringSystem:
                     ),
                     "memory_stats": memory_stats,
                     "performance_stats": perf_stats,
-                    "critical_alerts_count": len(critical_alerts),
+                    "critical_alerts_count": critical_alerts,
                     "callback_errors": self.callback_error_count,
                     "max_callback_errors": self.max_callback_errors,
                     "is_running": self.is_running,
@@ -2648,10 +2619,8 @@ class SmartMonitoringSystem:
         Returns:
             bool: True если алерт принадлежит системе
         """
-        if isinstance(item, Alert):
+        if isinstance(item, (Alert, str)):
             return item in self.alerts
-        elif isinstance(item, str):
-            return any(alert.alert_id == item for alert in self.alerts)
         return False
 
     def __enter__(self) -> "SmartMonitoringSystem":
@@ -2838,6 +2807,7 @@ class SmartMonitoringSystem:
             # Восстанавливаем метрики
             if "metrics" in data:
                 system.metrics.update(data["metrics"])
+                system._recount_metrics()
 
             return system
         except Exception as e:
@@ -2898,6 +2868,7 @@ class SmartMonitoringSystem:
                         self.metrics[metric_name] = self.metrics[metric_name][
                             -self.max_metrics_per_name:
                         ]
+                self._recount_metrics()
 
             return True
         except Exception as e:
@@ -2923,7 +2894,7 @@ class SmartMonitoringSystem:
             if not isinstance(self.rules, dict):
                 issues.append("Некорректный тип правил")
 
-            if not isinstance(self.alerts, list):
+            if not isinstance(self.alerts, AlertStore):
                 issues.append("Некорректный тип алертов")
 
             if not isinstance(self.metrics, dict):
@@ -2986,18 +2957,13 @@ class SmartMonitoringSystem:
             memory_saved = 0
 
             with self.lock:
-                # Очистка старых алертов
-                old_count = len(self.alerts)
+                # Перенос старых алертов в архив
+                old_bytes = self.alerts.nbytes
                 cutoff_time = datetime.now() - timedelta(days=7)
-                self.alerts = [
-                    alert
-                    for alert in self.alerts
-                    if alert.timestamp > cutoff_time
-                ]
-                removed_alerts = old_count - len(self.alerts)
+                removed_alerts = self.alerts.compact(cutoff_time)
                 if removed_alerts > 0:
                     optimizations.append(f"Удалено {removed_alerts} старых алертов")
-                    memory_saved += removed_alerts * 200  # Примерная оценка
+                    memory_saved += old_bytes - self.alerts.nbytes
 
                 # Очистка старых метрик
                 for metric_name in list(self.metrics.keys()):
@@ -3011,16 +2977,14 @@ class SmartMonitoringSystem:
                             f"Очищены метрики {metric_name}: {removed_metrics} значений"
                         )
                         memory_saved += removed_metrics * 8  # Размер float
+                self._recount_metrics()
 
                 # Очистка истории алертов
-                for rule_id in self.alert_history:
-                    old_count = len(self.alert_history[rule_id])
-                    self.alert_history[rule_id] = [
-                        alert_time
-                        for alert_time in self.alert_history[rule_id]
-                        if alert_time > cutoff_time
-                    ]
-                    removed_history = old_count - len(self.alert_history[rule_id])
+                now = datetime.now()
+                for history in self.alert_history.values():
+                    old_count = len(history)
+                    self._trim_history(history, now)
+                    removed_history = old_count - len(history)
                     if removed_history > 0:
                         memory_saved += removed_history * 50  # Примерная оценка
 
@@ -3049,11 +3013,10 @@ class SmartMonitoringSystem:
         """
         try:
             with self.lock:
-                # Вычисляем active_alerts_count напрямую, избегая вложенной блокировки
-                active_alerts_count = len([
-                    alert for alert in self.alerts
-                    if alert.status == AlertStatus.ACTIVE
-                ])
+                # Счетчик хранилища, без вложенной блокировки
+                active_alerts_count = self.alerts.count(
+                    status=AlertStatus.ACTIVE
+                )
                 return {
                     "name": self.name,
                     "status": "running" if self.is_running else "stopped",
@@ -3062,9 +3025,7 @@ class SmartMonitoringSystem:
                     "alerts_count": len(self.alerts),
                     "active_alerts_count": active_alerts_count,
                     "metrics_count": len(self.metrics),
-                    "total_metrics": sum(
-                        len(values) for values in self.metrics.values()
-                    ),
+                    "total_metrics": self._metric_values,
                     "health_score": 50,  # Базовое значение, вычисляемое без блокировки
                     "uptime_minutes": (
                         (datetime.now() - self.start_time).total_seconds() / 60
@@ -3157,6 +3118,7 @@ class SmartMonitoringSystem:
                     self.max_alerts_in_memory = settings.get(
                         "max_alerts_in_memory", self.max_alerts_in_memory
                     )
+                    self.alerts.resize(self.max_alerts_in_memory)
                     self.max_metrics_per_name = settings.get(
                         "max_metrics_per_name", self.max_metrics_per_name
                     )
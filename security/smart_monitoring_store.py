@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+"""
+ALADDIN Security System - Хранилище алертов умного мониторинга
+
+Память SmartMonitoringSystem не растет со временем работы:
+
+- AlertStore держит последние алерты в кольце фиксированной емкости,
+  вытесненные и устаревшие алерты уходят в AlertArchive. Счетчики по
+  серьезности, статусу и правилам обновляются при добавлении,
+  вытеснении и смене статуса, поэтому статистика не обходит алерты;
+- AlertArchive - файл JSON Lines только на дозапись с ротацией по
+  размеру;
+- HourlyCounters считает алерты правил за скользящий час в
+  циклических корзинах: добавление и проверка лимита - O(1).
+
+Размер алертов в памяти учитывается счетчиком байт, который
+меняется вместе с содержимым кольца.
+"""
+
+import json
+import os
+import sys
+from collections import deque
+from datetime import datetime
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Deque,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    from security.smart_monitoring import Alert, AlertSeverity, AlertStatus
+
+# Размер объекта Alert без строк и тегов (dataclass, datetime, числа)
+ALERT_OVERHEAD_BYTES = 400
+
+
+def alert_nbytes(alert: "Alert") -> int:
+    """Оценка размера алерта в памяти"""
+    size = ALERT_OVERHEAD_BYTES
+    for text in (
+        alert.alert_id,
+        alert.rule_id,
+        alert.title,
+        alert.message,
+        alert.metric_name,
+    ):
+        size += sys.getsizeof(text)
+    size += sys.getsizeof(alert.tags)
+    for key, value in alert.tags.items():
+        size += sys.getsizeof(key) + sys.getsizeof(value)
+    return size
+
+
+def alert_to_dict(alert: "Alert") -> Dict[str, Any]:
+    """Словарь алерта в формате экспорта"""
+    return {
+        "alert_id": alert.alert_id,
+        "rule_id": alert.rule_id,
+        "title": alert.title,
+        "message": alert.message,
+        "severity": alert.severity.value,
+        "status": alert.status.value,
+        "timestamp": alert.timestamp.isoformat(),
+        "metric_name": alert.metric_name,
+        "current_value": alert.current_value,
+        "threshold_value": alert.threshold_value,
+        "tags": alert.tags,
+        "occurrences": alert.occurrences,
+    }
+
+
+class AlertArchive:
+    """Архив алертов в файле JSON Lines с ротацией по размеру"""
+
+    def __init__(
+        self, path: str, max_bytes: int = 100 * 2**20, backups: int = 3
+    ):
+        """
+        Args:
+            path: Файл архива
+            max_bytes: Размер файла, после которого он ротируется
+            backups: Число хранимых старых файлов (path.1 ... path.N)
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.written = 0
+        self._file = None
+        self._size = 0
+
+    def append(self, alert: "Alert") -> None:
+        """Дозапись алерта в архив"""
+        if self._file is None:
+            self._open()
+        line = json.dumps(alert_to_dict(alert), ensure_ascii=False) + "\n"
+        data = line.encode("utf-8")
+        if self._size and self._size + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._size += len(data)
+        self.written += 1
+
+    def flush(self) -> None:
+        """Сброс буфера на диск"""
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        """Закрытие файла архива"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def read(self, since: Optional[datetime] = None) -> Iterator[dict]:
+        """
+        Алерты архива от старых к новым
+
+        Args:
+            since: Только алерты не старше этого времени
+        """
+        self.flush()
+        paths = [f"{self.path}.{i}" for i in range(self.backups, 0, -1)]
+        for path in paths + [self.path]:
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if since is not None and (
+                        datetime.fromisoformat(record["timestamp"]) < since
+                    ):
+                        continue
+                    yield record
+
+    def _open(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+
+    def _rotate(self) -> None:
+        self.close()
+        for i in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+
+class AlertStore:
+    """
+    Кольцо последних алертов со счетчиками
+
+    Ведет себя как список алертов от старых к новым (len, итерация,
+    индекс, in), но изменяется только через методы хранилища, чтобы
+    счетчики оставались верными.
+    """
+
+    def __init__(
+        self, capacity: int = 1000, archive: Optional[AlertArchive] = None
+    ):
+        """
+        Args:
+            capacity: Максимальное число алертов в памяти
+            archive: Архив вытесненных алертов (None - не сохранять)
+        """
+        self.capacity = max(int(capacity), 1)
+        self.archive = archive
+        self._alerts: Deque["Alert"] = deque()
+        self._by_id: Dict[str, "Alert"] = {}
+        self._active: Dict[int, "Alert"] = {}
+        # (серьезность, статус) -> число алертов в кольце
+        self._counts: Dict[Tuple[Hashable, Hashable], int] = {}
+        self.rule_counts: Dict[str, int] = {}
+        self.nbytes = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._alerts)
+
+    def __iter__(self) -> Iterator["Alert"]:
+        return iter(self._alerts)
+
+    def __getitem__(self, index: int) -> "Alert":
+        return self._alerts[index]
+
+    def __contains__(self, item: Any) -> bool:
+        if isinstance(item, str):
+            return item in self._by_id
+        alert = self._by_id.get(getattr(item, "alert_id", None))
+        return alert is not None and (alert is item or alert == item)
+
+    def append(self, alert: "Alert") -> None:
+        """Добавление алерта; самый старый вытесняется в архив"""
+        if len(self._alerts) >= self.capacity:
+            self._evict(self._alerts.popleft())
+        self._alerts.append(alert)
+        self._by_id[alert.alert_id] = alert
+        self._count(alert, 1)
+        self.nbytes += alert_nbytes(alert)
+
+    def extend(self, alerts: Iterable["Alert"]) -> None:
+        """Добавление нескольких алертов"""
+        for alert in alerts:
+            self.append(alert)
+
+    def get(self, alert_id: str) -> Optional["Alert"]:
+        """Алерт по ID (последний с таким ID)"""
+        return self._by_id.get(alert_id)
+
+    def set_status(self, alert_id: str, status: "AlertStatus") -> bool:
+        """Смена статуса алерта с пересчетом счетчиков"""
+        alert = self._by_id.get(alert_id)
+        if alert is None:
+            return False
+        if alert.status != status:
+            self._count(alert, -1)
+            alert.status = status
+            self._count(alert, 1)
+        return True
+
+    def active(self) -> List["Alert"]:
+        """Активные алерты"""
+        return list(self._active.values())
+
+    def count(
+        self,
+        severity: Optional["AlertSeverity"] = None,
+        status: Optional["AlertStatus"] = None,
+    ) -> int:
+        """Число алертов в кольце с серьезностью и/или статусом"""
+        return sum(
+            count
+            for (key_severity, key_status), count in self._counts.items()
+            if (severity is None or key_severity == severity)
+            and (status is None or key_status == status)
+        )
+
+    def compact(self, cutoff: datetime) -> int:
+        """
+        Перенос в архив алертов старше cutoff
+
+        Алерты лежат в порядке поступления, поэтому снимаются только
+        с начала кольца и обход останавливается на первом свежем.
+
+        Returns:
+            int: Число перенесенных алертов
+        """
+        removed = 0
+        while self._alerts and self._alerts[0].timestamp <= cutoff:
+            self._evict(self._alerts.popleft())
+            removed += 1
+        if removed and self.archive is not None:
+            self.archive.flush()
+        return removed
+
+    def resize(self, capacity: int) -> None:
+        """Изменение емкости кольца"""
+        self.capacity = max(int(capacity), 1)
+        while len(self._alerts) > self.capacity:
+            self._evict(self._alerts.popleft())
+
+    def clear(self) -> None:
+        """Удаление всех алертов из памяти (без записи в архив)"""
+        self._alerts.clear()
+        self._by_id.clear()
+        self._active.clear()
+        self._counts.clear()
+        self.rule_counts.clear()
+        self.nbytes = 0
+
+    def _evict(self, alert: "Alert") -> None:
+        if self._by_id.get(alert.alert_id) is alert:
+            del self._by_id[alert.alert_id]
+        self._count(alert, -1)
+        self.nbytes -= alert_nbytes(alert)
+        self.evicted += 1
+        if self.archive is not None:
+            self.archive.append(alert)
+
+    def _count(self, alert: "Alert", delta: int) -> None:
+        key = (alert.severity, alert.status)
+        self._counts[key] = self._counts.get(key, 0) + delta
+        if not self._counts[key]:
+            del self._counts[key]
+        if alert.status.value == "active":
+            if delta > 0:
+                self._active[id(alert)] = alert
+            else:
+                self._active.pop(id(alert), None)
+        rule_count = self.rule_counts.get(alert.rule_id, 0) + delta
+        if rule_count:
+            self.rule_counts[alert.rule_id] = rule_count
+        else:
+            self.rule_counts.pop(alert.rule_id, None)
+
+
+class HourlyCounters:
+    """Счетчики событий по ключам за скользящее окно в корзинах"""
+
+    def __init__(self, window: int = 3600, buckets: int = 60):
+        """
+        Args:
+            window: Длина окна в секундах
+            buckets: Число корзин окна
+        """
+        self.window = window
+        self.buckets = buckets
+        self._width = window / buckets
+        # ключ -> [сумма окна, номер последней корзины, корзины]
+        self._counters: Dict[Hashable, List[Any]] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._counters
+
+    def add(self, key: Hashable, now: float, amount: int = 1) -> int:
+        """Учет события; число событий ключа за окно"""
+        counter = self._advance(key, now)
+        counter[2][counter[1] % self.buckets] += amount
+        counter[0] += amount
+        return counter[0]
+
+    def count(self, key: Hashable, now: float) -> int:
+        """Число событий ключа за окно до момента now"""
+        if key not in self._counters:
+            return 0
+        return self._advance(key, now)[0]
+
+    def reset(self, key: Hashable) -> None:
+        """Обнуление счетчика ключа"""
+        self._counters.pop(key, None)
+
+    def clear(self) -> None:
+        """Обнуление всех счетчиков"""
+        self._counters.clear()
+
+    def snapshot(self, now: float) -> Dict[Hashable, int]:
+        """Число событий за окно по всем ключам"""
+        return {key: self.count(key, now) for key in list(self._counters)}
+
+    def _advance(self, key: Hashable, now: float) -> List[Any]:
+        bucket = int(now // self._width)
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = [0, bucket, [0] * self.buckets]
+            self._counters[key] = counter
+            return counter
+
+        elapsed = bucket - counter[1]
+        if elapsed >= self.buckets:
+            counter[0] = 0
+            counter[2] = [0] * self.buckets
+        elif elapsed > 0:
+            # Корзины, вышедшие из окна, обнуляются
+            slots = counter[2]
+            for index in range(counter[1] + 1, bucket + 1):
+                slot = index % self.buckets
+                counter[0] -= slots[slot]
+                slots[slot] = 0
+        if elapsed > 0:
+            counter[1] = bucket
+        return counter
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для потокового режима AnalyticsManager
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.managers.analytics_manager import (  # noqa: E402
+    AnalysisStatus,
+    AnalyticsConfig,
+    AnalyticsManager,
+    AnalyticsType,
+    BehavioralAnalyzer,
+    DataSource,
+)
+from security.managers.incremental_analytics import (  # noqa: E402
+    FeatureExtractor,
+    RunningStats,
+)
+
+NAMES = [name for name, _ in BehavioralAnalyzer.FEATURES]
+
+
+def _config(**kwargs):
+    values = dict(
+        analysis_type=AnalyticsType.BEHAVIORAL,
+        data_source=DataSource.USER_ACTIVITY,
+        time_window=3600,
+        sample_size=5000,
+        confidence_threshold=0.95,
+        anomaly_threshold=0.1,
+        incremental=True,
+        batch_size=1000,
+    )
+    values.update(kwargs)
+    return AnalyticsConfig(**values)
+
+
+def _manager(**kwargs):
+    manager = AnalyticsManager(_config(**kwargs))
+    manager.logger.setLevel(logging.CRITICAL)
+    return manager
+
+
+def _columns(rng, count, outliers=0.0):
+    columns = {
+        "session_duration": rng.normal(1200, 200, count),
+        "page_views": rng.poisson(15, count).astype(np.float64),
+        "click_rate": rng.uniform(0.1, 0.5, count),
+        "time_on_site": rng.normal(800, 100, count),
+        "bounce_rate": rng.uniform(0.1, 0.4, count),
+        "conversion_rate": rng.uniform(0.0, 0.1, count),
+    }
+    if outliers:
+        mask = rng.random(count) < outliers
+        columns["session_duration"][mask] *= 20
+        columns["page_views"][mask] += 500
+    return columns
+
+
+def _rows(columns):
+    count = len(columns[NAMES[0]])
+    return [
+        {name: float(columns[name][i]) for name in NAMES}
+        for i in range(count)
+    ]
+
+
+def test_feature_extractor_rows_and_columns_match_old_loop():
+    rng = np.random.default_rng(1)
+    rows = _rows(_columns(rng, 300))
+    for row in rows[::7]:
+        del row["click_rate"]
+    for row in rows[::11]:
+        row.pop("page_views", None)
+
+    old = np.array(
+        [[row.get(name, default) for name, default in
+          BehavioralAnalyzer.FEATURES] for row in rows]
+    )
+    extractor = FeatureExtractor(BehavioralAnalyzer.FEATURES)
+    assert np.array_equal(extractor.extract(rows), old)
+    columns = {
+        name: old[:, index]
+        for index, name in enumerate(NAMES)
+        if name != "bounce_rate"
+    }
+    expected = old.copy()
+    expected[:, NAMES.index("bounce_rate")] = 0.0
+    assert np.array_equal(extractor.extract(columns), expected)
+    assert extractor.extract([]).shape == (0, len(NAMES))
+    assert extractor.extract({}).shape == (0, len(NAMES))
+
+
+def test_running_stats_match_numpy():
+    rng = np.random.default_rng(2)
+    stats = RunningStats()
+    chunks = [rng.normal(5, 3, (size, 4)) for size in (1, 17, 500, 3)]
+    for chunk in chunks:
+        stats.update(chunk)
+    stats.update(np.empty((0, 4)))
+    everything = np.concatenate(chunks)
+    assert stats.count == everything.size
+    assert stats.mean == pytest.approx(everything.mean())
+    assert stats.std == pytest.approx(everything.std())
+    assert stats.min == everything.min()
+    assert stats.max == everything.max()
+
+
+def test_stream_analysis_finds_outliers_and_bounds_results():
+    async def run():
+        rng = np.random.default_rng(3)
+        manager = _manager(max_results=3)
+        columns = _columns(rng, 20000, outliers=0.02)
+
+        def batches():
+            for start in range(0, 20000, 2500):
+                yield {n: c[start: start + 2500] for n, c in columns.items()}
+
+        result = await manager.analyze_stream(batches())
+        assert result.status == AnalysisStatus.COMPLETED
+        assert result.data_points == 20000
+        assert result.metadata["batches"] == 8
+        assert sum(result.metadata["cluster_sizes"].values()) == 20000
+        assert 0.0 < result.anomaly_score < 0.3
+        assert any("кластеров" in insight for insight in result.insights)
+
+        # Строки-словари через analyze идут теми же пакетами
+        rows = await manager.analyze(_rows(_columns(rng, 2500)))
+        assert rows.status == AnalysisStatus.COMPLETED
+        assert rows.metadata["batches"] == 3
+        assert manager.incremental_models.samples_seen == 22500
+
+        async def async_batches():
+            yield _rows(_columns(rng, 100))
+
+        ids = [result.analysis_id, rows.analysis_id]
+        ids.append((await manager.analyze_stream(async_batches())).analysis_id)
+        assert await manager.get_results(ids[0]) is result
+        empty = await manager.analyze_stream([])
+        assert empty.status == AnalysisStatus.FAILED
+        ids.append(empty.analysis_id)
+        # Вытеснен самый давно использованный результат
+        assert list(manager.results) == [ids[2], ids[0], ids[3]]
+        assert await manager.get_results(ids[1]) is None
+        assert await manager.get_results(ids[0]) is result
+        await manager.shutdown()
+
+    asyncio.run(run())
+
+
+def test_models_warm_start_from_snapshot(tmp_path):
+    async def run():
+        path = str(tmp_path / "models" / "behavioral.joblib")
+        rng = np.random.default_rng(4)
+        first = _manager(model_snapshot_path=path)
+        assert not first.incremental_models.warm_started
+        result = await first.analyze_stream([_columns(rng, 5000)])
+        assert result.metadata["snapshot_saved"]
+        assert os.path.exists(path)
+
+        second = _manager(model_snapshot_path=path)
+        models = second.incremental_models
+        assert models.warm_started and models.samples_seen == 5000
+        assert np.allclose(
+            models.kmeans.cluster_centers_,
+            first.incremental_models.kmeans.cluster_centers_,
+        )
+        # Маленький первый пакет оценивается сразу теплой моделью
+        small = await second.analyze(_rows(_columns(rng, 3)))
+        assert small.metadata["warm_started"]
+        assert sum(small.metadata["cluster_sizes"].values()) == 3
+        assert models.samples_seen == 5003
+
+        # Несовместимый снимок игнорируется
+        other = _manager(model_snapshot_path=path, n_clusters=3)
+        assert not other.incremental_models.warm_started
+
+    asyncio.run(run())
+
+
+@pytest.mark.performance
+def test_stream_analysis_memory_and_throughput():
+    async def run():
+        manager = _manager(batch_size=100000, sample_size=10000)
+        rng = np.random.default_rng(5)
+        template = _columns(rng, 100000, outliers=0.01)
+        total = 10_000_000
+
+        def batches():
+            for start in range(0, total, 100000):
+                # Новый пакет на каждой итерации, как из источника данных
+                yield {name: column + start % 7 for name, column in
+                       template.items()}
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = await manager.analyze_stream(batches())
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        rows = _rows(_columns(rng, 200000))
+        extractor = manager.processors[AnalyticsType.BEHAVIORAL].extractor
+        start = time.perf_counter()
+        extractor.extract(rows)
+        extract = time.perf_counter() - start
+        start = time.perf_counter()
+        np.array(
+            [[row.get(name, 0) for name in NAMES] for row in rows]
+        )
+        loop = time.perf_counter() - start
+        return result, elapsed, peak, extract, loop, len(rows)
+
+    result, elapsed, peak, extract, loop, count = asyncio.run(run())
+    assert result.status == AnalysisStatus.COMPLETED
+    assert result.data_points == 10_000_000
+    assert result.metadata["batches"] == 100 and count == 200000
+    assert elapsed / result.data_points < 5e-6
+    # Память не зависит от числа строк: пакет и выборка
+    assert peak < 200 * 2**20
+    assert extract < loop
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для потоковых профилей поведения BehavioralAnalyticsEngine
+"""
+
+import os
+import random
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.ai_agents.behavior_profile import (  # noqa: E402
+    BehaviorProfile,
+    DecayedMoments,
+    FrequencySketch,
+)
+from security.ai_agents.behavioral_analytics_engine import (  # noqa: E402
+    BehavioralAnalyticsEngine,
+    UserActivity,
+)
+
+ACTIVITIES = [a.value for a in UserActivity if a != UserActivity.EMERGENCY]
+
+
+def _events(users, per_user, start=None, seed=3):
+    rnd = random.Random(seed)
+    start = start or datetime(2024, 1, 1, 8)
+    events = []
+    for step in range(per_user):
+        for u in range(users):
+            events.append(
+                {
+                    "user_id": "user{}".format(u),
+                    "activity_type": ACTIVITIES[(step + u) % 3],
+                    "timestamp": start + timedelta(hours=step * 2, minutes=u),
+                    "duration": 60.0 + rnd.random() * 60,
+                    "location": rnd.choice(("home", "home", "school")),
+                    "device": "mobile",
+                }
+            )
+    return events
+
+
+def test_decayed_moments_and_sketch():
+    values = [random.Random(1).gauss(10, 2) for _ in range(500)]
+    moments = DecayedMoments(half_life=1e18)
+    for i, value in enumerate(values):
+        moments.update(value, float(i))
+    assert moments.mean == pytest.approx(np.mean(values))
+    assert moments.std == pytest.approx(np.std(values))
+
+    decayed = DecayedMoments(half_life=10.0)
+    decayed.update(0.0, 0.0)
+    decayed.update(100.0, 1000.0)
+    assert decayed.mean > 99.0  # старое наблюдение почти забыто
+
+    sketch = FrequencySketch(capacity=4)
+    for i in range(1000):
+        sketch.add("home" if i % 2 else "item{}".format(i))
+    assert len(sketch.counts) == 4
+    assert sketch.most_common(1)[0][0] == "home"
+    assert sketch.estimate("home") >= 500
+    assert sketch.distinct == 501
+
+
+def test_profile_matches_history():
+    engine = BehavioralAnalyticsEngine()
+    events = _events(users=1, per_user=200)
+    engine.score_events(events)
+    profile = engine.behavior_profiles["user0"]
+
+    hours = Counter(e["timestamp"].hour for e in events)
+    patterns = profile.time_patterns()
+    assert profile.count == 200
+    assert patterns["activity_distribution"] == dict(hours)
+    assert patterns["most_active_hour"] == hours.most_common(1)[0][0]
+    locations = Counter(e["location"] for e in events)
+    assert profile.location_patterns()["location_distribution"] == dict(
+        locations
+    )
+    assert profile.durations.mean == pytest.approx(
+        np.mean([e["duration"] for e in events]), rel=0.05
+    )
+    assert profile.transition_probability(
+        ACTIVITIES[0], ACTIVITIES[1]
+    ) == pytest.approx(1.0)
+    assert engine.user_profiles["user0"]["total_behaviors"] == 200
+    assert engine.get_behavioral_analytics()["total_behaviors"] == 200
+
+    report = engine.analyze_user_behavior(
+        "user0", UserActivity.LOGIN, 90.0, "cafe", "mobile"
+    )
+    analysis = report["analysis_result"]["pattern_analysis"]
+    assert analysis["pattern_detected"]
+    types = {a["type"] for a in analysis["pattern_anomalies"]}
+    assert "location_anomaly" in types
+    assert profile.count == 201
+
+
+def test_batch_scoring_flags_rare_transition():
+    engine = BehavioralAnalyticsEngine()
+    engine.score_events(_events(users=5, per_user=90))
+    profile = engine.behavior_profiles["user0"]
+    last = profile.last_activity
+    rare = [
+        a for a in ACTIVITIES
+        if profile.transition_probability(last, a) == 0
+    ][0]
+    results = engine.score_events(
+        [
+            {
+                "user_id": "user0",
+                "activity_type": rare,
+                "timestamp": profile.last_seen + 7200,
+                "duration": 90.0,
+                "location": "home",
+                "device": "mobile",
+            },
+            {"user_id": "broken"},
+        ]
+    )
+    assert len(results) == 1
+    assert "transition_anomaly" in results[0]["anomalies"]
+    assert "location_anomaly" not in results[0]["anomalies"]
+    assert results[0]["anomaly_score"] >= 0.3
+
+
+def test_read_only_scoring_keeps_engine_state():
+    engine = BehavioralAnalyticsEngine()
+    engine.score_events(_events(users=3, per_user=20))
+    before = (
+        len(engine.anomalies),
+        len(engine.user_behaviors),
+        engine.behavior_profiles["user0"].count,
+    )
+    night = {
+        "user_id": "user0",
+        "activity_type": ACTIVITIES[0],
+        "timestamp": datetime(2024, 3, 1, 3),
+        "duration": 9000.0,
+        "location": "unknown",
+        "device": "unknown",
+    }
+    results = engine.score_events([night], update_profiles=False)
+    assert "unknown_device" in results[0]["anomalies"]
+    assert (
+        len(engine.anomalies),
+        len(engine.user_behaviors),
+        engine.behavior_profiles["user0"].count,
+    ) == before
+
+    engine.score_events([night])
+    assert len(engine.anomalies) == before[0] + 1
+
+
+def test_profiles_persist_compactly(tmp_path):
+    engine = BehavioralAnalyticsEngine()
+    engine.score_events(_events(users=20, per_user=50))
+    path = str(tmp_path / "profiles.json")
+    assert engine.save_profiles(path)
+
+    restored = BehavioralAnalyticsEngine()
+    assert restored.load_profiles(path) == 20
+    for user_id, profile in engine.behavior_profiles.items():
+        assert restored.behavior_profiles[user_id].to_dict() == (
+            profile.to_dict()
+        )
+    # Размер профиля не зависит от числа событий
+    assert os.path.getsize(path) / 20 < 2000
+    with pytest.raises(ValueError):
+        BehaviorProfile.from_dict("x", {"v": 99})
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Тесты для BreachIndex (индекс утёкших паролей на mmap)
+"""
+
+import hashlib
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.ai_agents.breach_index import (  # noqa: E402
+    BreachIndex,
+    BreachIndexBuilder,
+    BreachIndexError,
+    build_breach_index,
+)
+from security.ai_agents.password_security_agent import (  # noqa: E402
+    PasswordSecurityAgent,
+)
+
+
+def _sha(password):
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    source = tmp_path / "leaked.txt"
+    with open(source, "w") as f:
+        for i in range(5000):
+            f.write("leaked{}\n".format(i % 4000))  # с дубликатами
+        f.write("\n")
+    path = str(tmp_path / "breach.bin")
+    stats = build_breach_index(
+        [str(source)], path, chunk_records=700, prefix_bits=8
+    )
+    assert stats.runs > 1
+    assert stats.unique_digests == 4000
+    assert stats.records_skipped == 1
+    return path
+
+
+def test_lookup_matches_source(index_path):
+    with BreachIndex(index_path) as index:
+        assert len(index) == 4000
+        for i in range(0, 4000, 37):
+            assert index.contains_password("leaked{}".format(i))
+            assert _sha("leaked{}".format(i)) in index
+        misses = sum(
+            index.contains_password("unique-{}".format(i))
+            for i in range(2000)
+        )
+        assert misses == 0
+        # Большинство промахов отсекает фильтр Блума
+        assert index.bloom_rejections > 1900
+
+
+def test_hash_list_input_formats(tmp_path):
+    path = str(tmp_path / "hashes.bin")
+    builder = BreachIndexBuilder(path, input_format="sha256")
+    builder.add_lines(
+        [
+            _sha("alpha").upper() + ":42",
+            _sha("beta"),
+            "not-a-hash",
+        ]
+    )
+    stats = builder.finish()
+    assert stats.unique_digests == 2 and stats.records_skipped == 1
+    with BreachIndex(path) as index:
+        assert index.contains_password("alpha")
+        assert index.contains_password("beta")
+        assert not index.contains_password("gamma")
+
+
+def test_range_search_k_anonymity(index_path):
+    target = _sha("leaked123")
+    with BreachIndex(index_path) as index:
+        suffixes = index.range_search(target[:5].upper())
+        assert target[5:].upper() in suffixes
+        assert all(len(s) == 59 for s in suffixes)
+        # Префикс целиком в одном бакете и на границе бакетов
+        assert index.range_search(target) == [""]
+        with pytest.raises(ValueError):
+            index.range_search("abc")
+
+
+def test_empty_and_corrupted_index(tmp_path):
+    path = str(tmp_path / "empty.bin")
+    BreachIndexBuilder(path).finish()
+    with BreachIndex(path) as index:
+        assert len(index) == 0
+        assert not index.contains_password("123456")
+        assert index.range_search("00000") == []
+
+    broken = tmp_path / "broken.bin"
+    broken.write_bytes(b"x" * 100)
+    with pytest.raises(BreachIndexError):
+        BreachIndex(str(broken))
+
+
+def test_agent_uses_index(index_path):
+    agent = PasswordSecurityAgent(breach_index_path=index_path)
+    agent._load_breach_database()
+    assert agent.check_password_breach("123456")  # встроенный список
+    assert agent.check_password_breach("leaked77")
+    assert not agent.check_password_breach("correct horse battery")
+    target = _sha("leaked77")
+    assert target[6:].upper() in agent.check_breach_range(target[:6])
+    agent.breach_index.close()
+
+
+@pytest.mark.performance
+def test_lookup_latency(tmp_path):
+    path = str(tmp_path / "bench.bin")
+    builder = BreachIndexBuilder(path, chunk_records=100000)
+    builder.add_lines("pw{}".format(i) for i in range(300000))
+    builder.finish()
+
+    start = time.perf_counter()
+    index = BreachIndex(path)
+    open_time = time.perf_counter() - start
+
+    hits = ["pw{}".format(i) for i in range(0, 300000, 30)]
+    misses = ["other{}".format(i) for i in range(10000)]
+    start = time.perf_counter()
+    assert all(index.contains_password(p) for p in hits)
+    hit_us = (time.perf_counter() - start) / len(hits) * 1e6
+    start = time.perf_counter()
+    assert not any(index.contains_password(p) for p in misses)
+    miss_us = (time.perf_counter() - start) / len(misses) * 1e6
+    index.close()
+    # Файл - отсортированные SHA-256 и таблица смещений без лишнего
+    assert os.path.getsize(path) < 300000 * 40
+    assert open_time < 0.05
+    assert hit_us < 200 and miss_us < 200
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для потокового анализа звонков AntiFraudMasterAI
+"""
+
+import asyncio
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.ai_agents.anti_fraud_master_ai import (  # noqa: E402
+    AntiFraudConfig,
+    AntiFraudMasterAI,
+    ProtectionAction,
+    RiskLevel,
+)
+
+SCAM_FRAGMENTS = [
+    "Здравствуйте, вас беспокоит служба безопасности",
+    "ваш банк зафиксировал подозрительную операцию",
+    "срочно нужно перевести деньги на безопасный счет",
+    "иначе будет арест и блокировка средств",
+    "с вами свяжется полиция и ФСБ",
+    "немедленно оформите перевод, это займёт не более часа",
+    "оставайтесь на линии",
+]
+
+
+def _pcm(agent, seconds, freq=180.0):
+    sr = agent.voice_analyzer.sample_rate
+    t = np.arange(int(sr * seconds)) / sr
+    return (np.sin(2 * np.pi * freq * t) * 8000).astype(np.int16).tobytes()
+
+
+def _chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def _count_deepfake_calls(agent):
+    calls = []
+    original = agent.deepfake_detector.analyze_video_call
+
+    async def counting(video, audio, caller_name=""):
+        calls.append(len(video))
+        return await original(video, audio, caller_name)
+
+    agent.deepfake_detector.analyze_video_call = counting
+    return calls
+
+
+def test_caller_id_stage_short_circuits():
+    agent = AntiFraudMasterAI(
+        AntiFraudConfig(
+            blocked_numbers=["+70000000001"],
+            trusted_contacts=["+70000000002"],
+        )
+    )
+
+    async def run():
+        blocked = await agent.open_call_session("e1", "+70000000001")
+        assert blocked.closed
+        assert blocked.decision.action == ProtectionAction.BLOCK
+        assert blocked.decision.stage == "caller_id"
+        # Закрытый сеанс не анализирует новые данные
+        await blocked.feed_audio(_pcm(agent, 2))
+        await blocked.feed_transcript(SCAM_FRAGMENTS[2])
+        assert "voice" not in blocked.stage_metrics
+        assert "phrases" not in blocked.stage_metrics
+
+        trusted = await agent.open_call_session("e1", "+70000000002")
+        assert trusted.decision.action == ProtectionAction.ALLOW
+        assert trusted.closed
+
+        # Пакетный анализ тоже проверяет номер до анализа голоса
+        agent.voice_analyzer = None
+        return await agent.analyze_phone_call("e1", "+70000000001", b"")
+
+    level, action, _ = asyncio.run(run())
+    assert (level, action) == (RiskLevel.CRITICAL, ProtectionAction.BLOCK)
+
+
+def test_emergency_short_circuit_on_transcript():
+    agent = AntiFraudMasterAI()
+
+    async def run():
+        session = await agent.open_call_session("e1", "+79990001122")
+        assert not session.closed
+        decisions = []
+        for fragment in SCAM_FRAGMENTS:
+            decisions.append(await session.feed_transcript(fragment))
+            if session.closed:
+                break
+        # Дальнейший звук уже не анализируется
+        await session.feed_audio(_pcm(agent, 2))
+        final = await session.finish()
+        return session, decisions, final
+
+    session, decisions, final = asyncio.run(run())
+    risks = [d.risk_score for d in decisions]
+    assert risks == sorted(risks)
+    assert final.final and final.action == ProtectionAction.EMERGENCY_MODE
+    assert final.stage == "phrases"
+    assert final is decisions[-1]
+    assert len(decisions) < len(SCAM_FRAGMENTS)
+    assert {"срочно", "банк", "арест", "деньги"} <= session.matched_keywords
+    assert agent.emergency_alerts == 1
+    assert "voice" not in session.stage_metrics
+    assert session.time_to_decision < 1.0
+
+
+def test_deepfake_runs_only_when_ambiguous():
+    agent = AntiFraudMasterAI(AntiFraudConfig(stream_deepfake_interval=60))
+    calls = _count_deepfake_calls(agent)
+    video_chunk = bytes(range(256)) * 64
+
+    async def run():
+        session = await agent.open_call_session("e1", "+79990001122")
+        # Низкий риск - дорогой детектор не нужен
+        await session.feed_video(video_chunk)
+        assert calls == [] and not session.is_ambiguous
+
+        await session.feed_transcript("звонят из банка насчёт перевода")
+        assert session.is_ambiguous
+        await session.feed_video(video_chunk)
+        # Интервал между deepfake-анализами не истёк
+        await session.feed_video(video_chunk)
+        assert len(calls) == 1 and "deepfake" in session.stage_risks
+        return session
+
+    session = asyncio.run(run())
+    assert session.get_metrics()["stages"]["deepfake"]["calls"] == 1
+
+
+def test_finish_applies_protection_actions():
+    agent = AntiFraudMasterAI()
+
+    async def run():
+        session = await agent.open_call_session("e1", "+79990001122")
+        for chunk in _chunks(_pcm(agent, 3), 4410):
+            await session.feed_audio(chunk)
+        for fragment in SCAM_FRAGMENTS[1:3]:
+            await session.feed_transcript(fragment)
+        return session, await session.finish()
+
+    session, decision = asyncio.run(run())
+    assert decision.final and decision.stage == "final"
+    assert (
+        agent.family_notification_threshold
+        <= decision.risk_score
+        < agent.emergency_threshold
+    )
+    assert decision.action in (
+        ProtectionAction.NOTIFY_FAMILY,
+        ProtectionAction.BLOCK_PHONE,
+    )
+    assert agent.family_notifications == 1
+
+    metrics = session.get_metrics()
+    assert set(metrics["stages"]) == {"caller_id", "voice", "phrases"}
+    assert metrics["audio_duration"] == pytest.approx(3.0, abs=0.01)
+    report = agent.get_metrics_report()
+    assert report["call_stage_voice_seconds"]["count"] >= 30
+    assert report["call_time_to_decision"]["count"] == 1
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для ChatHub (семейный чат Mobile API)
+"""
+
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.api.chat_hub import ChatHub  # noqa: E402
+
+
+class FakeWebSocket:
+    """WebSocket-заглушка, записывающая время доставки"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.received = []
+        self.closed_code = None
+
+    async def send_text(self, payload):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received.append((time.perf_counter(), json.loads(payload)))
+
+    async def close(self, code=1000):
+        self.closed_code = code
+
+
+def _message(i, member_id="child_1", sender_id="parent_1"):
+    return {
+        "id": "msg_{}".format(i),
+        "member_id": member_id,
+        "sender_id": sender_id,
+        "text": "text {}".format(i),
+    }
+
+
+def test_history_cursor_pagination():
+    hub = ChatHub()
+
+    async def run():
+        for i in range(120):
+            member = "child_1" if i % 2 == 0 else "child_2"
+            hub.post_message("family_1", _message(i, member_id=member))
+
+    asyncio.run(run())
+    page = hub.get_history("family_1", "child_1", limit=25)
+    ids = [m["id"] for m in page["messages"]]
+    assert ids[0] == "msg_118" and len(ids) == 25
+
+    collected = list(ids)
+    while page["next_cursor"] is not None:
+        page = hub.get_history(
+            "family_1", "child_1", before=page["next_cursor"], limit=25
+        )
+        collected.extend(m["id"] for m in page["messages"])
+    assert collected == ["msg_{}".format(i) for i in range(118, -1, -2)]
+    assert hub.get_history("other", "child_1")["messages"] == []
+
+
+def test_fan_out_to_all_devices_of_members():
+    hub = ChatHub()
+
+    async def run():
+        phone, tablet = FakeWebSocket(), FakeWebSocket()
+        parent = FakeWebSocket()
+        stranger = FakeWebSocket()
+        connections = [
+            hub.connect(phone, "family_1", "child_1"),
+            hub.connect(tablet, "family_1", "child_1"),
+            hub.connect(parent, "family_1", "parent_1"),
+            hub.connect(stranger, "family_2", "child_1"),
+        ]
+        hub.post_message("family_1", _message(1))
+        await asyncio.sleep(0.01)
+        for connection in connections:
+            await hub.disconnect(connection)
+        return phone, tablet, parent, stranger
+
+    phone, tablet, parent, stranger = asyncio.run(run())
+    for ws in (phone, tablet, parent):
+        assert [e["message"]["id"] for _, e in ws.received] == ["msg_1"]
+    assert stranger.received == []
+    assert hub.get_stats()["connections"] == 0
+
+
+def test_disconnect_removes_only_that_device():
+    hub = ChatHub()
+
+    async def run():
+        first = hub.connect(FakeWebSocket(), "f", "child_1")
+        second = hub.connect(FakeWebSocket(), "f", "child_1")
+        await hub.disconnect(first)
+        assert hub.device_count("f", "child_1") == 1
+        await hub.disconnect(second)
+        assert hub.device_count("f", "child_1") == 0
+        assert ("f", "child_1") not in hub.connections
+
+    asyncio.run(run())
+
+
+def test_slow_consumer_is_dropped():
+    hub = ChatHub(send_queue_size=4)
+
+    async def run():
+        slow = FakeWebSocket(delay=1.0)
+        fast = FakeWebSocket()
+        hub.connect(slow, "f", "child_1")
+        fast_conn = hub.connect(fast, "f", "child_1")
+        for i in range(10):
+            hub.post_message("f", _message(i, sender_id="child_1"))
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+        await hub.disconnect(fast_conn)
+        return slow, fast
+
+    slow, fast = asyncio.run(run())
+    assert slow.closed_code == 1013
+    assert len(fast.received) == 10
+    assert hub.get_stats()["dropped_connections"] == 1
+
+
+def test_mobile_api_keeps_list_shape_and_adds_history_route():
+    testclient = pytest.importorskip("fastapi.testclient")
+    from security.api import mobile_api_endpoints as api
+
+    api.chat_hub = ChatHub()
+    client = testclient.TestClient(api.app)
+    for i in range(5):
+        response = client.post(
+            "/api/chat/send/child_1",
+            params={"family_id": "family_1"},
+            json={"sender_id": "parent_1", "text": "text {}".format(i)},
+        )
+        assert response.status_code == 200
+
+    # Прежний маршрут - список от старых к новым
+    messages = client.get(
+        "/api/chat/messages/child_1", params={"family_id": "family_1"}
+    ).json()
+    assert isinstance(messages, list)
+    assert [m["text"] for m in messages] == [
+        "text {}".format(i) for i in range(5)
+    ]
+
+    page = client.get(
+        "/api/chat/history/child_1",
+        params={"family_id": "family_1", "limit": 3},
+    ).json()
+    assert [m["text"] for m in page["messages"]] == [
+        "text 4",
+        "text 3",
+        "text 2",
+    ]
+    rest = client.get(
+        "/api/chat/history/child_1",
+        params={
+            "family_id": "family_1",
+            "before": page["next_cursor"],
+        },
+    ).json()
+    assert [m["text"] for m in rest["messages"]] == ["text 1", "text 0"]
+    assert rest["next_cursor"] is None
+    assert all("seq" not in m for m in messages + rest["messages"])
+
+
+@pytest.mark.performance
+def test_fan_out_load_latency():
+    """Нагрузка: тысячи соединений на одном event loop"""
+    hub = ChatHub()
+    families, members, devices = 500, 2, 3  # 3000 соединений
+
+    async def run():
+        sockets = []
+        connections = []
+        for f in range(families):
+            for m in range(members):
+                for _ in range(devices):
+                    ws = FakeWebSocket()
+                    sockets.append(ws)
+                    connections.append(
+                        hub.connect(ws, "family_{}".format(f), "m{}".format(m))
+                    )
+        sent_at = {}
+        for round_no in range(10):
+            for f in range(families):
+                msg = _message(
+                    "{}_{}".format(round_no, f), member_id="m0", sender_id="m1"
+                )
+                sent_at[msg["id"]] = time.perf_counter()
+                hub.post_message("family_{}".format(f), msg)
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.05)
+        for connection in connections:
+            await hub.disconnect(connection)
+        return sockets, sent_at
+
+    sockets, sent_at = asyncio.run(run())
+    latencies = [
+        received_at - sent_at[event["message"]["id"]]
+        for ws in sockets
+        for received_at, event in ws.received
+    ]
+    assert len(latencies) == families * members * devices * 10
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    assert p50 < 250
+    assert p99 < 1000
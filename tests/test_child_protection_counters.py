@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для дневных счётчиков и архива активности ChildProtection
+"""
+
+import logging
+import os
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.family.activity_tracker import (  # noqa: E402
+    MAX_DURATION,
+    ActivityArchive,
+    DailyUsageCounters,
+)
+from security.family.child_protection import (  # noqa: E402
+    ChildProtection,
+    ContentCategory,
+    ProtectionLevel,
+)
+
+
+def _protection(children=("teen",), age=14):
+    protection = ChildProtection()
+    protection.alert_parents = False
+    for child_id in children:
+        protection.add_child_profile(
+            child_id, child_id, age, ProtectionLevel.MODERATE
+        )
+    return protection
+
+
+def test_category_and_total_limits():
+    protection = _protection()
+    url = "https://games.example.org"
+    results = [
+        protection.check_content_access("teen", url, ContentCategory.GAMING)
+        for _ in range(100)
+    ]
+    # Лимит на игры для 14 лет - 90 минут
+    assert sum(r["allowed"] for r in results) == 90
+    assert results[-1]["reason"] == "Превышен лимит времени экрана"
+
+    # Общий лимит экрана: 90 + 30 = 120 минут
+    educational = [
+        protection.check_content_access(
+            "teen", "https://school.example.org", ContentCategory.EDUCATIONAL
+        )["allowed"]
+        for _ in range(40)
+    ]
+    assert sum(educational) == 30
+    report = protection.get_child_report("teen")
+    assert report["total_screen_time_today"] == 120
+    assert report["category_statistics"]["gaming"] == {
+        "time": 90,
+        "visits": 90,
+    }
+
+
+def test_midnight_rollover_resets_daily_state():
+    protection = _protection()
+    profile = protection.child_profiles["teen"]
+    yesterday = datetime.now() - timedelta(days=1)
+    profile.last_activity = yesterday
+    profile.violations.append("нарушение вчера")
+
+    protection._log_activity(
+        "teen", "content_access", ContentCategory.GAMING, "u",
+        duration=30, timestamp=yesterday,
+    )
+    assert protection.usage_counters.total_minutes(
+        "teen", yesterday.date()
+    ) == 30
+    assert profile.total_screen_time == 30
+
+    # Первая активность нового дня сбрасывает счётчики и нарушения
+    assert protection._get_total_screen_time_today("teen") == 0
+    assert profile.violations == [] and profile.total_screen_time == 0
+
+    # Запоздалая запись за вчера не попадает в сегодняшние счётчики
+    protection._log_activity(
+        "teen", "content_access", ContentCategory.GAMING, "u",
+        duration=15, timestamp=yesterday,
+    )
+    assert protection._get_total_screen_time_today("teen") == 0
+    assert profile.total_screen_time == 0
+    assert len(protection.activity_archive) == 2
+
+
+def test_reset_daily_limits_forces_reset():
+    protection = _protection(("a", "b"))
+    for child_id in ("a", "b"):
+        protection._log_activity(
+            child_id, "content_access", ContentCategory.SOCIAL, "u",
+            duration=60,
+        )
+    assert protection.check_content_access(
+        "a", "https://chat.example.org", ContentCategory.SOCIAL
+    )["allowed"] is False
+
+    protection.reset_daily_limits()
+    assert protection._get_category_time_today(
+        "a", ContentCategory.SOCIAL
+    ) == 0
+    assert protection.child_profiles["b"].total_screen_time == 0
+    # Архив для отчетов сохраняется
+    assert len(protection.activity_archive) == 2
+
+
+def test_activity_history_from_archive():
+    protection = _protection()
+    now = datetime.now().replace(microsecond=0)
+    for days_ago in (0, 2, 40):
+        protection._log_activity(
+            "teen", "content_access", ContentCategory.NEWS,
+            f"https://news.example.org/{days_ago}",
+            duration=days_ago + 1,
+            timestamp=now - timedelta(days=days_ago),
+        )
+    history = protection.get_activity_history("teen", days=7)
+    assert [log.details["url"] for log in history] == [
+        "https://news.example.org/2",
+        "https://news.example.org/0",
+    ]
+    assert history[1].timestamp == now
+    assert history[1].content_category == ContentCategory.NEWS
+    assert protection.get_activity_history("teen") == history[1:]
+    assert protection.get_activity_history("unknown") == []
+
+    # Старые дни удаляются по сроку хранения
+    protection.reset_daily_limits()
+    assert len(protection.activity_archive) == 2
+    assert protection.get_status()["total_activity_logs"] == 2
+
+
+def test_archive_interns_strings_and_summarizes_days():
+    archive = ActivityArchive(retention_days=2)
+    day = datetime(2026, 3, 10, 12, 0)
+    for i in range(6):
+        archive.append(
+            day + timedelta(days=i % 3, minutes=i),
+            "c{}".format(i % 2),
+            "content_access",
+            "gaming" if i % 3 else "educational",
+            5,
+            "https://same.example.org",
+            flagged=i == 5,
+        )
+    # Запись за прошедший день встала на свое место
+    assert archive.days() == [
+        date(2026, 3, 10),
+        date(2026, 3, 11),
+        date(2026, 3, 12),
+    ]
+    # Строки хранятся в таблице своего дня
+    assert [len(s.strings) for s in archive._segments.values()] == [5, 5, 5]
+    records = list(archive.iter_records("c1"))
+    assert [r["timestamp"].minute for r in records] == [3, 1, 5]
+    assert records[-1]["flagged"] is True
+    assert archive.daily_summary("c0", since=date(2026, 3, 11)) == {
+        date(2026, 3, 11): {"gaming": {"time": 5, "visits": 1}},
+        date(2026, 3, 12): {"gaming": {"time": 5, "visits": 1}},
+    }
+
+    assert archive.prune(date(2026, 3, 13)) == 2
+    assert len(archive) == 4 and archive.memory_usage() == 4 * 29
+
+
+def test_archive_frees_pruned_strings_and_clamps_duration():
+    archive = ActivityArchive(retention_days=1)
+    start = datetime(2026, 3, 1, 12, 0)
+    for i in range(30):
+        timestamp = start + timedelta(days=i)
+        archive.append(
+            timestamp,
+            "c",
+            "content_access",
+            "gaming",
+            1,
+            "https://site{}.example.org".format(i),
+        )
+        archive.prune(timestamp.date())
+    # Уникальные URL удаленных дней не копятся
+    assert len(archive) == 2
+    assert sum(len(s.strings) for s in archive._segments.values()) == 8
+
+    archive = ActivityArchive()
+    for duration in (-5, 2.7, 2 ** 40):
+        archive.append(start, "c", "content_access", "gaming", duration)
+    assert [r["duration"] for r in archive.iter_records()] == [
+        0,
+        2,
+        MAX_DURATION,
+    ]
+
+
+def test_counters_rollover_callback():
+    rolled = []
+    counters = DailyUsageCounters(
+        on_rollover=lambda child, day: rolled.append((child, day))
+    )
+    first, second = date(2026, 1, 1), date(2026, 1, 2)
+    counters.add("c", ContentCategory.GAMING, 10, first)
+    counters.add("c", ContentCategory.GAMING, 5, second)
+    counters.add("c", ContentCategory.GAMING, 7, first)
+    assert rolled == [("c", first)]
+    assert counters.category_stats("c", second) == {
+        ContentCategory.GAMING: {"time": 5, "visits": 1}
+    }
+    assert counters.total_minutes("c", first) == 0
+
+
+@pytest.mark.performance
+def test_access_check_cost_independent_of_history(monkeypatch):
+    logging.getLogger("security").setLevel(logging.WARNING)
+    children = ["child_{}".format(i) for i in range(100)]
+    protection = _protection(children, age=17)
+    protection.max_screen_time = 10 ** 9
+    for profile in protection.child_profiles.values():
+        profile.time_limits = {}
+    total = 200_000
+    categories = [
+        ContentCategory.EDUCATIONAL,
+        ContentCategory.GAMING,
+        ContentCategory.SOCIAL,
+        ContentCategory.NEWS,
+    ]
+    urls = ["https://site{}.example.org".format(i) for i in range(1000)]
+
+    # Обращения проверки к счётчикам и архиву
+    reads = []
+    for cls, name in (
+        (DailyUsageCounters, "category_minutes"),
+        (DailyUsageCounters, "total_minutes"),
+        (ActivityArchive, "iter_records"),
+        (ActivityArchive, "daily_summary"),
+    ):
+        def counted(self, *args, _name=name, _method=getattr(cls, name)):
+            reads.append(_name)
+            return _method(self, *args)
+
+        monkeypatch.setattr(cls, name, counted)
+
+    def check_cost():
+        checks = 20000
+        reads.clear()
+        start = time.perf_counter()
+        for i in range(checks):
+            protection._check_screen_time_limits(
+                children[i % 100], categories[i % 4]
+            )
+        elapsed = (time.perf_counter() - start) / checks
+        return sorted(set(reads)), len(reads) / checks, elapsed
+
+    before = check_cost()
+    # Записи равномерно за 25 дней, последняя - сейчас
+    step = timedelta(days=25) / total
+    timestamp = datetime.now() - step * total
+    log = protection._log_activity
+    for i in range(total):
+        timestamp += step
+        log(
+            children[i % 100],
+            "content_access",
+            categories[i % 4],
+            urls[i % 1000],
+            timestamp=timestamp,
+        )
+    after = check_cost()
+
+    archive = protection.activity_archive
+    assert len(archive) == total
+    assert len(archive.days()) in (25, 26)
+    # Колоночный архив: десятки байт на запись
+    assert archive.memory_usage() / total < 100
+    # Проверка читает только дневные счётчики, архив не трогает
+    assert before[:2] == after[:2] == (
+        ["category_minutes", "total_minutes"],
+        2,
+    )
+    assert after[2] < before[2] * 5
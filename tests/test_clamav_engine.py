@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для ClamAVEngine
+
+Сканирование проверяется на локальном поддельном clamd, который
+говорит на протоколе clamd (IDSESSION, INSTREAM, PING, VERSION).
+"""
+
+import asyncio
+import os
+import stat
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.antivirus.engines.clamav_engine import (  # noqa: E402
+    ClamAVEngine,
+    ClamdClient,
+    parse_clamd_address,
+    parse_stream_reply,
+)
+
+EICAR_MARKER = b"EICAR-STANDARD-ANTIVIRUS-TEST-FILE"
+
+
+class FakeClamd:
+    """Поддельный clamd в отдельном потоке со своим event loop"""
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.connections = 0
+        self.scanned = 0
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.server = None
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        session = False
+        request_id = 0
+        try:
+            while True:
+                command = (await reader.readuntil(b"\0"))[1:-1]
+                if command == b"IDSESSION":
+                    session = True
+                    continue
+                if command == b"END":
+                    break
+                request_id += 1
+                if command == b"PING":
+                    reply = b"PONG"
+                elif command == b"VERSION":
+                    reply = b"ClamAV 1.0.0/fake"
+                elif command == b"INSTREAM":
+                    data = bytearray()
+                    while True:
+                        size = struct.unpack(
+                            "!L", await reader.readexactly(4)
+                        )[0]
+                        if not size:
+                            break
+                        data += await reader.readexactly(size)
+                    self.scanned += 1
+                    if EICAR_MARKER in data:
+                        reply = b"stream: Eicar-Test-Signature FOUND"
+                    else:
+                        reply = b"stream: OK"
+                else:
+                    reply = b"UNKNOWN COMMAND"
+                prefix = ("%d: " % request_id).encode() if session else b""
+                writer.write(prefix + reply + b"\0")
+                await writer.drain()
+                if not session:
+                    break
+        except asyncio.IncompleteReadError:
+            pass
+        writer.close()
+
+    def start(self):
+        self.thread.start()
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.start_unix_server(self._handle, path=self.socket_path),
+            self.loop,
+        )
+        self.server = future.result(5)
+
+    def stop(self):
+        async def shutdown():
+            self.server.close()
+            await self.server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(5)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(5)
+        self.loop.close()
+
+
+@pytest.fixture
+def fake_clamd(tmp_path):
+    server = FakeClamd(str(tmp_path / "clamd.sock"))
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def sample_files(tmp_path):
+    paths = []
+    for i in range(40):
+        path = tmp_path / "file_{}.bin".format(i)
+        content = os.urandom(1024) * (i + 1)
+        if i % 10 == 3:
+            content += EICAR_MARKER
+        path.write_bytes(content)
+        paths.append(str(path))
+    return paths
+
+
+def _make_fake_clamscan(tmp_path, exit_code=0, output=""):
+    script = tmp_path / "clamscan"
+    script.write_text(
+        "#!/bin/sh\n"
+        "[ \"$1\" = \"--version\" ] && echo 'ClamAV 1.0.0' && exit 0\n"
+        "echo '{}'\nexit {}\n".format(output, exit_code)
+    )
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return str(script)
+
+
+def test_parse_clamd_address():
+    assert parse_clamd_address("/var/run/clamav/clamd.ctl") == (
+        "unix", "/var/run/clamav/clamd.ctl"
+    )
+    assert parse_clamd_address("tcp://10.0.0.1:3310") == (
+        "tcp", ("10.0.0.1", 3310)
+    )
+    assert parse_clamd_address("localhost:3310") == (
+        "tcp", ("localhost", 3310)
+    )
+    assert parse_clamd_address("clamd.sock") == ("unix", "clamd.sock")
+
+
+def test_parse_stream_reply():
+    assert parse_stream_reply("stream: OK") == (True, None, None)
+    assert parse_stream_reply("stream: Win.Test FOUND") == (
+        False, "Win.Test", None
+    )
+    clean, threat, error = parse_stream_reply(
+        "INSTREAM size limit exceeded. ERROR"
+    )
+    assert clean and threat is None and "ERROR" in error
+
+
+def test_scan_file_via_clamd(fake_clamd, tmp_path):
+    engine = ClamAVEngine({"clamd_socket": fake_clamd.socket_path})
+    assert engine.available
+    assert engine.get_status()["mode"] == "clamd"
+
+    clean_file = tmp_path / "clean.txt"
+    clean_file.write_bytes(b"hello" * 100000)
+    infected_file = tmp_path / "eicar.txt"
+    infected_file.write_bytes(b"X5O!P%@AP" + EICAR_MARKER)
+
+    async def run():
+        try:
+            clean = await engine.scan_file(str(clean_file))
+            infected = await engine.scan_file(str(infected_file))
+            version = await engine.client.version()
+            return clean, infected, version
+        finally:
+            await engine.close()
+
+    clean, infected, version = asyncio.run(run())
+    assert clean.clean and clean.error is None
+    assert not infected.clean
+    assert infected.threat_name == "Eicar-Test-Signature"
+    assert version.startswith("ClamAV")
+    # Все команды прошли по одной сессии из пула
+    assert fake_clamd.connections == 2  # ping_sync + сессия
+
+
+def test_scan_files_pipelined(fake_clamd, sample_files):
+    engine = ClamAVEngine(
+        {
+            "clamd_socket": fake_clamd.socket_path,
+            "pool_size": 2,
+            "pipeline_depth": 8,
+            "chunk_size": 4096,
+        }
+    )
+
+    async def run():
+        try:
+            first = await engine.scan_files(sample_files)
+            second = await engine.scan_files(sample_files)
+            return first, second
+        finally:
+            await engine.close()
+
+    first, second = asyncio.run(run())
+    assert [r.file_path for r in first] == sample_files
+    infected = {r.file_path for r in first if not r.clean}
+    assert infected == {
+        p for i, p in enumerate(sample_files) if i % 10 == 3
+    }
+    assert [r.clean for r in second] == [r.clean for r in first]
+    assert fake_clamd.scanned == 2 * len(sample_files)
+    # Соединения переиспользуются, а не открываются на каждый файл
+    assert fake_clamd.connections <= 1 + engine.client.pool_size
+
+
+def test_missing_file_does_not_break_batch(fake_clamd, sample_files):
+    engine = ClamAVEngine({"clamd_socket": fake_clamd.socket_path})
+    paths = sample_files[:3] + ["/nonexistent/file.bin"] + sample_files[3:5]
+
+    async def run():
+        try:
+            return await engine.scan_files(paths)
+        finally:
+            await engine.close()
+
+    results = asyncio.run(run())
+    assert len(results) == len(paths)
+    assert results[3].error is not None
+    assert all(r.error is None for i, r in enumerate(results) if i != 3)
+    assert not results[4].clean
+
+
+def test_clamscan_fallback_is_async(tmp_path):
+    script = _make_fake_clamscan(
+        tmp_path, exit_code=1, output="/tmp/x: Win.Trojan FOUND"
+    )
+    engine = ClamAVEngine(
+        {
+            "clamd_socket": str(tmp_path / "missing.sock"),
+            "clamscan_path": script,
+            "clamd_path": str(tmp_path / "no-clamd"),
+        }
+    )
+    assert engine.available
+    assert engine.mode == "clamscan"
+    target = tmp_path / "target.bin"
+    target.write_bytes(b"data")
+
+    result = asyncio.run(engine.scan_file(str(target)))
+    assert not result.clean
+    assert result.threat_name == "Win.Trojan"
+
+
+def test_client_ping(fake_clamd):
+    client = ClamdClient(fake_clamd.socket_path)
+    assert client.ping_sync()
+
+    async def run():
+        try:
+            return await client.ping()
+        finally:
+            await client.close()
+
+    assert asyncio.run(run())
+
+
+def test_client_timeout_is_not_retried(fake_clamd):
+    client = ClamdClient(fake_clamd.socket_path, timeout=0.05)
+    calls = []
+
+    async def stalled(session):
+        calls.append(session)
+        await asyncio.sleep(1)
+
+    async def run():
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await client._with_session(stalled)
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+    assert len(calls) == 1
+
+
+@pytest.mark.performance
+def test_throughput_vs_per_file_subprocess(fake_clamd, tmp_path, sample_files):
+    """Сравнение files/s: пул clamd против процесса на каждый файл"""
+    script = _make_fake_clamscan(tmp_path)
+
+    start = time.perf_counter()
+    for path in sample_files:
+        subprocess.run(
+            [script, "--no-summary", "--infected", "--stdout", path],
+            capture_output=True,
+            text=True,
+            timeout=30,
+        )
+    subprocess_rate = len(sample_files) / (time.perf_counter() - start)
+
+    engine = ClamAVEngine({"clamd_socket": fake_clamd.socket_path})
+
+    async def run():
+        try:
+            start = time.perf_counter()
+            results = await engine.scan_files(sample_files)
+            return results, time.perf_counter() - start
+        finally:
+            await engine.close()
+
+    results, elapsed = asyncio.run(run())
+    clamd_rate = len(sample_files) / elapsed
+    assert len(results) == len(sample_files)
+    assert sum(not r.clean for r in results) == 4
+    assert clamd_rate > subprocess_rate * 3
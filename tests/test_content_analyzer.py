@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для ContentAnalyzer (компоненты ParentalControlBot)
+"""
+
+import asyncio
+import logging
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.bots.components.content_analyzer import (  # noqa: E402
+    ContentAnalyzer,
+)
+from security.bots.parental_control_bot import (  # noqa: E402
+    ContentCategory,
+    ControlAction,
+)
+
+
+@pytest.fixture
+def analyzer():
+    return ContentAnalyzer(logging.getLogger("test_content_analyzer"))
+
+
+def _sequential_category(analyzer, url):
+    """Исходный алгоритм: перебор паттернов, затем ключевых слов"""
+    url_lower = url.lower()
+    for category, patterns in analyzer.url_patterns.items():
+        for pattern in patterns:
+            if re.search(pattern, url_lower):
+                return category
+    for category, keywords in analyzer.keywords.items():
+        for keyword in keywords:
+            if keyword in url_lower:
+                return category
+    return ContentCategory.UNKNOWN
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://www.khanacademy.org/math",
+        "https://m.youtube.com/watch?v=1",
+        "https://youtube.com/results?q=learn",
+        "https://www.youtube.com/xxx",
+        "https://example.com/gaming/news",
+        "https://store.example.org/play",
+        "https://mit.edu/courses",
+        "https://unknown-site.org/",
+        "https://notyoutube.com/",
+    ],
+)
+def test_combined_matcher_matches_sequential_order(analyzer, url):
+    assert analyzer._categorize_url(url) == _sequential_category(
+        analyzer, url
+    )
+
+
+def test_host_table_and_priority(analyzer):
+    # Хост развлекательный, но путь содержит образовательный паттерн
+    assert (
+        analyzer._categorize_url("https://youtube.com/channel.edu")
+        == ContentCategory.EDUCATIONAL
+    )
+    assert (
+        analyzer._categorize_url("https://m.twitch.tv/stream")
+        == ContentCategory.ENTERTAINMENT
+    )
+
+
+def test_results_are_cached_by_normalized_url_and_age(analyzer):
+    first = asyncio.run(
+        analyzer.analyze_content(
+            "https://YouTube.com/watch#t=1", "child_1", 8
+        )
+    )
+    second = asyncio.run(
+        analyzer.analyze_content("https://youtube.com/watch#T=1", "child_1", 9)
+    )
+    assert first.category == second.category
+    assert first.url == "https://YouTube.com/watch#t=1"
+    assert analyzer.stats.cache_hits == 1
+    assert analyzer.stats.cache_misses == 1
+
+    # Фрагмент входит в ключ кэша
+    asyncio.run(
+        analyzer.analyze_content("https://youtube.com/watch", "child_1", 9)
+    )
+    assert analyzer.stats.cache_misses == 2
+
+    # Другая возрастная граница - отдельная запись кэша
+    asyncio.run(
+        analyzer.analyze_content("https://youtube.com/watch", "child_1", 5)
+    )
+    assert analyzer.stats.cache_misses == 3
+
+
+def test_fragment_with_adult_keywords_is_blocked(analyzer):
+    clean = asyncio.run(
+        analyzer.analyze_content("https://www.cnn.com/world", "child_1", 10)
+    )
+    assert clean.category == ContentCategory.NEWS
+    for url in (
+        "https://www.cnn.com/world#nsfw",
+        "https://news.example.com/story#adult content",
+        "https://m.game/learn/b#xxx",
+    ):
+        result = asyncio.run(analyzer.analyze_content(url, "child_1", 10))
+        assert result.category == ContentCategory.ADULT
+        assert result.action == ControlAction.BLOCK
+        assert result.category == _sequential_category(analyzer, url)
+
+
+def test_cache_is_bounded():
+    analyzer = ContentAnalyzer(logging.getLogger("bounded"), cache_size=10)
+    urls = ["https://site{}.com/".format(i) for i in range(50)]
+    asyncio.run(analyzer.analyze_urls(urls, "child_1", 10))
+    assert len(analyzer._cache) == 10
+
+
+def test_analyze_urls_batch(analyzer):
+    urls = [
+        "https://www.khanacademy.org/",
+        "not-a-url",
+        "https://adult-site.com/",
+        "https://www.instagram.com/",
+    ]
+    results = asyncio.run(analyzer.analyze_urls(urls, "child_1", 10))
+    assert len(results) == 4
+    assert results[1] is None
+    assert results[0].action == ControlAction.ALLOW
+    assert results[2].action == ControlAction.BLOCK
+    assert results[3].category == ContentCategory.SOCIAL
+    assert analyzer.stats.total_analyses == 3
+    assert analyzer.stats.blocks_by_category["adult"] == 1
+    assert analyzer.get_category_counts()["social"] == 1
+
+
+def test_custom_pattern_invalidates_cache(analyzer):
+    url = "https://my-portal-xyz.org/"
+    before = asyncio.run(analyzer.analyze_content(url, "child_1", 10))
+    assert before.category == ContentCategory.UNKNOWN
+    asyncio.run(
+        analyzer.add_custom_pattern(
+            ContentCategory.EDUCATIONAL, r"my-portal-xyz\.org"
+        )
+    )
+    after = asyncio.run(analyzer.analyze_content(url, "child_1", 10))
+    assert after.category == ContentCategory.EDUCATIONAL
+
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для кэша виджетов, подписок и трендов DashboardManager
+"""
+
+import asyncio
+import logging
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.managers.dashboard_manager import (  # noqa: E402
+    DashboardConfig,
+    DashboardManager,
+    DashboardTheme,
+    SecurityDataProcessor,
+    UserRole,
+    WidgetConfig,
+    WidgetType,
+)
+
+WIDGET_TYPES = [WidgetType.GAUGE, WidgetType.CHART, WidgetType.METRIC]
+
+
+def _widgets(count=3):
+    return [
+        WidgetConfig(
+            widget_id="widget_{}".format(i),
+            widget_type=WIDGET_TYPES[i % len(WIDGET_TYPES)],
+            title="Виджет {}".format(i),
+            position=(i, 0),
+            size=(1, 1),
+            data_source="security_metrics",
+        )
+        for i in range(count)
+    ]
+
+
+def _manager(widgets=3, auto_refresh=False):
+    manager = DashboardManager(
+        DashboardConfig(
+            dashboard_id="test_dashboard",
+            name="Тестовая панель",
+            description="Панель для тестов",
+            theme=DashboardTheme.SECURITY,
+            widgets=_widgets(widgets),
+            user_roles=[UserRole.ADMIN],
+            auto_refresh=auto_refresh,
+        )
+    )
+    manager.logger.setLevel(logging.WARNING)
+    return manager
+
+
+def _data(threats=1, score=0.9):
+    return {
+        "threats_detected": threats,
+        "blocked_attacks": 10,
+        "security_score": score,
+        "vulnerabilities": 0,
+        "incidents": 0,
+        "compliance_score": 0.9,
+    }
+
+
+def _count_renders(manager):
+    calls = []
+    engine = manager.visualization_engine
+    render = engine.render_widget
+
+    async def counted(widget_config, data):
+        calls.append(widget_config.widget_id)
+        return await render(widget_config, data)
+
+    engine.render_widget = counted
+    return calls
+
+
+def test_rolling_trends_match_history():
+    async def run():
+        processor = SecurityDataProcessor(trend_window=5)
+        assert await processor.calculate_trends() == {
+            "trend": "stable",
+            "change_percent": 0.0,
+        }
+        history = []
+        for score in (0.5, 0.9, 0.85, 0.6, 0.61, 0.7, 0.95):
+            processed = await processor.process(_data(score=score))
+            processor.record(processed)
+            history.append(processed)
+            trends = await processor.calculate_trends()
+            expected = await processor.calculate_trends(history)
+            if len(history) >= 2:
+                assert trends["trend"] == expected["trend"]
+                assert trends["change_percent"] == pytest.approx(
+                    expected["change_percent"]
+                )
+                window = [h["security_score"] for h in history[-5:]]
+                assert trends["moving_average"] == pytest.approx(
+                    np.mean(window)
+                )
+                assert trends["samples"] == len(window)
+        assert trends["trend"] == "improving"
+
+    asyncio.run(run())
+
+
+def test_widgets_rerender_only_when_inputs_change():
+    async def run():
+        manager = _manager()
+        await manager.initialize()
+        calls = _count_renders(manager)
+
+        first = await manager.render_dashboard()
+        assert [w["widget_id"] for w in first["widgets"]] == [
+            "widget_0",
+            "widget_1",
+            "widget_2",
+        ]
+        assert len(calls) == 3
+        for _ in range(10):
+            assert await manager.render_dashboard() == first
+        assert len(calls) == 3
+
+        await manager.apply_data(_data(threats=1))
+        previous = await manager.render_dashboard()
+        assert len(calls) == 6
+        # Те же данные - версия и отображение не меняются
+        version = manager.data_version
+        await manager.apply_data(_data(threats=1))
+        await manager.render_dashboard()
+        assert manager.data_version == version and len(calls) == 6
+
+        # Число угроз видит только виджет-метрика
+        await manager.apply_data(_data(threats=7))
+        dashboard = await manager.render_dashboard()
+        assert calls[6:] == ["widget_2"]
+        assert dashboard["widgets"][2]["value"] == 7
+        assert dashboard["widgets"][0] is previous["widgets"][0]
+
+        manager.config.widgets[0].title = "Новое название"
+        manager.invalidate_widget("widget_0")
+        dashboard = await manager.render_dashboard()
+        assert calls[7:] == ["widget_0"]
+        assert dashboard["widgets"][0]["title"] == "Новое название"
+
+        # Изменения возвращенного словаря не портят кэш
+        dashboard["widgets"].clear()
+        assert len((await manager.render_dashboard())["widgets"]) == 3
+        await manager.shutdown()
+
+    asyncio.run(run())
+
+
+def test_subscribers_get_snapshot_then_shared_deltas():
+    async def run():
+        manager = _manager()
+        await manager.initialize()
+        await manager.apply_data(_data(threats=1))
+        first = await manager.subscribe("viewer_1")
+        second = await manager.subscribe("viewer_2")
+        assert await manager.subscribe("viewer_1") is first
+
+        for subscription in (first, second):
+            message = subscription.get_nowait()
+            assert message["type"] == "snapshot"
+            assert len(message["dashboard"]["widgets"]) == 3
+            assert subscription.empty()
+
+        await manager.apply_data(_data(threats=4))
+        delta = first.get_nowait()
+        assert second.get_nowait() is delta
+        assert delta["type"] == "delta"
+        assert list(delta["widgets"]) == ["widget_2"]
+        assert delta["widgets"]["widget_2"]["value"] == 4
+
+        # Без изменений ничего не отправляется
+        await manager.apply_data(_data(threats=4))
+        assert first.empty() and second.empty()
+
+        await manager.apply_data(_data(threats=4, score=0.3))
+        delta = first.get_nowait()
+        assert set(delta["widgets"]) == {"widget_0", "widget_1", "widget_2"}
+        assert delta["widgets"]["widget_2"]["trend"] == "declining"
+
+        await manager.remove_widget("widget_1")
+        delta = first.get_nowait()
+        assert delta["removed"] == ["widget_1"] and delta["widgets"] == {}
+        extra = _widgets(5)[4]
+        await manager.add_widget(extra)
+        assert list(first.get_nowait()["widgets"]) == ["widget_4"]
+        assert second.qsize() == 3
+        while not second.empty():
+            second.get_nowait()
+
+        assert await manager.unsubscribe("viewer_2")
+        assert not await manager.unsubscribe("viewer_2")
+        await manager.apply_data(_data(threats=5))
+        assert second.empty()
+
+        # Отставший зритель получает снимок вместо очереди изменений
+        manager.subscriber_queue_size = 2
+        slow = await manager.subscribe("slow")
+        for threats in range(10, 14):
+            await manager.apply_data(_data(threats=threats))
+        messages = [slow.get_nowait() for _ in range(slow.qsize())]
+        assert messages[0]["type"] == "snapshot"
+        widgets = messages[0]["dashboard"]["widgets"]
+        assert [w["widget_id"] for w in widgets] == [
+            "widget_0",
+            "widget_2",
+            "widget_4",
+        ]
+        values = {w["widget_id"]: w for w in widgets}
+        for message in messages[1:]:
+            values.update(message["widgets"])
+        assert values["widget_2"]["value"] == 13
+        assert (await manager.get_metrics())["subscribers"] == 2
+        await manager.shutdown()
+
+    asyncio.run(run())
+
+
+def test_background_update_waits_for_viewers():
+    async def run():
+        manager = _manager(auto_refresh=True)
+        manager.config.refresh_interval = 0.01
+        await manager.initialize()
+        version = manager.data_version
+        await asyncio.sleep(0.1)
+        assert manager.data_version == version
+        assert manager._stale
+
+        # Запрос панели подтягивает пропущенное обновление
+        await manager.render_dashboard()
+        assert manager.data_version == version + 1
+
+        subscription = await manager.subscribe("viewer")
+        subscription.get_nowait()
+        await asyncio.sleep(0.1)
+        assert manager.data_version > version + 1
+        assert not subscription.empty()
+        task = manager._update_task
+        await manager.shutdown()
+        await asyncio.sleep(0)
+        assert task.done()
+
+    asyncio.run(run())
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Тесты для AEAD-шифрования и пакетной защиты DataProtectionAgent
+"""
+
+import asyncio
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.ai_agents.data_protection_agent import (  # noqa: E402
+    DataProtectionAgent,
+    DataStatus,
+    DataType,
+)
+from security.ai_agents.data_protection_crypto import (  # noqa: E402
+    ANONYMIZED,
+    DataEncryptionError,
+    EncryptionContext,
+    FieldAnonymizer,
+    protect_chunk,
+)
+
+
+def _batch(count, size=256, data_type=DataType.PERSONAL):
+    return [
+        {
+            "data_id": "item_{}".format(i),
+            "data": {
+                "name": "Иван {}".format(i),
+                "email": "user{}@mail.ru".format(i),
+                "note": "x" * size,
+            },
+            "data_type": data_type,
+        }
+        for i in range(count)
+    ]
+
+
+def test_encrypt_roundtrip_and_integrity():
+    agent = DataProtectionAgent()
+    token = agent.encrypt_bytes(b"secret data", "doc1")
+    assert b"secret data" not in token
+    assert agent.decrypt_bytes(token, "doc1") == b"secret data"
+    # Одинаковые данные дают разные токены (случайный nonce)
+    assert agent.encrypt_bytes(b"secret data", "doc1") != token
+
+    with pytest.raises(DataEncryptionError):
+        agent.decrypt_bytes(token, "doc2")
+    tampered = bytearray(token)
+    tampered[-1] ^= 1
+    with pytest.raises(DataEncryptionError):
+        agent.decrypt_bytes(bytes(tampered), "doc1")
+
+    encrypted = agent._encrypt_data({"a": "тест"}, "doc3")
+    assert isinstance(encrypted, str)
+    assert agent._decrypt_data(encrypted, "doc3") == '{"a":"тест"}'.encode()
+
+
+def test_chacha20_method_and_wrong_method_token():
+    agent = DataProtectionAgent(config={"encryption_method": "chacha20"})
+    token = agent.encrypt_bytes(b"payload", "id")
+    assert agent.decrypt_bytes(token, "id") == b"payload"
+
+    aes = EncryptionContext(b"k" * 32, "aes_256")
+    with pytest.raises(DataEncryptionError):
+        aes.decrypt(EncryptionContext(b"k" * 32, "chacha20").encrypt(b"x"))
+    with pytest.raises(ValueError):
+        EncryptionContext(b"k" * 32, "rsa_2048")
+
+
+def test_context_is_picklable_for_process_pool():
+    context = EncryptionContext(os.urandom(32))
+    restored = pickle.loads(pickle.dumps(context))
+    assert restored.decrypt(context.encrypt(b"abc", b"id"), b"id") == b"abc"
+
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        results = executor.submit(
+            protect_chunk, context, FieldAnonymizer(), [("id", "text", True)]
+        ).result()
+    token, anonymized, size, error = results[0]
+    assert error is None and size == 4 and anonymized == ANONYMIZED
+    assert context.decrypt(token, b"id") == b"text"
+
+
+def test_field_anonymizer_rules():
+    anonymizer = FieldAnonymizer(salt=b"salt")
+    record = {
+        "first_name": "Иван",
+        "Email": "ivan@mail.ru",
+        "phone": "+7 (999) 123-45-67",
+        "passport": "4510 123456",
+        "birth_date": "1985-04-12",
+        "age": 39,
+        "children": [{"name": "Петя", "school": 5}],
+        "address": {"city": "Москва"},
+    }
+    result = anonymizer.anonymize(record)
+    assert result["first_name"] == ANONYMIZED
+    assert result["Email"] == "***@mail.ru"
+    assert result["phone"] == "***67"
+    assert result["passport"].startswith("anon_")
+    assert result["passport"] == anonymizer.anonymize(record)["passport"]
+    assert result["birth_date"] == "1985"
+    assert result["age"] == 39
+    assert result["children"] == [{"name": ANONYMIZED, "school": 5}]
+    assert result["address"] == ANONYMIZED
+    assert record["first_name"] == "Иван"  # исходные данные не меняются
+
+    custom = FieldAnonymizer([(r"^age$", "redact")])
+    assert list(custom.iter_anonymize([{"age": 1}, {"name": "x"}])) == [
+        {"age": ANONYMIZED},
+        {"name": "x"},
+    ]
+    with pytest.raises(ValueError):
+        FieldAnonymizer([("x", "unknown")])
+
+
+def test_async_api_uses_aead():
+    agent = DataProtectionAgent()
+
+    async def run():
+        encrypted = await agent._encrypt_data_async("данные", "a1")
+        anonymized = await agent._anonymize_data_async({"email": "a@b.ru"})
+        return encrypted, anonymized
+
+    encrypted, anonymized = asyncio.run(run())
+    assert agent._decrypt_data(encrypted, "a1") == "данные".encode()
+    assert anonymized == {"email": "***@b.ru"}
+
+
+def test_batch_protect_in_chunks():
+    agent = DataProtectionAgent(config={"batch_chunk_size": 16})
+    agent.backup_enabled = False
+    batch = _batch(100) + [{"data_id": "empty", "data": None}]
+    try:
+        results = asyncio.run(agent.batch_protect_data_async(batch))
+    finally:
+        agent.stop()
+    assert len(results) == 100
+    assert {r.data_id for r in results} == {
+        "item_{}".format(i) for i in range(100)
+    }
+    assert all(r.protection_status == DataStatus.ENCRYPTED for r in results)
+    assert all(r.encryption_method.value == "aes_256" for r in results)
+    stats = agent.last_batch_stats
+    assert stats["items"] == 100 and stats["chunks"] == 7
+    assert stats["bytes"] > 100 * 256
+
+
+@pytest.mark.performance
+def test_batch_throughput():
+    count, size = 20000, 4096
+    batch = _batch(count, size)
+    for executor in ("thread", "process"):
+        agent = DataProtectionAgent(
+            config={"batch_executor": executor, "batch_chunk_size": 512}
+        )
+        agent.backup_enabled = False
+        try:
+            results = asyncio.run(agent.batch_protect_data_async(batch))
+        finally:
+            agent.stop()
+        assert len(results) == count
+        stats = agent.last_batch_stats
+        assert stats["items"] == count and stats["bytes"] > count * size
+        assert stats["items_per_second"] > 2000
+        assert stats["mb_per_second"] > 8
+
+    context = EncryptionContext(os.urandom(32))
+    payload = os.urandom(16 << 20)
+    start = time.perf_counter()
+    context.encrypt(payload, b"bulk")
+    bulk = len(payload) / 1e6 / (time.perf_counter() - start)
+    assert bulk > 100
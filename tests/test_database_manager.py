@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для DatabaseManager (пул читателей, поток записи, WAL)
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from core.database import DatabaseManager  # noqa: E402
+
+
+@pytest.fixture
+def manager(tmp_path):
+    db = DatabaseManager(
+        config={
+            "db_path": str(tmp_path / "aladdin.db"),
+            "backup_path": str(tmp_path / "backups"),
+            "max_connections": 4,
+        }
+    )
+    assert db.initialize()
+    yield db
+    db.stop()
+
+
+def test_wal_mode_and_indexes(manager):
+    rows = manager.execute_query("PRAGMA journal_mode")
+    assert rows[0]["journal_mode"] == "wal"
+    indexes = {
+        row["name"]
+        for row in manager.execute_query(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"
+        )
+    }
+    assert "idx_metrics_name_time" in indexes
+    assert "idx_events_time" in indexes
+
+
+def test_metrics_are_parameterized_and_filtered(manager):
+    assert manager.add_metric("cpu", 10.0, component="core")
+    assert manager.add_metric("cpu", 20.0, component="api")
+    assert manager.add_metric("mem", 30.0, component="core")
+
+    assert len(manager.get_metrics(hours=1)) == 3
+    assert len(manager.get_metrics("cpu")) == 2
+    assert len(manager.get_metrics(component="core")) == 2
+    assert len(manager.get_metrics("cpu", "core")) == 1
+    # Строка вместо числа не попадает в текст запроса
+    with pytest.raises(ValueError):
+        manager.get_metrics(hours="1; DROP TABLE metrics")
+
+
+def test_failed_write_does_not_break_batch(manager):
+    good = [
+        manager.submit_update(
+            "INSERT INTO configurations (config_key, config_value)"
+            " VALUES (?, ?)",
+            ("k{}".format(i), "v"),
+        )
+        for i in range(5)
+    ]
+    duplicate = manager.submit_update(
+        "INSERT INTO configurations (config_key, config_value)"
+        " VALUES (?, ?)",
+        ("k0", "v"),
+    )
+    for future in good:
+        future.result(timeout=5)
+    with pytest.raises(Exception):
+        duplicate.result(timeout=5)
+    assert manager.get_configuration("k4") == "v"
+    assert manager.writer.stats["errors"] == 1
+
+
+def test_background_writes_and_streaming(manager):
+    metrics = [
+        {"metric_name": "latency", "metric_value": float(i), "tags": {"i": i}}
+        for i in range(2500)
+    ]
+    assert manager.add_metrics(metrics, wait=False)
+    for i in range(100):
+        manager.add_security_event(
+            "login", "low", "event {}".format(i), "test", wait=False
+        )
+    assert manager.flush()
+
+    streamed = list(manager.iter_metrics("latency", batch_size=100))
+    assert len(streamed) == 2500
+    assert len(manager.get_security_events(limit=1000)) == 100
+    stats = manager.get_database_stats()
+    assert stats["metrics_count"] == 2500
+    assert stats["pending_writes"] == 0
+
+
+def test_async_writes(manager):
+    async def run():
+        results = await asyncio.gather(
+            *(
+                manager.execute_update_async(
+                    "INSERT INTO metrics (metric_name, metric_value)"
+                    " VALUES (?, ?)",
+                    ("async", float(i)),
+                )
+                for i in range(200)
+            )
+        )
+        return results
+
+    assert all(asyncio.run(run()))
+    assert len(manager.get_metrics("async")) == 200
+
+
+def test_memory_database_is_shared_between_connections(tmp_path):
+    db = DatabaseManager(
+        config={"db_path": ":memory:", "backup_path": str(tmp_path / "b")}
+    )
+    assert db.initialize()
+    try:
+        assert db.set_configuration("mode", "test")
+        assert db.get_configuration("mode") == "test"
+    finally:
+        db.stop()
+
+
+def test_backup_with_wal(manager, tmp_path):
+    manager.add_metric("cpu", 1.0)
+    assert manager.create_backup()
+    backups = list((tmp_path / "backups").iterdir())
+    assert len(backups) == 1
+
+
+@pytest.mark.performance
+def test_write_throughput_and_read_latency(manager):
+    count = 5000
+    query = "INSERT INTO metrics (metric_name, metric_value) VALUES (?, ?)"
+
+    start = time.perf_counter()
+    for i in range(500):
+        manager.execute_update(query, ("sync", float(i)))
+    sync_rate = 500 / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    futures = [
+        manager.submit_update(query, ("grouped", float(i)))
+        for i in range(count)
+    ]
+    for future in futures:
+        future.result(timeout=30)
+    grouped_rate = count / (time.perf_counter() - start)
+
+    # Чтения из нескольких потоков во время непрерывной записи
+    latencies = []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            manager.add_metric("bg", float(i), wait=False)
+            i += 1
+            time.sleep(0.0005)
+
+    def reader():
+        local = []
+        for _ in range(100):
+            t0 = time.perf_counter()
+            manager.get_metrics("sync", hours=1)
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+
+    background = threading.Thread(target=writer)
+    background.start()
+    readers = [threading.Thread(target=reader) for _ in range(4)]
+    for thread in readers:
+        thread.start()
+    for thread in readers:
+        thread.join()
+    stop.set()
+    background.join()
+    manager.flush()
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    assert len(manager.get_metrics("grouped", hours=1)) == count
+    assert grouped_rate > sync_rate * 2
+    assert len(latencies) == 400
+    assert p50 < 50 and p99 < 500
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты конвейера кадров DeepfakeProtectionSystem (NumPy)
+"""
+
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.ai_agents.deepfake_protection_system import (  # noqa: E402
+    DeepfakeProtectionSystem,
+)
+
+HEIGHT, WIDTH = 48, 64
+
+
+@pytest.fixture
+def system():
+    system = DeepfakeProtectionSystem(
+        {"frame_height": HEIGHT, "frame_width": WIDTH}
+    )
+    yield system
+    system.close()
+
+
+def _stream(frames):
+    return np.ascontiguousarray(frames, dtype=np.uint8).tobytes()
+
+
+def _gradient_frames(count, flicker=0):
+    base = np.tile(
+        np.linspace(40, 200, WIDTH, dtype=np.float32), (HEIGHT, 1)
+    )
+    frames = np.empty((count, HEIGHT, WIDTH, 3), dtype=np.uint8)
+    for i in range(count):
+        level = base + (flicker if i % 2 else 0)
+        frames[i] = np.clip(level, 0, 255)[..., None].astype(np.uint8)
+    return frames
+
+
+def test_frames_are_zero_copy_views_with_stride(system):
+    source = _gradient_frames(100)
+    stream = _stream(source) + b"\x00" * 7  # незавершённый кадр
+    frames = system._extract_frames(stream)
+    assert frames.dtype == np.uint8
+    assert frames.shape == (10, HEIGHT, WIDTH, 3)
+    assert not frames.flags.owndata
+    assert np.shares_memory(frames, np.frombuffer(stream, dtype=np.uint8))
+    # Выборка равномерно покрывает весь поток
+    assert np.array_equal(frames[1], source[10])
+    assert np.array_equal(frames[-1], source[90])
+
+    short = system._extract_frames(_stream(source[:12]))
+    assert len(short) == 6 and np.array_equal(short[-1], source[10])
+    assert len(system._extract_frames(_stream(source[:7]))) == 7
+    assert len(system._extract_frames(b"tiny")) == 0
+
+
+def test_long_stream_sample_is_bounded(system):
+    source = _gradient_frames(1000)
+    frames = system._extract_frames(_stream(source))
+    assert len(frames) == system.max_analysis_frames
+    assert np.array_equal(frames[-1], source[900])
+
+
+def test_short_stream_gets_insufficient_data_verdict(system):
+    partial = _stream(_gradient_frames(1))[:-1]
+    result = asyncio.run(
+        system.analyze_video_call(partial, b"\x01\x02" * 800, "caller")
+    )
+    assert result["insufficient_data"]
+    assert result["confidence"] == 0.0 and result["risk_score"] == 0.5
+    detection = result["deepfake_detection"]
+    assert detection["risk_level"] == "unknown"
+    assert "insufficient_video_data" in detection["indicators"]
+    assert system.face_analyses == 0
+
+    system.frame_decoder = lambda data: _gradient_frames(0)
+    result = asyncio.run(system.analyze_video_call(b"encoded", b""))
+    assert result["insufficient_data"]
+
+    full = _stream(_gradient_frames(2))
+    system.frame_decoder = None
+    result = asyncio.run(system.analyze_video_call(full, b"\x01" * 100))
+    assert not result["insufficient_data"]
+
+
+def test_vectorized_metrics(system):
+    steady = _gradient_frames(10)
+    flicker = _gradient_frames(10, flicker=60)
+    assert system._assess_lighting_consistency(steady) == 1.0
+    assert system._assess_temporal_consistency(steady) == 1.0
+    assert system._assess_lighting_consistency(flicker) < 0.5
+    assert system._assess_temporal_consistency(flicker) < 0.8
+    assert system._assess_background_stability(flicker) < 0.5
+
+    blocky = np.repeat(
+        np.repeat(
+            np.random.default_rng(1).integers(
+                0, 255, (2, HEIGHT // 8, WIDTH // 8, 3), dtype=np.uint8
+            ),
+            8,
+            axis=1,
+        ),
+        8,
+        axis=2,
+    )
+    assert system._assess_compression_artifacts(blocky) > 0.9
+    assert system._assess_compression_artifacts(steady) < 0.1
+
+
+def test_analyze_video_call_decodes_once(system):
+    stream = _stream(_gradient_frames(50))
+    calls = []
+    original = system._extract_frames
+
+    def counting(video_stream):
+        calls.append(1)
+        return original(video_stream)
+
+    system._extract_frames = counting
+    result = asyncio.run(
+        system.analyze_video_call(stream, b"\x01\x02" * 800, "caller")
+    )
+    assert len(calls) == 1
+    video = result["video_analysis"]
+    assert video.frame_count == 10
+    assert video.resolution == (HEIGHT, WIDTH)
+    assert video.lighting_consistency == 1.0
+    assert result["face_analysis"].face_detected
+
+
+def test_custom_decoder(system):
+    system.frame_decoder = lambda data: _gradient_frames(3)
+    frames = system._extract_frames(b"encoded container")
+    assert frames.shape == (3, HEIGHT, WIDTH, 3)
+
+
+@pytest.mark.performance
+def test_frame_pipeline_throughput():
+    system = DeepfakeProtectionSystem(
+        {"frame_height": 480, "frame_width": 640}
+    )
+    rng = np.random.default_rng(0)
+    stream = rng.integers(
+        0, 255, (60, 480, 640, 3), dtype=np.uint8
+    ).tobytes()
+    calls = 20
+
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    async def run():
+        for _ in range(calls):
+            await system.analyze_video_call(stream, b"\x00" * 32000)
+
+    asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    system.close()
+
+    frames = calls * system.max_analysis_frames
+    assert system.frames_decoded == frames
+    assert peak < 64 * 1024 * 1024
+    assert elapsed / calls < 1.0
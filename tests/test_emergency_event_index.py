@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для индексов событий EmergencyEventManager
+"""
+
+import itertools
+import logging
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.ai_agents.emergency_id_generator import (  # noqa: E402
+    EmergencyIDGenerator,
+)
+from security.ai_agents.emergency_models import (  # noqa: E402
+    EmergencyEvent,
+    EmergencySeverity,
+    EmergencyType,
+    ResponseStatus,
+)
+from security.managers.emergency_event_index import haversine_km  # noqa
+from security.managers.emergency_event_manager import (  # noqa: E402
+    EmergencyEventManager,
+)
+
+CITIES = [
+    ("Москва", 55.7558, 37.6173),
+    ("Санкт-Петербург", 59.9343, 30.3351),
+    ("Казань", 55.7963, 49.1088),
+]
+
+
+def _event(number, rng, now, max_age_hours=24 * 60):
+    city, lat, lon = rng.choice(CITIES)
+    timestamp = now - timedelta(hours=rng.uniform(0, max_age_hours))
+    status = rng.choice(list(ResponseStatus))
+    return EmergencyEvent(
+        event_id="emerg_{}".format(number),
+        emergency_type=rng.choice(list(EmergencyType)),
+        severity=rng.choice(list(EmergencySeverity)),
+        location={
+            "lat": lat + rng.uniform(-0.2, 0.2),
+            "lon": lon + rng.uniform(-0.2, 0.2),
+            "country": "Россия",
+            "city": city,
+        },
+        description="событие {}".format(number),
+        user_id=rng.choice(["user_{}".format(i) for i in range(20)] + [None]),
+        timestamp=timestamp,
+        status=status,
+        resolved_at=(
+            timestamp + timedelta(minutes=rng.uniform(1, 90))
+            if status == ResponseStatus.RESOLVED
+            else None
+        ),
+    )
+
+
+def _manager(count, seed=1, **kwargs):
+    manager = EmergencyEventManager()
+    manager.logger.setLevel(logging.WARNING)
+    rng = random.Random(seed)
+    now = datetime.now()
+    for number in range(count):
+        manager._store_event(_event(number, rng, now, **kwargs))
+    return manager
+
+
+def _ids(events):
+    return sorted(event.event_id for event in events)
+
+
+def _scan(manager, predicate):
+    return _ids(e for e in manager.events.values() if predicate(e))
+
+
+def _assert_matches_scan(manager):
+    for emergency_type in EmergencyType:
+        assert _ids(manager.get_events_by_type(emergency_type)) == _scan(
+            manager, lambda e: e.emergency_type == emergency_type
+        )
+    for severity in EmergencySeverity:
+        assert _ids(manager.get_events_by_severity(severity)) == _scan(
+            manager, lambda e: e.severity == severity
+        )
+    for status in ResponseStatus:
+        assert _ids(manager.get_events_by_status(status)) == _scan(
+            manager, lambda e: e.status == status
+        )
+    assert _ids(manager.get_events_by_user("user_3")) == _scan(
+        manager, lambda e: e.user_id == "user_3"
+    )
+
+    cutoff = datetime.now() - timedelta(hours=72)
+    recent = manager.get_recent_events(hours=72)
+    assert [e.timestamp for e in recent] == sorted(
+        e.timestamp for e in recent
+    )
+    assert _ids(recent) == _scan(manager, lambda e: e.timestamp >= cutoff)
+
+    analytics = manager.get_advanced_analytics()
+    events = list(manager.events.values())
+    hotspots = {}
+    for event in events:
+        key = (
+            round(event.location["lat"], 2),
+            round(event.location["lon"], 2),
+        )
+        hotspots[key] = hotspots.get(key, 0) + 1
+    top = sorted(hotspots.values(), reverse=True)[:10]
+    assert [h["event_count"] for h in analytics["hotspots"]] == top
+    days = {}
+    for event in events:
+        day = event.timestamp.strftime("%Y-%m-%d")
+        days[day] = days.get(day, 0) + 1
+    assert analytics["trends"]["daily_distribution"] == days
+    resolved = sorted(
+        (e.resolved_at - e.timestamp).total_seconds()
+        for e in events
+        if e.status == ResponseStatus.RESOLVED
+    )
+    times = analytics["response_times"]
+    assert times["median"] == resolved[len(resolved) // 2]
+    assert times["average"] == pytest.approx(sum(resolved) / len(resolved))
+    users = analytics["user_activity"]["user_distribution"]
+    assert sum(users.values()) == sum(1 for e in events if e.user_id)
+    assert analytics["geographic_distribution"]["cities"] == {
+        city: sum(1 for e in events if e.location["city"] == city)
+        for city, _, _ in CITIES
+    }
+    statistics = manager.get_event_statistics()
+    assert statistics["total_events"] == len(events)
+    assert sum(statistics["severity_statistics"].values()) == len(events)
+
+
+def test_indexes_follow_create_update_delete_cleanup():
+    manager = _manager(3000)
+    _assert_matches_scan(manager)
+
+    ids = list(manager.events)
+    for event_id in ids[:300]:
+        manager.update_event_status(event_id, ResponseStatus.RESOLVED)
+    for event_id in ids[300:400]:
+        manager.update_event_status(event_id, ResponseStatus.CANCELLED)
+    manager.update_event_from_api(
+        ids[400], {"location": {"lat": 0.5, "lon": 0.5, "city": "Казань"}}
+    )
+    assert manager.get_nearby_events(0.5, 0.5, 1)[0].event_id == ids[400]
+    manager.update_event_from_api(
+        ids[400], {"location": {"lat": 55.0, "lon": 37.0, "city": "Москва"}}
+    )
+    for event_id in ids[500:600]:
+        assert manager.delete_event_from_api(event_id)["success"]
+    _assert_matches_scan(manager)
+
+    removed = manager.cleanup_old_events(days=30)
+    assert removed > 0
+    assert all(
+        e.timestamp >= datetime.now() - timedelta(days=30, minutes=1)
+        for e in manager.events.values()
+    )
+    _assert_matches_scan(manager)
+
+    assert manager.clear_all_events() == 3000 - 100 - removed
+    assert len(manager._index) == 0
+    assert manager.get_events_by_type(EmergencyType.FIRE) == []
+    assert manager.get_advanced_analytics()["hotspots"] == []
+
+
+def test_created_and_imported_events_are_indexed(tmp_path, monkeypatch):
+    counter = itertools.count()
+    monkeypatch.setattr(
+        EmergencyIDGenerator,
+        "create_event_id",
+        staticmethod(lambda: "emerg_new_{}".format(next(counter))),
+    )
+    manager = EmergencyEventManager()
+    source = _manager(50)
+    path = str(tmp_path / "events.json")
+    assert source.export_events(path)
+
+    for _ in range(5):
+        manager.create_event(
+            EmergencyType.FIRE,
+            EmergencySeverity.HIGH,
+            {"lat": 55.75, "lon": 37.61, "city": "Москва"},
+            "Пожар в здании, нужна помощь",
+            user_id="user_new",
+        )
+    assert manager.import_events(path) == 50
+    # Повторный импорт заменяет события с теми же ID
+    assert manager.import_events(path) == 50
+    assert len(manager._index) == len(manager.events) == 55
+    assert len(manager.get_events_by_user("user_new")) == 5
+    assert len(manager.get_recent_events(hours=1)) >= 5
+    _assert_matches_scan(manager)
+
+
+def test_nearby_events_match_haversine_scan():
+    manager = _manager(5000, seed=7)
+    for lat, lon, radius in (
+        (55.7558, 37.6173, 2),
+        (55.7558, 37.6173, 15),
+        (59.9, 30.3, 40),
+        (55.8, 49.1, 0.5),
+        (0.0, 0.0, 50),
+        (57.0, 40.0, 1500),
+    ):
+        nearby = manager.get_nearby_events(lat, lon, radius)
+        distances = [
+            haversine_km(lat, lon, e.location["lat"], e.location["lon"])
+            for e in nearby
+        ]
+        assert distances == sorted(distances)
+        assert _ids(nearby) == _scan(
+            manager,
+            lambda e: haversine_km(
+                lat, lon, e.location["lat"], e.location["lon"]
+            )
+            <= radius,
+        )
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для матрицы разрешений, журнала сообщений и пакетного ML анализа
+FamilyCommunicationHub
+"""
+
+import asyncio
+import itertools
+import logging
+import os
+import random
+import sys
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.family.family_communication_hub_enhanced import (  # noqa
+    CommunicationChannel,
+    CommunicationRule,
+    FamilyCommunicationHub,
+    FamilyMember,
+    FamilyRole,
+    Message,
+    MessagePriority,
+    MessageType,
+)
+
+MEMBERS = [
+    ("parent_1", FamilyRole.PARENT),
+    ("parent_2", FamilyRole.PARENT),
+    ("child_1", FamilyRole.CHILD),
+    ("child_2", FamilyRole.CHILD),
+    ("grandma", FamilyRole.ELDERLY),
+    ("guardian", FamilyRole.GUARDIAN),
+]
+
+_ids = itertools.count()
+
+
+def _message(sender, recipients, message_type=MessageType.TEXT,
+             channel=CommunicationChannel.INTERNAL, timestamp=None):
+    return Message(
+        id="msg_{}".format(next(_ids)),
+        sender_id=sender,
+        recipient_ids=list(recipients),
+        content="Привет! Как дела? Забери меня в 17:00.",
+        message_type=message_type,
+        priority=MessagePriority.NORMAL,
+        timestamp=timestamp or datetime.now(),
+        channel=channel,
+    )
+
+
+async def _hub():
+    hub = FamilyCommunicationHub("family_test")
+    hub.logger.setLevel(logging.WARNING)
+    for member_id, role in MEMBERS:
+        await hub.add_family_member(
+            FamilyMember(id=member_id, name=member_id, role=role)
+        )
+    return hub
+
+
+def _rules_allow(hub, message):
+    """Проверка по правилам без матрицы (прежний алгоритм)"""
+    sender = hub.members.get(message.sender_id)
+    if not sender:
+        return False
+    roles = [
+        hub.members[rid].role
+        for rid in message.recipient_ids
+        if rid in hub.members
+    ]
+    return any(
+        rule.is_active
+        and sender.role in rule.sender_roles
+        and any(role in rule.recipient_roles for role in roles)
+        and message.message_type in rule.allowed_message_types
+        and message.channel in rule.allowed_channels
+        for rule in hub.rules
+    )
+
+
+def _all_messages():
+    member_ids = [member_id for member_id, _ in MEMBERS] + ["stranger"]
+    for sender in member_ids:
+        for recipient in member_ids:
+            for message_type in MessageType:
+                for channel in CommunicationChannel:
+                    yield _message(sender, [recipient], message_type, channel)
+
+
+def test_permission_matrix_matches_rules_and_follows_changes():
+    async def run():
+        hub = await _hub()
+        assert all(
+            hub._check_communication_rules(m) == _rules_allow(hub, m)
+            for m in _all_messages()
+        )
+
+        guardian_rule = CommunicationRule(
+            id="guardian_push",
+            name="Guardian",
+            description="Опекун может писать детям в push",
+            sender_roles=[FamilyRole.GUARDIAN],
+            recipient_roles=[FamilyRole.CHILD],
+            allowed_message_types=[MessageType.TEXT, MessageType.LOCATION],
+            allowed_channels=[CommunicationChannel.PUSH],
+        )
+        message = _message(
+            "guardian", ["child_1"], channel=CommunicationChannel.PUSH
+        )
+        assert not hub._check_communication_rules(message)
+        hub.add_communication_rule(guardian_rule)
+        assert hub._check_communication_rules(message)
+        # Хотя бы один получатель с разрешенной ролью
+        assert hub._check_communication_rules(
+            _message(
+                "guardian",
+                ["parent_1", "stranger", "child_2"],
+                channel=CommunicationChannel.PUSH,
+            )
+        )
+        results = [
+            (hub._check_communication_rules(m), _rules_allow(hub, m))
+            for m in _all_messages()
+        ]
+        assert all(new == old for new, old in results)
+        assert any(new for new, _ in results)
+
+        assert hub.set_rule_active(hub.rules[0].id, False)
+        assert not hub._check_communication_rules(
+            _message("child_1", ["parent_1"], MessageType.EMERGENCY)
+        )
+        assert hub.remove_communication_rule("guardian_push")
+        assert not hub.remove_communication_rule("guardian_push")
+        assert not hub._check_communication_rules(message)
+        assert all(
+            hub._check_communication_rules(m) == _rules_allow(hub, m)
+            for m in _all_messages()
+        )
+        await hub.shutdown()
+
+    asyncio.run(run())
+
+
+def test_messages_are_paged_newest_first_with_cursor():
+    async def run():
+        hub = await _hub()
+        rng = random.Random(5)
+        senders = ["parent_1", "parent_2", "child_1", "grandma"]
+        recipients = ["parent_1", "child_1", "child_2", "grandma"]
+        start = datetime.now() - timedelta(hours=3)
+        for i in range(600):
+            sender = rng.choice(senders)
+            message = _message(
+                sender,
+                rng.sample([r for r in recipients if r != sender], 2),
+                rng.choice([MessageType.TEXT, MessageType.IMAGE]),
+                timestamp=start + timedelta(seconds=i * 10),
+            )
+            assert await hub.send_message(message)
+        assert len(hub.messages) == 600
+
+        everything = list(hub.messages)
+        for filters in (
+            {},
+            {"sender_id": "child_1"},
+            {"recipient_id": "grandma"},
+            {"message_type": MessageType.IMAGE},
+            {
+                "sender_id": "parent_1",
+                "recipient_id": "child_2",
+                "message_type": MessageType.TEXT,
+            },
+        ):
+            expected = [
+                m
+                for m in reversed(everything)
+                if m.sender_id == filters.get("sender_id", m.sender_id)
+                and filters.get("recipient_id", m.recipient_ids[0])
+                in m.recipient_ids
+                and m.message_type
+                == filters.get("message_type", m.message_type)
+            ]
+            pages, cursor = [], None
+            while True:
+                page = await hub.get_messages_page(
+                    limit=25, cursor=cursor, **filters
+                )
+                pages.extend(page["messages"])
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+            assert pages == expected
+            assert await hub.get_messages(limit=10, **filters) == (
+                expected[:10]
+            )
+
+        assert await hub.get_messages(sender_id="nobody") == []
+        assert [m.id for m in hub.messages.since(
+            start + timedelta(seconds=5975)
+        )] == [m.id for m in everything[-2:]]
+        assert hub.messages.get(everything[10].id) is everything[10]
+        await hub.shutdown()
+
+    asyncio.run(run())
+
+
+def _training_data(count=200):
+    rng = random.Random(1)
+    now = datetime.now()
+    return [
+        {
+            "content": "сообщение " + "!" * rng.randint(0, 5),
+            "timestamp": now - timedelta(minutes=rng.randint(0, 600)),
+            "priority": rng.randint(1, 4),
+            "message_type": "text",
+            "sender_id": "parent_1",
+            "sentiment": rng.randint(0, 1),
+        }
+        for _ in range(count)
+    ]
+
+
+def test_ml_analysis_runs_in_background_batches():
+    async def run():
+        hub = await _hub()
+        hub.ml_batch_size = 32
+        assert await hub.train_ml_models(_training_data())
+        assert hub.ml_analyzer.is_trained
+
+        messages = [_message("parent_1", ["child_1"]) for _ in range(100)]
+        for message in messages:
+            assert await hub.send_message(message)
+        # Доставка не ждет анализа
+        assert not any("sentiment" in m.metadata for m in messages)
+
+        await asyncio.wait_for(hub.wait_ml_idle(), timeout=30)
+        assert all(
+            "sentiment" in m.metadata and "anomaly_score" in m.metadata
+            for m in messages
+        )
+        assert hub.stats["ml_analyzed"] == 100
+        assert hub.stats["ml_batches"] == 4
+
+        # Остаток очереди анализируется при остановке
+        tail = _message("parent_1", ["child_1"])
+        await hub.send_message(tail)
+        await hub.shutdown()
+        assert "sentiment" in tail.metadata
+        assert all(task.done() for task in asyncio.all_tasks()
+                   if task is not asyncio.current_task())
+
+    asyncio.run(run())
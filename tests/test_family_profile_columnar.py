@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для индексов, колоночной таблицы членов семей и пакетного ML
+анализа сообщений FamilyProfileManagerEnhanced
+"""
+
+import logging
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.family.family_profile_manager_enhanced import (  # noqa: E402
+    AgeGroup,
+    FamilyMember,
+    FamilyProfileManagerEnhanced,
+    FamilyRole,
+    MessagePriority,
+)
+
+ROLES = list(FamilyRole)
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "logs").mkdir()
+    manager = FamilyProfileManagerEnhanced({"ml_batch_size": 32})
+    manager.logger.setLevel(logging.CRITICAL)
+    yield manager
+    manager.shutdown()
+
+
+def _loop_distribution(family, attribute):
+    # Прежний подсчет обходом всех членов семьи
+    distribution = {}
+    for member in family.members.values():
+        value = getattr(member, attribute).value
+        distribution[value] = distribution.get(value, 0) + 1
+    return distribution
+
+
+def _populate(manager, families, members, seed=1):
+    rng = random.Random(seed)
+    for f in range(families):
+        family_id = "family_{}".format(f)
+        manager.create_family(family_id, "Семья {}".format(f))
+        for m in range(members):
+            role = rng.choice(ROLES) if rng.random() < 0.3 else None
+            manager.add_family_member(
+                family_id,
+                "member_{}_{}".format(f, m),
+                "Член {}".format(m),
+                rng.randint(1, 90),
+                role,
+            )
+    return rng
+
+
+def test_family_indexes_match_member_loop(manager):
+    rng = _populate(manager, 5, 12)
+    family = manager.families["family_0"]
+    assert not manager.add_family_member("family_0", "member_0_0", "Дубль", 30)
+
+    for _ in range(200):
+        family_id = "family_{}".format(rng.randrange(5))
+        family = manager.families[family_id]
+        member_id = rng.choice(list(family.members) or ["missing"])
+        action = rng.random()
+        if action < 0.2:
+            manager.remove_family_member(family_id, member_id)
+        elif action < 0.4:
+            manager.add_family_member(
+                family_id,
+                "extra_{}".format(rng.random()),
+                "Новый",
+                rng.randint(1, 90),
+            )
+        else:
+            manager.update_family_member(
+                family_id,
+                member_id,
+                age=rng.randint(1, 90) if rng.random() < 0.5 else None,
+                role=rng.choice(ROLES) if rng.random() < 0.5 else None,
+                is_active=rng.random() < 0.7,
+            )
+
+    for family_id, family in manager.families.items():
+        stats = manager.get_family_statistics(family_id)
+        for key, attribute in (
+            ("age_distribution", "age_group"),
+            ("role_distribution", "role"),
+        ):
+            expected = _loop_distribution(family, attribute)
+            assert stats[key] == expected
+            assert list(stats[key]) == list(expected)
+        assert stats["active_members"] == sum(
+            m.is_active for m in family.members.values()
+        )
+        for role in ROLES:
+            assert manager.get_family_members_by_role(family_id, role) == [
+                m for m in family.members.values() if m.role == role
+            ]
+
+    members = [
+        m for family in manager.families.values()
+        for m in family.members.values()
+    ]
+    system = manager.get_system_statistics()
+    assert system["total_members"] == len(members)
+    assert system["active_members"] == sum(m.is_active for m in members)
+    assert system["role_distribution"] == dict(
+        Counter(m.role.value for m in members)
+    )
+    assert system["age_distribution"] == dict(
+        Counter(m.age_group.value for m in members)
+    )
+    assert system["average_age"] == pytest.approx(
+        sum(m.age for m in members) / len(members)
+    )
+
+
+def test_member_table_queries_and_group_cleanup(manager):
+    manager.create_family("smith", "Смиты")
+    manager.create_family("ivanov", "Ивановы")
+    manager.add_family_member("smith", "grandma", "Бабушка", 70)
+    manager.add_family_member("smith", "kid", "Малыш", 2)
+    manager.add_family_member("ivanov", "dad", "Папа", 40)
+    manager.add_family_member("ivanov", "kid", "Сын", 10)
+
+    table = manager.member_table
+    assert table.families_with(FamilyRole.ELDERLY) == ["smith"]
+    assert sorted(table.families_with(role=FamilyRole.CHILD)) == [
+        "ivanov",
+        "smith",
+    ]
+    assert table.families_with(age_group=AgeGroup.TODDLER) == ["smith"]
+
+    manager.update_member_security_level("ivanov", "kid", 3)
+    assert manager.get_system_statistics()[
+        "security_level_distribution"
+    ] == {1: 1, 2: 1, 3: 1, 4: 1}
+
+    manager.create_family_group("smith", "care", "Уход")
+    manager.add_member_to_group("smith", "care", "grandma")
+    assert manager.remove_family_member("smith", "grandma")
+    assert not manager.remove_family_member("smith", "grandma")
+    assert "grandma" not in manager.families["smith"].groups["care"].members
+    assert "grandma" not in manager.member_groups
+    assert table.families_with(FamilyRole.ELDERLY) == []
+
+    manager.update_family_member("ivanov", "dad", is_active=False)
+    assert table.select(FamilyRole.PARENT, active=False) == [
+        ("ivanov", "dad")
+    ]
+    assert manager.get_system_statistics()["active_members"] == 2
+    # Освобожденный слот занимает новый член семьи
+    manager.add_family_member("ivanov", "mom", "Мама", 38)
+    assert len(table) == 4 and table._size == 4
+
+    # Члены семьи, добавленные в обход менеджера, учитываются
+    family = manager.families["smith"]
+    family.members["guest"] = FamilyMember(
+        id="guest",
+        name="Гость",
+        age=30,
+        role=FamilyRole.GUARDIAN,
+        age_group=AgeGroup.ADULT,
+    )
+    assert manager.get_family_statistics("smith")["role_distribution"] == {
+        "child": 1,
+        "guardian": 1,
+    }
+    assert ("smith", "guest") in table
+
+
+def test_messages_scored_in_background_batches(manager):
+    assert manager.initialize()
+    manager.create_family("family", "Семья")
+    ids = [
+        manager.send_message(
+            "sender",
+            ["a", "b"][: 1 + i % 2],
+            "Привет! Как дела?" * (1 + i % 5),
+            family_id="family",
+        )
+        for i in range(100)
+    ]
+    urgent = manager.send_message("sender", ["a"], "URGENT: call back")
+    emergency = manager.send_message("sender", ["a"], "Emergency!")
+    # Приоритет по ключевым словам известен сразу после отправки
+    assert manager.messages[urgent].priority == MessagePriority.HIGH
+    assert manager.messages[emergency].priority == MessagePriority.EMERGENCY
+
+    assert manager.wait_ml_idle(timeout=10)
+    for message_id in ids + [urgent, emergency]:
+        metadata = manager.messages[message_id].metadata
+        assert metadata["cluster"] in (0, 1)
+        assert isinstance(metadata["anomaly_score"], float)
+    assert manager.ml_analyzed_messages == 102
+    assert manager.ml_batches < 102
+    assert manager.get_system_statistics()["ml_queue_size"] == 0
+
+    # Пакетные признаки совпадают с признаками одного сообщения
+    messages = [manager.messages[i] for i in ids[:10]]
+    features = manager._extract_messages_features(messages)
+    assert features.tolist() == [
+        manager._extract_message_features(m) for m in messages
+    ]
+
+    # Остановка дорабатывает очередь
+    manager.ml_batch_delay = 10
+    last = manager.send_message("sender", ["a"], "Последнее")
+    time.sleep(0.1)
+    start = time.perf_counter()
+    manager.shutdown()
+    assert time.perf_counter() - start < 10
+    assert not manager._ml_thread
+    assert "anomaly_score" in manager.messages[last].metadata
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для очереди запланированных напоминаний
+FamilyNotificationManagerEnhanced
+"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.family.family_notification_manager_enhanced import (  # noqa
+    FamilyNotificationManagerEnhanced,
+    NotificationType,
+)
+
+
+def _reminder(family_id, seconds, reminder_type="trial_reminder", **metadata):
+    return {
+        "family_id": family_id,
+        "reminder_type": reminder_type,
+        "scheduled_time": datetime.now() + timedelta(seconds=seconds),
+        "metadata": metadata or {"days_left": 3, "subscription_tier": "basic"},
+    }
+
+
+def _record_sends(manager, success=lambda reminder: True, delay=0.0):
+    sent = []
+    active = {"now": 0, "max": 0}
+
+    async def send(reminder):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            sent.append(reminder["family_id"])
+            return success(reminder)
+        finally:
+            active["now"] -= 1
+
+    manager._send_scheduled_reminder = send
+    return sent, active
+
+
+def test_only_due_reminders_sent_in_order_and_removed():
+    manager = FamilyNotificationManagerEnhanced(schedule_store_path=None)
+
+    async def run():
+        await manager.schedule_subscription_reminders(
+            [
+                _reminder("f3", -1),
+                _reminder("future", 3600),
+                _reminder("f1", -30),
+                _reminder("f2", -10, "subscription_expiring", days_left=2),
+            ]
+        )
+        first = await manager.process_scheduled_notifications()
+        second = await manager.process_scheduled_notifications()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert (first, second) == (3, 0)
+    assert [
+        r["family_id"] for r in manager.scheduled_notifications.values()
+    ] == ["future"]
+    # Реально отправлены уведомления нужных типов и в порядке сроков
+    sent = [
+        (n.family_id, n.notification_type)
+        for n in manager.notifications.values()
+    ]
+    assert sent == [
+        ("f1", NotificationType.TRIAL_REMINDER),
+        ("f2", NotificationType.SUBSCRIPTION_EXPIRING),
+        ("f3", NotificationType.TRIAL_REMINDER),
+    ]
+    stats = manager.get_schedule_stats()
+    assert stats["pending"] == 1 and stats["total_sent"] == 3
+    assert stats["queue_lag_seconds"] == 0.0
+    assert stats["last_tick"]["due"] == 0
+
+
+def test_failed_reminders_retried_then_dropped():
+    manager = FamilyNotificationManagerEnhanced(schedule_store_path=None)
+    manager.retry_delay_seconds = 0
+    _record_sends(manager, success=lambda r: r["family_id"] == "ok")
+
+    async def run():
+        await manager.schedule_subscription_reminders(
+            [_reminder("ok", -1), _reminder("bad", -1)]
+        )
+        return [
+            await manager.process_scheduled_notifications()
+            for _ in range(manager.retry_attempts + 1)
+        ]
+
+    assert asyncio.run(run()) == [1, 0, 0, 0]
+    stats = manager.get_schedule_stats()
+    assert stats["pending"] == 0
+    assert stats["total_failed"] == 1
+    assert stats["total_retried"] == manager.retry_attempts - 1
+
+
+def test_sends_are_concurrent_and_bounded_per_channel():
+    manager = FamilyNotificationManagerEnhanced(schedule_store_path=None)
+    manager.scheduled_batch_size = 20
+    sent, active = _record_sends(manager, delay=0.01)
+
+    async def run():
+        await manager.schedule_subscription_reminders(
+            [_reminder("f{}".format(i), -1) for i in range(100)]
+        )
+        start = time.perf_counter()
+        count = await manager.process_scheduled_notifications()
+        return count, time.perf_counter() - start
+
+    count, elapsed = asyncio.run(run())
+    assert count == 100 and len(sent) == 100
+    assert active["max"] == 20
+    # 5 пакетов по 10 мс вместо 100 последовательных отправок
+    assert elapsed < 0.5
+
+
+def test_schedule_survives_restart_and_cancel(tmp_path):
+    path = str(tmp_path / "reminders.jsonl")
+    manager = FamilyNotificationManagerEnhanced(schedule_store_path=path)
+
+    async def schedule():
+        await manager.schedule_subscription_reminders(
+            [_reminder("due", -5), _reminder("later", 3600)]
+        )
+        await manager.schedule_subscription_reminder(
+            "cancelled", "trial_reminder",
+            datetime.now() + timedelta(hours=2), {"days_left": 1},
+        )
+        await manager.process_scheduled_notifications()
+
+    asyncio.run(schedule())
+    cancelled = [
+        r["reminder_id"]
+        for r in manager.scheduled_notifications.values()
+        if r["family_id"] == "cancelled"
+    ]
+    assert manager.cancel_scheduled_reminder(cancelled[0])
+    assert not manager.cancel_scheduled_reminder(cancelled[0])
+
+    restarted = FamilyNotificationManagerEnhanced(schedule_store_path=path)
+    pending = list(restarted.scheduled_notifications.values())
+    assert [r["family_id"] for r in pending] == ["later"]
+    assert isinstance(pending[0]["scheduled_time"], datetime)
+    assert pending[0]["metadata"] == {
+        "days_left": 3,
+        "subscription_tier": "basic",
+    }
+
+
+def test_reminder_cancelled_during_failed_send_is_not_requeued():
+    manager = FamilyNotificationManagerEnhanced()
+    manager.retry_delay_seconds = 0
+
+    async def send(reminder):
+        await asyncio.sleep(0.01)
+        return False
+
+    manager._send_scheduled_reminder = send
+
+    async def run():
+        await manager.schedule_subscription_reminders(
+            [_reminder("cancelled", -1), _reminder("retried", -1)]
+        )
+        ids = {
+            r["family_id"]: r["reminder_id"]
+            for r in manager.scheduled_notifications.values()
+        }
+        tick = asyncio.create_task(manager.process_scheduled_notifications())
+        await asyncio.sleep(0)
+        assert manager.cancel_scheduled_reminder(ids["cancelled"])
+        assert await tick == 0
+        return ids
+
+    ids = asyncio.run(run())
+    assert manager.reminder_queue.store is None
+    assert list(manager.scheduled_notifications) == [ids["retried"]]
+    assert manager.get_schedule_stats()["total_retried"] == 1
+
+
+def test_reminders_return_to_queue_when_send_raises():
+    manager = FamilyNotificationManagerEnhanced()
+
+    async def broken(reminder):
+        raise RuntimeError("канал недоступен")
+
+    async def run():
+        await manager.schedule_subscription_reminders(
+            [_reminder("f{}".format(i), -10 + i) for i in range(3)]
+        )
+        manager._send_scheduled_reminder = broken
+        first = await manager.process_scheduled_notifications()
+        oldest = manager.reminder_queue.oldest_time()
+        _record_sends(manager)
+        second = await manager.process_scheduled_notifications()
+        return first, oldest, second
+
+    first, oldest, second = asyncio.run(run())
+    # После ошибки напоминания снова в куче и уходят следующим тиком
+    assert (first, second) == (0, 3)
+    assert oldest is not None and oldest <= datetime.now()
+    assert len(manager.reminder_queue) == 0
+
+
+def test_queue_lag_reported_in_stats():
+    manager = FamilyNotificationManagerEnhanced(schedule_store_path=None)
+    manager.max_reminders_per_tick = 2
+
+    async def run():
+        await manager.schedule_subscription_reminders(
+            [_reminder("f{}".format(i), -60 + i) for i in range(5)]
+        )
+        await manager.process_scheduled_notifications()
+        return await manager.get_notification_stats()
+
+    stats = asyncio.run(run())
+    schedule = stats["schedule"]
+    assert stats["scheduled_notifications"] == schedule["pending"] == 3
+    assert 57 <= schedule["queue_lag_seconds"] < 60
+    assert schedule["last_tick"]["sent"] == 2
+    assert schedule["last_tick"]["lag_max_seconds"] >= 59
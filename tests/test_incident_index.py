@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Тесты для многомерного индекса инцидентов (IncidentIndex)
+"""
+
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from core.base import SecurityLevel  # noqa: E402
+from security.ai_agents.incident_index import (  # noqa: E402
+    IncidentIndex,
+    TimeIndex,
+)
+from security.ai_agents.incident_response_agent import (  # noqa: E402
+    Incident,
+    IncidentPriority,
+    IncidentResponseManager,
+    IncidentStatus,
+    IncidentType,
+)
+
+STATUSES = ("open", "investigating", "resolved")
+PRIORITIES = ("low", "medium", "high", "critical")
+
+
+def _fill(index, count, seed=1):
+    rnd = random.Random(seed)
+    records = {}
+    for i in range(count):
+        keys = {
+            "status": rnd.choice(STATUSES),
+            "priority": rnd.choice(PRIORITIES),
+            "incident_type": "t{}".format(i % 5),
+            "assigned_to": rnd.choice(("tier1", "tier2", None)),
+        }
+        created = float(rnd.randrange(100000))
+        records["i{}".format(i)] = (keys, created)
+        index.add("i{}".format(i), keys, created)
+    return records
+
+
+def _brute(records, created_from=None, created_to=None, **filters):
+    result = []
+    for incident_id, (keys, created) in records.items():
+        if created_from is not None and created < created_from:
+            continue
+        if created_to is not None and created > created_to:
+            continue
+        if all(
+            keys[field] in (value if isinstance(value, list) else [value])
+            for field, value in filters.items()
+        ):
+            result.append((created, incident_id))
+    return sorted(result)
+
+
+def test_index_matches_brute_force():
+    index = IncidentIndex()
+    records = _fill(index, 3000)
+    queries = [
+        {},
+        {"status": "open"},
+        {"status": "open", "priority": "high"},
+        {"status": "resolved", "created_from": 1000.0, "created_to": 1500.0},
+        {"priority": ["high", "critical"], "assigned_to": "tier1"},
+        {"status": ["open", "investigating"], "incident_type": "t3"},
+        {"incident_type": "t1", "created_to": 50000.0},
+        {"status": "open", "priority": "low", "created_from": 90000.0},
+        {"status": "missing"},
+    ]
+    for query in queries:
+        expected = _brute(records, **query)
+        ids = index.query(**query)
+        assert [records[i][1] for i in ids] == [c for c, _ in expected]
+        assert set(ids) == {i for _, i in expected}
+        assert index.count(**query) == len(expected)
+
+    pages = list(index.iter_pages(100, status="open", priority="high"))
+    assert sum(pages, []) == index.query(status="open", priority="high")
+    assert all(len(page) == 100 for page in pages[:-1])
+    assert index.query(offset=10, limit=5) == index.query()[10:15]
+    assert index.query(status="open", offset=3, limit=2) == (
+        index.query(status="open")[3:5]
+    )
+
+
+def test_time_index_blocks_with_equal_times():
+    index = TimeIndex(load=2)
+    for i in range(40):
+        index.add("x{}".format(i), float(i % 4))
+    assert len(index) == 40
+    assert index.bounds(1.0, 2.0) == (10, 30)
+    assert index.ids(0, 10) == ["x{}".format(i) for i in range(0, 40, 4)]
+    for i in range(0, 40, 4):
+        assert index.remove("x{}".format(i + 1), 1.0)
+    assert not index.remove("x1", 1.0)
+    assert index.bounds(1.0, 1.0) == (10, 10)
+    assert index.ids(8, 12) == ["x32", "x36", "x2", "x6"]
+
+
+def test_reindex_and_remove_are_local():
+    index = IncidentIndex()
+    index.add("a", {"status": "open", "priority": "low"}, 10.0)
+    index.add("b", {"status": "open", "priority": "high"}, 5.0)
+    index.add("a", {"status": "resolved", "priority": "low"}, 10.0)
+    assert index.query(status="open") == ["b"]
+    assert index.query(status="resolved") == ["a"]
+    assert index.counts("status") == {"open": 1, "resolved": 1}
+
+    assert index.remove("b")
+    assert not index.remove("b")
+    assert index.counts("status") == {"resolved": 1}
+    assert index.counts("priority") == {"low": 1}
+    assert index.query() == ["a"]
+    assert index.keys_of("a")["status"] == "resolved"
+    with pytest.raises(KeyError):
+        index.query(unknown="x")
+
+
+def test_manager_keeps_index_in_sync():
+    manager = IncidentResponseManager(
+        "TestIndex", {"max_open_incidents": 100000}
+    )
+    manager.initialize()
+    now = datetime.now()
+    for i in range(30):
+        incident = Incident(
+            "INC-{}".format(i),
+            "Инцидент {}".format(i),
+            "Описание",
+            IncidentType.PHISHING_ATTACK,
+            IncidentPriority.HIGH if i % 3 == 0 else IncidentPriority.LOW,
+            SecurityLevel.MEDIUM,
+        )
+        incident.created_at = now - timedelta(hours=i, minutes=30)
+        manager.incidents[incident.incident_id] = incident
+        manager._update_indexes(incident)
+
+    assert manager.update_incident_status("INC-0", IncidentStatus.RESOLVED)
+    assert len(manager.get_open_incidents()) == 29
+    assert manager._get_incidents_by_status()["resolved"] == 1
+
+    candidates = manager.get_escalation_candidates(threshold_hours=24)
+    assert [i.incident_id for i in candidates] == [
+        "INC-{}".format(i) for i in range(29, 23, -1)
+    ]
+    assert manager.escalate_overdue_incidents(24) == 6
+    assert manager.get_escalation_candidates(24) == []
+    assert manager.count_incidents(status=IncidentStatus.ESCALATED) == 6
+    assert len(manager.get_incidents_by_team("tier3")) == 6
+
+    high_open = manager.query_incidents(
+        status=IncidentStatus.OPEN,
+        priority=IncidentPriority.HIGH,
+        created_after=now - timedelta(hours=10.5),
+    )
+    assert [i.incident_id for i in high_open] == ["INC-9", "INC-6", "INC-3"]
+    pages = list(manager.iter_incident_pages(10, status=IncidentStatus.OPEN))
+    assert [len(page) for page in pages] == [10, 10, 3]
+    assert len(manager.get_overdue_incidents(20)) == 10
+
+    assert manager._get_incident_cached("INC-1") is manager.incidents["INC-1"]
+    manager.incidents["INC-1"] = None
+    assert manager._get_incident_cached("INC-1") is None
+
+
+@pytest.mark.performance
+def test_escalation_sweep_1m_incidents():
+    count = 1000000
+    index = IncidentIndex()
+    rnd = random.Random(7)
+    start = time.perf_counter()
+    for i in range(count):
+        index.add(
+            "INC-{}".format(i),
+            {
+                "status": "open" if i % 10 else "resolved",
+                "priority": PRIORITIES[i % 4],
+                "incident_type": "t{}".format(i % 8),
+                "assigned_to": "tier{}".format(i % 3 + 1),
+            },
+            float(i),
+        )
+    build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stale = index.query(status="open", created_to=count * 0.01)
+    sweep_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    page = index.query(
+        status="open", priority="critical", created_from=500000.0, limit=50
+    )
+    compound_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    for _ in range(10000):
+        incident_id = "INC-{}".format(rnd.randrange(count))
+        keys = index.keys_of(incident_id)
+        keys["status"] = "resolved" if keys["status"] == "open" else "open"
+        index.add(incident_id, keys, float(incident_id[4:]))
+    update_us = (time.perf_counter() - start) / 10000 * 1e6
+
+    start = time.perf_counter()
+    for i in range(1000):
+        index.remove("INC-{}".format(i * 997))
+    remove_us = (time.perf_counter() - start) / 1000 * 1e6
+
+    # Открыт каждый инцидент, кроме каждого десятого
+    assert len(stale) == 9000
+    assert len(page) == 50
+    assert all(index.keys_of(i)["priority"] == "critical" for i in page)
+    assert build < 120
+    assert sweep_ms < 100 and compound_ms < 20
+    assert update_us < 200 and remove_us < 200
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты инкрементального сканирования директорий
+(MalwareScanner, AntivirusCore, индекс состояния сканирования)
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.antivirus.core.antivirus_core import AntivirusCore  # noqa
+from security.antivirus.core.scan_state import (  # noqa: E402
+    ScanStateIndex,
+    stream_match,
+)
+from security.antivirus.scanners.malware_scanner import (  # noqa: E402
+    MalwareScanner,
+)
+
+EICAR = (
+    "X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-"
+    "ANTIVIRUS-TEST-FILE!$H+H*"
+)
+
+
+def _populate(directory, count=30):
+    os.makedirs(os.path.join(directory, "nested"), exist_ok=True)
+    for i in range(count):
+        sub = "nested" if i % 2 else ""
+        path = os.path.join(directory, sub, "doc_{}.txt".format(i))
+        with open(path, "w") as f:
+            f.write("regular text line\n" * 50)
+            if i % 7 == 0:
+                f.write("start reverse shell now\n")
+
+
+@pytest.fixture
+def scanner(tmp_path):
+    return MalwareScanner(
+        {
+            "scan_index_path": str(tmp_path / "index" / "malware.db"),
+            "max_workers": 4,
+            "chunk_size": 256,
+        }
+    )
+
+
+def test_stream_match_across_chunk_boundary(tmp_path):
+    path = tmp_path / "big.txt"
+    with open(path, "w") as f:
+        f.write("x" * 1000 + "\n")
+        f.write("padding keylog" + "ger tail\n")
+    matchers = {"k": lambda text: "keylogger" in text}
+    # Фрагменты по 7 байт режут слово посередине
+    found, sha256, md5, size = stream_match(str(path), matchers, 7, 64)
+    assert found == ["k"]
+    assert size == os.path.getsize(path)
+    assert len(sha256) == 64 and len(md5) == 32
+
+
+def test_rescan_skips_unchanged_files(scanner, tmp_path):
+    directory = str(tmp_path / "data")
+    _populate(directory)
+
+    first = asyncio.run(scanner.scan_directory(directory))
+    report = scanner.last_scan_report
+    assert len(first) == 30
+    assert report.files_rescanned == 30 and report.files_skipped == 0
+    infected = sorted(r.file_path for r in first if not r.clean)
+    assert len(infected) == 5
+
+    second = asyncio.run(scanner.scan_directory(directory))
+    report = scanner.last_scan_report
+    assert report.files_skipped == 30 and report.files_rescanned == 0
+    # Пропущенные заражённые файлы остаются в результатах
+    assert sorted(r.file_path for r in second if not r.clean) == infected
+    assert report.threats_found == 5
+    assert scanner.get_scan_statistics()["total_scans"] == 30
+
+
+def test_changed_touched_and_deleted_files(scanner, tmp_path):
+    directory = str(tmp_path / "data")
+    _populate(directory)
+    asyncio.run(scanner.scan_directory(directory))
+
+    changed = os.path.join(directory, "doc_2.txt")
+    with open(changed, "a") as f:
+        f.write("decrypt your files, pay bitcoin\n")
+    touched = os.path.join(directory, "doc_4.txt")
+    stat = os.stat(touched)
+    os.utime(touched, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    os.remove(os.path.join(directory, "doc_6.txt"))
+
+    results = asyncio.run(scanner.scan_directory(directory))
+    report = scanner.last_scan_report
+    assert report.files_total == 29
+    assert report.files_rescanned == 1
+    assert report.files_rehashed == 1
+    assert report.files_skipped == 27
+    assert report.files_removed == 1
+    by_path = {r.file_path: r for r in results}
+    assert not by_path[changed].clean
+
+
+def test_pattern_change_invalidates_index(scanner, tmp_path):
+    directory = str(tmp_path / "data")
+    _populate(directory, count=10)
+    asyncio.run(scanner.scan_directory(directory))
+
+    scanner.patterns[0].active = False
+    scanner._compile_patterns()
+    asyncio.run(scanner.scan_directory(directory))
+    assert scanner.last_scan_report.files_rescanned == 10
+
+
+def test_scan_results_are_bounded(tmp_path):
+    scanner = MalwareScanner(
+        {
+            "scan_index_path": str(tmp_path / "idx.db"),
+            "max_scan_results": 5,
+        }
+    )
+    directory = str(tmp_path / "data")
+    _populate(directory, count=12)
+    asyncio.run(scanner.scan_directory(directory, incremental=False))
+    assert len(scanner.scan_results) == 5
+    assert scanner.get_scan_statistics()["total_scans"] == 12
+
+
+def test_index_persists_between_instances(tmp_path):
+    db_path = str(tmp_path / "state.db")
+    directory = str(tmp_path / "data")
+    _populate(directory, count=6)
+    asyncio.run(
+        MalwareScanner({"scan_index_path": db_path}).scan_directory(directory)
+    )
+    assert len(ScanStateIndex(db_path)) == 6
+
+    fresh = MalwareScanner({"scan_index_path": db_path})
+    asyncio.run(fresh.scan_directory(directory))
+    assert fresh.last_scan_report.files_skipped == 6
+
+
+def test_default_index_stays_in_memory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    directory = str(tmp_path / "data")
+    _populate(directory, count=8)
+    scanner = MalwareScanner()
+
+    first = asyncio.run(scanner.scan_directory(directory))
+    assert not any(r.from_index for r in first)
+    second = asyncio.run(scanner.scan_directory(directory))
+    assert all(r.from_index for r in second)
+    assert scanner.last_scan_report.files_skipped == 8
+    # Результаты из индекса не учитываются повторно
+    assert scanner.get_scan_statistics()["total_scans"] == 8
+    assert sorted(os.listdir(tmp_path)) == ["data"]
+
+    missing = asyncio.run(scanner.scan_file(str(tmp_path / "missing")))
+    assert missing.error and not missing.from_index
+
+
+def test_antivirus_core_incremental(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    core = AntivirusCore(
+        "TestCore",
+        {
+            "quarantine_path": str(tmp_path / "quarantine"),
+            "signatures_path": str(tmp_path / "signatures"),
+            "scan_index_path": str(tmp_path / "core.db"),
+            "chunk_size": 16,
+        },
+    )
+    directory = tmp_path / "data"
+    directory.mkdir()
+    (directory / "eicar.txt").write_text("prefix " + EICAR + "\n")
+    (directory / "clean.txt").write_text("nothing here\n")
+
+    results = asyncio.run(core.scan_directory(str(directory)))
+    assert sum(r.threat_found for r in results) == 1
+    assert core.last_scan_report.files_rescanned == 2
+
+    results = asyncio.run(core.scan_directory(str(directory)))
+    assert sum(r.threat_found for r in results) == 1
+    assert core.last_scan_report.files_skipped == 2
+    assert core.get_scan_statistics()["total_scans"] == 2
+
+
+@pytest.mark.performance
+def test_incremental_rescan_throughput(tmp_path):
+    directory = str(tmp_path / "data")
+    _populate(directory, count=400)
+    scanner = MalwareScanner(
+        {"scan_index_path": str(tmp_path / "bench.db"), "max_workers": 8}
+    )
+
+    start = time.perf_counter()
+    asyncio.run(scanner.scan_directory(directory))
+    full = time.perf_counter() - start
+    full_report = scanner.get_last_scan_report()
+
+    start = time.perf_counter()
+    asyncio.run(scanner.scan_directory(directory))
+    incremental = time.perf_counter() - start
+    report = scanner.get_last_scan_report()
+
+    assert full_report["files_rescanned"] == 400
+    assert full_report["files_per_second"] > 0
+    assert report["files_skipped"] == 400
+    assert report["files_per_second"] > full_report["files_per_second"]
+    assert incremental < full
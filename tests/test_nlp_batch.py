@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для единого матчера и пакетной обработки NaturalLanguageProcessor
+"""
+
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.ai_agents.natural_language_processor import (  # noqa: E402
+    EMOTION_KEYWORDS,
+    IntentType,
+    NaturalLanguageProcessor,
+    SentimentType,
+)
+from security.ai_agents.nlp_matcher import LexiconMatcher  # noqa: E402
+
+VOCABULARY = [
+    "включи", "безопасность", "мама", "дома", "срочно", "как", "какой",
+    "помощь", "help", "helpful", "дети", "сейчас", "42", "отлично",
+    "страх", "настройки", "камера", "покажи", "окно", "important", "когда",
+    "управление", "плохо", "радость", "uзел", "notification",
+]
+
+
+def _processor(tmp_path):
+    processor = NaturalLanguageProcessor()
+    processor.results_dir = str(tmp_path)
+    return processor
+
+
+def _random_texts(count, seed=7):
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(2, 12)))
+        for _ in range(count)
+    ]
+
+
+def _read_jsonl(tmp_path):
+    lines = []
+    for name in sorted(os.listdir(tmp_path)):
+        with open(os.path.join(tmp_path, name), encoding="utf-8") as f:
+            lines.extend(json.loads(line) for line in f)
+    return lines
+
+
+def test_matcher_matches_substring_semantics():
+    lexicon = {
+        "a": ["как", "help"],
+        "b": ["какой", "helpful", "elp"],
+        "c": ["ой"],
+    }
+    entity_patterns = {
+        "num": r"\b(\d+)\b",
+        "person": r"\b(мама|папа)\b",
+    }
+    matcher = LexiconMatcher(lexicon, entity_patterns)
+
+    for text in _random_texts(500) + ["HELPFUL какой"]:
+        analysis = matcher.analyze(text)
+        lower = text.lower()
+        expected_tags = {
+            tag
+            for tag, words in lexicon.items()
+            if any(word in lower for word in words)
+        }
+        assert analysis.tags == expected_tags, text
+        expected_entities = {
+            (kind, m.group(), m.start(), m.end())
+            for kind, pattern in entity_patterns.items()
+            for m in re.finditer(pattern, text, re.IGNORECASE)
+        }
+        assert set(analysis.entities) == expected_entities
+
+
+def test_components_share_analysis(tmp_path):
+    processor = _processor(tmp_path)
+
+    async def run():
+        for text in _random_texts(200, seed=11):
+            analysis = processor.matcher.analyze(text)
+            assert await processor.sentiment_analyzer.analyze_sentiment(
+                text, analysis
+            ) == await processor.sentiment_analyzer.analyze_sentiment(text)
+            assert await processor.emotion_detector.detect_emotions(
+                text, analysis
+            ) == await processor.emotion_detector.detect_emotions(text)
+            tokens = text.split()
+            assert await processor.keyword_extractor.extract_keywords(
+                text, tokens, analysis
+            ) == await processor.keyword_extractor.extract_keywords(
+                text, tokens
+            )
+
+    asyncio.run(run())
+    assert set(EMOTION_KEYWORDS) == {"joy", "sadness", "anger", "fear"}
+
+
+def test_intent_priority_and_context(tmp_path):
+    processor = _processor(tmp_path)
+
+    async def run(text):
+        return await processor.process_text(text, "u1", "s1")
+
+    result = asyncio.run(run("Как включить безопасность? Срочно!"))
+    assert result.intent.type == IntentType.SECURITY
+    assert result.intent.context == {"type": "urgent"}
+    assert result.sentiment == SentimentType.URGENT
+
+    # "помощь" есть и в EMERGENCY, и в HELP - побеждает порядок конфигурации
+    result = asyncio.run(run("нужна помощь маме"))
+    assert result.intent.type == IntentType.EMERGENCY
+
+    result = asyncio.run(run("когда это важно"))
+    assert result.intent.type == IntentType.QUERY
+    assert result.intent.confidence == 0.7
+    assert result.intent.context == {"type": "important"}
+
+
+def test_process_texts_batches_and_persists(tmp_path):
+    processor = _processor(tmp_path)
+    texts = _random_texts(1000)
+    items = texts[:500] + [
+        {"text": text, "user_id": "u2", "session_id": "s2"}
+        for text in texts[500:]
+    ]
+    items.insert(10, "")
+    items.insert(20, {"text": "x" * 5000})
+
+    results = asyncio.run(processor.process_texts(items, "u1", "s1", "ru", 64))
+
+    assert len(results) == 1002
+    assert results[10] is None and results[20] is None
+    ok = [r for r in results if r is not None]
+    assert len(ok) == 1000
+    assert ok[0].user_id == "u1" and ok[-1].user_id == "u2"
+    stats = processor.last_batch_stats
+    assert stats["failed"] == 2 and stats["batches"] == 16
+    assert processor.failed_processed == 2
+    assert processor.successful_processed == 1000
+    assert len(processor.processing_history) == 1000
+
+    # Построчная дозапись в порядке входа
+    saved = _read_jsonl(tmp_path)
+    assert [row["original_text"] for row in saved] == [
+        r.original_text for r in ok
+    ]
+
+    # Пакетный путь даёт тот же результат, что и одиночный
+    single = _processor(tmp_path / "single")
+
+    async def one_by_one():
+        return [
+            await single.process_text(text, "u1", "s1") for text in texts[:50]
+        ]
+
+    for a, b in zip(asyncio.run(one_by_one()), ok[:50]):
+        assert a.intent.type == b.intent.type
+        assert a.intent.context == b.intent.context
+        assert a.sentiment == b.sentiment
+        assert a.confidence == b.confidence
+        assert [(e.type, e.value, e.start_pos) for e in a.entities] == [
+            (e.type, e.value, e.start_pos) for e in b.entities
+        ]
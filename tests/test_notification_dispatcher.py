@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для диспетчера доставки SmartNotificationManager
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.managers.notification_dispatcher import (  # noqa: E402
+    AsyncTokenBucket,
+    ChannelSettings,
+    NotificationDispatcher,
+    PendingNotificationStore,
+)
+from security.managers.smart_notification_manager import (  # noqa: E402
+    NotificationChannel,
+    NotificationStatus,
+    NotificationType,
+    SmartNotificationManager,
+)
+
+
+class RecordingSender:
+    """Отправитель, запоминающий пакеты и момент отправки"""
+
+    def __init__(self, fail=None, delay=0.0):
+        self.fail = fail or (lambda channel, payload: False)
+        self.delay = delay
+        self.batches = []
+        self.sent_at = {}
+        self.lock = threading.Lock()
+
+    async def __call__(self, channel, payloads):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        now = time.time()
+        with self.lock:
+            self.batches.append((channel, list(payloads)))
+            for payload in payloads:
+                self.sent_at.setdefault(payload, now)
+        return [not self.fail(channel, payload) for payload in payloads]
+
+
+def _completions():
+    done = {}
+
+    def on_complete(item_id, payload, ok, failed):
+        done[item_id] = (sorted(ok), sorted(failed))
+
+    return done, on_complete
+
+
+def test_delayed_items_fire_in_due_order():
+    sender = RecordingSender()
+    dispatcher = NotificationDispatcher(
+        sender, {"push": ChannelSettings(workers=1)}
+    )
+    now = time.time()
+    delays = [0.3, 0.1, 0.0, 0.2, 0.15, 0.05]
+    dispatcher.submit_many(
+        ("n{}".format(i), "n{}".format(i), ["push"], now + d, None)
+        for i, d in enumerate(delays)
+    )
+    try:
+        assert dispatcher.join(5)
+    finally:
+        dispatcher.stop()
+
+    order = [payload for _, batch in sender.batches for payload in batch]
+    expected = [
+        "n{}".format(i) for i in sorted(range(6), key=lambda i: delays[i])
+    ]
+    assert order == expected
+    for i, d in enumerate(delays):
+        # Не раньше срока и без опроса с шагом в секунду
+        assert 0 <= sender.sent_at["n{}".format(i)] - (now + d) < 0.1
+
+    stats = dispatcher.get_stats()
+    assert stats["dispatched"] == stats["completed"] == 6
+    assert stats["lateness_max"] < 0.1
+
+
+def test_rate_limit_and_batching():
+    sender = RecordingSender()
+    dispatcher = NotificationDispatcher(
+        sender,
+        {
+            "sms": ChannelSettings(workers=2, rate=20, burst=5),
+            "push": ChannelSettings(workers=1, batch_size=50),
+        },
+    )
+    # Первый пакет запускает пулы каналов, остальные копятся в очереди
+    dispatcher.start()
+    start = time.perf_counter()
+    dispatcher.submit_many(
+        ("s{}".format(i), "s{}".format(i), ["sms"], None, None)
+        for i in range(25)
+    )
+    dispatcher.submit_many(
+        ("p{}".format(i), "p{}".format(i), ["push"], None, None)
+        for i in range(200)
+    )
+    try:
+        assert dispatcher.join(10)
+    finally:
+        dispatcher.stop()
+    elapsed = time.perf_counter() - start
+
+    # 5 токенов сразу, остальные 20 - со скоростью 20/с
+    assert elapsed >= 0.9
+    push_batches = [b for channel, b in sender.batches if channel == "push"]
+    assert sum(len(b) for b in push_batches) == 200
+    assert max(len(b) for b in push_batches) == 50
+    assert len(push_batches) < 200
+
+    channels = dispatcher.get_stats()["channels"]
+    assert channels["sms"]["sent"] == 25
+    assert channels["push"]["batches"] == len(push_batches)
+
+
+def test_token_bucket_allows_burst_then_paces():
+    async def run():
+        bucket = AsyncTokenBucket(rate=100, capacity=10)
+        start = time.perf_counter()
+        for _ in range(10):
+            await bucket.acquire()
+        burst = time.perf_counter() - start
+        for _ in range(20):
+            await bucket.acquire()
+        return burst, time.perf_counter() - start
+
+    burst, total = asyncio.run(run())
+    assert burst < 0.05
+    assert 0.15 <= total < 0.5
+
+
+def test_retries_and_per_channel_results():
+    attempts = {"sms": 0}
+
+    async def sender(channel, payloads):
+        if channel == "sms":
+            attempts["sms"] += 1
+            if attempts["sms"] < 3:
+                raise ConnectionError("шлюз недоступен")
+        if channel == "voice":
+            raise ConnectionError("линия занята")
+        return [True] * len(payloads)
+
+    done, on_complete = _completions()
+    dispatcher = NotificationDispatcher(
+        sender,
+        {
+            "sms": ChannelSettings(max_retries=2, retry_delay=0.01),
+            "voice": ChannelSettings(max_retries=1, retry_delay=0.01),
+        },
+        on_complete=on_complete,
+    )
+    dispatcher.submit("a", "a", ["sms", "push"])
+    dispatcher.submit("b", "b", ["voice"])
+    try:
+        assert dispatcher.join(5)
+    finally:
+        dispatcher.stop()
+
+    assert attempts["sms"] == 3
+    assert done["a"] == (["push", "sms"], [])
+    assert done["b"] == ([], ["voice"])
+    stats = dispatcher.get_stats()
+    assert stats["completed"] == 1 and stats["failed"] == 1
+
+
+def test_short_or_long_sender_results_still_complete_entries():
+    async def sender(channel, payloads):
+        if channel == "sms":
+            return [True] * (len(payloads) - 1)
+        return [True] * (len(payloads) + 2)
+
+    done, on_complete = _completions()
+    dispatcher = NotificationDispatcher(
+        sender,
+        {
+            "sms": ChannelSettings(batch_size=10),
+            "push": ChannelSettings(batch_size=10),
+        },
+        on_complete=on_complete,
+    )
+    dispatcher.start()
+    dispatcher.submit_many(
+        ("n{}".format(i), "n{}".format(i), ["sms"], None, None)
+        for i in range(5)
+    )
+    dispatcher.submit("p", "p", ["push"])
+    try:
+        assert dispatcher.join(5)
+    finally:
+        dispatcher.stop()
+
+    assert len(done) == 6 and done["p"] == (["push"], [])
+    failed = [item for item, (_, bad) in done.items() if bad == ["sms"]]
+    channels = dispatcher.get_stats()["channels"]
+    assert channels["sms"]["failed"] == len(failed) >= 1
+    assert channels["sms"]["sent"] + len(failed) == 5
+
+
+def test_pending_items_survive_restart(tmp_path):
+    path = str(tmp_path / "pending.jsonl")
+    sender = RecordingSender()
+    done, on_complete = _completions()
+    dispatcher = NotificationDispatcher(
+        sender,
+        store=PendingNotificationStore(path),
+        on_complete=on_complete,
+        flush_interval=0.01,
+    )
+    now = time.time()
+    dispatcher.submit("now", "now", ["push"], None, {"due": None})
+    dispatcher.submit("later", "later", ["push"], now + 60, {"due": 60})
+    dispatcher.submit("cancel", "cancel", ["push"], now + 60, {"due": 60})
+    dispatcher.cancel("cancel")
+    time.sleep(0.2)
+    dispatcher.stop()
+    assert list(done) == ["now"]
+
+    # Журнал дописывается с обрывом последней строки
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"op":"add","id":"broken"')
+
+    store = PendingNotificationStore(path)
+    pending = store.load()
+    assert pending == {"later": {"due": 60}}
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 1
+
+    restored = NotificationDispatcher(
+        sender, store=store, on_complete=on_complete
+    )
+    restored.submit_many(
+        (item_id, item_id, ["push"], None, None) for item_id in pending
+    )
+    try:
+        assert restored.join(5)
+    finally:
+        restored.stop()
+    assert set(done) == {"now", "later"}
+    assert PendingNotificationStore(path).load() == {}
+
+
+def test_manager_delivers_through_dispatcher(tmp_path):
+    manager = SmartNotificationManager()
+    manager.pending_store.path = str(tmp_path / "pending.jsonl")
+    sent = []
+
+    async def send_batch(notifications, channel):
+        sent.append((channel, [n.id for n in notifications]))
+        return [channel != NotificationChannel.SMS for _ in notifications]
+
+    manager.channel_manager.send_batch = send_batch
+
+    async def create(channels, delay=0.0):
+        manager.timing_optimizer.optimize_timing = _fixed_timing(delay)
+        return await manager.create_notification(
+            NotificationType.FAMILY, "Ужин готов", ["u1"], channels=channels
+        )
+
+    async def run():
+        first = await create(
+            [NotificationChannel.PUSH, NotificationChannel.SMS]
+        )
+        failed = await create([NotificationChannel.SMS])
+        delayed = await create([NotificationChannel.EMAIL], delay=0.2)
+        cancelled = await create([NotificationChannel.EMAIL], delay=30)
+        manager.cancel_notification(cancelled.id)
+        return first, failed, delayed, cancelled
+
+    try:
+        first, failed, delayed, cancelled = asyncio.run(run())
+        assert manager.dispatcher.join(5)
+    finally:
+        manager.stop_processing()
+
+    assert first.status == NotificationStatus.SENT
+    assert failed.status == NotificationStatus.FAILED
+    assert delayed.status == NotificationStatus.SENT
+    assert delayed.sent_at >= delayed.scheduled_at
+    assert cancelled.status == NotificationStatus.PENDING
+    assert not any(cancelled.id in ids for _, ids in sent)
+
+    stats = manager.get_notification_statistics()
+    assert stats["sent_notifications"] == 2
+    assert stats["failed_notifications"] == 1
+    dispatcher_stats = stats["dispatcher"]
+    assert dispatcher_stats["cancelled"] == 1
+    assert dispatcher_stats["channels"]["sms"]["failed"] == 2
+    assert len(manager.notification_history) == 4
+    for notification in (first, failed, delayed, cancelled):
+        os.remove(
+            "data/notifications/notification_{}.json".format(notification.id)
+        )
+
+
+def test_manager_restores_pending_notifications(tmp_path):
+    path = str(tmp_path / "pending.jsonl")
+    manager = SmartNotificationManager()
+    manager.pending_store.path = path
+
+    async def create():
+        manager.timing_optimizer.optimize_timing = _fixed_timing(0.5)
+        return await manager.create_notification(
+            NotificationType.REMINDER, "Принять лекарство", ["u1"]
+        )
+
+    notification = asyncio.run(create())
+    manager.stop_processing()
+    assert notification.status == NotificationStatus.PENDING
+
+    restarted = SmartNotificationManager()
+    restarted.pending_store.path = path
+    sent = []
+
+    async def send_batch(notifications, channel):
+        sent.extend(n.id for n in notifications)
+        return [True] * len(notifications)
+
+    restarted.channel_manager.send_batch = send_batch
+    # Без создания новых уведомлений: журнал доставляется при старте
+    assert restarted.start()
+    assert restarted.start_processing()
+    try:
+        assert restarted.dispatcher.join(5)
+    finally:
+        restarted.stop()
+    assert set(sent) == {notification.id}
+    assert restarted.total_notifications == 0
+    assert restarted.sent_notifications == 1
+    assert len(PendingNotificationStore(path).load()) == 0
+    os.remove(
+        "data/notifications/notification_{}.json".format(notification.id)
+    )
+
+
+def test_status_writes_leave_dispatcher_thread(tmp_path):
+    manager = SmartNotificationManager()
+    manager.pending_store.path = str(tmp_path / "pending.jsonl")
+    writes = []
+    release = threading.Event()
+
+    def write(data):
+        release.wait(5)
+        writes.append((data["id"], threading.current_thread().name))
+
+    manager._write_notification_data = write
+
+    async def send_batch(notifications, channel):
+        return [True] * len(notifications)
+
+    manager.channel_manager.send_batch = send_batch
+
+    async def run():
+        manager.timing_optimizer.optimize_timing = _fixed_timing(0)
+        return [
+            await manager.create_notification(
+                NotificationType.FAMILY, "Сообщение", ["u1"]
+            )
+            for _ in range(20)
+        ]
+
+    release.set()
+    created = asyncio.run(run())
+    release.clear()
+    try:
+        # Диспетчер не ждёт медленную запись статусов
+        assert manager.dispatcher.join(5)
+        assert manager.sent_notifications == 20
+    finally:
+        release.set()
+        manager.stop_processing()
+
+    threads = {name for _, name in writes}
+    assert "smart_notification_dispatcher" not in threads
+    status_writes = {
+        item_id
+        for item_id, name in writes
+        if name.startswith("notification-status")
+    }
+    assert status_writes == {n.id for n in created}
+
+
+def test_concurrent_start_runs_one_loop():
+    dispatcher = NotificationDispatcher(RecordingSender(), name="one-loop")
+    barrier = threading.Barrier(8)
+
+    def submit(i):
+        barrier.wait()
+        dispatcher.submit(str(i), i, ["push"])
+
+    threads = [
+        threading.Thread(target=submit, args=(i,)) for i in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    try:
+        assert dispatcher.join(5)
+        loops = [t for t in threading.enumerate() if t.name == "one-loop"]
+        assert len(loops) == 1
+        assert dispatcher.get_stats()["completed"] == 8
+    finally:
+        dispatcher.stop()
+
+
+def _fixed_timing(delay):
+    async def optimize_timing(*args):
+        scheduled_at = datetime.now() + timedelta(seconds=delay)
+        return {
+            "scheduled_at": scheduled_at,
+            "optimal_time": scheduled_at,
+            "delay_minutes": delay / 60,
+        }
+
+    return optimize_timing
+
+
+@pytest.mark.performance
+def test_million_scheduled_notifications(tmp_path):
+    total = 1000000
+    # Сроки размазаны по окну в перемешанном порядке; окно начинается
+    # после постановки всех уведомлений в очередь
+    delay, window = 20.0, 15.0
+    path = str(tmp_path / "pending.jsonl")
+    dispatcher = NotificationDispatcher(
+        _count_only,
+        {
+            "push": ChannelSettings(workers=4, batch_size=1000),
+            "email": ChannelSettings(workers=2, batch_size=500),
+        },
+        store=PendingNotificationStore(path),
+    )
+    dispatcher.start()
+    channels = (["push"], ["email"], ["push", "email"])
+    base = time.time() + delay
+
+    start = time.perf_counter()
+    chunk = 50000
+    for offset in range(0, total, chunk):
+        dispatcher.submit_many(
+            (
+                str(i),
+                i,
+                channels[i % 3],
+                base + ((i * 7919) % total) / total * window,
+                {"i": i},
+            )
+            for i in range(offset, offset + chunk)
+        )
+    submitted = time.perf_counter() - start
+    try:
+        assert dispatcher.join(delay + window + 60)
+    finally:
+        dispatcher.stop()
+    delivered = time.time() - base
+
+    stats = dispatcher.get_stats()
+    assert submitted < delay
+    # Доставка укладывается в окно сроков с запасом на последний пакет
+    assert delivered < window + 5
+    assert stats["channels"]["push"]["batches"] < total // 10
+    assert stats["completed"] == total
+    assert stats["channels"]["push"]["sent"] == total // 3 * 2 + 1
+    assert stats["lateness_p99"] < 1.0
+    assert PendingNotificationStore(path).load() == {}
+
+
+async def _count_only(channel, payloads):
+    return None
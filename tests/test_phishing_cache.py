@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Тесты для кэша, rate limiting и пакетного анализа PhishingProtectionAgent
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.ai_agents.phishing_protection_agent import (  # noqa: E402
+    PhishingProtectionAgent,
+    RateLimitExceededError,
+    TokenBucket,
+    TTLCache,
+)
+
+
+def _collect(agent, urls, concurrency=None):
+    async def run():
+        return [
+            d async for d in agent.batch_analyze_urls(urls, concurrency)
+        ]
+
+    return asyncio.run(run())
+
+
+def test_ttl_cache_lru_and_expiry():
+    cache = TTLCache(maxsize=3, ttl=60)
+    for key in ("a", "b", "c"):
+        cache.set(key, key.upper())
+    assert cache.get("a") == "A"  # "a" становится свежей
+    cache.set("d", "D")
+    assert "b" not in cache and len(cache) == 3
+    assert cache.evictions == 1
+
+    cache.set("none", None)
+    assert cache.get("none", "missing") is None
+    cache.set("short", 1, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("short", "missing") == "missing"
+    assert cache.purge_expired() == 0
+    assert cache.get_stats()["hits"] >= 2
+
+    cache.set("x1", 1, tag="host")
+    cache.set("x2", 2, tag="host")
+    cache.set("x2", 3, tag="other")
+    assert cache.invalidate("host") == 1
+    assert "x1" not in cache and cache.get("x2") == 3
+    assert cache.invalidate("host") == 0
+
+
+def test_block_and_trust_invalidate_only_that_host():
+    agent = PhishingProtectionAgent()
+    calls = []
+    original = agent._analyze_url_uncached
+
+    async def counting(url):
+        calls.append(url)
+        return await original(url)
+
+    agent._analyze_url_uncached = counting
+    good, other = "https://example.org/", "https://other.org/"
+
+    async def run():
+        assert await agent.analyze_url_async(good) is None
+        assert await agent.analyze_url_async(other) is None
+        assert agent.analyze_url(good) is None
+        agent.block_domain("Example.org")
+        assert await agent.analyze_url_async(good) is not None
+        assert agent.analyze_url(good) is not None
+        assert await agent.analyze_url_async(other) is None
+        agent.trust_domain("other.org")
+        assert await agent.analyze_url_async(other) is None
+
+    asyncio.run(run())
+    assert calls == [good, other, good, other]
+
+
+def test_verdict_in_flight_during_block_is_dropped():
+    agent = PhishingProtectionAgent()
+    started = []
+    url = "https://late.example/"
+
+    async def lookup(domain):
+        started.append(domain)
+        await asyncio.sleep(0.02)
+        return {
+            "is_blocked": domain in agent.blocked_domains,
+            "is_trusted": False,
+            "is_valid": True,
+        }
+
+    agent._lookup_domain = lookup
+
+    async def run():
+        first = asyncio.create_task(agent.analyze_url_async(url))
+        await asyncio.sleep(0.005)
+        agent.block_domain("late.example")
+        # Вызов после блокировки не присоединяется к старой проверке
+        second = await agent.analyze_url_async(url)
+        return await first, second
+
+    first, second = asyncio.run(run())
+    assert first is not None and second is not None
+    assert started == ["late.example", "late.example"]
+    assert asyncio.run(agent.analyze_url_async(url)) is not None
+    assert agent._inflight == {}
+
+
+def test_token_bucket_rate_limit():
+    bucket = TokenBucket(capacity=5, rate=1000)
+    assert all(bucket.consume() for _ in range(5))
+    time.sleep(0.01)
+    assert bucket.consume()  # пополнение
+
+    agent = PhishingProtectionAgent()
+    agent._max_requests_per_minute = 10
+    agent._rate_limits = {}
+    for _ in range(10):
+        agent._check_rate_limit("m")
+    with pytest.raises(RateLimitExceededError):
+        agent._check_rate_limit("m")
+    # Лимиты методов независимы
+    assert agent._check_rate_limit("other")
+
+
+def test_benign_results_are_cached():
+    agent = PhishingProtectionAgent()
+    calls = []
+    original = agent._analyze_url_uncached
+
+    async def counting(url):
+        calls.append(url)
+        return await original(url)
+
+    agent._analyze_url_uncached = counting
+
+    async def run():
+        for _ in range(3):
+            result = await agent.analyze_url_async("https://example.org/")
+            assert result is None
+
+    asyncio.run(run())
+    assert len(calls) == 1
+
+
+def test_batch_coalesces_and_bounds_concurrency():
+    agent = PhishingProtectionAgent()
+    agent.block_domain("evil.example")
+    lookups = []
+    active = {"now": 0, "max": 0}
+
+    async def lookup(domain):
+        lookups.append(domain)
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        return {
+            "is_blocked": domain in agent.blocked_domains,
+            "is_trusted": False,
+            "is_valid": True,
+        }
+
+    agent._lookup_domain = lookup
+    urls = [
+        "https://{}/page{}".format(
+            "evil.example" if i % 10 == 0 else "site{}.ru".format(i % 7),
+            i % 50,
+        )
+        for i in range(2000)
+    ]
+    detections = _collect(agent, iter(urls), concurrency=16)
+
+    # Один запрос на домен, несмотря на 2000 URL
+    assert sorted(lookups) == sorted(
+        ["evil.example"] + ["site{}.ru".format(i) for i in range(7)]
+    )
+    assert active["max"] <= 16
+    assert len(detections) == 200
+    assert all(d.source.startswith("https://evil.example") for d in detections)
+    assert agent.get_protection_info()["coalesced_requests"] > 0
+    assert agent._inflight == {}
+
+
+def test_batch_skips_invalid_and_stops_early():
+    agent = PhishingProtectionAgent()
+    urls = ["ftp://bad", "https://bit.ly/x", "https://tinyurl.com/y"]
+    assert len(_collect(agent, urls)) == 2
+
+    async def first_only():
+        async for detection in agent.batch_analyze_urls(
+            ("https://bit.ly/{}".format(i) for i in range(10000)), 8
+        ):
+            return detection
+
+    assert asyncio.run(first_only()) is not None
+
+
+@pytest.mark.performance
+def test_batch_throughput_1m_urls():
+    agent = PhishingProtectionAgent()
+    agent._cache = TTLCache(maxsize=50000, ttl=3600)
+    total, unique = 1000000, 100000
+
+    def corpus():
+        for i in range(total):
+            n = (i * 7919) % unique
+            yield "https://site{}.example.com/path/{}".format(n % 5000, n)
+
+    start = time.perf_counter()
+    detections = _collect(agent, corpus(), concurrency=200)
+    elapsed = time.perf_counter() - start
+    stats = agent._cache.get_stats()
+    assert detections == []
+    # Вердикты доменов (5000) остаются в кэше
+    assert stats["hit_rate"] > 0.45
+    assert total / elapsed > 5000
+    assert stats["size"] <= 50000
+    assert agent._inflight == {}
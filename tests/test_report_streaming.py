@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты для потоковой генерации отчетов ReportManager
+"""
+
+import csv
+import html
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.managers.report_manager import (  # noqa: E402
+    ReportFormat,
+    ReportManager,
+    ReportType,
+)
+
+SEVERITIES = ["low", "medium", "high", "critical"]
+TYPES = ["malware", "phishing", "ddos", "intrusion", "leak"]
+MONTH = (datetime(2025, 9, 1), datetime(2025, 10, 1))
+
+
+def _data(incidents=1000, seed=1):
+    rng = random.Random(seed)
+    start = MONTH[0]
+    return {
+        "total_incidents": incidents,
+        "resolved_incidents": incidents // 2,
+        "active_threats": 3,
+        "security_score": 87,
+        "uptime_percentage": 99.9,
+        "incidents": [
+            {
+                "id": i,
+                "severity": rng.choice(SEVERITIES),
+                "type": rng.choice(TYPES),
+                "created_at": (start + timedelta(minutes=i)).isoformat(),
+            }
+            for i in range(incidents)
+        ],
+        "threats": [
+            {
+                "category": rng.choice(TYPES),
+                "risk_level": rng.choice(SEVERITIES),
+                "status": "active" if i % 500 == 0 else "blocked",
+            }
+            for i in range(incidents)
+        ],
+        "violations": [
+            {"type": rng.choice(TYPES), "severity": "high", "resolved": True}
+            for _ in range(incidents // 10)
+        ],
+        "improvements": [{"implemented": True}, {"planned": True}],
+        "compliance": {"overall_score": 91, "by_standard": {"152-ФЗ": 95}},
+        "avg_response_time": 1.5,
+        "error_rate": 0.01,
+    }
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "logs").mkdir()
+    return ReportManager()
+
+
+def _count_sections(manager, monkeypatch):
+    calls = []
+    generate = manager._generate_section
+
+    def counted(section, data):
+        calls.append(section)
+        return generate(section, data)
+
+    monkeypatch.setattr(manager, "_generate_section", counted)
+    return calls
+
+
+def test_streamed_exports_match_previous_format(manager, tmp_path):
+    data = _data(300)
+    data["incidents"][0]["type"] = "<script>"
+    report_id = manager.generate_report(
+        ReportType.DAILY, "Отчет <за день> & итоги", data
+    )
+    report = manager.get_report(report_id)
+    assert list(report.data["sections"]) == [
+        "summary",
+        "incidents",
+        "threats",
+        "performance",
+    ]
+    assert report.data["sections"]["incidents"]["by_type"]["<script>"] == 1
+    assert len(report.charts) == 3
+
+    path = manager.export_report(
+        report_id, ReportFormat.JSON, str(tmp_path / "r.json")
+    )
+    with open(path, encoding="utf-8") as f:
+        assert f.read() == json.dumps(
+            report.data, ensure_ascii=False, indent=2
+        )
+
+    path = manager.export_report(
+        report_id, ReportFormat.CSV, str(tmp_path / "r.csv")
+    )
+    flat = manager._flatten_data(report.data)
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows == [
+        list(flat.keys()),
+        ["" if v is None else str(v) for v in flat.values()],
+    ]
+
+    path = manager.export_report(
+        report_id, ReportFormat.HTML, str(tmp_path / "r.html")
+    )
+    with open(path, encoding="utf-8") as f:
+        page = f.read()
+    assert "<title>Отчет &lt;за день&gt; &amp; итоги</title>" in page
+    assert "<script>" not in page
+    body = page.split("<pre>")[1].split("</pre>")[0]
+    assert json.loads(html.unescape(body)) == report.data
+    assert not [n for n in os.listdir(tmp_path) if n.endswith(".tmp")]
+
+
+def test_section_cache_reused_across_formats(
+    manager, tmp_path, monkeypatch
+):
+    calls = _count_sections(manager, monkeypatch)
+    data = _data(500)
+    path = manager.stream_report(
+        ReportType.MONTHLY,
+        "Соответствие за сентябрь",
+        data,
+        ReportFormat.JSON,
+        data_range=MONTH,
+        data_version=1,
+    )
+    assert path.startswith(os.path.join("reports", "monthly"))
+    assert sorted(calls) == [
+        "compliance_status",
+        "improvements",
+        "violations",
+    ]
+    with open(path, encoding="utf-8") as f:
+        streamed = json.load(f)
+    assert streamed["sections"]["violations"]["total"] == 50
+    assert streamed["summary"] == manager._generate_summary(data)
+
+    manager.stream_report(
+        ReportType.MONTHLY,
+        "Соответствие за сентябрь",
+        data,
+        ReportFormat.CSV,
+        str(tmp_path / "month.csv"),
+        data_range=MONTH,
+        data_version=1,
+    )
+    report_id = manager.generate_report(
+        ReportType.MONTHLY, "Сентябрь", data, data_range=MONTH, data_version=1
+    )
+    assert len(calls) == 3
+    assert (
+        manager.get_report(report_id).data["sections"] == streamed["sections"]
+    )
+    assert manager.section_cache.hits == 6
+
+    # Другой период и другой шаблон считаются заново
+    october = (MONTH[1], MONTH[1] + timedelta(days=31))
+    manager.generate_report(
+        ReportType.MONTHLY, "Октябрь", data, data_range=october, data_version=1
+    )
+    manager.generate_report(
+        ReportType.MONTHLY,
+        "Тот же период",
+        data,
+        "daily_security",
+        data_range=MONTH,
+        data_version=1,
+    )
+    assert len(calls) == 10
+    assert manager.invalidate_sections(MONTH) == 7
+    manager.generate_report(
+        ReportType.MONTHLY, "Снова", data, data_range=MONTH, data_version=1
+    )
+    assert len(calls) == 13
+    # Без периода кэш не используется
+    manager.generate_report(ReportType.MONTHLY, "Без периода", data)
+    manager.generate_report(ReportType.MONTHLY, "Без периода", data)
+    assert len(calls) == 19
+    assert manager.get_status()["cached_sections"] == 6
+
+
+def test_late_data_for_same_range_is_not_served_from_cache(
+    manager, monkeypatch
+):
+    calls = _count_sections(manager, monkeypatch)
+    late = _data(500)
+    late["violations"].append(
+        {"type": "leak", "severity": "high", "resolved": False}
+    )
+    # Без версии данных период не кэшируется: данные могли дойти позже
+    for data in (_data(500), late):
+        report_id = manager.generate_report(
+            ReportType.MONTHLY, "Сентябрь", data, data_range=MONTH
+        )
+    assert len(calls) == 6 and len(manager.section_cache) == 0
+    violations = manager.get_report(report_id).data["sections"]["violations"]
+    assert violations["total"] == 51
+
+    # Новая версия от вызывающего считается заново, та же - из кэша
+    for version in (1, 1, 2):
+        manager.generate_report(
+            ReportType.MONTHLY,
+            "Сентябрь",
+            late,
+            data_range=MONTH,
+            data_version=version,
+        )
+    assert len(calls) == 12 and manager.section_cache.hits == 3
+    assert manager.invalidate_sections(MONTH) == 6
+
+
+def test_counts_match_loop_and_failed_export_leaves_no_file(
+    manager, tmp_path
+):
+    items = _data(2000)["incidents"]
+    items.append({"id": "no_severity"})
+    expected = {}
+    for item in items:
+        severity = item.get("severity", "unknown")
+        expected[severity] = expected.get(severity, 0) + 1
+    counts = manager._count_by_severity(items)
+    assert counts == expected and list(counts) == list(expected)
+    assert manager._count_by_priority([]) == {}
+
+    data = _data(10)
+    data["incidents"][-1]["created_at"] = object()
+    target = tmp_path / "broken.json"
+    with pytest.raises(TypeError):
+        manager.stream_report(
+            ReportType.DAILY, "Сломанный", data, ReportFormat.JSON, str(target)
+        )
+    assert sorted(os.listdir(tmp_path)) == ["logs", "reports"]
+    with pytest.raises(ValueError):
+        manager.stream_report(
+            ReportType.DAILY, "PDF", data, ReportFormat.PDF, str(target)
+        )
+
+
+@pytest.mark.performance
+def test_report_time_by_incident_count(manager, tmp_path):
+    def previous(data):
+        # Прежний путь: отчет целиком в памяти, HTML одной строкой
+        report_id = manager.generate_report(ReportType.DAILY, "Отчет", data)
+        report = manager.get_report(report_id)
+        with open(tmp_path / "old.html", "w", encoding="utf-8") as f:
+            f.write(manager._generate_html_content(report))
+        manager.delete_report(report_id)
+
+    def streamed(data, format_type, data_range, data_version=None):
+        manager.stream_report(
+            ReportType.DAILY,
+            "Отчет",
+            data,
+            format_type,
+            str(tmp_path / "new.{}".format(format_type.value)),
+            data_range=data_range,
+            data_version=data_version,
+        )
+
+    def timed(call, *args):
+        start = time.perf_counter()
+        call(*args)
+        return time.perf_counter() - start
+
+    def peak(call, *args):
+        tracemalloc.start()
+        call(*args)
+        _, result = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return result / 2**20
+
+    for incidents in (10000, 100000, 1000000):
+        data = _data(incidents, seed=incidents)
+        data_range = (MONTH[0], MONTH[0] + timedelta(minutes=incidents))
+        old = timed(previous, data)
+        new = timed(streamed, data, ReportFormat.HTML, data_range, incidents)
+        cached = timed(
+            streamed, data, ReportFormat.CSV, data_range, incidents
+        )
+        assert new < old * 1.5
+        assert cached < new / 10
+
+    data = _data(100000, seed=5)
+    data["threats"] = [dict(t, status="active") for t in data["threats"]]
+    old_peak = peak(previous, data)
+    new_peak = peak(streamed, data, ReportFormat.HTML, None)
+    assert new_peak < old_peak / 2
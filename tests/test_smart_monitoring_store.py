@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Тесты для кольца алертов, архива и скользящих часовых счетчиков
+SmartMonitoringSystem
+"""
+
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.smart_monitoring import (  # noqa: E402
+    Alert,
+    AlertRule,
+    AlertSeverity,
+    AlertStatus,
+    SmartMonitoringSystem,
+)
+from security.smart_monitoring_store import (  # noqa: E402
+    AlertArchive,
+    AlertStore,
+    HourlyCounters,
+)
+
+SEVERITIES = list(AlertSeverity)
+START = datetime(2025, 10, 1)
+
+
+def _alert(i, rule_id="rule", severity=AlertSeverity.WARNING, minutes=None):
+    return Alert(
+        alert_id="alert_{}".format(i),
+        rule_id=rule_id,
+        title="Правило: cpu",
+        message="Метрика cpu = {}".format(i),
+        severity=severity,
+        status=AlertStatus.ACTIVE,
+        timestamp=START + timedelta(minutes=i if minutes is None else minutes),
+        metric_name="cpu",
+        current_value=float(i),
+        threshold_value=50.0,
+        tags={"host": "h{}".format(i % 3)},
+    )
+
+
+def _scan_stats(alerts):
+    # Прежний подсчет обходом всех алертов
+    alerts = list(alerts)
+    return {
+        "active": len(
+            [a for a in alerts if a.status == AlertStatus.ACTIVE]
+        ),
+        "severity": {
+            s.value: len([a for a in alerts if a.severity == s])
+            for s in AlertSeverity
+        },
+        "rules": dict(Counter(a.rule_id for a in alerts)),
+    }
+
+
+def _store_stats(store):
+    return {
+        "active": store.count(status=AlertStatus.ACTIVE),
+        "severity": {s.value: store.count(severity=s) for s in AlertSeverity},
+        "rules": dict(store.rule_counts),
+    }
+
+
+@pytest.fixture
+def monitor(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "logs").mkdir()
+    with contextlib.redirect_stdout(io.StringIO()):
+        monitor = SmartMonitoringSystem(
+            "test", archive_path=str(tmp_path / "archive" / "alerts.jsonl")
+        )
+        monitor.add_rule(
+            AlertRule(
+                rule_id="cpu_high",
+                name="Высокая загрузка",
+                metric_name="cpu",
+                condition=">",
+                threshold=90,
+                severity=AlertSeverity.CRITICAL,
+                cooldown=0,
+                max_alerts_per_hour=10**9,
+                adaptive_threshold=False,
+            )
+        )
+    yield monitor
+    with contextlib.redirect_stdout(io.StringIO()):
+        monitor.stop_monitoring()
+
+
+def test_ring_evicts_to_rotating_archive(tmp_path):
+    path = str(tmp_path / "alerts.jsonl")
+    archive = AlertArchive(path, max_bytes=4096, backups=2)
+    store = AlertStore(capacity=10, archive=archive)
+    for i in range(100):
+        store.append(_alert(i))
+
+    assert len(store) == 10 and store.evicted == 90
+    assert [a.alert_id for a in store] == [
+        "alert_{}".format(i) for i in range(90, 100)
+    ]
+    assert store[0].alert_id == "alert_90" and "alert_89" not in store
+    assert store.get("alert_95") is store[5] and store[5] in store
+
+    archived = list(archive.read())
+    assert os.path.exists(path + ".1") and not os.path.exists(path + ".3")
+    # Ротация отбрасывает самые старые файлы, порядок сохраняется
+    ids = [int(r["alert_id"].split("_")[1]) for r in archived]
+    assert ids == list(range(ids[0], 90)) and ids[0] > 0
+    assert archived[-1]["tags"] == {"host": "h2"}
+    assert archived[-1]["timestamp"] == _alert(89).timestamp.isoformat()
+    since = START + timedelta(minutes=85)
+    assert [r["alert_id"] for r in archive.read(since)] == [
+        "alert_{}".format(i) for i in range(85, 90)
+    ]
+
+    # Алерты старше порога снимаются с начала кольца
+    assert store.compact(START + timedelta(minutes=94)) == 5
+    assert store[0].alert_id == "alert_95" and archive.written == 95
+    store.resize(2)
+    assert [a.alert_id for a in store] == ["alert_98", "alert_99"]
+    archive.close()
+
+
+def test_store_counters_match_scan_through_status_changes():
+    rng = random.Random(3)
+    store = AlertStore(capacity=50)
+    total_bytes = []
+    for i in range(500):
+        rule_id = "rule_{}".format(rng.randrange(4))
+        store.append(_alert(i, rule_id, rng.choice(SEVERITIES)))
+        target = store[rng.randrange(len(store))].alert_id
+        if rng.random() < 0.3:
+            store.set_status(target, rng.choice(list(AlertStatus)))
+        assert _store_stats(store) == _scan_stats(store)
+        assert store.active() and all(
+            a.status == AlertStatus.ACTIVE for a in store.active()
+        )
+        assert len(store.active()) == store.count(status=AlertStatus.ACTIVE)
+        total_bytes.append(store.nbytes)
+    assert not store.set_status("alert_0", AlertStatus.RESOLVED)
+    assert max(total_bytes[100:]) < min(total_bytes[100:]) * 1.1
+    store.clear()
+    assert len(store) == 0 and store.nbytes == 0 and not store.rule_counts
+
+
+def test_hourly_counters_slide_over_window():
+    counters = HourlyCounters(window=3600, buckets=60)
+    now = 1_000_000.0
+    for minute in range(90):
+        counters.add("rule", now + minute * 60)
+    # За последние 60 минут остались только последние 60 событий
+    assert counters.count("rule", now + 89 * 60) == 60
+    assert counters.count("rule", now + 100 * 60) == 49
+    assert counters.count("rule", now + 200 * 60) == 0
+    assert counters.count("other", now) == 0 and "other" not in counters
+    assert counters.add("rule", now + 200 * 60, amount=5) == 5
+    assert counters.snapshot(now + 200 * 60) == {"rule": 5}
+    counters.reset("rule")
+    assert "rule" not in counters
+
+
+def test_monitor_limits_alerts_per_sliding_hour(monitor):
+    rule = monitor.rules["cpu_high"]
+    rule.max_alerts_per_hour = 3
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(10):
+            monitor.add_metric("cpu", 99)
+    assert monitor.total_alerts_count == 3
+    assert monitor.total_alerts_generated == 3
+    # Для min_occurrences=1 хватает одной записи истории
+    assert len(monitor.alert_history["cpu_high"]) == 1
+
+    # Через час лимит освобождается
+    counters = monitor.hourly_alert_counts
+    counters._counters["cpu_high"][1] -= counters.buckets
+    with contextlib.redirect_stdout(io.StringIO()):
+        monitor.add_metric("cpu", 99)
+    assert monitor.total_alerts_count == 4
+
+    # После очистки алерты снова генерируются
+    with contextlib.redirect_stdout(io.StringIO()):
+        monitor.clear()
+        monitor.add_metric("cpu", 99)
+    assert monitor.total_alerts_count == 1
+    assert monitor.get_alert_stats()["hourly_limits"] == {"cpu_high": 1}
+
+
+def test_monitor_stats_and_archive_stay_consistent(monitor, tmp_path):
+    monitor.alerts.resize(20)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for i in range(60):
+            monitor.alerts.append(
+                _alert(i, "cpu_high", SEVERITIES[i % 4], minutes=0)
+            )
+        monitor.suppress_alert("alert_50")
+        monitor.suppress_alert("alert_50")
+        monitor.resolve_alert("alert_51")
+        assert not monitor.resolve_alert("alert_0")
+        stats = monitor.get_alert_stats()
+
+    expected = _scan_stats(monitor.alerts)
+    assert stats["total_alerts"] == 20
+    assert stats["active_alerts"] == expected["active"] == 18
+    assert stats["severity_stats"] == expected["severity"]
+    assert stats["rule_stats"] == {"cpu_high": 20}
+    assert monitor.total_alerts_suppressed == 1
+    assert "alert_55" in monitor and monitor.alerts[0] in monitor
+    assert monitor.validate()["valid"]
+    critical = [
+        a for a in monitor.alerts
+        if a.severity == AlertSeverity.CRITICAL
+        and a.status == AlertStatus.ACTIVE
+    ]
+    with contextlib.redirect_stdout(io.StringIO()):
+        health = monitor.get_system_health_detailed()
+    assert health["critical_alerts_count"] == len(critical)
+
+    memory = monitor.get_memory_stats()["memory_usage"]
+    assert memory["archived_alerts"] == 40
+    assert memory["alerts_mb"] * 2**20 == monitor.alerts.nbytes
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        monitor.stop_monitoring()
+    path = tmp_path / "archive" / "alerts.jsonl"
+    with open(path, encoding="utf-8") as f:
+        archived = [json.loads(line) for line in f]
+    assert [r["alert_id"] for r in archived] == [
+        "alert_{}".format(i) for i in range(40)
+    ]
+
+
+def test_async_trim_updates_metric_count_incrementally(monitor, monkeypatch):
+    def recount(self):
+        raise AssertionError("полный пересчет метрик")
+
+    monitor.max_metrics_per_name = 10
+    monkeypatch.setattr(SmartMonitoringSystem, "_recount_metrics", recount)
+
+    async def run():
+        for i in range(25):
+            await monitor.add_metric_async("latency", float(i))
+            await monitor.add_metric_async("other", float(i))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(run())
+    assert monitor.metrics["latency"] == [float(i) for i in range(18, 25)]
+    assert monitor._metric_values == sum(
+        len(values) for values in monitor.metrics.values()
+    )
@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Тесты для параллельного сбора лент угроз (ThreatFeedCollector, IOCIndex)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from security.ai_agents.threat_feed_collector import (  # noqa: E402
+    FeedResponse,
+    IOCIndex,
+    NDJSONParser,
+    RSSParser,
+    detect_ioc_type,
+)
+from security.ai_agents.threat_intelligence_agent import (  # noqa: E402
+    IOCType,
+    ThreatIntelligenceAgent,
+    ThreatSeverity,
+)
+
+
+class FeedServer:
+    """Локальный HTTP-сервер лент с поддержкой ETag"""
+
+    def __init__(self, use_etag=True):
+        self.feeds = {}  # path -> (body, content_type)
+        self.requests = []
+        self.use_etag = use_etag
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.requests.append(
+                    (self.path, self.headers.get("If-None-Match"))
+                )
+                if self.path not in server.feeds:
+                    self.send_response(500)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body, content_type = server.feeds[self.path]
+                etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+                if (
+                    server.use_etag
+                    and self.headers.get("If-None-Match") == etag
+                ):
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                if server.use_etag:
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, daemon=True
+        )
+
+    def url(self, path):
+        return "http://127.0.0.1:{}{}".format(
+            self.httpd.server_address[1], path
+        )
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def _ndjson(records):
+    return "\n".join(json.dumps(r) for r in records).encode()
+
+
+def _threat_records(count, start=0, prefix="t"):
+    return [
+        {
+            "id": "{}{}".format(prefix, i),
+            "title": "Threat {}".format(i),
+            "type": "phishing" if i % 2 else "malware",
+            "severity": "high",
+            "iocs": [
+                "10.{}.{}.{}".format(
+                    i // 65536 % 256, i // 256 % 256, i % 256
+                ),
+                {"type": "domain", "value": "bad{}.example.com".format(i)},
+            ],
+        }
+        for i in range(start, start + count)
+    ]
+
+
+def _agent(server, paths, feed_format="ndjson"):
+    agent = ThreatIntelligenceAgent("TestFeeds")
+    agent.sources = {
+        "feeds": {
+            "name": "Test feeds",
+            "type": "open_source",
+            "format": feed_format,
+            "urls": [server.url(path) for path in paths],
+            "reliability": 0.7,
+            "active": True,
+        }
+    }
+    return agent
+
+
+def test_ioc_detection_and_index():
+    assert detect_ioc_type("192.168.0.1") == "ip_address"
+    assert detect_ioc_type("2001:DB8::1") == "ip_address"
+    assert detect_ioc_type("Evil.Example.COM.") == "domain"
+    assert detect_ioc_type("https://Evil.com/Path") == "url"
+    assert detect_ioc_type("d41d8cd98f00b204e9800998ecf8427e") == "file_hash"
+    assert detect_ioc_type("user@mail.ru") == "email"
+    assert detect_ioc_type("not an ioc") is None
+
+    index = IOCIndex()
+    index.add("t1", [("domain", "Evil.Example.com"), ("ip_address", "::1")])
+    index.add("t2", [("domain", "evil.example.com.")])
+    assert index.lookup("EVIL.example.com") == {"t1", "t2"}
+    assert index.lookup("0:0::1") == {"t1"}
+    index.remove("t1")
+    assert index.lookup("evil.example.com") == {"t2"}
+    assert "::1" not in index
+    assert len(index) == 1
+
+
+def test_parsers_are_incremental():
+    data = _ndjson(_threat_records(50)) + b"\n{broken\n"
+    parser = NDJSONParser()
+    records = []
+    for i in range(0, len(data), 7):
+        records.extend(parser.feed(data[i:i + 7]))
+    records.extend(parser.close())
+    assert [r["id"] for r in records] == ["t{}".format(i) for i in range(50)]
+    assert parser.errors == 1
+
+    rss = (
+        b"<rss><channel>"
+        + b"".join(
+            "<item><title>News {0}</title><link>https://n/{0}</link>"
+            "<guid>g{0}</guid></item>".format(i).encode()
+            for i in range(20)
+        )
+        + b"</channel></rss>"
+    )
+    parser = RSSParser()
+    first = parser.feed(rss[: len(rss) // 2])
+    rest = parser.feed(rss[len(rss) // 2:]) + parser.close()
+    assert 0 < len(first) < 20
+    ids = [r["id"] for r in first + rest]
+    assert ids == ["g{}".format(i) for i in range(20)]
+
+
+def test_conditional_requests_and_incremental_analysis():
+    with FeedServer() as server:
+        server.feeds["/threats"] = (
+            _ndjson(_threat_records(2000)),
+            "application/x-ndjson",
+        )
+        server.feeds["/blocklist"] = (
+            b"# blocklist\n"
+            + "\n".join(
+                "172.16.{}.{}".format(i // 256, i % 256) for i in range(1000)
+            ).encode(),
+            "text/plain",
+        )
+        agent = _agent(server, ["/threats"])
+        agent.sources["blocklist"] = {
+            "type": "community",
+            "format": "text",
+            "urls": [server.url("/blocklist")],
+            "active": True,
+        }
+
+        assert agent.collect_threats() == 3000
+        assert agent.analyze_threats() == 3000
+        assert agent.lookup_ioc("10.0.0.5")[0].threat_id == "t5"
+        assert agent.lookup_ioc("BAD7.example.com")[0].threat_id == "t7"
+        assert agent.lookup_ioc("172.16.3.1")[0].title == "172.16.3.1"
+        assert agent.lookup_ioc("10.0.0.5", IOCType.DOMAIN) == []
+
+        # Ленты не изменились - 304, ничего не анализируется
+        assert agent.collect_threats() == 0
+        assert agent.last_collection["not_modified"] == 2
+        assert agent.analyze_threats() == 0
+
+        # Изменены 5 записей и добавлены 3 новые
+        records = _threat_records(2003)
+        for record in records[:5]:
+            record["severity"] = "critical"
+            record["iocs"] = ["203.0.113.{}".format(record["id"][1:])]
+        server.feeds["/threats"] = (_ndjson(records), "application/x-ndjson")
+
+        assert agent.collect_threats() == 8
+        summary = agent.last_collection
+        assert (summary["new"], summary["changed"]) == (3, 5)
+        assert summary["duplicates"] == 1995
+        assert summary["not_modified"] == 1
+        assert agent.analyze_threats() == 8
+        assert agent.threats["t0"].severity == ThreatSeverity.CRITICAL
+        # Индикаторы старой версии угрозы удалены из индекса
+        assert agent.lookup_ioc("10.0.0.0") == []
+        assert agent.lookup_ioc("203.0.113.0")[0].threat_id == "t0"
+
+    with_etag = [p for p, etag in server.requests if etag]
+    assert len(with_etag) == 4
+
+
+def test_content_hash_dedup_without_validators():
+    with FeedServer(use_etag=False) as server:
+        server.feeds["/a"] = (_ndjson(_threat_records(100)), "text/plain")
+        server.feeds["/b"] = (
+            json.dumps({"threats": _threat_records(150)}).encode(),
+            "application/json",
+        )
+        agent = _agent(server, ["/a"])
+        agent.sources["api"] = {
+            "type": "commercial",
+            "format": "json",
+            "api_endpoints": [server.url("/b")],
+            "active": True,
+        }
+        # Первые 100 записей в обеих лентах совпадают
+        assert agent.collect_threats() == 150
+        assert agent.last_collection["duplicates"] == 100
+        assert agent.analyze_threats() == 150
+        assert agent.collect_threats() == 0
+        assert agent.last_collection["duplicates"] == 250
+        assert agent.analyze_threats() == 0
+
+
+def test_failed_feed_does_not_block_others():
+    with FeedServer() as server:
+        server.feeds["/ok"] = (_ndjson(_threat_records(10)), "text/plain")
+        agent = _agent(server, ["/ok", "/missing"])
+        assert agent.collect_threats() == 10
+        assert agent.last_collection["errors"] == 1
+        assert agent.metrics.source_errors["feeds"] == 1
+        assert agent.metrics.api_errors == 1
+
+
+def test_injected_fetcher_replaces_network():
+    body = _ndjson(_threat_records(30))
+    calls = []
+
+    async def fetcher(url, headers):
+        calls.append((url, headers.get("If-None-Match")))
+        await asyncio.sleep(0)
+        if url.endswith("/broken"):
+            raise ConnectionResetError("reset")
+        if headers.get("If-None-Match") == '"v1"':
+            return FeedResponse(304, {"ETag": '"v1"'})
+        return FeedResponse(200, {"ETag": '"v1"'}, body)
+
+    urls = ["https://feeds.test/threats", "https://feeds.test/broken"]
+    agent = ThreatIntelligenceAgent(
+        "TestFeeds",
+        sources={
+            "feeds": {"format": "ndjson", "urls": urls, "active": True}
+        },
+        feed_fetcher=fetcher,
+    )
+    agent.initialize()
+    agent.feed_collector.chunk_size = 100
+    assert agent.collect_threats() == 30
+    assert agent.last_collection["errors"] == 1
+    assert agent.lookup_ioc("bad3.example.com")[0].threat_id == "t3"
+    assert agent.feed_collector._session is None
+
+    assert agent.collect_threats() == 0
+    assert agent.last_collection["not_modified"] == 1
+    assert calls[-2:] == [(urls[0], '"v1"'), (urls[1], None)]
+
+
+def test_default_agent_does_not_touch_network():
+    agent = ThreatIntelligenceAgent("TestFeeds")
+    agent.initialize()
+    assert all(not s["active"] for s in agent.sources.values())
+    assert agent.collect_threats() == 0
+    assert agent.feed_collector.stats["requests"] == 0
+
+
+@pytest.mark.performance
+def test_parallel_collection_throughput():
+    feeds, per_feed = 8, 25000
+    with FeedServer() as server:
+        paths = []
+        for f in range(feeds):
+            path = "/feed{}".format(f)
+            server.feeds[path] = (
+                _ndjson(_threat_records(per_feed, f * per_feed)),
+                "application/x-ndjson",
+            )
+            paths.append(path)
+        size = sum(len(body) for body, _ in server.feeds.values())
+        agent = _agent(server, paths)
+
+        start = time.perf_counter()
+        collected = agent.collect_threats()
+        collect_time = time.perf_counter() - start
+        assert collected == feeds * per_feed
+
+        start = time.perf_counter()
+        assert agent.collect_threats() == 0
+        revalidate_time = time.perf_counter() - start
+
+        probes = ["10.1.{}.{}".format(i // 256, i % 256) for i in range(10000)]
+        start = time.perf_counter()
+        hits = sum(1 for value in probes if agent.ioc_index.lookup(value))
+        lookup_us = (time.perf_counter() - start) / len(probes) * 1e6
+
+    assert size > 10 * 2**20
+    assert hits == 10000
+    assert revalidate_time < collect_time
+    assert lookup_us < 100
@@ -21,6 +21,8 @@
 Дата: 2024
 """
 
+import asyncio
+import json
 import os
 import sys
 import unittest
@@ -31,6 +33,7 @@ from datetime import datetime
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 try:
+    from security.ai_agents.threat_feed_collector import FeedResponse
     from security.ai_agents.threat_intelligence_agent import (
         ThreatIntelligenceAgent,
         ThreatIntelligence,
@@ -45,6 +48,38 @@ except ImportError as e:
     sys.exit(1)
 
 
+# Локальная лента вместо сетевых источников
+FEED_URL = "https://feeds.test/threats.ndjson"
+FEED_SOURCES = {
+    "fixture": {
+        "name": "Fixture feed",
+        "type": "open_source",
+        "format": "ndjson",
+        "urls": [FEED_URL],
+        "reliability": 0.8,
+        "active": True,
+    }
+}
+FEED_RECORDS = [
+    {
+        "id": "fixture_{}".format(i),
+        "title": "Phishing campaign {}".format(i),
+        "description": "Detailed description of phishing campaign {}".format(i),
+        "type": "phishing",
+        "severity": "high",
+        "iocs": ["203.0.113.{}".format(i), "phish{}.example.com".format(i)],
+    }
+    for i in range(5)
+]
+
+
+async def fixture_fetcher(url, headers):
+    """Подменный загрузчик лент: ответ без сети"""
+    await asyncio.sleep(0)
+    body = "\n".join(json.dumps(record) for record in FEED_RECORDS)
+    return FeedResponse(200, {"ETag": '"fixture"'}, body.encode())
+
+
 class TestThreatIntelligenceAgent(unittest.TestCase):
     """
     Тесты для ThreatIntelligenceAgent
@@ -58,6 +93,14 @@ class TestThreatIntelligenceAgent(unittest.TestCase):
         """Настройка тестов"""
         self.agent = ThreatIntelligenceAgent("TestThreatIntelligenceAgent")
     
+    def _use_fixture_feed(self):
+        """Агент с локальной лентой и подменным загрузчиком"""
+        self.agent = ThreatIntelligenceAgent(
+            "TestThreatIntelligenceAgent",
+            sources=FEED_SOURCES,
+            feed_fetcher=fixture_fetcher,
+        )
+    
     def test_initialization(self):
         """Тест инициализации агента"""
         self.assertIsNotNone(self.agent)
@@ -115,6 +158,7 @@ class TestThreatIntelligenceAgent(unittest.TestCase):
     
     def test_threat_collection(self):
         """Тест сбора угроз"""
+        self._use_fixture_feed()
         self.agent.initialize()
         
         # Сбор угроз
@@ -127,9 +171,19 @@ class TestThreatIntelligenceAgent(unittest.TestCase):
         # Проверка метрик
         self.assertGreater(self.agent.metrics.total_threats_collected, 0)
         self.assertIsNotNone(self.agent.metrics.last_collection_time)
+        self.assertEqual(self.agent.feed_collector.stats["requests"], 1)
+    
+    def test_default_sources_stay_offline(self):
+        """Тест: встроенные публичные ленты выключены по умолчанию"""
+        self.agent.initialize()
+        self.assertTrue(self.agent.sources)
+        self.assertEqual(self.agent.active_sources_count, 0)
+        self.assertEqual(self.agent.collect_threats(), 0)
+        self.assertEqual(self.agent.feed_collector.stats["requests"], 0)
     
     def test_threat_analysis(self):
         """Тест анализа угроз"""
+        self._use_fixture_feed()
         self.agent.initialize()
         self.agent.collect_threats()
         
@@ -328,6 +382,7 @@ class TestThreatIntelligenceAgent(unittest.TestCase):
     
     def test_full_workflow(self):
         """Тест полного рабочего процесса"""
+        self._use_fixture_feed()
         # Инициализация
         self.assertTrue(self.agent.initialize())
         